@@ -0,0 +1,34 @@
+"""partial indexes for active trigger projection
+
+Revision ID: 20261016_active_trigger_idx
+Revises: 20251130_fix_stuck_shadow
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20261016_active_trigger_idx'
+down_revision = '20251130_fix_stuck_shadow'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # build_triggers_index يقرأ فقط الصفقات النشطة — فهرس جزئي صغير بدل مسح الجدول كاملاً
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_recommendations_active_triggers
+        ON recommendations (id)
+        WHERE status IN ('PENDING', 'ACTIVE') AND is_shadow = false;
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_user_trades_active_triggers
+        ON user_trades (id)
+        WHERE status IN ('WATCHLIST', 'PENDING_ACTIVATION', 'ACTIVATED');
+    """)
+    print("✅ Active-trigger partial indexes created.")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_user_trades_active_triggers;")
+    op.execute("DROP INDEX IF EXISTS ix_recommendations_active_triggers;")
@@ -0,0 +1,55 @@
+"""transactional notification outbox
+
+Revision ID: 20261016_notification_outbox
+Revises: 20261016_active_trigger_idx
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261016_notification_outbox'
+down_revision = '20261016_active_trigger_idx'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if "notification_outbox" in inspect(op.get_bind()).get_table_names():
+        print("[MIGRATION] notification_outbox already exists.")
+        return
+
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('idempotency_key', sa.String(128), nullable=False),
+        sa.Column('kind', sa.String(16), nullable=False),
+        sa.Column('recommendation_id', sa.Integer(), sa.ForeignKey('recommendations.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('reply_to_message_id', sa.BigInteger(), nullable=True),
+        sa.Column('payload', postgresql.JSONB(), nullable=False),
+        sa.Column('status', sa.String(16), nullable=False, server_default='PENDING'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint('idempotency_key', name='uq_notification_outbox_idempotency_key'),
+    )
+    op.create_index('ix_notification_outbox_recommendation_id', 'notification_outbox', ['recommendation_id'])
+    # الـ relay يقرأ PENDING فقط — فهرس جزئي لا يكبر مع الصفوف المُرسَلة
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_notification_outbox_pending
+        ON notification_outbox (available_at)
+        WHERE status = 'PENDING';
+    """)
+    print("✅ notification_outbox created.")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_notification_outbox_pending;")
+    op.drop_index('ix_notification_outbox_recommendation_id', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
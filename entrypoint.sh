@@ -9,6 +9,14 @@ echo "Entrypoint: Running database migrations..."
 # This ensures the script waits for migrations to complete before proceeding.
 alembic upgrade head
 
+# Alert worker processes for supervisord (numprocs must be >= 1, so 0 shards = 1 idle program)
+export ALERT_SHARD_COUNT="${ALERT_SHARD_COUNT:-0}"
+if [ "$ALERT_SHARD_COUNT" -gt 0 ]; then
+    export ALERT_WORKER_PROCS="$ALERT_SHARD_COUNT" ALERT_WORKER_AUTOSTART=true
+else
+    export ALERT_WORKER_PROCS=1 ALERT_WORKER_AUTOSTART=false
+fi
+
 # Start the main application using supervisord
 echo "Entrypoint: Migrations complete. Starting supervisor..."
 exec /usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf
\ No newline at end of file
@@ -1,6 +1,77 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
 # File: src/capitalguard/application/services/alert_service.py
-# Version: v30.0-PARTITIONED
+# Version: v30.9.2-LEADER-ELECTION
+#
+# ✅ THE FIX (v30.9.2): مستمع "cg:trigger_update" يُعيد بناء الفهرس بعد كل (إعادة)
+#   اشتراك — التغييرات المنشورة أثناء انقطاع Redis، قبل اشتراك القائد الجديد، أو
+#   أثناء انتقال القيادة لا تنتظر _run_index_sync (حتى 10 دقائق) بلا مراقبة SL/TP.
+#   ALERT_LEADER_ELECTION أصبح معطَّلاً افتراضياً (التمرير عبر pub/sub غير مضمون).
+#
+# ✅ THE FIX (v30.9.1): ملكية حالات StrategyEngine الغائبة عند إعادة البناء تُحدَّد
+#   بـ shard رمزها (المحفوظ في الـ checkpoint) لا بوجودها في الفهرس السابق —
+#   أول بناء بعد إعادة التشغيل كان يُفلِت حالات التوصيات المغلقة أثناء التوقف
+#   بدل حذفها، فيكبر الـ hash المشترك بلا حد.
+#
+# ✅ THE UPGRADE (v30.9) — تشغيل/إيقاف عند تغيّر القيادة (leader_election.py):
+#   start_evaluating() / stop_evaluating() يستدعيهما LeaderElector:
+#   القائد يبني الفهرس ويبث الأسعار، والتابع يُمرِّر تغييرات الـ triggers
+#   على "cg:trigger_update" (forward_updates) ليلتقطها القائد.
+#   stop() يُصفِّر workers والـ loop → start() ممكن مجدداً عند إعادة الانتخاب.
+#
+# ✅ THE UPGRADE (v30.8) — عمال alert مُقسَّمون بالرموز (alert_shards.py):
+#   shard=SymbolShard(i, n) → الفهرس والاشتراكات والحالة للرموز المملوكة فقط،
+#   وتغييرات العملية الرئيسية تصل عبر "cg:trigger_update" (إعادة قراءة من DB).
+#   forward_updates=True (العملية الرئيسية حين ALERT_SHARD_COUNT > 0) → add/upsert/remove
+#   تُنشَر للعمال بدل فهرس محلي لا يُقيَّم.
+#   آثار lifecycle بلا تغيير: get_for_update + فحص الأحداث يضمنان مالكاً واحداً
+#   حتى لو تداخل عاملان لحظياً أثناء إعادة التوزيع.
+#
+# ✅ THE FIX (v30.7) — حالة StrategyEngine تنجو من إعادة البناء وإعادة التشغيل:
+#   _apply_new_index يستدعي retain_states بدل clear_all_states + init للجميع.
+#   restore_strategy_state() قبل build_triggers_index، و run_checkpointer على bg loop.
+#   stop() يُفرِّغ آخر checkpoint عبر strategy_engine.shutdown().
+#
+# ✅ THE FIX (v30.6) — بناء الفهرس من projection مُبثَّة:
+#   build_triggers_index يستهلك repo.iter_active_triggers_data (أعمدة + array_agg للأحداث)
+#   صفاً صفاً إلى TriggerRecord — بدون تحميل كائنات ORM وكل تاريخ الأحداث.
+#   القراءة تتم في thread (asyncio.to_thread) → الـ resync كل 10 دقائق لا يحجب bg loop.
+#   cg_alert_index_build_seconds = مدة آخر بناء.
+#
+# ✅ THE FIX (v30.5) — DB work off the alert loop:
+#   استدعاءات LifecycleService (session_scope + SQLAlchemy متزامن) تُرسَل الآن
+#   كـ jobs لـ DbExecutor (threads محدودة) بدل تنفيذها على alertservice-bg.
+#   worker الرمز ينتظر الـ job (نفس الترتيب لكل رمز) لكن بقية الرموز و WS لا تتوقف.
+#   تعديلات الفهرس القادمة من loops أخرى تُنفَّذ على bg loop (_run_on_bg_loop).
+#   cg_alert_stage_latency_seconds{stage}: decision / db_queue / db_job / commit / notify.
+#
+# ✅ THE FIX (v30.4) — Coalescing Tick Router:
+#   queue من 10 خانات لكل رمز + حذف أقدم تيك عند الامتلاء
+#   → spike يضرب SL داخل تيك محذوف كان يضيع تماماً.
+#   الآن: _TickMailbox لكل رمز — إذا كان الـ worker مشغولاً، التيك الجديد
+#   يُدمج في نافذة معلَّقة واحدة (min low, max high, last close).
+#   الـ worker يُقيِّم شمعة مدمجة واحدة → لا تضيع أي قمة/قاع، والتراكم O(1) لكل رمز.
+#   عدّاد cg_alert_ticks_merged_total{symbol} + self.merged_ticks.
+#
+# ✅ THE UPGRADE (v30.3) — Compact Trigger Records:
+#   active_triggers يحمل TriggerRecord (__slots__) بدل dict بـ ~20 مفتاحاً:
+#   أسعار int مُقيَّسة + bitmask للأحداث المعالَجة (trigger_records.py).
+#   التحويل يتم عند الإدخال (add/upsert/_apply_new_index) — builders بدون تغيير.
+#   _evaluate_core_triggers يقارن ints بحدود التيك (ceil/floor) → نفس النتائج تماماً.
+#
+# ✅ THE UPGRADE (v30.2) — Sorted Price-Level Index:
+#   _symbol_worker كان يُقيِّم كل triggers الرمز في كل تيك.
+#   الآن: SymbolLevelIndex (trigger_index.py) لكل رمز — مستويات SL/ENTRY/TP مرتبة
+#   والتيك [low, high] يُعيد فقط triggers التي عَبَر أحد مستوياتها (bisect).
+#   توصيات profit_stop_active فقط تمر على StrategyEngine في كل تيك (watermarks).
+#   الفهرس يُحدَّث مع active_triggers في add/upsert/remove/_apply_new_index.
+#
+# ✅ THE UPGRADE (v30.1) — Delta Index Updates:
+#   كل تعديل SL/Targets/Activation كان يستدعي build_triggers_index()
+#   → قراءة كل التوصيات والصفقات النشطة من DB + مسح كل حالات StrategyEngine
+#   (تضيع قيم highest/lowest الخاصة بالـ Trailing Stop).
+#   الآن: sync_trigger_from_orm() / upsert_trigger_data() تُحدِّث trigger واحداً
+#   من كائن ORM المُحمَّل مسبقاً، وتحافظ على حالة المحرك للتوصية.
+#   إعادة البناء الكامل تبقى فقط في _run_index_sync (شبكة أمان كل 10 دقائق).
 #
 # ✅ THE UPGRADE — Partitioned Processing (معالجة مُقسَّمة لكل رمز):
 #
@@ -16,7 +87,7 @@
 #     تُوجِّهها فوراً لـ queue الرمز المناسب
 #     لا تقوم بأي معالجة — router فقط
 #
-#   الطبقة 2: _symbol_queues[key] + _symbol_workers[key]
+#   الطبقة 2: _symbol_mailboxes[key] + _symbol_workers[key]
 #     queue منفصلة لكل رمز: "BTCUSDT:Futures", "ETHUSDT:Futures", ...
 #     worker منفصل لكل رمز يعمل باستقلالية تامة
 #     BTC يضرب SL؟ ETH وSOL لا يتأثران أبداً
@@ -57,10 +128,34 @@ from capitalguard.application.strategy.engine import (
     AlertAction,
 )
 from capitalguard.infrastructure.sched.price_streamer import PriceStreamer
+from capitalguard.infrastructure.sched.alert_shards import (
+    ACTION_REMOVE,
+    ACTION_UPSERT,
+    SymbolShard,
+    listen_trigger_events,
+    publish_trigger_event,
+)
+from capitalguard.infrastructure.monitoring.metrics import (
+    ALERT_TICKS_ROUTED,
+    ALERT_TICKS_MERGED,
+    ALERT_STAGE_LATENCY,
+    ALERT_INDEX_BUILD_SECONDS,
+)
+from .trigger_index import SymbolLevelIndex
+from .trigger_records import (
+    TriggerRecord,
+    EV_ACTIVATED,
+    EV_INVALIDATED,
+    EV_SL_HIT,
+    EV_FINAL_CLOSE,
+    scaled_bounds,
+    tp_bit,
+)
 
 if False:
     from .lifecycle_service import LifecycleService
     from .price_service import PriceService
+    from capitalguard.infrastructure.db.executor import DbExecutor
 
 log = logging.getLogger(__name__)
 
@@ -68,10 +163,6 @@ log = logging.getLogger(__name__)
 # حجم الـ routing queue (الطبقة 1)
 ROUTER_QUEUE_SIZE = 5_000
 
-# حجم كل symbol queue (الطبقة 2)
-# كل رمز يحصل على تيك واحد في الثانية → 10 تيكات كافية
-SYMBOL_QUEUE_SIZE = 10
-
 
 def _to_decimal(value: Any, default: Decimal = Decimal("0")) -> Decimal:
     if isinstance(value, Decimal):
@@ -85,6 +176,78 @@ def _to_decimal(value: Any, default: Decimal = Decimal("0")) -> Decimal:
         return default
 
 
+def _parse_tick(payload: Any) -> Optional[Dict[str, Any]]:
+    """
+    يُحوِّل payload الـ PriceStreamer (dict أو tuple) إلى
+    {"symbol", "market", "low", "high", "close"} بـ Decimal. None إذا كان غير صالح.
+    """
+    if isinstance(payload, (list, tuple)):
+        if len(payload) == 4:
+            symbol, market, low_raw, high_raw = payload
+            close_raw = high_raw
+        elif len(payload) >= 5:
+            symbol, market, low_raw, high_raw, close_raw = payload[:5]
+        else:
+            return None
+    elif isinstance(payload, dict):
+        symbol    = payload.get("symbol")
+        market    = payload.get("market", "Futures")
+        low_raw   = payload.get("low")
+        high_raw  = payload.get("high")
+        close_raw = payload.get("close", high_raw)
+    else:
+        return None
+
+    try:
+        return {
+            "symbol": symbol,
+            "market": market,
+            "low":    Decimal(str(low_raw)),
+            "high":   Decimal(str(high_raw)),
+            "close":  Decimal(str(close_raw)),
+            # وقت الاستلام — النافذة المدموجة تحتفظ بأقدم قيمة
+            "received_at": time.monotonic(),
+        }
+    except Exception:
+        return None
+
+
+class _TickMailbox:
+    """
+    Latest-window mailbox لرمز واحد (بديل asyncio.Queue).
+    خانة معلَّقة واحدة فقط: التيكات التي تصل أثناء انشغال الـ worker تُدمج فيها
+    (min low, max high, last close) بدلاً من أن تصطف أو تُحذف.
+    """
+
+    __slots__ = ("_pending", "_event")
+
+    def __init__(self) -> None:
+        self._pending: Optional[Dict[str, Any]] = None
+        self._event = asyncio.Event()
+
+    def put(self, tick: Dict[str, Any]) -> bool:
+        """يُعيد True إذا دُمج التيك في نافذة معلَّقة موجودة."""
+        pending = self._pending
+        if pending is None:
+            self._pending = dict(tick)
+            self._event.set()
+            return False
+        if tick["low"] < pending["low"]:
+            pending["low"] = tick["low"]
+        if tick["high"] > pending["high"]:
+            pending["high"] = tick["high"]
+        pending["close"] = tick["close"]
+        return True
+
+    async def get(self) -> Dict[str, Any]:
+        while self._pending is None:
+            self._event.clear()
+            await self._event.wait()
+        tick, self._pending = self._pending, None
+        self._event.clear()
+        return tick
+
+
 class AlertService:
     """
     AlertService v30 — Partitioned Processing.
@@ -92,9 +255,9 @@ class AlertService:
     Architecture:
       Binance WS → PriceStreamer → price_queue (Router)
           ↓
-      _route_ticks() → symbol_queues["BTCUSDT:Futures"]
-                     → symbol_queues["ETHUSDT:Futures"]
-                     → symbol_queues["SOLUSDT:Futures"]
+      _route_ticks() → symbol_mailboxes["BTCUSDT:Futures"]
+                     → symbol_mailboxes["ETHUSDT:Futures"]
+                     → symbol_mailboxes["SOLUSDT:Futures"]
           ↓              ↓              ↓
       worker_BTC     worker_ETH     worker_SOL
       (مستقل)        (مستقل)        (مستقل)
@@ -109,11 +272,26 @@ class AlertService:
         repo: RecommendationRepository,
         strategy_engine: StrategyEngine,
         streamer: Optional[PriceStreamer] = None,
+        db_executor: Optional["DbExecutor"] = None,
+        checkpoint_interval_seconds: float = 5.0,
+        checkpoint_full_seconds: float = 300.0,
+        shard: Optional[SymbolShard] = None,
+        forward_updates: bool = False,
     ):
         self.lifecycle_service = lifecycle_service
         self.price_service = price_service
         self.repo = repo
         self.strategy_engine = strategy_engine
+        # None → استدعاءات lifecycle تُنفَّذ مباشرة على bg loop (السلوك القديم)
+        self.db_executor = db_executor
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+        self.checkpoint_full_seconds = checkpoint_full_seconds
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        # None → كل الرموز في هذه العملية؛ وإلا عامل alert_worker لـ shard واحد
+        self.shard = shard
+        # True → لا فهرس محلي؛ تغييرات الـ triggers تُنشَر لعمال الـ shards
+        self.forward_updates = forward_updates
+        self._trigger_events_task: Optional[asyncio.Task] = None
 
         self._streamer_arg = streamer
 
@@ -121,10 +299,12 @@ class AlertService:
         # تستقبل كل التيكات — PriceStreamer يكتب هنا (interface بدون تغيير)
         self.price_queue: Optional[asyncio.Queue] = None
 
-        # ── Tier 2: Per-Symbol Queues + Workers ────────────────────────────
+        # ── Tier 2: Per-Symbol Mailboxes + Workers ─────────────────────────
         # يُنشأ ديناميكياً عند أول تيك لكل رمز
-        self._symbol_queues: Dict[str, asyncio.Queue] = {}
+        self._symbol_mailboxes: Dict[str, _TickMailbox] = {}
         self._symbol_workers: Dict[str, asyncio.Task] = {}
+        # عدد التيكات المدموجة لكل مفتاح (نفس cg_alert_ticks_merged_total)
+        self.merged_ticks: Dict[str, int] = {}
 
         # ── Thread Safety ─────────────────────────────────────────────────
         self._sync_lock = threading.RLock()
@@ -132,7 +312,9 @@ class AlertService:
         self._workers_lock: Optional[asyncio.Lock] = None  # لحماية _symbol_workers
 
         # ── Triggers Index ────────────────────────────────────────────────
-        self.active_triggers: Dict[str, List[Dict[str, Any]]] = {}
+        self.active_triggers: Dict[str, List[TriggerRecord]] = {}
+        # فهرس مستويات الأسعار لكل مفتاح — متزامن دائماً مع active_triggers
+        self._level_index: Dict[str, SymbolLevelIndex] = {}
 
         # ── Tasks ─────────────────────────────────────────────────────────
         self._routing_task: Optional[asyncio.Task] = None    # Router (Tier 1)
@@ -162,11 +344,17 @@ class AlertService:
                 self._workers_lock = asyncio.Lock()
                 log.info("AlertService: queues and locks created.")
 
+                if self.db_executor is not None:
+                    self.db_executor.start()
+
                 # ── PriceStreamer ──────────────────────────────────────────
                 if self._streamer_arg is not None:
                     self.streamer = self._streamer_arg
                 else:
-                    self.streamer = PriceStreamer(self.price_queue, self.repo)
+                    self.streamer = PriceStreamer(
+                        self.price_queue, self.repo,
+                        symbol_filter=self.shard.owns if self.shard else None,
+                    )
                     log.info("AlertService: PriceStreamer created.")
 
                 # ✅ P1-FIX: نُمرِّر مرجع active_triggers للـ PriceStreamer
@@ -175,9 +363,18 @@ class AlertService:
                     self.streamer.set_active_triggers_ref(self.active_triggers)
 
                 # ── Tasks ──────────────────────────────────────────────────
-                # Router يقرأ من price_queue ويُوجِّه لـ symbol queues
+                # Router يقرأ من price_queue ويُوجِّه لـ symbol mailboxes
                 self._routing_task   = loop.create_task(self._route_ticks())
                 self._index_sync_task = loop.create_task(self._run_index_sync())
+                self._checkpoint_task = loop.create_task(self.strategy_engine.run_checkpointer(
+                    self.checkpoint_interval_seconds, self.checkpoint_full_seconds,
+                ))
+                # تغييرات الـ triggers من العمليات الأخرى (API تابع / عملية رئيسية)
+                self._trigger_events_task = loop.create_task(
+                    listen_trigger_events(self._on_trigger_event, on_subscribed=self.build_triggers_index)
+                )
+                if self.shard is not None:
+                    log.info("AlertService: serving symbol shard %s.", self.shard)
 
                 # ── PriceStreamer start ────────────────────────────────────
                 try:
@@ -195,9 +392,10 @@ class AlertService:
                         "AlertService: %d pre-loaded triggers transferred to bg loop.",
                         loaded,
                     )
+                    # الحالة المستعادة/المبنية مسبقاً تبقى — التهيئة للناقص فقط
                     for triggers in self.active_triggers.values():
                         for t in triggers:
-                            if t.get("item_type") == "recommendation":
+                            if t.get("item_type") == "recommendation" and not self.strategy_engine.has_state(t.get("id")):
                                 self.strategy_engine.initialize_state_for_recommendation(t)
 
                 log.info(
@@ -228,7 +426,7 @@ class AlertService:
     async def _route_ticks(self) -> None:
         """
         الطبقة 1: يقرأ من price_queue ويُوجِّه كل تيك
-        لـ queue الرمز المناسب في الطبقة 2.
+        لـ mailbox الرمز المناسب في الطبقة 2.
         لا يقوم بأي معالجة — router خالص.
         """
         log.info("AlertService: Tick Router started.")
@@ -270,12 +468,13 @@ class AlertService:
                 async with self._triggers_lock:
                     has_triggers = bool(self.active_triggers.get(key))
 
-                if not has_triggers:
+                tick = _parse_tick(payload) if has_triggers else None
+                if tick is None:
                     self.price_queue.task_done()
                     continue
 
                 # ── توجيه للـ Symbol Worker ────────────────────────────
-                await self._dispatch_to_symbol(key, payload)
+                await self._dispatch_to_symbol(key, tick)
                 self.price_queue.task_done()
 
             except asyncio.CancelledError:
@@ -284,100 +483,75 @@ class AlertService:
             except Exception:
                 log.exception("AlertService: Router unexpected error.")
 
-    async def _dispatch_to_symbol(self, key: str, payload: Any) -> None:
+    async def _dispatch_to_symbol(self, key: str, tick: Dict[str, Any]) -> None:
         """
-        يُرسل التيك لـ queue الرمز.
+        يُسلِّم التيك لـ mailbox الرمز.
         إذا لم يوجد worker → يُنشئه.
-        إذا امتلأ الـ queue → يتجاهل التيك القديم ويضع الجديد.
+        إذا كان الـ worker مشغولاً → التيك يُدمج في النافذة المعلَّقة (لا شيء يُحذف).
         """
         async with self._workers_lock:
-            # إنشاء queue + worker عند الحاجة
-            if key not in self._symbol_queues:
-                q = asyncio.Queue(maxsize=SYMBOL_QUEUE_SIZE)
-                self._symbol_queues[key] = q
-                task = asyncio.ensure_future(self._symbol_worker(key, q))
+            # إنشاء mailbox + worker عند الحاجة
+            mailbox = self._symbol_mailboxes.get(key)
+            if mailbox is None:
+                mailbox = _TickMailbox()
+                self._symbol_mailboxes[key] = mailbox
+                task = asyncio.ensure_future(self._symbol_worker(key, mailbox))
                 self._symbol_workers[key] = task
                 log.debug("AlertService: created worker for %s", key)
 
-            q = self._symbol_queues[key]
-
-        # ── وضع التيك — non-blocking ────────────────────────────────────
-        try:
-            q.put_nowait(payload)
-        except asyncio.QueueFull:
-            # الـ queue ممتلئة → تجاهل أقدم تيك واستبدله بالجديد
-            # التيك القديم بيانات منتهية الصلاحية — الجديد أدق
-            try:
-                q.get_nowait()
-            except asyncio.QueueEmpty:
-                pass
-            try:
-                q.put_nowait(payload)
-            except asyncio.QueueFull:
-                pass  # لا يحدث عملياً
+        ALERT_TICKS_ROUTED.labels(key).inc()
+        if mailbox.put(tick):
+            self.merged_ticks[key] = self.merged_ticks.get(key, 0) + 1
+            ALERT_TICKS_MERGED.labels(key).inc()
 
     # ─────────────────────────────────────────────────────────────────────────
     # Tier 2 — Per-Symbol Worker
     # ─────────────────────────────────────────────────────────────────────────
 
-    async def _symbol_worker(self, key: str, queue: asyncio.Queue) -> None:
+    async def _symbol_worker(self, key: str, mailbox: _TickMailbox) -> None:
         """
         الطبقة 2: معالج مستقل لرمز واحد.
         BTC worker و ETH worker يعملان بالتوازي — لا يحجب أحدهما الآخر.
+        كل دورة تُقيِّم نافذة واحدة (قد تكون عدة تيكات مدموجة).
         """
         log.debug("AlertService: worker started for %s", key)
         while True:
             try:
-                payload = await queue.get()
-
-                # ── استخراج بيانات التيك ──────────────────────────────
-                if isinstance(payload, (list, tuple)):
-                    if len(payload) == 4:
-                        symbol, market, low_raw, high_raw = payload
-                        close_raw = high_raw
-                    elif len(payload) >= 5:
-                        symbol, market, low_raw, high_raw, close_raw = payload[:5]
-                    else:
-                        queue.task_done()
-                        continue
-                elif isinstance(payload, dict):
-                    symbol    = payload.get("symbol")
-                    market    = payload.get("market", "Futures")
-                    low_raw   = payload.get("low")
-                    high_raw  = payload.get("high")
-                    close_raw = payload.get("close", high_raw)
-                else:
-                    queue.task_done()
-                    continue
+                window = await mailbox.get()
 
-                try:
-                    low_price   = Decimal(str(low_raw))
-                    high_price  = Decimal(str(high_raw))
-                    close_price = Decimal(str(close_raw))
-                except Exception:
-                    queue.task_done()
-                    continue
+                symbol      = window["symbol"]
+                market      = window["market"]
+                low_price   = window["low"]
+                high_price  = window["high"]
+                close_price = window["close"]
+                received_at = window.get("received_at")
 
                 tick = {
-                    "high":  high_price,
-                    "low":   low_price,
-                    "close": close_price,
-                    "ts":    int(time.time()),
+                    "high":   high_price,
+                    "low":    low_price,
+                    "close":  close_price,
+                    "ts":     int(time.time()),
+                    # يُحدِّد مقياس fixed-point في StrategyEngine (tickSize الرمز)
+                    "symbol": symbol,
+                    "market": market,
                 }
 
-                # ── snapshot triggers لهذا الرمز ──────────────────────
+                # ── triggers التي عَبَرها التيك فقط (فهرس المستويات) ──
                 async with self._triggers_lock:
-                    triggers_for_key = list(self.active_triggers.get(key, []))
+                    level_index = self._level_index.get(key)
+                    if level_index:
+                        crossed_triggers  = level_index.crossed(low_price, high_price)
+                        strategy_triggers = level_index.strategy_triggers()
 
-                if not triggers_for_key:
+                if not level_index:
                     # لا توصيات نشطة → نظّف الـ worker
-                    queue.task_done()
                     await self._cleanup_worker(key)
                     return
 
                 # ── Evaluation ────────────────────────────────────────
-                rec_triggers   = [t for t in triggers_for_key if t.get("item_type") == "recommendation"]
-                other_triggers = [t for t in triggers_for_key if t.get("item_type") != "recommendation"]
+                rec_triggers   = [t for t in strategy_triggers if t.get("item_type") == "recommendation"]
+                other_triggers = [t for t in strategy_triggers if t.get("item_type") != "recommendation"]
+                triggers_for_key = strategy_triggers + crossed_triggers
 
                 strategy_actions: List[BaseAction] = []
                 if rec_triggers:
@@ -397,18 +571,20 @@ class AlertService:
                         log.exception("evaluate failed id=%s", trig.get("id"))
 
                 core_actions: List[BaseAction] = []
-                for trig in triggers_for_key:
+                bounds: Dict[int, Any] = {}  # exp → (low_i, high_i) لهذا التيك
+                for trig in crossed_triggers:
                     try:
-                        acts = await self._evaluate_core_triggers(trig, high_price, low_price)
+                        acts = await self._evaluate_core_triggers(trig, high_price, low_price, bounds)
                         if acts:
                             core_actions.extend(acts)
                     except Exception:
                         log.exception("core_evaluate failed id=%s", trig.get("id"))
 
                 all_actions = strategy_actions + core_actions
+                if received_at is not None:
+                    ALERT_STAGE_LATENCY.labels("decision").observe(time.monotonic() - received_at)
 
                 if not all_actions:
-                    queue.task_done()
                     continue
 
                 # ── تنفيذ Actions ─────────────────────────────────────
@@ -417,7 +593,8 @@ class AlertService:
                 )
                 if close_action:
                     try:
-                        await self.lifecycle_service.close_recommendation_async(
+                        await self._submit_lifecycle(
+                            self.lifecycle_service.close_recommendation_async,
                             rec_id=close_action.rec_id,
                             user_id=self._find_user_id_for_rec(
                                 close_action.rec_id, triggers_for_key
@@ -432,13 +609,13 @@ class AlertService:
                         self.strategy_engine.clear_state(close_action.rec_id)
                     except Exception:
                         pass
-                    queue.task_done()
                     continue
 
                 for act in all_actions:
                     try:
                         if isinstance(act, MoveSLAction):
-                            await self.lifecycle_service.update_sl_for_user_async(
+                            await self._submit_lifecycle(
+                                self.lifecycle_service.update_sl_for_user_async,
                                 rec_id=act.rec_id,
                                 user_id=self._find_user_id_for_rec(
                                     act.rec_id, triggers_for_key
@@ -448,7 +625,8 @@ class AlertService:
                         elif isinstance(act, AlertAction):
                             if hasattr(self.lifecycle_service, "send_alert_async"):
                                 try:
-                                    await self.lifecycle_service.send_alert_async(
+                                    await self._submit_lifecycle(
+                                        self.lifecycle_service.send_alert_async,
                                         rec_id=act.rec_id,
                                         level=getattr(act, "level", "info"),
                                         message=getattr(act, "message", ""),
@@ -459,8 +637,6 @@ class AlertService:
                     except Exception:
                         log.exception("Action %s failed rec=%s", type(act), getattr(act, "rec_id", None))
 
-                queue.task_done()
-
             except asyncio.CancelledError:
                 log.debug("AlertService: worker cancelled for %s", key)
                 break
@@ -470,7 +646,7 @@ class AlertService:
     async def _cleanup_worker(self, key: str) -> None:
         """يُزيل worker رمز ليس له triggers نشطة."""
         async with self._workers_lock:
-            self._symbol_queues.pop(key, None)
+            self._symbol_mailboxes.pop(key, None)
             task = self._symbol_workers.pop(key, None)
             if task and not task.done():
                 task.cancel()
@@ -570,7 +746,46 @@ class AlertService:
             log.exception("Failed to build trigger data from ORM.")
         return None
 
+    # ─────────────────────────────────────────────────────────────────────────
+    # Cross-loop helpers
+    # ─────────────────────────────────────────────────────────────────────────
+
+    async def _submit_lifecycle(self, fn, *args, **kwargs):
+        """يُرسل استدعاء lifecycle (DB متزامن) لـ DbExecutor إن وُجد."""
+        if self.db_executor is None:
+            return await fn(*args, **kwargs)
+        return await self.db_executor.submit(fn, *args, **kwargs)
+
+    async def _run_on_bg_loop(self, coro):
+        """
+        _triggers_lock مرتبط بـ bg loop — أي تعديل للفهرس من loop آخر
+        (DbExecutor، PTB/FastAPI) يُنفَّذ هناك.
+        """
+        bg = self._bg_loop
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if bg is None or current is bg or not bg.is_running():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, bg))
+
+    def _owns(self, asset: str) -> bool:
+        return self.shard is None or self.shard.owns(asset)
+
+    async def _forward(self, action: str, item_type: str, item_id: int,
+                       asset: Optional[str] = None) -> None:
+        await publish_trigger_event(action, item_type, item_id, asset)
+
     async def add_trigger_data(self, item_data: Dict[str, Any]) -> None:
+        if self.forward_updates:
+            if item_data:
+                await self._forward(ACTION_UPSERT, item_data.get("item_type"),
+                                    item_data.get("id"), item_data.get("asset"))
+            return
+        await self._run_on_bg_loop(self._add_trigger_data(item_data))
+
+    async def _add_trigger_data(self, item_data: Dict[str, Any]) -> None:
         if not item_data:
             return
         item_id   = item_data.get("id")
@@ -579,6 +794,8 @@ class AlertService:
         if not asset:
             log.error("add_trigger_data: missing asset for item %s", item_id)
             return
+        if not self._owns(asset):
+            return
         key = f"{asset.upper()}:{item_data.get('market', 'Futures')}"
 
         try:
@@ -592,13 +809,21 @@ class AlertService:
             log.exception("add_trigger_data failed for %s", item_id)
 
     def _add_trigger_unsafe(self, key, item_data, item_id, item_type):
+        item_data = TriggerRecord.from_dict(item_data)
         lst = self.active_triggers.setdefault(key, [])
-        if not any(t["id"] == item_id and t["item_type"] == item_type for t in lst):
+        if not any(t.id == item_id and t.item_type == item_type for t in lst):
             lst.append(item_data)
+            self._level_index.setdefault(key, SymbolLevelIndex()).add(item_data)
             if item_type == "recommendation":
                 self.strategy_engine.initialize_state_for_recommendation(item_data)
 
     async def remove_single_trigger(self, item_type: str, item_id: int) -> None:
+        if self.forward_updates:
+            await self._forward(ACTION_REMOVE, item_type, item_id)
+            return
+        await self._run_on_bg_loop(self._remove_single_trigger(item_type, item_id))
+
+    async def _remove_single_trigger(self, item_type: str, item_id: int) -> None:
         try:
             if self._triggers_lock is not None:
                 async with self._triggers_lock:
@@ -611,41 +836,168 @@ class AlertService:
         except Exception:
             log.exception("remove_single_trigger failed for %s:%s", item_type, item_id)
 
+    async def _release_trigger(self, item_type: str, item_id: int) -> None:
+        """يُسقط trigger ليس ملك هذا الـ shard — حالة المحرك تبقى في الـ checkpoint."""
+        if self._triggers_lock is not None:
+            async with self._triggers_lock:
+                self._remove_trigger_unsafe(item_type, item_id)
+        else:
+            with self._sync_lock:
+                self._remove_trigger_unsafe(item_type, item_id)
+        if item_type == "recommendation":
+            self.strategy_engine.release_state(item_id)
+
     def _remove_trigger_unsafe(self, item_type, item_id):
         for key in list(self.active_triggers.keys()):
             lst = self.active_triggers.get(key, [])
             obj = next(
-                (t for t in lst if t["id"] == item_id and t["item_type"] == item_type),
+                (t for t in lst if t.id == item_id and t.item_type == item_type),
                 None,
             )
             if obj:
                 lst.remove(obj)
                 if not lst:
                     del self.active_triggers[key]
+                level_index = self._level_index.get(key)
+                if level_index is not None:
+                    level_index.remove((item_type, item_id))
+                    if not level_index:
+                        del self._level_index[key]
                 break
 
+    # ─────────────────────────────────────────────────────────────────────────
+    # Delta updates — trigger واحد بدلاً من إعادة بناء الفهرس كاملاً
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _is_trackable_orm(item_orm: Union[Recommendation, UserTrade]) -> bool:
+        """نفس شروط list_all_active_triggers_data لكن لكائن واحد."""
+        if isinstance(item_orm, Recommendation):
+            return (
+                item_orm.status in (RecommendationStatusEnum.PENDING, RecommendationStatusEnum.ACTIVE)
+                and not getattr(item_orm, "is_shadow", False)
+            )
+        if isinstance(item_orm, UserTrade):
+            return item_orm.status in (
+                UserTradeStatusEnum.WATCHLIST,
+                UserTradeStatusEnum.PENDING_ACTIVATION,
+                UserTradeStatusEnum.ACTIVATED,
+            )
+        return False
+
+    async def upsert_trigger_data(self, item_data: Dict[str, Any]) -> None:
+        """
+        يُضيف trigger أو يستبدل النسخة الموجودة (نفس id + item_type).
+        حالة StrategyEngine للتوصية تُحفَظ إن وُجدت (highest/lowest لا تُصفَّر).
+        """
+        if self.forward_updates:
+            if item_data:
+                await self._forward(ACTION_UPSERT, item_data.get("item_type"),
+                                    item_data.get("id"), item_data.get("asset"))
+            return
+        await self._run_on_bg_loop(self._upsert_trigger_data(item_data))
+
+    async def _upsert_trigger_data(self, item_data: Dict[str, Any]) -> None:
+        if not item_data:
+            return
+        item_id   = item_data.get("id")
+        item_type = item_data.get("item_type")
+        asset     = item_data.get("asset")
+        if not asset:
+            log.error("upsert_trigger_data: missing asset for item %s", item_id)
+            return
+        if not self._owns(asset):
+            # الرمز تغيّر إلى shard آخر → المالك الجديد يلتقطه
+            await self._release_trigger(item_type, item_id)
+            return
+        key = f"{asset.upper()}:{item_data.get('market', 'Futures')}"
+
+        try:
+            if self._triggers_lock is not None:
+                async with self._triggers_lock:
+                    self._upsert_trigger_unsafe(key, item_data, item_id, item_type)
+            else:
+                with self._sync_lock:
+                    self._upsert_trigger_unsafe(key, item_data, item_id, item_type)
+        except Exception:
+            log.exception("upsert_trigger_data failed for %s", item_id)
+
+    def _upsert_trigger_unsafe(self, key, item_data, item_id, item_type):
+        item_data = TriggerRecord.from_dict(item_data)
+        lst = self.active_triggers.get(key)
+        idx = next(
+            (
+                i for i, t in enumerate(lst or [])
+                if t.id == item_id and t.item_type == item_type
+            ),
+            None,
+        )
+        if idx is not None:
+            lst[idx] = item_data
+        else:
+            # قد يكون موجوداً تحت مفتاح آخر (تغيّر asset/market) → أزله أولاً
+            self._remove_trigger_unsafe(item_type, item_id)
+            self.active_triggers.setdefault(key, []).append(item_data)
+        # add() يستبدل مستويات نفس ref إن وُجدت
+        self._level_index.setdefault(key, SymbolLevelIndex()).add(item_data)
+
+        if item_type == "recommendation" and not self.strategy_engine.has_state(item_id):
+            self.strategy_engine.initialize_state_for_recommendation(item_data)
+
+    async def sync_trigger_from_orm(
+        self, item_orm: Union[Recommendation, UserTrade]
+    ) -> None:
+        """
+        Delta API: يُزامن trigger عنصر واحد مع كائن ORM مُحمَّل مسبقاً.
+          - عنصر نشط → upsert (بدون أي query إضافية على الفهرس)
+          - عنصر مغلق/ظل → remove
+        يُستدعى من LifecycleService/CreationService بعد commit.
+        """
+        if item_orm is None:
+            return
+        item_type = "recommendation" if isinstance(item_orm, Recommendation) else "user_trade"
+        item_id = getattr(item_orm, "id", None)
+        if item_id is None:
+            return
+
+        if not self._is_trackable_orm(item_orm):
+            await self.remove_single_trigger(item_type, item_id)
+            return
+
+        trigger_data = self.build_trigger_data_from_orm(item_orm)
+        if trigger_data:
+            await self.upsert_trigger_data(trigger_data)
+        else:
+            await self.remove_single_trigger(item_type, item_id)
+
+    def _load_index_from_db(self) -> Dict[str, List[TriggerRecord]]:
+        """يقرأ الـ triggers النشطة (مُبثَّة) ويحوِّلها لسجلات مباشرة — يُنفَّذ في thread."""
+        new_index: Dict[str, List[TriggerRecord]] = {}
+        with session_scope() as session:
+            for d in self.repo.iter_active_triggers_data(session):
+                if not d:
+                    continue
+                try:
+                    asset = d.get("asset")
+                    if not asset:
+                        continue
+                    if not self._owns(asset):
+                        continue
+                    key = f"{asset.upper()}:{d.get('market', 'Futures')}"
+                    new_index.setdefault(key, []).append(TriggerRecord.from_dict(d))
+                except Exception:
+                    log.exception("Failed to process trigger item: %s", d.get("id"))
+        return new_index
+
     async def build_triggers_index(self) -> None:
         log.info("AlertService: Building triggers index from DB...")
+        started = time.monotonic()
         try:
-            with session_scope() as session:
-                items = self.repo.list_all_active_triggers_data(session)
+            new_index = await asyncio.to_thread(self._load_index_from_db)
         except Exception:
             log.exception("Failed reading triggers from DB.")
             return
 
-        new_index: Dict[str, List[Dict[str, Any]]] = {}
-        for d in items:
-            if not d:
-                continue
-            try:
-                asset = d.get("asset")
-                if not asset:
-                    continue
-                key = f"{asset.upper()}:{d.get('market', 'Futures')}"
-                new_index.setdefault(key, []).append(d)
-            except Exception:
-                log.exception("Failed to process trigger item: %s", d.get("id"))
-
         if self._triggers_lock is not None:
             async with self._triggers_lock:
                 self._apply_new_index(new_index)
@@ -653,22 +1005,99 @@ class AlertService:
             with self._sync_lock:
                 self._apply_new_index(new_index)
 
+        elapsed = time.monotonic() - started
+        ALERT_INDEX_BUILD_SECONDS.set(elapsed)
         total = sum(len(v) for v in new_index.values())
         log.info(
-            "AlertService: index built — %d symbols, %d triggers.",
-            len(new_index), total,
+            "AlertService: index built — %d symbols, %d triggers in %.1f ms.",
+            len(new_index), total, elapsed * 1000,
         )
 
+    @staticmethod
+    def _build_level_index(
+        index: Dict[str, List[TriggerRecord]]
+    ) -> Dict[str, SymbolLevelIndex]:
+        level_index: Dict[str, SymbolLevelIndex] = {}
+        for key, triggers in index.items():
+            sym_index = SymbolLevelIndex()
+            for t in triggers:
+                sym_index.add(t)
+            if sym_index:
+                level_index[key] = sym_index
+        return level_index
+
     def _apply_new_index(self, new_index: Dict) -> None:
+        new_index = {
+            key: [TriggerRecord.from_dict(t) for t in triggers]
+            for key, triggers in new_index.items()
+        }
+        # الغائب الذي يملك الـ shard رمزه أُغلق → يُحذف؛ غيره (حالة shard آخر) يُفلَت فقط
+        owned = self.shard.owns if self.shard is not None else None
         self.active_triggers = new_index
-        self.strategy_engine.clear_all_states()
-        for triggers in new_index.values():
-            for t in triggers:
-                if t.get("item_type") == "recommendation":
-                    self.strategy_engine.initialize_state_for_recommendation(t)
+        self._level_index = self._build_level_index(new_index)
+        # watermarks التوصيات الموجودة تبقى — فقط الجديدة تُهيَّأ والمغلقة تُحذف
+        self.strategy_engine.retain_states(
+            (t for triggers in new_index.values() for t in triggers
+             if t.get("item_type") == "recommendation"),
+            owned=owned,
+        )
+
+    def _load_trigger_from_db(self, item_type: str, item_id: int) -> Optional[Dict[str, Any]]:
+        """trigger عنصر واحد من DB (None إن لم يعد قابلاً للتتبع) — يُنفَّذ في thread."""
+        with session_scope() as session:
+            if item_type == "recommendation":
+                item_orm = self.repo.get(session, item_id)
+            else:
+                item_orm = self.repo.get_user_trade_by_id(session, item_id)
+            if item_orm is None or not self._is_trackable_orm(item_orm):
+                return None
+            return self.build_trigger_data_from_orm(item_orm)
+
+    async def _on_trigger_event(self, event: Dict[str, Any]) -> None:
+        """حدث من "cg:trigger_update" (على bg loop) — يُطبَّق فقط إن كان الرمز ملكنا."""
+        try:
+            item_type = event["item_type"]
+            item_id = int(event["item_id"])
+            asset = event.get("asset") or ""
+            if event.get("action") == ACTION_REMOVE:
+                await self._remove_single_trigger(item_type, item_id)
+                return
+            if asset and not self._owns(asset):
+                await self._release_trigger(item_type, item_id)
+                return
+            data = await asyncio.to_thread(self._load_trigger_from_db, item_type, item_id)
+            if data:
+                await self._upsert_trigger_data(data)
+            else:
+                await self._remove_single_trigger(item_type, item_id)
+        except Exception:
+            log.exception("AlertService: trigger event failed: %s", event)
+
+    async def start_evaluating(self) -> None:
+        """
+        القائد: حالة المحرك ← الفهرس من DB ← bg loop (نفس ترتيب on_startup).
+        البناء الأول يجهِّز أول تيك فقط؛ ما يُنشر قبل اشتراك المستمع (أو أثناء
+        انتقال القيادة بلا مشترك) تلتقطه إعادة البناء بعد الاشتراك (on_subscribed).
+        """
+        self.forward_updates = False
+        await self.restore_strategy_state()
+        await self.build_triggers_index()
+        self.start()
+
+    async def stop_evaluating(self) -> None:
+        """التابع: إيقاف التقييم والبث، والتغييرات اللاحقة تُمرَّر للقائد."""
+        self.forward_updates = True
+        await asyncio.to_thread(self.stop)
+
+    async def restore_strategy_state(self) -> int:
+        """يُستدعى قبل build_triggers_index — حالة المحرك جاهزة قبل أول تيك."""
+        return await self.strategy_engine.restore_checkpoint()
 
     async def _run_index_sync(self, interval_seconds: int = 600) -> None:
-        """شبكة أمان — كل 10 دقائق فقط."""
+        """
+        شبكة أمان — كل 10 دقائق فقط.
+        التحديثات العادية تمر عبر sync_trigger_from_orm (delta) لا من هنا.
+        """
         while True:
             await asyncio.sleep(interval_seconds)
             try:
@@ -677,17 +1106,18 @@ class AlertService:
                 log.exception("Index sync iteration failed.")
 
     # ─────────────────────────────────────────────────────────────────────────
-    # Core evaluation helpers (بدون تغيير)
+    # Core evaluation helpers
     # ─────────────────────────────────────────────────────────────────────────
 
     def _is_price_condition_met(
         self,
         side: str,
-        low_price: Decimal,
-        high_price: Decimal,
-        target_price: Decimal,
+        low_price: Union[Decimal, int],
+        high_price: Union[Decimal, int],
+        target_price: Union[Decimal, int],
         condition_type: str,
     ) -> bool:
+        # يعمل على Decimal أو ints مُقيَّسة بنفس الـ exp (TriggerRecord)
         side_upper = (side or "").upper()
         cond = (condition_type or "").upper()
         if side_upper == "LONG":
@@ -702,75 +1132,90 @@ class AlertService:
 
     async def _evaluate_core_triggers(
         self,
-        trigger: Dict[str, Any],
+        trigger: Union[TriggerRecord, Dict[str, Any]],
         high_price: Decimal,
         low_price: Decimal,
+        bounds: Optional[Dict[int, Any]] = None,
     ) -> List[BaseAction]:
+        """
+        نفس منطق SL/TP/ENTRY السابق، لكن على أسعار int مُقيَّسة.
+        bounds: cache لحدود التيك لكل exp (يُمرَّر من الـ worker لكل تيك).
+        """
         actions: List[BaseAction] = []
-        item_id         = trigger.get("id")
-        status          = trigger.get("status")
-        side            = trigger.get("side")
-        item_type       = trigger.get("item_type", "recommendation")
-        processed_events = trigger.get("processed_events", set())
+        rec = TriggerRecord.from_dict(trigger)
+        item_id   = rec.id
+        status    = rec.status
+        side      = rec.side
+        item_type = rec.item_type
+        events    = rec.events
 
         try:
+            tick_bounds = bounds.get(rec.exp) if bounds is not None else None
+            if tick_bounds is None:
+                tick_bounds = scaled_bounds(low_price, high_price, rec.exp)
+                if bounds is not None:
+                    bounds[rec.exp] = tick_bounds
+            low_i, high_i = tick_bounds
+
             if item_type == "recommendation":
                 if status == RecommendationStatusEnum.PENDING:
-                    entry_price = trigger.get("entry")
-                    sl_price    = trigger.get("stop_loss")
-                    if "INVALIDATED" not in processed_events and self._is_price_condition_met(
-                        side, low_price, high_price, sl_price, "SL"
+                    if not events & EV_INVALIDATED and self._is_price_condition_met(
+                        side, low_i, high_i, rec.sl_i, "SL"
                     ):
-                        await self.lifecycle_service.process_invalidation_event(item_id)
-                    elif "ACTIVATED" not in processed_events and self._is_price_condition_met(
-                        side, low_price, high_price, entry_price, "ENTRY"
+                        await self._submit_lifecycle(self.lifecycle_service.process_invalidation_event, item_id)
+                    elif not events & EV_ACTIVATED and self._is_price_condition_met(
+                        side, low_i, high_i, rec.entry_i, "ENTRY"
                     ):
-                        await self.lifecycle_service.process_activation_event(item_id)
+                        await self._submit_lifecycle(self.lifecycle_service.process_activation_event, item_id)
 
                 elif status == RecommendationStatusEnum.ACTIVE:
-                    sl_price = trigger.get("stop_loss")
-                    if "SL_HIT" not in processed_events and "FINAL_CLOSE" not in processed_events:
-                        if self._is_price_condition_met(side, low_price, high_price, sl_price, "SL"):
-                            actions.append(CloseAction(rec_id=item_id, price=sl_price, reason="SL_HIT"))
+                    if not events & (EV_SL_HIT | EV_FINAL_CLOSE):
+                        if self._is_price_condition_met(side, low_i, high_i, rec.sl_i, "SL"):
+                            actions.append(
+                                CloseAction(rec_id=item_id, price=rec.price(rec.sl_i), reason="SL_HIT")
+                            )
                             return actions
 
-                    for i, target in enumerate(trigger.get("targets", []) or [], 1):
-                        if f"TP{i}_HIT" in processed_events:
+                    for i, tp_i in enumerate(rec.tp_i, 1):
+                        if events & tp_bit(i):
                             continue
-                        tp_price = Decimal(str(target.get("price")))
-                        if self._is_price_condition_met(side, low_price, high_price, tp_price, "TP"):
-                            await self.lifecycle_service.process_tp_hit_event(item_id, i, tp_price)
+                        if self._is_price_condition_met(side, low_i, high_i, tp_i, "TP"):
+                            await self._submit_lifecycle(self.lifecycle_service.process_tp_hit_event, item_id, i, rec.price(tp_i))
 
             elif item_type == "user_trade":
                 if status in (UserTradeStatusEnum.WATCHLIST, UserTradeStatusEnum.PENDING_ACTIVATION):
-                    entry_price  = trigger.get("entry")
-                    sl_price     = trigger.get("stop_loss")
-                    published_at = trigger.get("original_published_at")
+                    published_at = rec.original_published_at
                     if published_at and datetime.now(timezone.utc) < published_at:
                         return actions
 
-                    if "INVALIDATED" not in processed_events and self._is_price_condition_met(
-                        side, low_price, high_price, sl_price, "SL"
+                    if not events & EV_INVALIDATED and self._is_price_condition_met(
+                        side, low_i, high_i, rec.sl_i, "SL"
                     ):
-                        await self.lifecycle_service.process_user_trade_invalidation_event(item_id, sl_price)
-                    elif "ACTIVATED" not in processed_events and self._is_price_condition_met(
-                        side, low_price, high_price, entry_price, "ENTRY"
+                        await self._submit_lifecycle(
+                            self.lifecycle_service.process_user_trade_invalidation_event,
+                            item_id, rec.price(rec.sl_i)
+                        )
+                    elif not events & EV_ACTIVATED and self._is_price_condition_met(
+                        side, low_i, high_i, rec.entry_i, "ENTRY"
                     ):
-                        await self.lifecycle_service.process_user_trade_activation_event(item_id)
+                        await self._submit_lifecycle(self.lifecycle_service.process_user_trade_activation_event, item_id)
 
                 elif status == UserTradeStatusEnum.ACTIVATED:
-                    sl_price = trigger.get("stop_loss")
-                    if "SL_HIT" not in processed_events and "FINAL_CLOSE" not in processed_events:
-                        if self._is_price_condition_met(side, low_price, high_price, sl_price, "SL"):
-                            await self.lifecycle_service.process_user_trade_sl_hit_event(item_id, sl_price)
+                    if not events & (EV_SL_HIT | EV_FINAL_CLOSE):
+                        if self._is_price_condition_met(side, low_i, high_i, rec.sl_i, "SL"):
+                            await self._submit_lifecycle(
+                                self.lifecycle_service.process_user_trade_sl_hit_event,
+                                item_id, rec.price(rec.sl_i)
+                            )
                             return actions
 
-                    for i, target in enumerate(trigger.get("targets", []) or [], 1):
-                        if f"TP{i}_HIT" in processed_events:
+                    for i, tp_i in enumerate(rec.tp_i, 1):
+                        if events & tp_bit(i):
                             continue
-                        tp_price = Decimal(str(target.get("price")))
-                        if self._is_price_condition_met(side, low_price, high_price, tp_price, "TP"):
-                            await self.lifecycle_service.process_user_trade_tp_hit_event(item_id, i, tp_price)
+                        if self._is_price_condition_met(side, low_i, high_i, tp_i, "TP"):
+                            await self._submit_lifecycle(self.lifecycle_service.process_user_trade_tp_hit_event, 
+                                item_id, i, rec.price(tp_i)
+                            )
 
         except Exception:
             log.exception("Error evaluating trigger for %s id=%s", item_type, item_id)
@@ -799,6 +1244,10 @@ class AlertService:
                     self._bg_loop.call_soon_threadsafe(self._routing_task.cancel)
                 if self._index_sync_task:
                     self._bg_loop.call_soon_threadsafe(self._index_sync_task.cancel)
+                if self._checkpoint_task:
+                    self._bg_loop.call_soon_threadsafe(self._checkpoint_task.cancel)
+                if self._trigger_events_task:
+                    self._bg_loop.call_soon_threadsafe(self._trigger_events_task.cancel)
                 # إلغاء كل symbol workers
                 for task in self._symbol_workers.values():
                     if not task.done():
@@ -806,6 +1255,16 @@ class AlertService:
                 self._bg_loop.call_soon_threadsafe(self._bg_loop.stop)
             if self._bg_thread:
                 self._bg_thread.join(timeout=5.0)
+            if self.db_executor is not None:
+                self.db_executor.stop()
+            # آخر checkpoint بعد توقف الـ workers
+            self.strategy_engine.shutdown()
+            # كائنات الـ loop المتوقف لا تُستخدم في start() التالي
+            self._symbol_mailboxes.clear()
+            self._symbol_workers.clear()
+            self._bg_loop = None
+            self._bg_thread = None
+            self.streamer = None
         except Exception:
             log.exception("Error stopping AlertService.")
 
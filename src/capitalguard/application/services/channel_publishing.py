@@ -0,0 +1,59 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/application/services/channel_publishing.py
+# Version: v1.0.0-BULK-PUBLISH
+#
+# ✅ مسار النشر الجماعي المشترك بين CreationService و TradeService:
+#   - post_card_to_channels: البطاقة تُبنى مرة واحدة لكل القنوات (notifier.post_to_channels)
+#     مع رجوع لـ post_to_channel لكل قناة حين لا يدعم الـ notifier المسار الجماعي.
+#   - save_published_messages: كل صفوف PublishedMessage في INSERT واحد (executemany).
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import asyncio
+import inspect
+from typing import Any, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from capitalguard.infrastructure.db.models import PublishedMessage
+from capitalguard.domain.entities import Recommendation as RecommendationEntity
+
+
+async def post_card_to_channels(notifier: Any, channel_ids: List[int], rec_entity: RecommendationEntity, keyboard: Any) -> List[Any]:
+    """
+    يُرسل البطاقة لكل القنوات ويُعيد نتيجة لكل قناة بنفس الترتيب:
+    (chat_id, message_id) عند النجاح، وإلا None أو Exception.
+    """
+    post_many = getattr(notifier, "post_to_channels", None)
+    if inspect.iscoroutinefunction(post_many):
+        # render واحد للبطاقة، وكل الإرسالات عبر الموزِّع المحدود المعدل
+        try:
+            by_channel = await post_many(channel_ids, rec_entity, keyboard)
+        except Exception as e:
+            return [e] * len(channel_ids)
+        return [by_channel.get(ch_id) for ch_id in channel_ids]
+
+    # notifier بدون مسار جماعي (أو متزامن) — إرسال لكل قناة
+    async def _send(ch_id):
+        fn = notifier.post_to_channel
+        if inspect.iscoroutinefunction(fn):
+            return await fn(ch_id, rec_entity, keyboard)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, ch_id, rec_entity, keyboard)
+
+    return await asyncio.gather(*(_send(ch_id) for ch_id in channel_ids), return_exceptions=True)
+
+
+def save_published_messages(session: Session, rec_id: int, sent: List[Tuple[int, int]]) -> None:
+    """يحفظ كل رسائل القنوات المنشورة في INSERT واحد (executemany) بدل session.add لكل صف."""
+    if not sent:
+        return
+    session.execute(
+        insert(PublishedMessage),
+        [
+            {"recommendation_id": rec_id, "telegram_channel_id": chat_id, "telegram_message_id": message_id}
+            for chat_id, message_id in sent
+        ],
+    )
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
@@ -1,6 +1,10 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/application/services/creation_service.py ---
 # File: src/capitalguard/application/services/creation_service.py
-# Version: v5.0.0-GOLD (Atomic Shadow Fix & Full Resilience)
+# Version: v5.2.1-GOLD (Atomic Shadow Fix & Full Resilience + Delta Index + Bulk Publish)
+# ✅ v5.1.0: الفهرسة عبر AlertService.upsert_trigger_data (delta) بدلاً من add_trigger_data.
+# ✅ v5.2.0: النشر عبر notifier.post_to_channels — البطاقة تُبنى مرة واحدة لكل القنوات
+#    (لا render + سعر حي لكل قناة)، وصفوف PublishedMessage تُحفظ بـ INSERT واحد.
+# ✅ v5.2.1: مسار النشر الجماعي انتقل إلى channel_publishing.py (مشترك مع TradeService).
 # ✅ THE FIX: 
 #    1. Forced SQL Update: Bypasses ORM session cache to ensure 'is_shadow=False' sticks.
 #    2. Decoupled Fate: Telegram errors no longer kill the trade activation.
@@ -25,12 +29,12 @@ from capitalguard.infrastructure.db.models import (
     RecommendationStatusEnum, UserTrade,
     OrderTypeEnum, ExitStrategyEnum,
     UserTradeStatusEnum,
-    WatchedChannel,
-    PublishedMessage
+    WatchedChannel
 )
 from capitalguard.infrastructure.db.repository import (
     RecommendationRepository, ChannelRepository, UserRepository
 )
+from .channel_publishing import post_card_to_channels, save_published_messages
 from capitalguard.domain.entities import (
     Recommendation as RecommendationEntity,
     RecommendationStatus as RecommendationStatusEntity,
@@ -165,26 +169,20 @@ class CreationService:
         
         keyboard = public_channel_keyboard(rec_entity.id, getattr(self.notifier, "bot_username", None))
         
-        # دالة داخلية للنشر الآمن
-        async def _send(ch_id):
-            try:
-                return await self._call_notifier_maybe_async(self.notifier.post_to_channel, ch_id, rec_entity, keyboard)
-            except Exception as e: 
-                return e
-
-        # النشر المتوازي لجميع القنوات
-        tasks = [asyncio.create_task(_send(ch.telegram_channel_id)) for ch in channels]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # النشر الجماعي لكل القنوات (render واحد)
+        channel_ids = [ch.telegram_channel_id for ch in channels]
+        results = await post_card_to_channels(self.notifier, channel_ids, rec_entity, keyboard)
         
-        for i, ch in enumerate(channels):
-            res = results[i]
+        sent: List[Tuple[int, int]] = []
+        for ch_id, res in zip(channel_ids, results):
             if isinstance(res, tuple) and len(res) == 2:
-                # حفظ رسالة القناة في قاعدة البيانات للرجوع إليها لاحقاً (للتعديل/الإغلاق)
-                session.add(PublishedMessage(recommendation_id=rec_entity.id, telegram_channel_id=res[0], telegram_message_id=res[1]))
-                report["success"].append({"channel_id": ch.telegram_channel_id})
+                # رسالة القناة تُحفظ للرجوع إليها لاحقاً (للتعديل/الإغلاق)
+                sent.append(res)
+                report["success"].append({"channel_id": ch_id})
             else:
-                report["failed"].append({"channel_id": ch.telegram_channel_id, "error": str(res)})
+                report["failed"].append({"channel_id": ch_id, "error": str(res)})
         
+        save_published_messages(session, rec_entity.id, sent)
         session.flush()
         return rec_entity, report
 
@@ -327,7 +325,7 @@ class CreationService:
                         rec_orm_fresh = self.repo.get(session, rec_id) 
                         trigger_data = self.alert_service.build_trigger_data_from_orm(rec_orm_fresh)
                         if trigger_data:
-                            await self.alert_service.add_trigger_data(trigger_data)
+                            await self.alert_service.upsert_trigger_data(trigger_data)
                             logger.info(f"[BG Rec {rec_id}]: Added to Monitoring Index.")
                             # ✅ P1-FIX: إخبار PriceStreamer بالرمز الجديد فوراً
                             await _publish_symbol_event(
@@ -415,7 +413,7 @@ class CreationService:
                 db_session.refresh(new_trade, attribute_names=['user'])
                 trigger_data = self.alert_service.build_trigger_data_from_orm(new_trade)
                 if trigger_data:
-                    await self.alert_service.add_trigger_data(trigger_data)
+                    await self.alert_service.upsert_trigger_data(trigger_data)
                     # ✅ P1-FIX: إخبار PriceStreamer بالرمز الجديد فوراً
                     await _publish_symbol_event(
                         trigger_data.get("asset", ""),
@@ -478,7 +476,7 @@ class CreationService:
                 db_session.refresh(new_trade, attribute_names=['user'])
                 trigger_data = self.alert_service.build_trigger_data_from_orm(new_trade)
                 if trigger_data:
-                    await self.alert_service.add_trigger_data(trigger_data)
+                    await self.alert_service.upsert_trigger_data(trigger_data)
                     # ✅ P1-FIX: إخبار PriceStreamer بالرمز الجديد فوراً
                     await _publish_symbol_event(
                         trigger_data.get("asset", ""),
@@ -1,6 +1,16 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/application/services/lifecycle_service.py ---
 # File: src/capitalguard/application/services/lifecycle_service.py
-# Version: v106.0.1-PRODUCTION-MERGED
+# Version: v106.3.0-OUTBOX
+# ✅ v106.3.0: الردود على البطاقات وإشعارات صفقات المستخدم تُكتب في notification_outbox
+#    داخل نفس session تغيير الحالة (commit واحد)، ويُسلِّمها OutboxRelay لاحقاً
+#    (at-least-once، مفتاح idempotency لكل حدث). لا create_task لكل رد في مسار التيك.
+#    بدون outbox_relay (سكربتات/اختبارات) يبقى الإرسال المباشر القديم.
+# ✅ v106.2.0: عند التنفيذ داخل DbExecutor (thread منفصل)، إرسال Telegram يعود
+#    لـ loop المُرسِل عبر run_on_origin_loop. زمن commit/notify يُسجَّل في
+#    cg_alert_stage_latency_seconds.
+# ✅ v106.1.0: _commit_and_dispatch لم يعد يُعيد بناء فهرس التنبيهات كاملاً من DB.
+#    يُزامن trigger العنصر المُعدَّل فقط عبر AlertService.sync_trigger_from_orm
+#    (يحافظ على حالة Trailing Stop في StrategyEngine).
 # ✅ MERGED FIXES:
 #    1. ✅ All critical fixes from v106.0.0 maintained
 #    2. ✅ Added 'await' to ALL notify_reply calls (from v106)
@@ -16,15 +26,21 @@ from __future__ import annotations
 import logging
 import asyncio
 import inspect
+import time
 from typing import List, Optional, Tuple, Dict, Any, Set, Union
 from datetime import datetime, timezone
 from decimal import Decimal, InvalidOperation
 from sqlalchemy.orm import Session
-from sqlalchemy import select, text
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import selectinload
 
 # Infrastructure & Domain Imports
 from capitalguard.infrastructure.db.uow import session_scope
+from capitalguard.infrastructure.db.executor import run_on_origin_loop
+from capitalguard.infrastructure.monitoring.metrics import ALERT_STAGE_LATENCY
+from capitalguard.infrastructure.notify.outbox import (
+    KIND_PRIVATE, KIND_REPLY, enqueue_notifications, outbox_key,
+)
 from capitalguard.infrastructure.db.models import (
     PublishedMessage, Recommendation, RecommendationEvent, User,
     RecommendationStatusEnum, UserTrade, 
@@ -47,6 +63,7 @@ from capitalguard.domain.value_objects import Symbol, Side, Price, Targets
 # Type-only imports
 if False:
     from .alert_service import AlertService
+    from capitalguard.infrastructure.notify.outbox import OutboxRelay
 
 logger = logging.getLogger(__name__)
 
@@ -142,11 +159,17 @@ class LifecycleService:
         self.repo = repo
         self.notifier = notifier
         self.alert_service: Optional["AlertService"] = None
+        # يُحقن في boot — وجوده يعني: الإشعارات عبر notification_outbox
+        self.outbox_relay: Optional["OutboxRelay"] = None
 
     # --- Internal Core Methods ---
     async def _commit_and_dispatch(self, session: Session, obj: Any, rebuild_alerts: bool = True):
-        """✅ ENHANCED: Added Detached Instance Fix from v200."""
+        """
+        ✅ ENHANCED: Added Detached Instance Fix from v200.
+        rebuild_alerts=True → يُزامن trigger هذا العنصر فقط (delta) في AlertService.
+        """
         try:
+            commit_started = time.monotonic()
             session.commit()
             
             # ✅ ADDED FROM v200: Prevent DetachedInstanceError
@@ -154,9 +177,14 @@ class LifecycleService:
                 session.refresh(obj) 
             except Exception: 
                 pass  # Object might be deleted or state invalid, safe to ignore
+            ALERT_STAGE_LATENCY.labels("commit").observe(time.monotonic() - commit_started)
+            if self.outbox_relay is not None:
+                # إشعارات هذا الـ commit محفوظة الآن — تسليم فوري بدل انتظار الـ poll
+                self.outbox_relay.wake()
             
+            # Delta index: trigger واحد من الكائن المُحمَّل — لا إعادة بناء كاملة
             if rebuild_alerts and self.alert_service:
-                await self.alert_service.build_triggers_index()
+                await self.alert_service.sync_trigger_from_orm(obj)
 
             if isinstance(obj, Recommendation):
                 entity = self.repo._to_entity(obj)
@@ -193,10 +221,21 @@ class LifecycleService:
                 loop = asyncio.get_running_loop()
                 await loop.run_in_executor(None, self.notifier.edit_recommendation_card_by_ids, ch_id, msg_id, rec_entity, bot_username)
 
-        await asyncio.gather(*[_upd(m.telegram_channel_id, m.telegram_message_id) for m in msgs], return_exceptions=True)
+        async def _upd_all():
+            started = time.monotonic()
+            await asyncio.gather(*[_upd(ch_id, msg_id) for ch_id, msg_id in targets], return_exceptions=True)
+            ALERT_STAGE_LATENCY.labels("notify").observe(time.monotonic() - started)
+
+        # نقرأ المعرّفات هنا (قد نكون على thread الـ DbExecutor) ثم نرسل على loop المُرسِل
+        targets = [(m.telegram_channel_id, m.telegram_message_id) for m in msgs]
+        await run_on_origin_loop(_upd_all())
 
     async def notify_reply(self, rec_id: int, text: str, db_session: Session):
-        """✅ FIXED: Added proper exception handling for async tasks."""
+        """يكتب رداً لكل رسالة منشورة في الـ outbox (نفس transaction)، أو يرسل مباشرة بدونه."""
+        if self.outbox_relay is not None:
+            self._enqueue_replies(rec_id, text, db_session)
+            return
+
         msgs = self.repo.get_published_messages(db_session, rec_id)
         
         def _handle_task_error(task):
@@ -209,28 +248,70 @@ class LifecycleService:
             task = asyncio.create_task(self._send_reply(m.telegram_channel_id, m.telegram_message_id, text))
             task.add_done_callback(_handle_task_error)
 
+    def _enqueue_replies(self, rec_id: int, text: str, db_session: Session) -> int:
+        msgs = self.repo.get_published_messages(db_session, rec_id)
+        if not msgs:
+            return 0
+        # عدد الأحداث (بعد flush الحدث الجديد) يُميِّز تغيير الحالة → نفس الحدث مرتين = مفتاح واحد
+        db_session.flush()
+        seq = db_session.execute(
+            select(func.count(RecommendationEvent.id)).where(RecommendationEvent.recommendation_id == rec_id)
+        ).scalar() or 0
+        return enqueue_notifications(db_session, [
+            {
+                "idempotency_key": outbox_key(KIND_REPLY, rec_id, seq, m.telegram_channel_id, m.telegram_message_id, text),
+                "kind": KIND_REPLY,
+                "recommendation_id": rec_id,
+                "chat_id": m.telegram_channel_id,
+                "reply_to_message_id": m.telegram_message_id,
+                "payload": {"text": text},
+            }
+            for m in msgs
+        ])
+
     async def _send_reply(self, ch, msg, text):
         """✅ FIXED: Now logs errors instead of silently ignoring them."""
         try:
-            if inspect.iscoroutinefunction(self.notifier.post_notification_reply):
-                await self.notifier.post_notification_reply(ch, msg, text)
-            else:
-                loop = asyncio.get_running_loop()
-                await loop.run_in_executor(None, self.notifier.post_notification_reply, ch, msg, text)
+            await run_on_origin_loop(self._post_reply(ch, msg, text))
         except Exception as e:
             logger.error(f"Failed to send reply to channel {ch}, message {msg}: {e}")
 
-    async def _notify_user_trade_update(self, user_id: int, text: str):
+    async def _post_reply(self, ch, msg, text):
+        started = time.monotonic()
+        if inspect.iscoroutinefunction(self.notifier.post_notification_reply):
+            await self.notifier.post_notification_reply(ch, msg, text)
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.notifier.post_notification_reply, ch, msg, text)
+        ALERT_STAGE_LATENCY.labels("notify").observe(time.monotonic() - started)
+
+    async def _send_private(self, chat_id, text):
+        started = time.monotonic()
+        if inspect.iscoroutinefunction(self.notifier.send_private_text):
+            await self.notifier.send_private_text(chat_id, text)
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.notifier.send_private_text, chat_id, text)
+        ALERT_STAGE_LATENCY.labels("notify").observe(time.monotonic() - started)
+
+    async def _notify_user_trade_update(self, user_id: int, text: str,
+                                        db_session: Optional[Session] = None, event_key: Optional[str] = None):
+        """event_key + db_session → رسالة خاصة في الـ outbox مع تغيير حالة الصفقة."""
+        if self.outbox_relay is not None and db_session is not None and event_key:
+            user = UserRepository(db_session).find_by_id(user_id)
+            if user:
+                enqueue_notifications(db_session, [{
+                    "idempotency_key": outbox_key(KIND_PRIVATE, user_id, event_key),
+                    "kind": KIND_PRIVATE,
+                    "chat_id": user.telegram_user_id,
+                    "payload": {"text": text},
+                }])
+            return
         try:
             with session_scope() as session:
                 user = UserRepository(session).find_by_id(user_id)
                 if user:
-                    chat_id = user.telegram_user_id
-                    if inspect.iscoroutinefunction(self.notifier.send_private_text):
-                        await self.notifier.send_private_text(chat_id, text)
-                    else:
-                        loop = asyncio.get_running_loop()
-                        await loop.run_in_executor(None, self.notifier.send_private_text, chat_id, text)
+                    await run_on_origin_loop(self._send_private(user.telegram_user_id, text))
         except Exception as e:
             logger.error(f"Failed to notify user {user_id}: {e}")
 
@@ -323,7 +404,7 @@ class LifecycleService:
                  rec.id, user_id, price, db_session, "PARTIAL_FINAL", rebuild_alerts=False
              )
         
-        await self._commit_and_dispatch(db_session, rec, rebuild_alerts=False)
+        await self._commit_and_dispatch(db_session, rec, rebuild_alerts=True)
         return self.repo._to_entity(rec)
 
     # --- Recommendation Updates ---
@@ -549,7 +630,7 @@ class LifecycleService:
                      rec_orm.id, analyst_uid, price, s, "AUTO_FINAL", rebuild_alerts=False
                  )
             elif close_percent <= 0:
-                await self._commit_and_dispatch(s, rec_orm, rebuild_alerts=False)
+                await self._commit_and_dispatch(s, rec_orm, rebuild_alerts=True)
 
     async def process_sl_hit_event(self, item_id: int, price: Decimal):
          with session_scope() as s:
@@ -610,7 +691,8 @@ class LifecycleService:
                 ))
                 await self._notify_user_trade_update(
                     trade.user_id, 
-                    f"▶️ Trade #{trade.asset} Activated!"
+                    f"▶️ Trade #{trade.asset} Activated!",
+                    s, f"trade:{trade.id}:ACTIVATED"
                 )
                 await self._commit_and_dispatch(s, trade, rebuild_alerts=True)
 
@@ -632,7 +714,8 @@ class LifecycleService:
                 
                 await self._notify_user_trade_update(
                     trade.user_id, 
-                    f"❌ Trade #{trade.asset} Invalidated"
+                    f"❌ Trade #{trade.asset} Invalidated",
+                    s, f"trade:{trade.id}:INVALIDATED"
                 )
                 await self._commit_and_dispatch(s, trade, rebuild_alerts=False)
 
@@ -655,7 +738,8 @@ class LifecycleService:
                 
                 await self._notify_user_trade_update(
                     trade.user_id, 
-                    f"🛑 SL Hit #{trade.asset} @ {_format_price(price)} (PnL: {pnl:.2f}%)"
+                    f"🛑 SL Hit #{trade.asset} @ {_format_price(price)} (PnL: {pnl:.2f}%)",
+                    s, f"trade:{trade.id}:SL_HIT"
                 )
                 await self._commit_and_dispatch(s, trade, rebuild_alerts=False)
 
@@ -680,7 +764,8 @@ class LifecycleService:
             
             await self._notify_user_trade_update(
                 trade.user_id, 
-                f"🎯 TP{target_index} Hit #{trade.asset}"
+                f"🎯 TP{target_index} Hit #{trade.asset}",
+                s, f"trade:{trade.id}:{event_type}"
             )
             
             if target_index == len(trade.targets or []):
@@ -694,11 +779,12 @@ class LifecycleService:
                 
                 await self._notify_user_trade_update(
                     trade.user_id, 
-                    f"🏆 Final Target Hit! PnL: {pnl:.2f}%"
+                    f"🏆 Final Target Hit! PnL: {pnl:.2f}%",
+                    s, f"trade:{trade.id}:FINAL_TP"
                 )
                 await self._commit_and_dispatch(s, trade, rebuild_alerts=False)
             else:
-                await self._commit_and_dispatch(s, trade, rebuild_alerts=False)
+                await self._commit_and_dispatch(s, trade, rebuild_alerts=True)
 
     async def close_user_trade_async(self, user_id: str, trade_id: int, exit_price: Decimal, 
                                      db_session: Session) -> Optional[UserTrade]:
@@ -1,6 +1,11 @@
-#--- START OF FINAL, HARDENED, AND PRODUCTION-READY FILE (Version 1.4.0) ---
+#--- START OF FINAL, HARDENED, AND PRODUCTION-READY FILE (Version 1.5.0) ---
 # src/capitalguard/application/services/market_data_service.py
 #
+# ✅ THE UPGRADE (v1.5.0 — Tick Sizes):
+#   exchangeInfo يحمل PRICE_FILTER.tickSize لكل رمز/سوق — كان يُتجاهل.
+#   الآن يُخزَّن في _symbols_cache[symbol]["tick_sizes"][market]
+#   ويُعرض عبر get_tick_size() — يستخدمه StrategyEngine للمسار fixed-point.
+#
 # ✅ THE FIX (v1.4.0 — Circuit Breaker with Auto Recovery):
 #
 #   v1.3.0 أضاف: {429, 451, 403} → CoinGecko fallback فوري.
@@ -25,7 +30,8 @@ import logging
 import asyncio
 import os
 import time
-from typing import Dict, Any, Set
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, Optional, Set
 
 import httpx
 from capitalguard.infrastructure.pricing.coingecko_client import CoinGeckoClient
@@ -122,6 +128,19 @@ class MarketDataService:
             )
             return market, []
 
+    @staticmethod
+    def _extract_tick_size(symbol_data: Dict[str, Any]) -> Optional[Decimal]:
+        """PRICE_FILTER.tickSize من exchangeInfo (None إذا غاب أو كان صفراً)."""
+        for f in symbol_data.get("filters", []) or []:
+            if f.get("filterType") != "PRICE_FILTER":
+                continue
+            try:
+                tick = Decimal(str(f.get("tickSize")))
+            except (InvalidOperation, TypeError, ValueError):
+                return None
+            return tick.normalize() if tick.is_finite() and tick > 0 else None
+        return None
+
     async def _refresh_binance_cache(self):
         """Fetches and consolidates symbols from all Binance endpoints."""
         log.info("Attempting to refresh symbols cache from Binance...")
@@ -143,8 +162,11 @@ class MarketDataService:
                 if symbol_data.get("status") == "TRADING":
                     symbol_name = symbol_data["symbol"].upper()
                     if symbol_name not in unified_cache:
-                        unified_cache[symbol_name] = {"markets": set()}
+                        unified_cache[symbol_name] = {"markets": set(), "tick_sizes": {}}
                     unified_cache[symbol_name]["markets"].add(market)
+                    tick_size = self._extract_tick_size(symbol_data)
+                    if tick_size is not None:
+                        unified_cache[symbol_name]["tick_sizes"][market] = tick_size
 
         if unified_cache:
             self._symbols_cache = unified_cache
@@ -283,5 +305,20 @@ class MarketDataService:
 
         return False
 
-# --- END OF FINAL, HARDENED, AND PRODUCTION-READY FILE (Version 1.4.0) ---
+    def get_tick_size(self, symbol: str, market: str) -> Optional[Decimal]:
+        """
+        tickSize للرمز في السوق المطلوب (نفس مطابقة market في is_valid_symbol).
+        None إذا كان الكاش من CoinGecko أو الرمز غير معروف.
+        """
+        entry = self._symbols_cache.get((symbol or "").strip().upper())
+        if not entry:
+            return None
+        tick_sizes = entry.get("tick_sizes") or {}
+        market_lower = (market or "").lower()
+        for available_market, tick_size in tick_sizes.items():
+            if market_lower in available_market.lower():
+                return tick_size
+        return None
+
+# --- END OF FINAL, HARDENED, AND PRODUCTION-READY FILE (Version 1.5.0) ---
 #--- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/application/services/market_data_service.py ---
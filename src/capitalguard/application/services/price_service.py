@@ -1,6 +1,33 @@
 #--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/application/services/price_service.py ---
 # File: src/capitalguard/application/services/price_service.py
-# Version: v17.0.0-WS-FIRST
+# Version: v17.4.1-LATEST-PRICES
+#
+# ✅ THE FIX (v17.4.1): force_refresh كان ينضم لطلب upstream قيد التنفيذ وإن بدأ
+#   قبل الاستدعاء → سعر أقدم من المطلوب لأوامر MARKET. الآن force_refresh يبدأ
+#   طلباً خاصاً ويحل محل الـ Future في _inflight، فينضم إليه من يأتي بعده فقط.
+#
+# ✅ THE UPGRADE (v17.4) — latest_prices قبل L0:
+#   BinanceWSClient يكتب آخر تيك في جدول داخل العملية (price_table).
+#   لرمز مُشترَك به يصبح السعر قراءة dict — بلا await ولا Redis.
+#
+# ✅ THE FIX (v17.3) — single-flight لـ get_cached_price أيضاً:
+#   عند خروج سعر من الكاش كان كل المستدعين المتزامنين (WebApp polling،
+#   notify_card_update، build_trade_card_text) يطلقون get_price/CoinGecko
+#   معاً → 429 على IP مشترك. الآن كل miss يمر عبر _resolve_misses:
+#   طلب upstream واحد لكل (الرمز، السوق) والباقون ينتظرونه،
+#   ويُعدّ المنتظرون في cg_price_fetch_coalesced_total{market}.
+#
+# ✅ THE UPGRADE (v17.2) — REST دفعة + single-flight للدفعات:
+#   Cold cache + محفظة 40 أصل = 40 طلب /ticker/price. الآن ما لم يُحلّ من
+#   L0/L1: إذا عدد الرموز >= bulk_fetch_threshold → get_all_prices واحد لكل
+#   سوق، وكل الرموز المُعادة تُكتب في L0/L1 دفعة واحدة؛ وإلا طلبات فردية.
+#   الطلبات المتزامنة لنفس (الرمز، السوق) تنتظر نفس الـ Future (single-flight).
+#
+# ✅ THE UPGRADE (v17.1) — get_cached_prices (دفعة):
+#   المحفظة / لوحة الصفقات كانت تُطلق get_cached_price لكل أصل →
+#   حتى 2×N GET لـ Redis (مفتاح أساسي + بديل). الآن:
+#     L0 محلياً ← core_cache.get_many لكل المفاتيح (MGET واحد)
+#     ← REST/CoinGecko فقط لما بقي بلا سعر.
 #
 # ✅ THE FIX — توحيد مصدر الأسعار (WebSocket أولاً):
 #
@@ -43,10 +70,12 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from capitalguard.infrastructure.cache import InMemoryCache
+from capitalguard.infrastructure.market.price_table import latest_prices
+from capitalguard.infrastructure.monitoring.metrics import PRICE_FETCH_COALESCED
 from capitalguard.infrastructure.pricing.binance import BinancePricing
 from capitalguard.infrastructure.pricing.coingecko_client import CoinGeckoClient
 
@@ -68,6 +97,13 @@ class PriceService:
     L3: CoinGecko      → fallback نهائي
     """
 
+    # عدد الرموز الناقصة الذي يصبح عنده get_all_prices أرخص من طلبات فردية
+    bulk_fetch_threshold: int = 8
+    # (loop_id, symbol, spot|futures) → Future السعر قيد الجلب
+    _inflight: Dict[Tuple[int, str, str], asyncio.Future] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
     # ─────────────────────────────────────────────────────────────
     # Internal helpers
     # ─────────────────────────────────────────────────────────────
@@ -84,10 +120,19 @@ class PriceService:
             return normalized
         return symbol_upper
 
+    def _is_spot(self, market: str) -> bool:
+        return str(market or "Spot").lower().startswith("spot")
+
     def _l0_key(self, symbol: str, market: str) -> str:
         """مفتاح L0 (InMemoryCache) — محلي لهذه الخدمة."""
         return f"price:any:{(market or 'spot').lower()}:{symbol}"
 
+    def _ws_keys(self, symbol: str, market: str) -> Tuple[str, str]:
+        """(المفتاح الأساسي، البديل) بنفس صيغة PriceStreamer."""
+        if "SPOT" in (market or "Futures").upper():
+            return f"price:SPOT:{symbol}", f"price:FUTURES:{symbol}"
+        return f"price:FUTURES:{symbol}", f"price:SPOT:{symbol}"
+
     async def _get_from_ws_cache(
         self, symbol: str, market: str
     ) -> Optional[float]:
@@ -98,13 +143,7 @@ class PriceService:
         try:
             from capitalguard.infrastructure.core_engine import core_cache
 
-            market_upper = (market or "Futures").upper()
-            if "SPOT" in market_upper:
-                primary_key   = f"price:SPOT:{symbol}"
-                secondary_key = f"price:FUTURES:{symbol}"
-            else:
-                primary_key   = f"price:FUTURES:{symbol}"
-                secondary_key = f"price:SPOT:{symbol}"
+            primary_key, secondary_key = self._ws_keys(symbol, market)
 
             price = await core_cache.get(primary_key)
             if price is not None:
@@ -135,16 +174,152 @@ class PriceService:
         # L1 — async، قد يفشل في بعض الـ loop contexts
         try:
             from capitalguard.infrastructure.core_engine import core_cache
-            market_upper = (market or "Futures").upper()
-            ws_key = (
-                f"price:SPOT:{symbol}"
-                if "SPOT" in market_upper
-                else f"price:FUTURES:{symbol}"
-            )
+            ws_key, _ = self._ws_keys(symbol, market)
             await core_cache.set(ws_key, price, ttl=60)
         except Exception:
             pass
 
+    async def _fetch_live(self, normalized: str, market: str) -> Optional[float]:
+        """L2 (Binance REST) ثم L3 (CoinGecko) + write-back في L0/L1."""
+        # ── L2: Binance REST ────────────────────────────────────────
+        provider_env = os.getenv("MARKET_DATA_PROVIDER", "binance").lower()
+        live_price: Optional[float] = None
+
+        if provider_env == "binance":
+            try:
+                is_spot = self._is_spot(market)
+                # ✅ async مباشرة — BinancePricing.get_price أصبحت async
+                live_price = await BinancePricing.get_price(normalized, is_spot)
+            except Exception as e:
+                log.warning("Binance REST failed for %s: %s", normalized, e)
+                live_price = None
+
+        # ── L3: CoinGecko (fallback نهائي) ─────────────────────────
+        if live_price is None:
+            if provider_env == "binance":
+                log.info(
+                    "Binance REST unavailable for %s — "
+                    "falling back to CoinGecko.",
+                    normalized,
+                )
+            live_price = await self._fetch_coingecko(normalized)
+
+        # ── Write-back: حفظ في L0 وL1 ─────────────────────────────
+        if live_price is not None:
+            await self._write_back_cache(normalized, market, live_price)
+            return live_price
+
+        log.error("All price providers failed for %s", normalized)
+        return None
+
+    async def _fetch_coingecko(self, normalized: str) -> Optional[float]:
+        try:
+            cg_client = CoinGeckoClient()
+            live_price = await cg_client.get_price(normalized)
+            if live_price:
+                log.info(
+                    "CoinGecko price for %s: %s", normalized, live_price
+                )
+            return live_price
+        except Exception as e:
+            log.error("CoinGecko failed for %s: %s", normalized, e)
+            return None
+
+    async def _write_back_bulk(self, tickers: Dict[str, float], is_spot: bool) -> None:
+        """يكتب كل أسعار get_all_prices في L0 وL1 دفعة واحدة."""
+        market = "Spot" if is_spot else "Futures"
+        for symbol, price in tickers.items():
+            price_cache.set(self._l0_key(symbol, market), price, ttl_seconds=60)
+        try:
+            from capitalguard.infrastructure.core_engine import core_cache
+            await core_cache.set_many(
+                {self._ws_keys(symbol, market)[0]: price for symbol, price in tickers.items()},
+                ttl=60,
+            )
+        except Exception:
+            pass
+
+    async def _fetch_many(
+        self, pairs: List[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Optional[float]]:
+        """
+        L2/L3 لقائمة (normalized, market):
+        أقل من bulk_fetch_threshold → _fetch_live لكل رمز بالتوازي،
+        وإلا get_all_prices واحد لكل سوق ثم CoinGecko لما لم يُوجد.
+        """
+        provider_env = os.getenv("MARKET_DATA_PROVIDER", "binance").lower()
+        if provider_env != "binance" or len(pairs) < self.bulk_fetch_threshold:
+            fetched = await asyncio.gather(
+                *(self._fetch_live(normalized, market) for normalized, market in pairs),
+                return_exceptions=True,
+            )
+            return {
+                pair: price if isinstance(price, (int, float)) else None
+                for pair, price in zip(pairs, fetched)
+            }
+
+        result: Dict[Tuple[str, str], Optional[float]] = {}
+        by_kind: Dict[bool, List[Tuple[str, str]]] = {}
+        for pair in pairs:
+            by_kind.setdefault(self._is_spot(pair[1]), []).append(pair)
+
+        for is_spot, group in by_kind.items():
+            tickers = await BinancePricing.get_all_prices(spot=is_spot)
+            if tickers:
+                await self._write_back_bulk(tickers, is_spot)
+            for normalized, market in group:
+                price = tickers.get(normalized)
+                if price is not None:
+                    price_cache.set(self._l0_key(normalized, market), price, ttl_seconds=60)
+                result[(normalized, market)] = price
+
+        leftovers = [pair for pair, price in result.items() if price is None]
+        if leftovers:
+            log.info("Bulk ticker missed %d symbols — falling back to CoinGecko.", len(leftovers))
+            fetched = await asyncio.gather(*(self._fetch_coingecko(n) for n, _ in leftovers))
+            for (normalized, market), price in zip(leftovers, fetched):
+                if price is not None:
+                    await self._write_back_cache(normalized, market, price)
+                result[(normalized, market)] = price
+        return result
+
+    async def _resolve_misses(
+        self, pairs: List[Tuple[str, str]], fresh: bool = False
+    ) -> Dict[Tuple[str, str], Optional[float]]:
+        """
+        Single-flight فوق _fetch_many: الرموز قيد الجلب من طلب آخر
+        تنتظر نفس الـ Future، والباقي يُجلب هنا ويُسوّى لكل المنتظرين.
+        fresh=True: لا انضمام لطلب بدأ قبل الاستدعاء — طلب جديد يحل محله للاحقين.
+        """
+        loop = asyncio.get_running_loop()
+        owned: Dict[Tuple[int, str, str], Tuple[Tuple[str, str], asyncio.Future]] = {}
+        futures: Dict[Tuple[str, str], asyncio.Future] = {}
+        for pair in pairs:
+            kind = "spot" if self._is_spot(pair[1]) else "futures"
+            flight_key = (id(loop), pair[0], kind)
+            fut = None if fresh and flight_key not in owned else self._inflight.get(flight_key)
+            if fut is None:
+                fut = loop.create_future()
+                self._inflight[flight_key] = fut
+                owned[flight_key] = (pair, fut)
+            elif flight_key not in owned:
+                PRICE_FETCH_COALESCED.labels(kind).inc()
+            futures[pair] = fut
+
+        try:
+            if owned:
+                fetched = await self._fetch_many([pair for pair, _ in owned.values()])
+                for pair, fut in owned.values():
+                    fut.set_result(fetched.get(pair))
+        finally:
+            for flight_key, (_, fut) in owned.items():
+                if not fut.done():
+                    fut.set_result(None)
+                if self._inflight.get(flight_key) is fut:
+                    del self._inflight[flight_key]
+
+        return {pair: await asyncio.shield(fut) for pair, fut in futures.items()}
+
     # ─────────────────────────────────────────────────────────────
     # Public API
     # ─────────────────────────────────────────────────────────────
@@ -161,12 +336,20 @@ class PriceService:
         force_refresh=True:
           يتخطى L0 وL1 ويجلب مباشرة من L2/L3.
           يُستخدم لأوامر MARKET التي تحتاج السعر اللحظي الدقيق.
+          لا ينضم لطلب upstream بدأ قبله — يبدأ طلباً جديداً (سعر بعد الاستدعاء)،
+          والاستدعاءات اللاحقة لنفس الرمز تنضم إليه.
         """
         if not symbol:
             return None
 
         normalized = self._normalize_symbol(symbol)
 
+        # ── Live: آخر تيك WS في نفس العملية (قراءة dict) ──────────
+        if not force_refresh:
+            live = latest_prices.get_close(normalized)
+            if live is not None:
+                return live
+
         # ── L0: InMemoryCache (sync — بلا event loop) ─────────────
         if not force_refresh:
             try:
@@ -195,45 +378,70 @@ class PriceService:
                     pass
                 return ws_price
 
-        # ── L2: Binance REST ────────────────────────────────────────
-        provider_env = os.getenv("MARKET_DATA_PROVIDER", "binance").lower()
-        live_price: Optional[float] = None
+        # ── L2/L3: طلب upstream واحد لكل (الرمز، السوق) ──────────
+        fetched = await self._resolve_misses([(normalized, market)], fresh=force_refresh)
+        return fetched.get((normalized, market))
 
-        if provider_env == "binance":
-            try:
-                is_spot = str(market or "Spot").lower().startswith("spot")
-                # ✅ async مباشرة — BinancePricing.get_price أصبحت async
-                live_price = await BinancePricing.get_price(normalized, is_spot)
-            except Exception as e:
-                log.warning("Binance REST failed for %s: %s", normalized, e)
-                live_price = None
+    async def get_cached_prices(
+        self, items: Iterable[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Optional[float]]:
+        """
+        نسخة الدفعة من get_cached_price لقائمة (symbol, market).
 
-        # ── L3: CoinGecko (fallback نهائي) ─────────────────────────
-        if live_price is None:
-            if provider_env == "binance":
-                log.info(
-                    "Binance REST unavailable for %s — "
-                    "falling back to CoinGecko.",
-                    normalized,
-                )
+        L0 محلياً، ثم core_cache.get_many لكل المفاتيح الأساسية والبديلة
+        (round-trip واحد لـ Redis)، ثم REST لما بقي فقط (_resolve_misses).
+        المفاتيح في النتيجة هي الأزواج كما مُرِّرت.
+        """
+        pairs = list(dict.fromkeys(items))
+        result: Dict[Tuple[str, str], Optional[float]] = {}
+        pending: List[Tuple[Tuple[str, str], str]] = []
+
+        # ── Live + L0 ───────────────────────────────────────────────
+        for pair in pairs:
+            symbol, market = pair
+            if not symbol:
+                result[pair] = None
+                continue
+            normalized = self._normalize_symbol(symbol)
+            cached = latest_prices.get_close(normalized)
+            if cached is None:
+                cached = price_cache.get(self._l0_key(normalized, market))
+            if cached is not None:
+                result[pair] = cached
+            else:
+                pending.append((pair, normalized))
+
+        # ── L1: WebSocket core_cache (MGET واحد) ───────────────────
+        if pending:
             try:
-                cg_client = CoinGeckoClient()
-                live_price = await cg_client.get_price(normalized)
-                if live_price:
-                    log.info(
-                        "CoinGecko price for %s: %s", normalized, live_price
-                    )
+                from capitalguard.infrastructure.core_engine import core_cache
+
+                keys = [k for pair, normalized in pending for k in self._ws_keys(normalized, pair[1])]
+                found = await core_cache.get_many(keys)
             except Exception as e:
-                log.error("CoinGecko failed for %s: %s", normalized, e)
-                live_price = None
+                log.debug("WS cache batch lookup failed: %s", e)
+                found = {}
 
-        # ── Write-back: حفظ في L0 وL1 ─────────────────────────────
-        if live_price is not None:
-            await self._write_back_cache(normalized, market, live_price)
-            return live_price
+            still_missing = []
+            for pair, normalized in pending:
+                primary_key, secondary_key = self._ws_keys(normalized, pair[1])
+                price = found.get(primary_key)
+                if price is None:
+                    price = found.get(secondary_key)
+                if price is None:
+                    still_missing.append((pair, normalized))
+                    continue
+                result[pair] = float(price)
+                price_cache.set(self._l0_key(normalized, pair[1]), result[pair], ttl_seconds=60)
+            pending = still_missing
 
-        log.error("All price providers failed for %s", normalized)
-        return None
+        # ── L2/L3: REST لما بقي (فردي أو bulk، مع single-flight) ──
+        if pending:
+            fetched = await self._resolve_misses([(normalized, pair[1]) for pair, normalized in pending])
+            for pair, normalized in pending:
+                result[pair] = fetched.get((normalized, pair[1]))
+
+        return result
 
     # backward-compatible alias
     async def get_preview_price(
@@ -1,6 +1,12 @@
 #--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/application/services/trade_service.py ---
 # File: src/capitalguard/application/services/trade_service.py
-# Version: v33.0.0-R3-FINAL (Postgres Fix + R3 Architecture)
+# Version: v33.2.1-R3-FINAL (Postgres Fix + R3 Architecture + Delta Index + Bulk Publish)
+# ✅ v33.1.0: _commit_and_dispatch يُزامن trigger العنصر فقط (AlertService.sync_trigger_from_orm).
+# ✅ v33.2.0: _publish_recommendation يستخدم مسار النشر الجماعي لـ CreationService
+#    (render واحد لكل القنوات + INSERT واحد لصفوف PublishedMessage).
+# ✅ v33.2.0: notify_reply يكتب في notification_outbox عبر LifecycleService عند تفعيله
+#    بدل create_task لكل رسالة منشورة.
+# ✅ v33.2.1: مسار النشر الجماعي من channel_publishing (استيراد على مستوى الوحدة).
 # ✅ THE FIX:
 #    1. (Postgres) Replaced invalid SQL 'SELECT DISTINCT ... ORDER BY' with Python-side deduplication
 #       in 'get_recent_assets_for_user'.
@@ -22,7 +28,7 @@ from sqlalchemy.orm import selectinload
 # Infrastructure & Domain Imports
 from capitalguard.infrastructure.db.uow import session_scope
 from capitalguard.infrastructure.db.models import (
-    PublishedMessage, Recommendation, RecommendationEvent, User,
+    Recommendation, RecommendationEvent, User,
     RecommendationStatusEnum, UserTrade, 
     OrderTypeEnum, ExitStrategyEnum,
     UserTradeStatusEnum, 
@@ -32,6 +38,7 @@ from capitalguard.infrastructure.db.models import (
 from capitalguard.infrastructure.db.repository import (
     RecommendationRepository, ChannelRepository, UserRepository
 )
+from .channel_publishing import post_card_to_channels, save_published_messages
 from capitalguard.domain.entities import (
     Recommendation as RecommendationEntity,
     RecommendationStatus as RecommendationStatusEntity,
@@ -139,10 +146,10 @@ class TradeService:
             rec_orm = orm_object
             if rebuild_alerts and self.alert_service:
                 try:
-                    logger.info(f"Rebuilding full alert index on request for Rec ID {item_id}...")
-                    await self.alert_service.build_triggers_index()
+                    logger.debug(f"Syncing alert trigger (delta) for Rec ID {item_id}...")
+                    await self.alert_service.sync_trigger_from_orm(rec_orm)
                 except Exception as alert_err:
-                    logger.exception(f"Alert rebuild fail Rec ID {item_id}: {alert_err}")
+                    logger.exception(f"Alert sync fail Rec ID {item_id}: {alert_err}")
 
             updated_entity = self.repo._to_entity(rec_orm)
             if updated_entity:
@@ -153,10 +160,10 @@ class TradeService:
         elif isinstance(orm_object, UserTrade):
              if rebuild_alerts and self.alert_service:
                 try:
-                    logger.info(f"Rebuilding full alert index on request for UserTrade ID {item_id}...")
-                    await self.alert_service.build_triggers_index()
+                    logger.debug(f"Syncing alert trigger (delta) for UserTrade ID {item_id}...")
+                    await self.alert_service.sync_trigger_from_orm(orm_object)
                 except Exception as alert_err:
-                    logger.exception(f"Alert rebuild fail UserTrade ID {item_id}: {alert_err}")
+                    logger.exception(f"Alert sync fail UserTrade ID {item_id}: {alert_err}")
 
     async def _call_notifier_maybe_async(self, fn, *args, **kwargs):
         if inspect.iscoroutinefunction(fn): return await fn(*args, **kwargs)
@@ -177,6 +184,8 @@ class TradeService:
     def notify_reply(self, rec_id: int, text: str, db_session: Session):
         rec_orm = self.repo.get(db_session, rec_id)
         if not rec_orm or getattr(rec_orm, "is_shadow", False): return
+        if getattr(self.lifecycle_service, "outbox_relay", None) is not None:
+            self.lifecycle_service._enqueue_replies(rec_id, text, db_session); return
         published_messages = self.repo.get_published_messages(db_session, rec_id)
         for msg in published_messages: asyncio.create_task(self._call_notifier_maybe_async( self.notifier.post_notification_reply, chat_id=msg.telegram_channel_id, message_id=msg.telegram_message_id, text=text ))
 
@@ -231,22 +240,21 @@ class TradeService:
             public_channel_keyboard = lambda *_: None
             logger.warning("public_channel_keyboard not found.")
         keyboard = public_channel_keyboard(rec_entity.id, getattr(self.notifier, "bot_username", None))
-        tasks = []
-        channel_map = {ch.telegram_channel_id: ch for ch in channels_to_publish}
-        for channel_id in channel_map.keys(): tasks.append(self._call_notifier_maybe_async( self.notifier.post_to_channel, channel_id, rec_entity, keyboard ))
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        for i, channel_id in enumerate(channel_map.keys()):
-            result = results[i]
+        channel_ids = list(dict.fromkeys(ch.telegram_channel_id for ch in channels_to_publish))
+        results = await post_card_to_channels(self.notifier, channel_ids, rec_entity, keyboard)
+        sent: List[Tuple[int, int]] = []
+        for channel_id, result in zip(channel_ids, results):
             if isinstance(result, Exception):
-                logger.exception(f"Failed publish Rec {rec_entity.id} channel {channel_id}: {result}")
+                logger.error(f"Failed publish Rec {rec_entity.id} channel {channel_id}: {result}")
                 report["failed"].append({"channel_id": channel_id, "reason": str(result)})
             elif isinstance(result, tuple) and len(result) == 2:
-                session.add(PublishedMessage(recommendation_id=rec_entity.id, telegram_channel_id=result[0], telegram_message_id=result[1]))
+                sent.append(result)
                 report["success"].append({"channel_id": channel_id, "message_id": result[1]})
             else:
                 reason = f"Notifier unexpected result: {type(result)}"
                 logger.error(f"Failed publish Rec {rec_entity.id} channel {channel_id}: {reason}")
                 report["failed"].append({"channel_id": channel_id, "reason": reason})
+        save_published_messages(session, rec_entity.id, sent)
         session.flush()
         return rec_entity, report
 
@@ -284,7 +292,7 @@ class TradeService:
                 trigger_data = self.alert_service.build_trigger_data_from_orm(rec_orm_for_trigger)
 
                 if trigger_data:
-                    await self.alert_service.add_trigger_data(trigger_data)
+                    await self.alert_service.upsert_trigger_data(trigger_data)
                 else:
                     logger.error(f"[BG Task Rec {rec_id}]: Failed to build trigger data. AlertService will not track this trade!")
 
@@ -0,0 +1,203 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/application/services/trigger_index.py
+# Version: v1.0.0-PRICE-LEVELS
+#
+# ✅ THE UPGRADE — فهرس مستويات الأسعار لكل رمز:
+#
+# المشكلة:
+#   _symbol_worker كان ينسخ active_triggers[key] كاملة في كل تيك (1s)
+#   ثم يستدعي _evaluate_core_triggers على كل trigger ويحسب Decimal لكل هدف.
+#   BTCUSDT مع مئات الصفقات = O(N) عمل Decimal في كل ثانية حتى لو السعر بعيد.
+#
+# الحل — مصفوفتان مرتبتان لكل رمز (bisect):
+#   UP   : مستويات تُضرب عندما high >= level  (TP للـ LONG، SL/ENTRY للـ SHORT)
+#   DOWN : مستويات تُضرب عندما low  <= level  (SL/ENTRY للـ LONG، TP للـ SHORT)
+#   تيك [low, high] → prefix من UP + suffix من DOWN = O(log N + k)
+#
+# نفس قواعد AlertService._is_price_condition_met تماماً — الفهرس يُرشِّح فقط،
+# والتقييم النهائي (processed_events، published_at، ...) يبقى في AlertService.
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from capitalguard.infrastructure.db.models import (
+    RecommendationStatusEnum,
+    UserTradeStatusEnum,
+)
+
+# (item_type, item_id)
+TriggerRef = Tuple[str, int]
+
+LEVEL_UP = "UP"      # fires when tick high >= level
+LEVEL_DOWN = "DOWN"  # fires when tick low  <= level
+
+_PENDING_STATUSES = (
+    RecommendationStatusEnum.PENDING,
+    UserTradeStatusEnum.WATCHLIST,
+    UserTradeStatusEnum.PENDING_ACTIVATION,
+)
+_ACTIVE_STATUSES = (
+    RecommendationStatusEnum.ACTIVE,
+    UserTradeStatusEnum.ACTIVATED,
+)
+
+
+def _level_price(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    try:
+        d = value if isinstance(value, Decimal) else Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return d if d.is_finite() else None
+
+
+def trigger_ref(trigger: Dict[str, Any]) -> TriggerRef:
+    return (trigger.get("item_type", "recommendation"), trigger.get("id"))
+
+
+def levels_for_trigger(trigger: Dict[str, Any]) -> List[Tuple[str, Decimal]]:
+    """
+    يُعيد مستويات السعر التي قد تُطلق تقييماً لهذا الـ trigger.
+      PENDING/WATCHLIST → SL + ENTRY
+      ACTIVE/ACTIVATED  → SL + كل TP
+    """
+    side = (trigger.get("side") or "").upper()
+    if side == "LONG":
+        sl_dir, entry_dir, tp_dir = LEVEL_DOWN, LEVEL_DOWN, LEVEL_UP
+    elif side == "SHORT":
+        sl_dir, entry_dir, tp_dir = LEVEL_UP, LEVEL_UP, LEVEL_DOWN
+    else:
+        return []
+
+    status = trigger.get("status")
+    levels: List[Tuple[str, Decimal]] = []
+
+    sl = _level_price(trigger.get("stop_loss"))
+    if status in _PENDING_STATUSES:
+        if sl is not None:
+            levels.append((sl_dir, sl))
+        entry = _level_price(trigger.get("entry"))
+        if entry is not None:
+            levels.append((entry_dir, entry))
+    elif status in _ACTIVE_STATUSES:
+        if sl is not None:
+            levels.append((sl_dir, sl))
+        for target in trigger.get("targets", []) or []:
+            tp = _level_price(target.get("price"))
+            if tp is not None:
+                levels.append((tp_dir, tp))
+    return levels
+
+
+class SymbolLevelIndex:
+    """
+    فهرس مستويات مرتب لرمز واحد ("BTCUSDT:Futures").
+    ليس thread-safe بذاته — AlertService يحميه بـ _triggers_lock.
+    """
+
+    __slots__ = (
+        "_up_prices", "_up_refs", "_down_prices", "_down_refs",
+        "_levels", "_triggers", "_seq", "_next_seq", "_strategy_refs",
+    )
+
+    def __init__(self) -> None:
+        self._up_prices: List[Decimal] = []
+        self._up_refs: List[TriggerRef] = []
+        self._down_prices: List[Decimal] = []
+        self._down_refs: List[TriggerRef] = []
+        self._levels: Dict[TriggerRef, List[Tuple[str, Decimal]]] = {}
+        self._triggers: Dict[TriggerRef, Dict[str, Any]] = {}
+        # ترتيب الإدراج — يحافظ على ترتيب التقييم كما في القائمة الأصلية
+        self._seq: Dict[TriggerRef, int] = {}
+        self._next_seq = 0
+        # توصيات لها استراتيجية profit-stop فعّالة → تُقيَّم في كل تيك
+        self._strategy_refs: Dict[TriggerRef, None] = {}
+
+    def __len__(self) -> int:
+        return len(self._triggers)
+
+    def __contains__(self, ref: TriggerRef) -> bool:
+        return ref in self._triggers
+
+    # ── Mutations ──────────────────────────────────────────────────────────
+
+    def add(self, trigger: Dict[str, Any]) -> None:
+        """يُضيف trigger أو يستبدله (نفس ref) مع إعادة فهرسة مستوياته."""
+        ref = trigger_ref(trigger)
+        if ref in self._triggers:
+            self._drop_levels(ref)
+        else:
+            self._seq[ref] = self._next_seq
+            self._next_seq += 1
+
+        self._triggers[ref] = trigger
+        levels = levels_for_trigger(trigger)
+        self._levels[ref] = levels
+        for direction, price in levels:
+            if direction == LEVEL_UP:
+                pos = bisect_right(self._up_prices, price)
+                self._up_prices.insert(pos, price)
+                self._up_refs.insert(pos, ref)
+            else:
+                pos = bisect_right(self._down_prices, price)
+                self._down_prices.insert(pos, price)
+                self._down_refs.insert(pos, ref)
+
+        if trigger.get("profit_stop_active"):
+            self._strategy_refs[ref] = None
+        else:
+            self._strategy_refs.pop(ref, None)
+
+    def remove(self, ref: TriggerRef) -> bool:
+        if ref not in self._triggers:
+            return False
+        self._drop_levels(ref)
+        del self._triggers[ref]
+        self._seq.pop(ref, None)
+        self._strategy_refs.pop(ref, None)
+        return True
+
+    def _drop_levels(self, ref: TriggerRef) -> None:
+        for direction, price in self._levels.pop(ref, []):
+            if direction == LEVEL_UP:
+                prices, refs = self._up_prices, self._up_refs
+            else:
+                prices, refs = self._down_prices, self._down_refs
+            lo = bisect_left(prices, price)
+            hi = bisect_right(prices, price)
+            for i in range(lo, hi):
+                if refs[i] == ref:
+                    del prices[i]
+                    del refs[i]
+                    break
+
+    # ── Queries ────────────────────────────────────────────────────────────
+
+    def crossed(self, low: Decimal, high: Decimal) -> List[Dict[str, Any]]:
+        """
+        كل triggers التي عَبَر التيك [low, high] أحد مستوياتها — O(log N + k).
+        """
+        hit: Dict[TriggerRef, None] = {}
+        up_end = bisect_right(self._up_prices, high)
+        for ref in self._up_refs[:up_end]:
+            hit[ref] = None
+        down_start = bisect_left(self._down_prices, low)
+        for ref in self._down_refs[down_start:]:
+            hit[ref] = None
+        return self._ordered(hit)
+
+    def strategy_triggers(self) -> List[Dict[str, Any]]:
+        return self._ordered(self._strategy_refs)
+
+    def all_triggers(self) -> List[Dict[str, Any]]:
+        return self._ordered(self._triggers)
+
+    def _ordered(self, refs: Iterable[TriggerRef]) -> List[Dict[str, Any]]:
+        seq = self._seq
+        return [self._triggers[r] for r in sorted(refs, key=seq.__getitem__)]
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
@@ -0,0 +1,231 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/application/services/trigger_records.py
+# Version: v1.0.0-COMPACT-TRIGGERS
+#
+# ✅ THE UPGRADE — سجلات triggers مضغوطة بدل dict لكل trigger:
+#
+# المشكلة:
+#   كل trigger في active_triggers = dict بـ ~20 مفتاحاً + Decimals + set + dict لكل هدف.
+#   الذاكرة وكلفة البحث عن المفاتيح تنمو خطياً مع عدد الصفقات المفتوحة.
+#
+# الحل — TriggerRecord (__slots__):
+#   - الأسعار int مُقيَّسة (fixed-point): price = value / 10**exp
+#     exp = أكبر عدد منازل عشرية بين أسعار السجل → التحويل دقيق بلا تقريب
+#   - processed_events → bitmask (ACTIVATED, INVALIDATED, SL_HIT, FINAL_CLOSE, TPn_HIT)
+#     وهي الأحداث الوحيدة التي يقرأها التقييم
+#   - الأهداف tuple من int + tuple من close_percent
+#   - get()/[] متوافقة مع واجهة dict القديمة (StrategyEngine، الفهرس، الاختبارات)
+#
+# مقارنة التيك دقيقة تماماً مع مسار Decimal:
+#   high >= L  ⇔  floor(high·10^exp) >= L_i
+#   low  <= L  ⇔  ceil(low·10^exp)   <= L_i
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+from decimal import Decimal, InvalidOperation, ROUND_CEILING, ROUND_FLOOR
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# ── Processed-event bits ─────────────────────────────────────────────────────
+EV_ACTIVATED   = 1 << 0
+EV_INVALIDATED = 1 << 1
+EV_SL_HIT      = 1 << 2
+EV_FINAL_CLOSE = 1 << 3
+_TP_BIT_OFFSET = 3  # TP1_HIT = 1 << 4, TP2_HIT = 1 << 5, ...
+
+_NAMED_EVENTS = {
+    "ACTIVATED": EV_ACTIVATED,
+    "INVALIDATED": EV_INVALIDATED,
+    "SL_HIT": EV_SL_HIT,
+    "FINAL_CLOSE": EV_FINAL_CLOSE,
+}
+
+
+def tp_bit(index: int) -> int:
+    """Bit لحدث TP{index}_HIT (index يبدأ من 1)."""
+    return 1 << (_TP_BIT_OFFSET + index)
+
+
+def events_to_mask(events: Optional[Iterable[str]]) -> int:
+    mask = 0
+    for ev in events or ():
+        bit = _NAMED_EVENTS.get(ev)
+        if bit is not None:
+            mask |= bit
+        elif ev.startswith("TP") and ev.endswith("_HIT"):
+            try:
+                idx = int(ev[2:-4])
+            except ValueError:
+                continue
+            if idx >= 1:
+                mask |= tp_bit(idx)
+    return mask
+
+
+def mask_to_events(mask: int) -> set:
+    events = {name for name, bit in _NAMED_EVENTS.items() if mask & bit}
+    idx = 1
+    rest = mask >> (_TP_BIT_OFFSET + 1)
+    while rest:
+        if rest & 1:
+            events.add(f"TP{idx}_HIT")
+        rest >>= 1
+        idx += 1
+    return events
+
+
+# ── Fixed-point helpers ──────────────────────────────────────────────────────
+
+def _as_decimal(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _places(d: Optional[Decimal]) -> int:
+    if d is None or not d.is_finite():
+        return 0
+    exponent = d.as_tuple().exponent
+    return -exponent if exponent < 0 else 0
+
+
+def _to_scaled(d: Optional[Decimal], exp: int) -> Optional[int]:
+    if d is None or not d.is_finite():
+        return None
+    return int(d.scaleb(exp))
+
+
+def _from_scaled(value: Optional[int], exp: int) -> Optional[Decimal]:
+    if value is None:
+        return None
+    return Decimal(value).scaleb(-exp)
+
+
+def scaled_bounds(low: Decimal, high: Decimal, exp: int) -> Tuple[int, int]:
+    """(ceil(low·10^exp), floor(high·10^exp)) — حدود التيك بنفس مقياس السجل."""
+    lo_i = int(low.scaleb(exp).to_integral_value(rounding=ROUND_CEILING))
+    hi_i = int(high.scaleb(exp).to_integral_value(rounding=ROUND_FLOOR))
+    return lo_i, hi_i
+
+
+class TriggerRecord:
+    """
+    سجل trigger مضغوط. للقراءة فقط بعد الإنشاء — أي تغيير = سجل جديد
+    (نفس نمط upsert في AlertService).
+    """
+
+    __slots__ = (
+        "id", "item_type", "user_id", "user_db_id", "asset", "side", "status",
+        "order_type", "market", "profit_stop_mode", "profit_stop_active",
+        "profit_stop_trailing_value", "original_published_at",
+        "exp", "entry_i", "sl_i", "tp_i", "close_percents", "profit_stop_price_i",
+        "events",
+    )
+
+    def __init__(self) -> None:
+        # يُملأ عبر from_dict
+        pass
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TriggerRecord":
+        if isinstance(data, TriggerRecord):
+            return data
+        rec = cls()
+        rec.id = data.get("id")
+        rec.item_type = data.get("item_type", "recommendation")
+        rec.user_id = data.get("user_id")
+        rec.user_db_id = data.get("user_db_id")
+        rec.asset = data.get("asset")
+        rec.side = data.get("side")
+        rec.status = data.get("status")
+        rec.order_type = data.get("order_type")
+        rec.market = data.get("market", "Futures")
+        rec.profit_stop_mode = data.get("profit_stop_mode", "NONE")
+        rec.profit_stop_active = data.get("profit_stop_active", False)
+        rec.profit_stop_trailing_value = data.get("profit_stop_trailing_value")
+        rec.original_published_at = data.get("original_published_at")
+
+        entry = _as_decimal(data.get("entry"))
+        sl = _as_decimal(data.get("stop_loss"))
+        psp = _as_decimal(data.get("profit_stop_price"))
+        targets = data.get("targets", []) or []
+        tps = [_as_decimal(t.get("price")) for t in targets]
+
+        exp = max([_places(entry), _places(sl), _places(psp)] + [_places(p) for p in tps])
+        rec.exp = exp
+        rec.entry_i = _to_scaled(entry, exp)
+        rec.sl_i = _to_scaled(sl, exp)
+        rec.profit_stop_price_i = _to_scaled(psp, exp)
+        rec.tp_i = tuple(_to_scaled(p, exp) for p in tps)
+        rec.close_percents = tuple(t.get("close_percent", 0.0) for t in targets)
+        rec.events = events_to_mask(data.get("processed_events"))
+        return rec
+
+    # ── Fast accessors ────────────────────────────────────────────────────
+
+    def has_event(self, bit: int) -> bool:
+        return bool(self.events & bit)
+
+    def price(self, scaled: Optional[int]) -> Optional[Decimal]:
+        """يحوِّل قيمة مُقيَّسة من هذا السجل إلى Decimal."""
+        return _from_scaled(scaled, self.exp)
+
+    # ── dict-compatible read API ──────────────────────────────────────────
+
+    def _targets(self) -> List[Dict[str, Any]]:
+        return [
+            {"price": _from_scaled(p, self.exp), "close_percent": cp}
+            for p, cp in zip(self.tp_i, self.close_percents)
+        ]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        getter = _FIELD_GETTERS.get(key)
+        if getter is None:
+            return default
+        return getter(self)
+
+    def __getitem__(self, key: str) -> Any:
+        getter = _FIELD_GETTERS.get(key)
+        if getter is None:
+            raise KeyError(key)
+        return getter(self)
+
+    def __contains__(self, key: str) -> bool:
+        return key in _FIELD_GETTERS
+
+    def keys(self):
+        return _FIELD_GETTERS.keys()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getter(self) for k, getter in _FIELD_GETTERS.items()}
+
+    def __repr__(self) -> str:
+        return f"TriggerRecord({self.item_type}:{self.id} {self.asset} {self.side} {self.status})"
+
+
+_FIELD_GETTERS = {
+    "id": lambda r: r.id,
+    "item_type": lambda r: r.item_type,
+    "user_id": lambda r: r.user_id,
+    "user_db_id": lambda r: r.user_db_id,
+    "asset": lambda r: r.asset,
+    "side": lambda r: r.side,
+    "entry": lambda r: _from_scaled(r.entry_i, r.exp),
+    "stop_loss": lambda r: _from_scaled(r.sl_i, r.exp),
+    "targets": lambda r: r._targets(),
+    "status": lambda r: r.status,
+    "order_type": lambda r: r.order_type,
+    "market": lambda r: r.market,
+    "processed_events": lambda r: mask_to_events(r.events),
+    "profit_stop_mode": lambda r: r.profit_stop_mode,
+    "profit_stop_price": lambda r: _from_scaled(r.profit_stop_price_i, r.exp),
+    "profit_stop_trailing_value": lambda r: r.profit_stop_trailing_value,
+    "profit_stop_active": lambda r: r.profit_stop_active,
+    "original_published_at": lambda r: r.original_published_at,
+}
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
@@ -13,6 +13,31 @@ src/capitalguard/application/strategy/engine.py — StrategyEngine v4.0
 - دعم خيارات metrics و storage (اختياري).
 - جميع عمليات الحساب بالـ Decimal للحفاظ على الدقة العددية.
 
+v4.1 — مسار fixed-point لـ evaluate_batch:
+- عند توفر tick_size_provider (MarketDataService.get_tick_size) وعدم وجود hooks،
+  تُحوَّل high/low إلى int مُقيَّس بـ tickSize الرمز مرة واحدة لكل batch.
+- تحديث highest/lowest يتم بمقارنات int في تمريرة واحدة على كل الـ batch.
+- نتائج TRAILING/BREAK_EVEN تُعاد استخدامها ما لم تتغير watermarks أو السجل نفسه.
+- to_serializable() لا يُستدعى إلا عند تسجيل hook لـ on_state_changed.
+- أي قيمة غير قابلة للتمثيل بالمقياس → الرجوع لمسار Decimal (نفس Actions تماماً).
+
+v4.2 — Checkpointing مُجمَّع لحالة المحرك:
+- كل تغيير في highest/lowest/in_profit_zone/last_trailing_sl يُعلِّم التوصية dirty
+  (لا كتابة لكل تيك) — run_checkpointer يكتب الـ dirty فقط كل interval،
+  ونسخة كاملة دورياً، عبر storage.save_items (Redis hash: field لكل rec).
+- restore_checkpoint() يُستدعى قبل بناء الفهرس وأول تيك.
+- retain_states() لإعادة البناء: تُحفَظ حالة التوصيات الموجودة، وتُحذف حالة المغلقة فقط.
+
+v4.3 — عمال alert مُقسَّمون بالرموز (hash مشترك):
+- retain_states(recs, owned=...) : الغائب غير المملوك يُفلَت من الذاكرة (release_state)
+  دون حذفه من الـ checkpoint — حالته ملك عامل آخر.
+
+v4.4 — الملكية من رمز التوصية لا من الفهرس السابق:
+- كل حالة تحفظ asset (يُكتب في الـ checkpoint) → retain_states(owned=shard.owns)
+  يعرف مالك الحالة الغائبة حتى بعد إعادة التشغيل (الفهرس السابق فارغ).
+  الغائبة المملوكة تُحذف من الـ hash (أُغلقت أثناء توقف العامل)، غير المملوكة تُفلَت.
+- حالات قديمة بلا asset: تُكمَل عند ظهور التوصية في الفهرس، وإلا تُفلَت (لا حذف بلا مالك معروف).
+
 المطلوبات قبل التشغيل:
 - تمرير كائن lifecycle_service يوفّر واجهات التنفيذ عند الحاجة (لكن المحرك لا ينفذ أي أثر جانبي بنفسه).
 - إذا رُغب بالـ persistence: تمرير storage مع واجهات get/set.
@@ -25,11 +50,13 @@ import time
 import json
 from decimal import Decimal, getcontext, Context
 from dataclasses import dataclass, asdict, field
-from typing import Dict, Any, List, Optional, Callable, Iterable, Tuple
+from typing import Dict, Any, List, Optional, Callable, Iterable, Set, Tuple
 
 # Types for lifecycle_service and storage are loosely typed to avoid circular imports.
 # lifecycle_service must implement side-effect methods (used externally by caller).
 # storage is optional: expected methods get(key)->str|None, set(key, str)->None, delete(key)->None.
+#   batched checkpointing additionally uses load_items(key)->Dict[str, str] and
+#   save_items(key, items: Dict[str, str], removed: Iterable[str])->None (see strategy_state_store).
 # metrics is optional: expected methods increment(name, value=1), gauge(name, value), timing(name, ms)
 logger = logging.getLogger(__name__)
 
@@ -63,6 +90,37 @@ class AlertAction(BaseAction):
 
 Action = Any  # Union[CloseAction, MoveSLAction, AlertAction] — kept Any for simpler typing across files
 
+
+# --- Fixed-point helpers ---
+def _exp_for_tick_size(tick_size: Any) -> Optional[int]:
+    """Number of decimal places implied by a tick size ("0.01000000" -> 2)."""
+    try:
+        d = Decimal(str(tick_size)).normalize()
+    except Exception:
+        return None
+    if not d.is_finite() or d <= 0:
+        return None
+    exponent = d.as_tuple().exponent
+    return -exponent if exponent < 0 else 0
+
+
+def _scale_exact(value: Any, exp: int) -> Optional[int]:
+    """value * 10**exp as int, or None if that would lose precision."""
+    try:
+        d = value if isinstance(value, Decimal) else Decimal(str(value))
+        scaled = d.scaleb(exp)
+        if not scaled.is_finite() or scaled != scaled.to_integral_value():
+            return None
+        return int(scaled)
+    except Exception:
+        return None
+
+def _asset_of(rec: Dict[str, Any]) -> Optional[str]:
+    asset = rec.get("asset")
+    asset = getattr(asset, "value", asset)
+    return str(asset).upper() if asset else None
+
+
 # --- Internal state model per recommendation ---
 # Stored values must be JSON-serializable via to_serializable_state()
 class _EngineStateItem:
@@ -74,6 +132,31 @@ class _EngineStateItem:
         self.last_trailing_sl: Optional[Decimal] = None
         self.last_tick_ts: Optional[int] = ts
         self.initialized_at: int = int(time.time())
+        # رمز التوصية — يحدد الـ shard المالك للحالة في الـ checkpoint المشترك
+        self.asset: Optional[str] = None
+        # fixed-point caches (not serialized): (decimal_ref, exp, scaled_int)
+        self._highest_scaled: Optional[Tuple[Decimal, int, int]] = None
+        self._lowest_scaled: Optional[Tuple[Decimal, int, int]] = None
+        # memoized strategy result: (rec_ref, highest, lowest, last_trailing_sl, action)
+        self._memo: Optional[Tuple[Any, Decimal, Decimal, Optional[Decimal], Optional[Action]]] = None
+
+    def highest_scaled(self, exp: int) -> Optional[int]:
+        cached = self._highest_scaled
+        if cached is not None and cached[0] is self.highest and cached[1] == exp:
+            return cached[2]
+        value = _scale_exact(self.highest, exp)
+        if value is not None:
+            self._highest_scaled = (self.highest, exp, value)
+        return value
+
+    def lowest_scaled(self, exp: int) -> Optional[int]:
+        cached = self._lowest_scaled
+        if cached is not None and cached[0] is self.lowest and cached[1] == exp:
+            return cached[2]
+        value = _scale_exact(self.lowest, exp)
+        if value is not None:
+            self._lowest_scaled = (self.lowest, exp, value)
+        return value
 
     def to_serializable(self) -> Dict[str, Any]:
         return {
@@ -84,6 +167,7 @@ class _EngineStateItem:
             "last_trailing_sl": str(self.last_trailing_sl) if self.last_trailing_sl is not None else None,
             "last_tick_ts": self.last_tick_ts,
             "initialized_at": self.initialized_at,
+            "asset": self.asset,
         }
 
     @classmethod
@@ -95,6 +179,7 @@ class _EngineStateItem:
         obj.last_trailing_sl = Decimal(data["last_trailing_sl"]) if data.get("last_trailing_sl") is not None else None
         obj.last_tick_ts = data.get("last_tick_ts")
         obj.initialized_at = data.get("initialized_at", int(time.time()))
+        obj.asset = data.get("asset")
         return obj
 
 
@@ -112,7 +197,8 @@ class StrategyEngine:
         *,
         storage: Optional[Any] = None,
         metrics: Optional[Any] = None,
-        config: Optional[Dict[str, Any]] = None
+        config: Optional[Dict[str, Any]] = None,
+        tick_size_provider: Optional[Callable[[str, str], Optional[Decimal]]] = None
     ):
         """
         Args:
@@ -120,6 +206,8 @@ class StrategyEngine:
             storage: optional persistence (expects get/set/delete).
             metrics: optional metrics sink (increment, gauge, timing).
             config: engine tuning options (thresholds, heuristics).
+            tick_size_provider: optional (symbol, market) -> tick size; enables the
+                fixed-point fast path in evaluate_batch.
         """
         self.lifecycle_service = lifecycle_service
         self._state: Dict[int, _EngineStateItem] = {}
@@ -128,6 +216,11 @@ class StrategyEngine:
         self.storage = storage
         self.metrics = metrics
         self.config = config or {}
+        self.tick_size_provider = tick_size_provider
+        self._price_exps: Dict[Tuple[str, str], int] = {}
+        # checkpointing: recs changed / removed since the last save_items
+        self._dirty: Set[int] = set()
+        self._removed: Set[int] = set()
         self.engine_version = "v4"
         logger.info("StrategyEngine v4 initialized")
 
@@ -146,6 +239,12 @@ class StrategyEngine:
             except Exception as e:
                 logger.exception("Hook %s raised: %s", name, e)
 
+    def _emit_state_changed(self, rec_id: Optional[int], state: Optional[_EngineStateItem]) -> None:
+        """Emit on_state_changed only when someone listens (to_serializable is not free)."""
+        if not self._hooks.get("on_state_changed"):
+            return
+        self._emit_hook("on_state_changed", rec_id, state.to_serializable() if state is not None else None)
+
     # --- Lock helpers ---
     def _get_lock(self, rec_id: int) -> asyncio.Lock:
         if rec_id not in self._locks:
@@ -197,22 +296,157 @@ class StrategyEngine:
         except Exception:
             logger.exception("Failed to load persisted engine state")
 
+    # --- Batched checkpointing ---
+    @property
+    def persistence_key(self) -> str:
+        return self.config.get("persistence_key", "strategy_engine_state_v4")
+
+    @property
+    def _items_key(self) -> str:
+        return f"{self.persistence_key}:items"
+
+    def _supports_items(self) -> bool:
+        return bool(self.storage) and hasattr(self.storage, "save_items") and hasattr(self.storage, "load_items")
+
+    def _mark_dirty(self, rec_id: int) -> None:
+        self._dirty.add(rec_id)
+
+    def _take_checkpoint_batch(self, full: bool) -> Tuple[Dict[str, str], List[str]]:
+        ids = list(self._state) if full else [i for i in self._dirty if i in self._state]
+        items = {str(i): json.dumps(self._state[i].to_serializable()) for i in ids}
+        removed = [str(i) for i in self._removed if i not in self._state]
+        self._dirty.clear()
+        self._removed.clear()
+        return items, removed
+
+    async def checkpoint(self, full: bool = False) -> int:
+        """
+        يكتب حالات التوصيات المتغيرة (أو كلها إن full) دفعة واحدة.
+        التسلسل على الـ loop الحالي، والكتابة في thread. يُعيد عدد العناصر المكتوبة.
+        """
+        if not self._supports_items():
+            if full:
+                await self.persist_state(self.persistence_key)
+            return 0
+        if not full and not self._dirty and not self._removed:
+            return 0
+        items, removed = self._take_checkpoint_batch(full)
+        try:
+            await asyncio.to_thread(self.storage.save_items, self._items_key, items, removed)
+        except Exception:
+            # أعِد التعليم — تُعاد المحاولة في الدورة التالية
+            self._dirty.update(int(i) for i in items)
+            self._removed.update(int(i) for i in removed)
+            logger.exception("Strategy checkpoint failed (%d items)", len(items))
+            return 0
+        if self.metrics:
+            try:
+                self.metrics.gauge("strategy.checkpoint_items", len(items))
+            except Exception:
+                logger.debug("Metric gauge failed for checkpoint", exc_info=False)
+        logger.debug("Checkpointed %d engine states (%d removed)", len(items), len(removed))
+        return len(items)
+
+    async def restore_checkpoint(self) -> int:
+        """يدمج الحالات المحفوظة في _state (قبل أول تيك). يُعيد عدد الحالات المستعادة."""
+        if not self._supports_items():
+            await self.load_persisted_state(self.persistence_key)
+            return len(self._state)
+        try:
+            raw_items = await asyncio.to_thread(self.storage.load_items, self._items_key)
+        except Exception:
+            logger.exception("Failed to load strategy checkpoint")
+            return 0
+        restored = 0
+        for rec_id_str, raw in (raw_items or {}).items():
+            try:
+                obj = _EngineStateItem.from_serializable(json.loads(raw))
+                self._state[int(rec_id_str)] = obj
+                restored += 1
+            except Exception:
+                logger.exception("Failed to restore state for rec %s", rec_id_str)
+        logger.info("Strategy checkpoint restored: %d states", restored)
+        return restored
+
+    async def run_checkpointer(self, interval_seconds: float = 5.0, full_every_seconds: float = 300.0) -> None:
+        """حلقة خلفية: dirty كل interval_seconds، ونسخة كاملة كل full_every_seconds."""
+        last_full = time.monotonic()
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                full = time.monotonic() - last_full >= full_every_seconds
+                await self.checkpoint(full=full)
+                if full:
+                    last_full = time.monotonic()
+            except Exception:
+                logger.exception("Strategy checkpointer iteration failed")
+
     # --- Public state operations ---
     def initialize_state_for_recommendation(self, rec_dict: Dict[str, Any]) -> None:
         rec_id = int(rec_dict["id"])
         entry = rec_dict.get("entry", "0")
         ts = rec_dict.get("created_at") or int(time.time())
         self._state[rec_id] = _EngineStateItem(rec_id, Decimal(str(entry)), ts=ts)
+        self._state[rec_id].asset = _asset_of(rec_dict)
+        self._mark_dirty(rec_id)
         logger.debug("Initialized state for rec #%d", rec_id)
-        self._emit_hook("on_state_changed", rec_id, self._state[rec_id].to_serializable())
+        self._emit_state_changed(rec_id, self._state[rec_id])
+
+    def retain_states(
+        self,
+        recs: Iterable[Dict[str, Any]],
+        owned: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        """
+        مزامنة الحالة مع مجموعة التوصيات الحالية (إعادة بناء الفهرس):
+        الموجودة تحتفظ بـ watermarks، الجديدة تُهيَّأ، والغائبة تُحذف.
+        owned(asset): إن مُرِّر، الغائبة التي لا يملك هذا المحرك رمزها (أو رمزها
+        غير معروف) تُفلَت فقط (release_state) — الحذف لمالك الرمز وحده.
+        """
+        keep: Set[int] = set()
+        for rec in recs:
+            try:
+                rec_id = int(rec["id"])
+            except Exception:
+                continue
+            keep.add(rec_id)
+            state = self._state.get(rec_id)
+            if state is None:
+                self.initialize_state_for_recommendation(rec)
+            elif state.asset is None and _asset_of(rec):
+                state.asset = _asset_of(rec)
+                self._mark_dirty(rec_id)
+        for rec_id in [i for i in self._state if i not in keep]:
+            asset = self._state[rec_id].asset
+            if owned is None or (asset is not None and owned(asset)):
+                self.clear_state(rec_id)
+            else:
+                self.release_state(rec_id)
+
+    def has_state(self, rec_id: int) -> bool:
+        """True if the engine already tracks state (watermarks) for this rec."""
+        try:
+            return int(rec_id) in self._state
+        except (TypeError, ValueError):
+            return False
 
     def clear_state(self, rec_id: int) -> None:
         if rec_id in self._state:
             self._state.pop(rec_id, None)
+            self._dirty.discard(rec_id)
+            self._removed.add(rec_id)
             logger.debug("Cleared state for rec #%d", rec_id)
             self._emit_hook("on_state_changed", rec_id, None)
 
+    def release_state(self, rec_id: int) -> None:
+        """يُسقط الحالة من الذاكرة دون حذفها من الـ checkpoint (المالك عامل آخر)."""
+        if self._state.pop(rec_id, None) is not None:
+            self._dirty.discard(rec_id)
+            logger.debug("Released state for rec #%d", rec_id)
+
     def clear_all_states(self) -> None:
+        self._removed.update(self._state)
+        self._dirty.clear()
         self._state.clear()
         logger.debug("Cleared all engine states")
         self._emit_hook("on_state_changed", None, None)
@@ -241,6 +475,14 @@ class StrategyEngine:
         close = Decimal(str(tick.get("close", "0")))
         ts = int(tick.get("ts", int(time.time())))
 
+        recs = list(recs)
+        exp = self._price_exp_for_tick(tick)
+        if exp is not None:
+            fast_actions = self._evaluate_batch_fixed(recs, high, low, ts, exp)
+            if fast_actions is not None:
+                self._record_actions(fast_actions)
+                return fast_actions
+
         actions: List[Action] = []
         # Evaluate sequentially but collect actions first to avoid partial side-effects
         for rec in recs:
@@ -254,16 +496,171 @@ class StrategyEngine:
                 new_actions = self._evaluate_single_locked(rec, high, low, close, ts)
                 if new_actions:
                     actions.extend(new_actions)
-                    for act in new_actions:
-                        self._emit_hook("on_action_generated", act)
-                        if self.metrics:
-                            try:
-                                self.metrics.increment("strategy.actions_generated_total", 1)
-                                self.metrics.increment(f"strategy.actions_by_type.{act.__class__.__name__}", 1)
-                            except Exception:
-                                logger.debug("Metric increment failed for action metrics", exc_info=False)
+                    self._record_actions(new_actions)
+        return actions
+
+    def _record_actions(self, actions: List[Action]) -> None:
+        for act in actions:
+            self._emit_hook("on_action_generated", act)
+            if self.metrics:
+                try:
+                    self.metrics.increment("strategy.actions_generated_total", 1)
+                    self.metrics.increment(f"strategy.actions_by_type.{act.__class__.__name__}", 1)
+                except Exception:
+                    logger.debug("Metric increment failed for action metrics", exc_info=False)
+
+    # --- Fixed-point fast path ---
+    def _price_exp_for_tick(self, tick: Dict[str, Any]) -> Optional[int]:
+        """Decimal places of the tick's symbol, or None when the fast path must not be used."""
+        if self.tick_size_provider is None or self._hooks.get("on_state_changed"):
+            return None
+        symbol = tick.get("symbol")
+        if not symbol:
+            return None
+        key = (str(symbol).upper(), str(tick.get("market") or "Futures"))
+        exp = self._price_exps.get(key)
+        if exp is None:
+            try:
+                exp = _exp_for_tick_size(self.tick_size_provider(*key))
+            except Exception:
+                logger.debug("tick_size_provider failed for %s", key, exc_info=False)
+                exp = None
+            if exp is None:
+                return None
+            self._price_exps[key] = exp
+        return exp
+
+    def _evaluate_batch_fixed(
+        self, recs: List[Dict[str, Any]], high: Decimal, low: Decimal, ts: int, exp: int
+    ) -> Optional[List[Action]]:
+        """
+        Same decisions as _evaluate_single_locked, with prices as ints scaled by 10**exp.
+        Runs without awaiting, so per-rec locks are only checked, not acquired.
+        Returns None when the batch must go through the Decimal path instead.
+        """
+        high_i = _scale_exact(high, exp)
+        low_i = _scale_exact(low, exp)
+        if high_i is None or low_i is None:
+            return None
+
+        eligible: List[Tuple[Dict[str, Any], _EngineStateItem, bool]] = []
+        for rec in recs:
+            try:
+                rec_id = int(rec["id"])
+            except Exception:
+                continue
+            lock = self._locks.get(rec_id)
+            if lock is not None and lock.locked():
+                return None
+            if not rec or str(rec.get("status", "")).upper() != "ACTIVE" or not rec.get("profit_stop_active", False):
+                continue
+            if rec_id not in self._state:
+                self.initialize_state_for_recommendation(rec)
+            state = self._state[rec_id]
+            state.last_tick_ts = ts
+            eligible.append((rec, state, str(rec.get("side", "LONG")).upper() == "LONG"))
+
+        # Watermarks: one integer pass over the whole batch
+        dirty = self._dirty
+        for _, state, is_long in eligible:
+            if is_long:
+                current = state.highest_scaled(exp)
+                if current is None:
+                    if high > state.highest:
+                        state.highest = Decimal(high)
+                        dirty.add(state.rec_id)
+                elif high_i > current:
+                    state.highest = Decimal(high)
+                    state._highest_scaled = (state.highest, exp, high_i)
+                    dirty.add(state.rec_id)
+            else:
+                current = state.lowest_scaled(exp)
+                if current is None:
+                    if low < state.lowest:
+                        state.lowest = Decimal(low)
+                        dirty.add(state.rec_id)
+                elif low_i < current:
+                    state.lowest = Decimal(low)
+                    state._lowest_scaled = (state.lowest, exp, low_i)
+                    dirty.add(state.rec_id)
+
+        actions: List[Action] = []
+        for rec, state, is_long in eligible:
+            mode = str(rec.get("profit_stop_mode", "NONE")).upper()
+            act = None
+            if mode == "FIXED":
+                act = self._handle_fixed_profit_stop_scaled(rec, high, low, high_i, low_i, exp, state, is_long)
+            elif mode == "TRAILING":
+                act = self._memoized(rec, state, self._handle_trailing_stop)
+                if isinstance(act, MoveSLAction):
+                    if state.last_trailing_sl != act.new_sl:
+                        dirty.add(state.rec_id)
+                    state.last_trailing_sl = act.new_sl
+            elif mode == "BREAK_EVEN":
+                act = self._memoized(rec, state, self._handle_break_even)
+            elif mode == "TIME_BASED":
+                act = self._handle_time_based(rec, state, ts)
+            if act:
+                actions.append(act)
         return actions
 
+    @staticmethod
+    def _memoized(
+        rec: Dict[str, Any],
+        state: _EngineStateItem,
+        handler: Callable[[Dict[str, Any], _EngineStateItem], Optional[Action]],
+    ) -> Optional[Action]:
+        """
+        TRAILING/BREAK_EVEN are pure functions of (rec, watermarks, last_trailing_sl).
+        Trigger records are replaced (never mutated) on update, so identity is a safe key;
+        last_trailing_sl is compared by value since each MoveSL carries a fresh Decimal.
+        """
+        memo = state._memo
+        if (
+            memo is not None
+            and memo[0] is rec
+            and memo[1] is state.highest
+            and memo[2] is state.lowest
+            and memo[3] == state.last_trailing_sl
+        ):
+            return memo[4]
+        act = handler(rec, state)
+        state._memo = (rec, state.highest, state.lowest, state.last_trailing_sl, act)
+        return act
+
+    def _handle_fixed_profit_stop_scaled(
+        self,
+        rec: Dict[str, Any],
+        high: Decimal,
+        low: Decimal,
+        high_i: int,
+        low_i: int,
+        exp: int,
+        state: _EngineStateItem,
+        is_long: bool,
+    ) -> Optional[CloseAction]:
+        profit_price_raw = rec.get("profit_stop_price")
+        if profit_price_raw is None:
+            return None
+        profit_i = _scale_exact(profit_price_raw, exp)
+        if profit_i is None:
+            return self._handle_fixed_profit_stop(rec, high, low, state)
+
+        if not state.in_profit_zone:
+            if (is_long and high_i >= profit_i) or (not is_long and low_i <= profit_i):
+                state.in_profit_zone = True
+                self._mark_dirty(state.rec_id)
+                logger.info("Rec #%d entered profit zone at %s (FIXED)", state.rec_id, str(profit_price_raw))
+                return None
+
+        if state.in_profit_zone:
+            if (is_long and low_i <= profit_i) or (not is_long and high_i >= profit_i):
+                profit_price = Decimal(str(profit_price_raw))
+                logger.info("FIXED profit stop hit for rec #%d at %s", state.rec_id, str(profit_price))
+                return CloseAction(rec_id=state.rec_id, price=profit_price, reason="PROFIT_STOP_HIT", metadata={"engine": self.engine_version})
+
+        return None
+
     async def evaluate(self, rec: Dict[str, Any], tick: Dict[str, Any]) -> List[Action]:
         """
         Evaluate a single recommendation against tick.
@@ -277,14 +674,7 @@ class StrategyEngine:
         ts = int(tick.get("ts", int(time.time())))
         async with lock:
             actions = self._evaluate_single_locked(rec, high, low, close, ts)
-            for act in actions:
-                self._emit_hook("on_action_generated", act)
-                if self.metrics:
-                    try:
-                        self.metrics.increment("strategy.actions_generated_total", 1)
-                        self.metrics.increment(f"strategy.actions_by_type.{act.__class__.__name__}", 1)
-                    except Exception:
-                        logger.debug("Metric increment failed for action metrics", exc_info=False)
+            self._record_actions(actions)
             return actions
 
     # --- Core single-evaluation logic (expects lock to be held) ---
@@ -310,12 +700,14 @@ class StrategyEngine:
         if side == "LONG":
             if high > state.highest:
                 state.highest = Decimal(high)
+                self._mark_dirty(rec_id)
         else:  # SHORT
             if low < state.lowest:
                 state.lowest = Decimal(low)
+                self._mark_dirty(rec_id)
 
         # Emit state change hook
-        self._emit_hook("on_state_changed", rec_id, state.to_serializable())
+        self._emit_state_changed(rec_id, state)
 
         # Strategy dispatch
         if mode == "FIXED":
@@ -327,8 +719,10 @@ class StrategyEngine:
                 actions.append(act)
                 # update last_trailing_sl on successful potential move to avoid repeated identical moves
                 if isinstance(act, MoveSLAction):
+                    if state.last_trailing_sl != act.new_sl:
+                        self._mark_dirty(rec_id)
                     state.last_trailing_sl = act.new_sl
-                    self._emit_hook("on_state_changed", rec_id, state.to_serializable())
+                    self._emit_state_changed(rec_id, state)
         elif mode == "BREAK_EVEN":
             act = self._handle_break_even(rec, state)
             if act: actions.append(act)
@@ -351,8 +745,9 @@ class StrategyEngine:
         if not state.in_profit_zone:
             if (side == "LONG" and high >= profit_price) or (side == "SHORT" and low <= profit_price):
                 state.in_profit_zone = True
+                self._mark_dirty(rec_id)
                 logger.info("Rec #%d entered profit zone at %s (FIXED)", rec_id, str(profit_price))
-                self._emit_hook("on_state_changed", rec_id, state.to_serializable())
+                self._emit_state_changed(rec_id, state)
                 return None
 
         # If in zone, trigger close on retracement to or beyond profit_price
@@ -490,8 +885,12 @@ class StrategyEngine:
         logger.info("StrategyEngine shutdown called")
         # optionally flush to storage synchronously if storage supports it
         try:
-            if self.storage and hasattr(self.storage, "set"):
-                key = self.config.get("persistence_key", "strategy_engine_state_v4")
+            if self._supports_items():
+                items, removed = self._take_checkpoint_batch(full=True)
+                self.storage.save_items(self._items_key, items, removed)
+                logger.debug("Checkpointed %d states on shutdown to key=%s", len(items), self._items_key)
+            elif self.storage and hasattr(self.storage, "set"):
+                key = self.persistence_key
                 self.storage.set(key, json.dumps(self.serialize_state()))
                 logger.debug("Persisted state on shutdown to key=%s", key)
         except Exception:
@@ -32,6 +32,9 @@ from capitalguard.application.services.parsing_service import ParsingService
 from capitalguard.application.strategy.engine import StrategyEngine
 
 # Repository Layer
+from capitalguard.infrastructure.db.executor import DbExecutor
+from capitalguard.infrastructure.sched.alert_shards import SymbolShard
+from capitalguard.infrastructure.strategy_state_store import build_strategy_state_store
 from capitalguard.infrastructure.db.repository import (
     RecommendationRepository,
     UserRepository,
@@ -42,12 +45,16 @@ from capitalguard.infrastructure.db.performance_repository import PerformanceRep
 
 # Notifiers, Executors
 from capitalguard.infrastructure.notify.telegram import TelegramNotifier
+from capitalguard.infrastructure.notify.outbox import OutboxRelay
 from capitalguard.infrastructure.execution.binance_exec import BinanceExec, BinanceCreds
 
 log = logging.getLogger(__name__)
 
 
-def build_services(ptb_app: Optional[Application] = None) -> Dict[str, Any]:
+def build_services(
+    ptb_app: Optional[Application] = None,
+    alert_shard: Optional[SymbolShard] = None,
+) -> Dict[str, Any]:
     """
     R3 — Full Dependency Tree Construction
     Unified DI Container:
@@ -56,6 +63,11 @@ def build_services(ptb_app: Optional[Application] = None) -> Dict[str, Any]:
       - Strategy Engine v4
       - AlertService (Action Executor)
       - Facade Services
+
+    alert_shard: set by alert_worker — the AlertService evaluates only its symbols.
+    Without it and with ALERT_SHARD_COUNT > 0 the AlertService forwards
+    trigger changes to the workers instead of evaluating in-process.
+    With ALERT_LEADER_ELECTION it also starts forwarding, until elected.
     """
     log.info("Building services (R3 Architecture)...")
 
@@ -102,12 +114,25 @@ def build_services(ptb_app: Optional[Application] = None) -> Dict[str, Any]:
             notifier=notifier,
         )
 
+        # --- Notification outbox relay (started by the API / alert_worker loop) ---
+        if settings.NOTIFY_OUTBOX_ENABLED:
+            outbox_relay = OutboxRelay(
+                notifier,
+                batch_size=settings.NOTIFY_OUTBOX_BATCH_SIZE,
+                poll_interval=settings.NOTIFY_OUTBOX_POLL_SECONDS,
+                max_attempts=settings.NOTIFY_OUTBOX_MAX_ATTEMPTS,
+                chat_rate_per_minute=settings.TELEGRAM_GROUP_RATE_PER_MIN,
+            )
+            lifecycle_service.outbox_relay = outbox_relay
+            services["outbox_relay"] = outbox_relay
+
         # --- Strategy Engine v4 ---
         strategy_engine = StrategyEngine(
             lifecycle_service=lifecycle_service,
-            storage=None,
+            storage=build_strategy_state_store(),
             metrics=None,
-            config={"percentage_threshold": 10, "min_sl_move": "0"}
+            config={"percentage_threshold": 10, "min_sl_move": "0"},
+            tick_size_provider=services["market_data_service"].get_tick_size,
         )
 
         # --- AlertService (Action Executor) ---
@@ -116,6 +141,16 @@ def build_services(ptb_app: Optional[Application] = None) -> Dict[str, Any]:
             price_service=services["price_service"],
             repo=recommendation_repo,
             strategy_engine=strategy_engine,
+            db_executor=DbExecutor(
+                workers=settings.ALERT_DB_EXECUTOR_WORKERS,
+                max_pending=settings.ALERT_DB_EXECUTOR_MAX_PENDING,
+            ),
+            checkpoint_interval_seconds=settings.STRATEGY_CHECKPOINT_INTERVAL_SECONDS,
+            checkpoint_full_seconds=settings.STRATEGY_CHECKPOINT_FULL_SECONDS,
+            shard=alert_shard,
+            forward_updates=alert_shard is None and (
+                settings.ALERT_SHARD_COUNT > 0 or settings.ALERT_LEADER_ELECTION
+            ),
         )
 
         # --- Trade Facade (wraps creation + lifecycle) ---
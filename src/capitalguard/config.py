@@ -21,6 +21,15 @@ class Settings(BaseSettings):
     # Environment / DB
     ENV: str = Field(default="dev")
     DATABASE_URL: str = Field(default="sqlite:///./dev.db")
+
+    # DB connection pools (sync engine: PTB/services — async engine: webapp/async handlers)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0          # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 3600
+    DB_STATEMENT_TIMEOUT_MS: int = 30000   # Postgres statement_timeout; 0 = disabled
+    DB_ASYNC_POOL_SIZE: int = 10
+    DB_ASYNC_MAX_OVERFLOW: int = 10
     
     # ❌ REMOVED: REDIS_URL is now read directly in main.py to avoid startup race conditions.
 
@@ -46,6 +55,45 @@ class Settings(BaseSettings):
     # This setting is now loaded from the .env file
     AI_SERVICE_URL: str | None = None
 
+    # AlertService — DB executor stage (lifecycle writes off the alert loop)
+    ALERT_DB_EXECUTOR_WORKERS: int = 4
+    ALERT_DB_EXECUTOR_MAX_PENDING: int = 256
+
+    # Alert evaluation shards — 0: in the API process; N: N alert_worker processes,
+    # each owning crc32(symbol) % N == ALERT_SHARD_INDEX (set per process by supervisord)
+    ALERT_SHARD_COUNT: int = 0
+    ALERT_SHARD_INDEX: int = 0
+
+    # Leader election (Redis lease): one evaluator per shard across replicas.
+    # Crash failover ≈ lease + lease/3; graceful shutdown hands over within lease/3.
+    # Off by default: followers forward trigger changes over non-durable pub/sub —
+    # the leader resyncs from DB on (re)subscribe, but nothing replays missed messages.
+    ALERT_LEADER_ELECTION: bool = False
+    ALERT_LEADER_LEASE_SECONDS: float = 10.0
+
+    # StrategyEngine state checkpointing (Redis hash; disabled without REDIS_URL)
+    STRATEGY_CHECKPOINT_INTERVAL_SECONDS: float = 5.0
+    STRATEGY_CHECKPOINT_FULL_SECONDS: float = 300.0
+
+    # Telegram outbound dispatcher — shared rate limits for every Bot call
+    TELEGRAM_GLOBAL_RATE: float = 25.0
+    TELEGRAM_GROUP_RATE_PER_MIN: float = 20.0
+    TELEGRAM_PRIVATE_RATE: float = 1.0
+    TELEGRAM_DISPATCH_MAX_QUEUE: int = 1000
+    TELEGRAM_DISPATCH_CONCURRENCY: int = 8
+    # Card edits per (channel, message) are coalesced within this window
+    TELEGRAM_CARD_EDIT_DEBOUNCE_SECONDS: float = 1.0
+    # Channel replies / private trade notices go through the notification_outbox table
+    NOTIFY_OUTBOX_ENABLED: bool = True
+    NOTIFY_OUTBOX_BATCH_SIZE: int = 100
+    NOTIFY_OUTBOX_POLL_SECONDS: float = 2.0
+    NOTIFY_OUTBOX_MAX_ATTEMPTS: int = 8
+
+    # Binance WS pool — sharding and control-message pacing per connection
+    BINANCE_WS_MAX_STREAMS_PER_CONN: int = 200
+    BINANCE_WS_SUBSCRIBE_RATE: float = 4.0
+    BINANCE_WS_SUBSCRIBE_BATCH: int = 100
+
     # Observability
     SENTRY_DSN: str | None = None
     METRICS_ENABLED: bool = True
@@ -1,6 +1,25 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
 # File: src/capitalguard/infrastructure/core_engine.py
-# Version: v3.0.0-PER-LOOP-REDIS
+# Version: v4.1.1-BATCH-API
+#
+# ✅ THE FIX (v4.1.1): _pending مشترك بين threads (loop لكل thread) —
+#   delete() كان يمرّ على قيمه بينما thread آخر يُضيف (setdefault) أو يسحب (pop)
+#   دفعة loop → "dictionary changed size during iteration". كل تعديل/مرور على
+#   _pending الآن تحت _pending_lock (عمليات dict قصيرة، لا I/O تحت القفل).
+#
+# ✅ THE UPGRADE (v4.0) — L1 محدود + L2 write-behind:
+#   المشكلة: l1_cache/l1_ttl بلا حد، والمنتهي لا يُحذف إلا عند قراءته،
+#   وكل set() = setex + json.dumps فوراً. الـ Router يكتب مفتاحين لكل تيك
+#   → round-trip-ان لـ Redis لكل رمز كل ثانية لبيانات موجودة أصلاً في الذاكرة.
+#   الحل:
+#     - L1 = OrderedDict (LRU) بحد max_entries + TTL لكل عنصر + تنظيف دوري
+#     - set() يكتب L1 ويُسجِّل المفتاح في buffer الـ loop (آخر قيمة تفوز)
+#     - مهمة صيانة لكل loop: pipeline واحد (SETEX×N) كل flush_interval (250ms)
+#     - cg_cache_* على /metrics: hits{tier}، misses، evictions{reason}، l1_entries، flushes
+#
+# ✅ v4.1 — get_many/set_many:
+#   get_many: L1 محلياً + MGET واحد للباقي (بدل N×GET متتالية)
+#   set_many: L1 + buffer الـ write-behind (نفس pipeline الـ flush)
 #
 # ✅ THE FIX (BUG-REDIS-LOOP):
 #   "got Future <Future pending> attached to a different loop"
@@ -32,7 +51,18 @@ import time
 import logging
 import json
 import os
-from typing import Any, Callable, Dict, Optional, TypeVar
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from capitalguard.infrastructure.monitoring.metrics import (
+    CACHE_HITS,
+    CACHE_MISSES,
+    CACHE_EVICTIONS,
+    CACHE_L1_ENTRIES,
+    CACHE_L2_FLUSHES,
+    CACHE_L2_FLUSHED_KEYS,
+)
 
 try:
     import redis.asyncio as redis
@@ -49,21 +79,36 @@ class CacheStats:
     l1_hits: int = 0
     l2_hits: int = 0
     misses: int = 0
+    evictions: int = 0
+    l2_flushes: int = 0
 
 
 class AdvancedCacheSystem:
     """
-    Hybrid Cache: L1 (memory per-process) + L2 (Redis per-loop).
+    Hybrid Cache: L1 (memory per-process, LRU + TTL) + L2 (Redis per-loop, write-behind).
 
     ✅ FIX v3.0: كل event loop يحصل على Redis client منفصل.
     يحل مشكلة "attached to a different loop" الناتجة عن وجود
     AlertService bg thread وFastAPI loop في نفس الوقت.
+
+    ✅ v4.0: L1 محدود (max_entries) + انتهاء صلاحية في الخلفية،
+    و set() لا ينتظر Redis — الكتابات تُدمج وتُرسَل كل flush_interval.
     """
 
-    def __init__(self, redis_url: str = None):
-        # L1: memory cache — مشترك بين كل الـ loops (بيانات غير async)
-        self.l1_cache: Dict[str, Any] = {}
-        self.l1_ttl: Dict[str, float] = {}
+    def __init__(
+        self,
+        redis_url: str = None,
+        max_entries: int = 10_000,
+        flush_interval: float = 0.25,
+        sweep_interval: float = 5.0,
+    ):
+        # L1: OrderedDict key → (value, expires_at) — الأحدث استخداماً في النهاية
+        # مشترك بين كل الـ loops/threads → عمليات قصيرة تحت threading.Lock
+        self._l1: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._l1_lock = threading.Lock()
+        self.max_entries = max(1, int(max_entries))
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
 
         # ✅ FIX v3.0: dict من loop_id → redis_client
         self._redis_url = redis_url
@@ -71,6 +116,11 @@ class AdvancedCacheSystem:
         self._redis_url_resolved: Optional[str] = None
         self._url_resolved = False
 
+        # Write-behind: لكل loop كتاباته المعلَّقة (آخر قيمة تفوز) ومهمة صيانة واحدة
+        self._pending: Dict[int, Dict[str, Tuple[Any, int]]] = {}
+        self._pending_lock = threading.Lock()
+        self._maintenance_tasks: Dict[int, asyncio.Task] = {}
+
         self.stats = CacheStats()
 
     def _resolve_url(self) -> Optional[str]:
@@ -119,18 +169,119 @@ class AdvancedCacheSystem:
             log.warning("core_cache: Redis client creation failed: %s", e)
             return None
 
+    # ─────────────────────────────────────────────────────────────
+    # L1 (LRU + TTL)
+    # ─────────────────────────────────────────────────────────────
+
+    def _l1_get(self, key: str) -> Tuple[bool, Any]:
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if time.time() >= expires_at:
+                del self._l1[key]
+                self._count_eviction("expired")
+                return False, None
+            self._l1.move_to_end(key)
+            return True, value
+
+    def _l1_put(self, key: str, value: Any, ttl: float) -> None:
+        with self._l1_lock:
+            self._l1[key] = (value, time.time() + ttl)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.max_entries:
+                self._l1.popitem(last=False)
+                self._count_eviction("lru")
+        CACHE_L1_ENTRIES.set(len(self._l1))
+
+    def _count_eviction(self, reason: str) -> None:
+        self.stats.evictions += 1
+        CACHE_EVICTIONS.labels(reason).inc()
+
+    def sweep_expired(self) -> int:
+        """يحذف كل العناصر المنتهية من L1 (تُستدعى دورياً من مهمة الصيانة)."""
+        now = time.time()
+        with self._l1_lock:
+            expired = [k for k, (_, exp) in self._l1.items() if exp <= now]
+            for k in expired:
+                del self._l1[k]
+        for _ in expired:
+            self._count_eviction("expired")
+        CACHE_L1_ENTRIES.set(len(self._l1))
+        return len(expired)
+
+    # ─────────────────────────────────────────────────────────────
+    # L2 write-behind
+    # ─────────────────────────────────────────────────────────────
+
+    def _schedule_write(self, key: str, value: Any, ttl: int) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop_id = id(loop)
+        if REDIS_AVAILABLE and self._resolve_url():
+            with self._pending_lock:
+                self._pending.setdefault(loop_id, {})[key] = (value, ttl)
+        task = self._maintenance_tasks.get(loop_id)
+        if task is None or task.done():
+            self._maintenance_tasks[loop_id] = loop.create_task(self._maintenance_loop(loop_id))
+
+    async def _maintenance_loop(self, loop_id: int) -> None:
+        """كل flush_interval: إرسال الكتابات المعلَّقة دفعة واحدة + تنظيف L1 دورياً."""
+        last_sweep = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await self._flush_loop_pending(loop_id)
+                    if time.monotonic() - last_sweep >= self.sweep_interval:
+                        self.sweep_expired()
+                        last_sweep = time.monotonic()
+                except Exception as e:
+                    log.warning("core_cache maintenance error: %s", e)
+        except asyncio.CancelledError:
+            # الـ loop يُغلق → محاولة أخيرة لإرسال ما تبقى
+            await self._flush_loop_pending(loop_id)
+            raise
+
+    async def _flush_loop_pending(self, loop_id: int) -> int:
+        with self._pending_lock:
+            batch = self._pending.pop(loop_id, None)
+        if not batch:
+            return 0
+        r = self._get_redis()
+        if not r:
+            return 0
+        try:
+            pipe = r.pipeline(transaction=False)
+            for key, (value, ttl) in batch.items():
+                pipe.setex(key, ttl, json.dumps(value, default=str))
+            await pipe.execute()
+            self.stats.l2_flushes += 1
+            CACHE_L2_FLUSHES.inc()
+            CACHE_L2_FLUSHED_KEYS.inc(len(batch))
+            return len(batch)
+        except Exception as e:
+            log.warning("Redis pipeline flush error (%d keys): %s", len(batch), e)
+            return 0
+
+    async def flush(self) -> int:
+        """يُرسل كتابات الـ loop الحالي فوراً (shutdown / الاختبارات)."""
+        return await self._flush_loop_pending(id(asyncio.get_running_loop()))
+
     # ─────────────────────────────────────────────────────────────
     # Cache operations
     # ─────────────────────────────────────────────────────────────
 
     async def get(self, key: str) -> Any:
         # L1: memory
-        if key in self.l1_cache:
-            if time.time() < self.l1_ttl[key]:
-                self.stats.l1_hits += 1
-                return self.l1_cache[key]
-            else:
-                del self.l1_cache[key]
+        hit, value = self._l1_get(key)
+        if hit:
+            self.stats.l1_hits += 1
+            CACHE_HITS.labels("l1").inc()
+            return value
 
         # L2: Redis (loop-safe)
         r = self._get_redis()
@@ -139,32 +290,73 @@ class AdvancedCacheSystem:
                 data = await r.get(key)
                 if data:
                     self.stats.l2_hits += 1
+                    CACHE_HITS.labels("l2").inc()
                     decoded = json.loads(data)
                     # populate L1
-                    self.l1_cache[key] = decoded
-                    self.l1_ttl[key] = time.time() + 10
+                    self._l1_put(key, decoded, 10)
                     return decoded
             except Exception as e:
                 log.warning("Redis get error: %s", e)
 
         self.stats.misses += 1
+        CACHE_MISSES.inc()
         return None
 
     async def set(self, key: str, value: Any, ttl: int = 60) -> None:
-        # L1
-        self.l1_cache[key] = value
-        self.l1_ttl[key] = time.time() + ttl
-        # L2
-        r = self._get_redis()
+        # L1 فوراً — L2 يُكتب في الدفعة التالية (write-behind)
+        self._l1_put(key, value, ttl)
+        self._schedule_write(key, value, ttl)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        قراءة دفعة: L1 محلياً، والباقي بـ MGET واحد.
+        يُعيد {key: value} للمفاتيح الموجودة فقط.
+        """
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            hit, value = self._l1_get(key)
+            if hit:
+                found[key] = value
+            else:
+                missing.append(key)
+        if found:
+            self.stats.l1_hits += len(found)
+            CACHE_HITS.labels("l1").inc(len(found))
+
+        r = self._get_redis() if missing else None
         if r:
             try:
-                await r.setex(key, ttl, json.dumps(value, default=str))
+                for key, data in zip(missing, await r.mget(missing)):
+                    if data:
+                        decoded = json.loads(data)
+                        self._l1_put(key, decoded, 10)
+                        found[key] = decoded
             except Exception as e:
-                log.warning("Redis set error: %s", e)
+                log.warning("Redis mget error (%d keys): %s", len(missing), e)
+
+        l2_hits = sum(1 for k in missing if k in found)
+        if l2_hits:
+            self.stats.l2_hits += l2_hits
+            CACHE_HITS.labels("l2").inc(l2_hits)
+        misses = len(missing) - l2_hits
+        if misses:
+            self.stats.misses += misses
+            CACHE_MISSES.inc(misses)
+        return found
+
+    async def set_many(self, mapping: Dict[str, Any], ttl: int = 60) -> None:
+        """كتابة دفعة — تُرسَل كلها في pipeline الـ flush التالي."""
+        for key, value in mapping.items():
+            self._l1_put(key, value, ttl)
+            self._schedule_write(key, value, ttl)
 
     async def delete(self, key: str) -> None:
-        self.l1_cache.pop(key, None)
-        self.l1_ttl.pop(key, None)
+        with self._l1_lock:
+            self._l1.pop(key, None)
+        with self._pending_lock:
+            for pending in self._pending.values():
+                pending.pop(key, None)
         r = self._get_redis()
         if r:
             try:
@@ -0,0 +1,235 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/db/executor.py
+# Version: v1.0.1-DB-STAGE
+#
+# ✅ THE FIX (v1.0.1): stop() كان يوقف loops الـ workers فقط — _worker_main يُدمَّر
+#   معلَّقاً عند loop.close() والمُرسِلون ينتظرون futures لن تُحسم أبداً
+#   (يحدث عند كل تغيّر قيادة: stop_evaluating → AlertService.stop).
+#   الآن: coroutine إيقاف على كل loop تُلغي مهمة الـ worker، والـ job الجارية
+#   وكل المنتظرة في الطابور تُحسم بـ RuntimeError("DbExecutor stopped").
+#
+# ✅ THE UPGRADE — DB Executor Stage:
+#
+# المشكلة:
+#   معالجات LifecycleService (process_tp_hit_event, close_recommendation_async, ...)
+#   تُنفِّذ session_scope() + SQLAlchemy المتزامن مباشرةً على loop الـ alertservice-bg.
+#   commit بطيء في Postgres = كل symbol workers + قارئ Binance WS متوقفون.
+#
+# الحل — DbExecutor:
+#   عدد محدود من الـ threads، لكل thread event loop خاص به.
+#   submit(fn, ...) يُرسل coroutine الـ lifecycle كـ job وينتظر نتيجتها
+#   بدون حجب loop المُرسِل (asyncio.wrap_future).
+#   كل thread يُنفِّذ job واحدة في كل مرة → scoped_session (thread-local)
+#   لا تُشارَك بين jobs متزامنة.
+#
+#   origin loop: الـ loop الذي أرسل الـ job متاح عبر run_on_origin_loop()
+#   حتى تبقى استدعاءات Telegram/الفهرس على loop المُرسِل كما كانت.
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, List, Optional
+
+from capitalguard.infrastructure.monitoring.metrics import ALERT_STAGE_LATENCY
+
+log = logging.getLogger(__name__)
+
+_ORIGIN_LOOP: contextvars.ContextVar[Optional[asyncio.AbstractEventLoop]] = contextvars.ContextVar(
+    "db_executor_origin_loop", default=None
+)
+
+
+def origin_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """الـ loop الذي أرسل الـ job الحالية (None خارج DbExecutor)."""
+    return _ORIGIN_LOOP.get()
+
+
+async def run_on_origin_loop(coro: Awaitable[Any]) -> Any:
+    """
+    يُنفِّذ coroutine على loop المُرسِل إن كنا داخل job، وإلا مباشرةً.
+    يُستخدم للإشعارات — عميل Telegram يبقى على loop واحد.
+    """
+    origin = _ORIGIN_LOOP.get()
+    try:
+        current = asyncio.get_running_loop()
+    except RuntimeError:
+        current = None
+    if origin is None or origin is current or origin.is_closed():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, origin))
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "origin", "submitted_at")
+
+    def __init__(self, fn, args, kwargs, future, origin):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.origin = origin
+        self.submitted_at = time.monotonic()
+
+
+class _Worker:
+    def __init__(self, name: str):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.thread: Optional[threading.Thread] = None
+        self.ready = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.pending = 0  # jobs مُرسَلة لم تكتمل بعد (least-loaded dispatch)
+
+
+class DbExecutor:
+    """
+    Bounded thread pool لـ coroutines تعتمد على DB متزامن.
+      workers      : عدد الـ threads (= أقصى عدد transactions متزامنة)
+      max_pending  : أقصى عدد jobs معلَّقة لكل loop مُرسِل (backpressure)
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 256, name: str = "db-exec"):
+        self.workers_count = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.name = name
+        self._workers: List[_Worker] = []
+        self._started = False
+        self._start_lock = threading.Lock()
+        # Semaphore لكل loop مُرسِل (asyncio.Semaphore مرتبط بـ loop واحد)
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._started:
+                return
+            for i in range(self.workers_count):
+                worker = _Worker(f"{self.name}-{i}")
+                worker.thread = threading.Thread(
+                    target=self._thread_main, args=(worker,), name=worker.name, daemon=True
+                )
+                worker.thread.start()
+                worker.ready.wait(timeout=5.0)
+                self._workers.append(worker)
+            self._started = True
+        log.info("DbExecutor started — %d workers, max_pending=%d.", self.workers_count, self.max_pending)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._start_lock:
+            workers, self._workers = self._workers, []
+            self._started = False
+        for worker in workers:
+            if worker.loop and worker.loop.is_running():
+                try:
+                    asyncio.run_coroutine_threadsafe(self._shutdown_worker(worker), worker.loop)
+                except RuntimeError:
+                    pass  # الـ loop أُغلق للتو
+        for worker in workers:
+            if worker.thread:
+                worker.thread.join(timeout=timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._started
+
+    def _thread_main(self, worker: _Worker) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        worker.loop = loop
+        worker.queue = asyncio.Queue()
+        worker.task = loop.create_task(self._worker_main(worker))
+        worker.ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            # jobs وصلت بعد التفريغ (call_soon_threadsafe قبل stop) لا تبقى معلَّقة
+            self._fail_queued(worker)
+            try:
+                loop.close()
+            except Exception:
+                pass
+
+    async def _shutdown_worker(self, worker: _Worker) -> None:
+        if worker.task is not None:
+            worker.task.cancel()
+            try:
+                await worker.task
+            except asyncio.CancelledError:
+                pass
+        self._fail_queued(worker)
+        asyncio.get_running_loop().stop()
+
+    @staticmethod
+    def _fail_queued(worker: _Worker) -> None:
+        while worker.queue is not None and not worker.queue.empty():
+            job: _Job = worker.queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("DbExecutor stopped"))
+
+    async def _worker_main(self, worker: _Worker) -> None:
+        while True:
+            job: _Job = await worker.queue.get()
+            started = time.monotonic()
+            ALERT_STAGE_LATENCY.labels("db_queue").observe(started - job.submitted_at)
+            token = _ORIGIN_LOOP.set(job.origin)
+            try:
+                result = await job.fn(*job.args, **job.kwargs)
+            except asyncio.CancelledError as e:
+                if asyncio.current_task().cancelling() > 0:
+                    # stop(): الـ job الجارية تُحسم قبل خروج الـ worker
+                    if not job.future.done():
+                        job.future.set_exception(RuntimeError("DbExecutor stopped"))
+                    raise
+                if not job.future.cancelled():
+                    job.future.set_exception(e)
+            except BaseException as e:  # noqa: BLE001 — يُعاد رفعه عند المُرسِل
+                if not job.future.cancelled():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.cancelled():
+                    job.future.set_result(result)
+            finally:
+                _ORIGIN_LOOP.reset(token)
+                ALERT_STAGE_LATENCY.labels("db_job").observe(time.monotonic() - started)
+
+    # ── Submission ────────────────────────────────────────────────────────
+
+    def _slots_for(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        sem = self._slots.get(loop)
+        if sem is None:
+            sem = asyncio.Semaphore(self.max_pending)
+            self._slots[loop] = sem
+        return sem
+
+    async def submit(self, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """
+        يُنفِّذ fn(*args, **kwargs) على أحد الـ workers وينتظر النتيجة.
+        إذا لم يبدأ الـ executor → تنفيذ مباشر (نفس السلوك القديم).
+        """
+        if not self._started or not self._workers:
+            return await fn(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        async with self._slots_for(loop):
+            # أقل worker انشغالاً — commit بطيء لا يحجز الـ jobs التالية خلفه
+            worker = min(self._workers, key=lambda w: w.pending)
+            worker.pending += 1
+            try:
+                future: Future = Future()
+                job = _Job(fn, args, kwargs, future, loop)
+                worker.loop.call_soon_threadsafe(worker.queue.put_nowait, job)
+                return await asyncio.wrap_future(future)
+            finally:
+                worker.pending -= 1
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
@@ -3,6 +3,7 @@
 This file makes the 'models' directory a package and ensures all SQLAlchemy ORM
 models are discoverable by Alembic and the application.
 ✅ THE FIX (R1-S1 HOTFIX 10): Added UserTradeEvent to the imports and __all__ list.
+✅ Added NotificationOutbox (transactional notification outbox).
 """
 
 from .base import Base 
@@ -25,6 +26,7 @@ from .parsing import ParsingTemplate, ParsingAttempt
 from .watched_channel import WatchedChannel
 # ✅ R1-S1 HOTFIX 10: Import the new event model
 from .user_trade_event import UserTradeEvent
+from .notification_outbox import NotificationOutbox
 
 __all__ = [
     "Base",
@@ -47,5 +49,6 @@ __all__ = [
     "WatchedChannel",
     # ✅ R1-S1 HOTFIX 10: Export the new event model
     "UserTradeEvent",
+    "NotificationOutbox",
 ]
 # --- END of models init ---
\ No newline at end of file
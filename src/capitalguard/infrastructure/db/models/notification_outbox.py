@@ -0,0 +1,57 @@
+# --- START OF NEW FILE: src/capitalguard/infrastructure/db/models/notification_outbox.py ---
+"""
+SQLAlchemy ORM model for the transactional notification outbox.
+Rows are written in the same session as the state change they announce and
+delivered afterwards by OutboxRelay (infrastructure/notify/outbox.py).
+Reviewed-by: Guardian Protocol v1 — 2026-10-16
+"""
+
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, BigInteger,
+    ForeignKey, Index, func
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from .base import Base
+
+
+class NotificationOutbox(Base):
+    """
+    One pending Telegram notification (channel reply or private message).
+    idempotency_key is unique: re-running the same state change never enqueues twice.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String(128), nullable=False, unique=True)
+
+    # 'REPLY' (reply under a published card) or 'PRIVATE' (direct message)
+    kind = Column(String(16), nullable=False)
+    recommendation_id = Column(Integer, ForeignKey("recommendations.id", ondelete="CASCADE"), nullable=True, index=True)
+    chat_id = Column(BigInteger, nullable=False)
+    reply_to_message_id = Column(BigInteger, nullable=True)
+    payload = Column(JSONB, nullable=False)
+
+    # PENDING → SENT | FAILED
+    status = Column(String(16), nullable=False, server_default="PENDING")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    # Not before this time: retry backoff, or the relay's claim lease while delivering
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # الـ relay يقرأ PENDING فقط بترتيب available_at — فهرس جزئي صغير
+        Index(
+            "ix_notification_outbox_pending", "available_at",
+            postgresql_where=(status == "PENDING"),
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"<NotificationOutbox(id={self.id}, kind='{self.kind}', "
+            f"chat={self.chat_id}, status='{self.status}')>"
+        )
+# --- END OF NEW FILE ---
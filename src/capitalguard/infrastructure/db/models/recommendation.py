@@ -1,13 +1,15 @@
-# src/capitalguard/infrastructure/db/models/recommendation.py (v25.4 - R1-S1 Event Link)
+# src/capitalguard/infrastructure/db/models/recommendation.py (v25.5 - Active Partial Indexes)
 """
 SQLAlchemy ORM models.
+✅ v25.5: Partial indexes on active statuses (ix_*_active_triggers) backing the
+       lean trigger projection used by AlertService.build_triggers_index.
 ✅ THE FIX (R1-S1 Hotfix 10): Linked UserTrade model to the new UserTradeEvent
        model via the 'events' relationship to solve notification spam (Bug B).
 """
 import sqlalchemy as sa
 from sqlalchemy import (
     Column, Integer, String, DateTime, Boolean,
-    ForeignKey, Enum, Text, BigInteger, Numeric, func
+    ForeignKey, Enum, Text, BigInteger, Numeric, Index, func
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
@@ -77,6 +79,13 @@ class Recommendation(Base):
     user_trades = relationship("UserTrade", back_populates="source_recommendation")
     published_messages = relationship("PublishedMessage", back_populates="recommendation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index(
+            "ix_recommendations_active_triggers", "id",
+            postgresql_where=sa.text("status IN ('PENDING', 'ACTIVE') AND is_shadow = false"),
+        ),
+    )
+
 class UserTrade(Base):
     __tablename__ = 'user_trades'
     id = Column(Integer, primary_key=True)
@@ -110,6 +119,13 @@ class UserTrade(Base):
     # ✅ R1-S1 HOTFIX 10: Add relationship to the new event table
     events = relationship("UserTradeEvent", back_populates="user_trade", cascade="all, delete-orphan", lazy="selectin")
 
+    __table_args__ = (
+        Index(
+            "ix_user_trades_active_triggers", "id",
+            postgresql_where=sa.text("status IN ('WATCHLIST', 'PENDING_ACTIVATION', 'ACTIVATED')"),
+        ),
+    )
+
 
 class RecommendationEvent(Base):
     __tablename__ = 'recommendation_events'
@@ -0,0 +1,70 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/db/pool.py
+# Version: v1.0.0-POOL-METRICS
+#
+# ✅ THE UPGRADE — Pool مُراقَب للـ engines (sync + async):
+#
+# المشكلة:
+#   نفس العملية تشغِّل FastAPI + PTB + AlertService + النسخ الاحتياطي + webhook.
+#   عند الضغط (دفعة TradingView + /portfolio) يحدث pool exhaustion timeout
+#   بدون أي رؤية: كم اتصالاً مستخدماً؟ كم overflow؟ كم ننتظر؟
+#
+# الحل:
+#   InstrumentedQueuePool / InstrumentedAsyncQueuePool يقيسان زمن connect()
+#   (انتظار الـ pool + إنشاء اتصال جديد + pre-ping) → cg_db_pool_checkout_seconds
+#   وآخر زمن انتظار → cg_db_pool_last_checkout_wait_seconds
+#   و TimeoutError → cg_db_pool_checkout_timeouts_total
+#   Gauges الحجم/checked_out/overflow تُقرأ من الـ pool لحظة الـ scrape (set_function).
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from capitalguard.infrastructure.monitoring.metrics import (
+    DB_POOL_SIZE,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_LAST_WAIT,
+    DB_POOL_CHECKOUT_LATENCY,
+    DB_POOL_CHECKOUT_TIMEOUTS,
+)
+
+
+class _CheckoutTimingMixin:
+    """يقيس connect() ويُسجِّله تحت label = metrics_label."""
+
+    metrics_label = "sync"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_label).inc()
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            DB_POOL_CHECKOUT_LATENCY.labels(self.metrics_label).observe(waited)
+            DB_POOL_LAST_WAIT.labels(self.metrics_label).set(waited)
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def register_pool_gauges(pool: Pool, label: str) -> None:
+    """يربط gauges الحالة بالـ pool الحالي (آخر تسجيل يفوز — بعد dispose/إعادة إنشاء)."""
+    if not isinstance(pool, QueuePool):
+        return
+    DB_POOL_SIZE.labels(label).set_function(pool.size)
+    DB_POOL_CHECKED_OUT.labels(label).set_function(pool.checkedout)
+    DB_POOL_OVERFLOW.labels(label).set_function(lambda: max(0, pool.overflow()))
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
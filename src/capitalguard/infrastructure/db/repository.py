@@ -1,9 +1,19 @@
 #--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/db/repository.py ---
 # File: src/capitalguard/infrastructure/db/repository.py
-# Version: v3.0.0-R3 (Status Normalization Layer)
+# Version: v3.2.1-R3 (Lean Trigger Projection)
 # ✅ THE FIX: Added centralized 'normalize_status' methods.
 #    - All DB reads now pass through normalization before becoming Entities.
 #    - Prevents crashes even if DB contains legacy values like 'STOPPED'.
+# ✅ THE UPGRADE (v3.1): نسخ async للقراءات الساخنة (AsyncSession):
+#    - get_async / get_for_update_async / list_all_active_triggers_data_async /
+#      get_published_messages_async / UserRepository.find_by_telegram_id_async
+#    - نفس الاستعلامات ونفس التحويل إلى dict — المنطق مشترك بين النسختين.
+# ✅ THE UPGRADE (v3.2): iter_active_triggers_data — projection بالأعمدة المطلوبة فقط
+#    + أنواع الأحداث مُجمَّعة في SQL (array_agg) بدل تحميل كائنات ORM وكل الأحداث.
+#    النتائج تُبَث (yield_per) مباشرة إلى باني الفهرس في AlertService.
+# ✅ THE FIX (v3.2.1): التجميع يقتصر على الأحداث التي يقرؤها الفهرس
+#    (ACTIVATED, INVALIDATED, SL_HIT, FINAL_CLOSE, TPn_HIT) — SL_UPDATED وأمثاله
+#    كانت تُجمَّع لكل توصية ثم تُهمَل في events_to_mask. نفس الفلتر في مسار ORM.
 # 🎯 IMPACT: System resilience against Data Drift.
 
 import logging
@@ -11,6 +21,9 @@ from typing import List, Optional, Any, Dict
 from decimal import Decimal, InvalidOperation
 from datetime import datetime 
 
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.orm import Session, joinedload, selectinload
 import sqlalchemy as sa
 from sqlalchemy import and_, or_, func, select, case
@@ -28,7 +41,7 @@ from capitalguard.domain.value_objects import Symbol, Price, Targets, Side
 # Import ORM models
 from .models import (
     User, Channel, Recommendation, RecommendationEvent,
-    PublishedMessage, UserTrade, 
+    PublishedMessage, UserTrade, UserTradeEvent,
     RecommendationStatusEnum,
     UserTradeStatusEnum,
     OrderTypeEnum,
@@ -38,6 +51,42 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
+
+class event_types_agg(FunctionElement):
+    """تجميع event_type لكل صف: array_agg في Postgres، group_concat في SQLite (dev/tests)."""
+    inherit_cache = True
+    name = "event_types_agg"
+
+
+@compiles(event_types_agg, "postgresql")
+def _event_types_agg_pg(element, compiler, **kw):
+    return "array_agg(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(event_types_agg)
+def _event_types_agg_default(element, compiler, **kw):
+    return "group_concat(%s, ',')" % compiler.process(element.clauses, **kw)
+
+
+_TRIGGER_EVENT_TYPES = ("ACTIVATED", "INVALIDATED", "SL_HIT", "FINAL_CLOSE")
+
+
+def _trigger_events_filter(column):
+    """الأحداث التي تدخل processed_events فقط: الأنواع المسمّاة أو TP{n}_HIT."""
+    return or_(column.in_(_TRIGGER_EVENT_TYPES), column.like("TP%\\_HIT", escape="\\"))
+
+
+def _is_trigger_event(event_type: str) -> bool:
+    return event_type in _TRIGGER_EVENT_TYPES or (event_type.startswith("TP") and event_type.endswith("_HIT"))
+
+
+def _event_type_set(raw: Any) -> set:
+    if not raw:
+        return set()
+    if isinstance(raw, str):
+        return set(raw.split(","))
+    return set(raw)
+
 # ==========================================================
 # USER REPOSITORY
 # ==========================================================
@@ -50,6 +99,11 @@ class UserRepository:
         """Finds a user by their Telegram ID."""
         return self.session.query(User).filter(User.telegram_user_id == telegram_id).first()
 
+    async def find_by_telegram_id_async(self, telegram_id: int) -> Optional[User]:
+        """Async twin of find_by_telegram_id (self.session is an AsyncSession)."""
+        result = await self.session.execute(select(User).where(User.telegram_user_id == telegram_id).limit(1))
+        return result.scalars().first()
+
     def find_by_id(self, user_id: int) -> Optional[User]:
         """Finds a user by their internal database ID."""
         return self.session.query(User).filter(User.id == user_id).first()
@@ -345,73 +399,186 @@ class RecommendationRepository:
     def get(self, session: Session, rec_id: int) -> Optional[Recommendation]:
         return session.query(Recommendation).options(joinedload(Recommendation.analyst), selectinload(Recommendation.events)).filter(Recommendation.id == rec_id).first()
 
+    async def get_async(self, session: AsyncSession, rec_id: int) -> Optional[Recommendation]:
+        stmt = select(Recommendation).options(joinedload(Recommendation.analyst), selectinload(Recommendation.events)).where(Recommendation.id == rec_id)
+        return (await session.execute(stmt)).unique().scalars().first()
+
     def get_for_update(self, session: Session, rec_id: int) -> Optional[Recommendation]:
         return session.query(Recommendation).filter(Recommendation.id == rec_id).with_for_update().first()
 
+    async def get_for_update_async(self, session: AsyncSession, rec_id: int) -> Optional[Recommendation]:
+        stmt = select(Recommendation).where(Recommendation.id == rec_id).with_for_update()
+        return (await session.execute(stmt)).scalars().first()
+
+    # --- Active trigger data (shared by sync/async) ---
+    @staticmethod
+    def _active_recs_stmt():
+        return select(Recommendation).options(selectinload(Recommendation.events), joinedload(Recommendation.analyst)).where(
+            Recommendation.status.in_([RecommendationStatusEnum.PENDING, RecommendationStatusEnum.ACTIVE]),
+            Recommendation.is_shadow.is_(False)
+        )
+
+    @staticmethod
+    def _active_trades_stmt():
+        return select(UserTrade).options(joinedload(UserTrade.user), selectinload(UserTrade.events)).where(
+            UserTrade.status.in_([UserTradeStatusEnum.WATCHLIST, UserTradeStatusEnum.PENDING_ACTIVATION, UserTradeStatusEnum.ACTIVATED])
+        )
+
+    def _rec_trigger_data(self, rec: Recommendation) -> Optional[Dict[str, Any]]:
+        telegram_user_id = rec.analyst.telegram_user_id if rec.analyst else None
+        return self._rec_trigger_dict(rec, telegram_user_id, {e.event_type for e in rec.events if _is_trigger_event(e.event_type)})
+
+    def _trade_trigger_data(self, trade: UserTrade) -> Optional[Dict[str, Any]]:
+        telegram_user_id = trade.user.telegram_user_id if trade.user else None
+        return self._trade_trigger_dict(trade, telegram_user_id, {e.event_type for e in trade.events if _is_trigger_event(e.event_type)})
+
+    def _rec_trigger_dict(self, rec: Any, telegram_user_id: Any, event_types: set) -> Optional[Dict[str, Any]]:
+        """rec = كائن ORM أو صف projection بنفس أسماء الأعمدة."""
+        try:
+            entry_dec = self._to_decimal(rec.entry)
+            sl_dec = self._to_decimal(rec.stop_loss)
+            targets_list = [{"price": self._to_decimal(t.get("price")), "close_percent": t.get("close_percent", 0.0)} for t in (rec.targets or []) if t.get("price") is not None]
+            if not targets_list: return None
+            user_id_str = str(telegram_user_id) if telegram_user_id is not None else None
+            if not user_id_str: return None
+
+            return {
+                "id": rec.id, "item_type": "recommendation", "user_id": user_id_str, "user_db_id": rec.analyst_id,
+                "asset": rec.asset, "side": rec.side, "entry": entry_dec, "stop_loss": sl_dec, "targets": targets_list,
+                "status": rec.status, "order_type": rec.order_type, "market": rec.market,
+                "processed_events": event_types,
+                "profit_stop_mode": getattr(rec, 'profit_stop_mode', 'NONE'),
+                "profit_stop_price": self._to_decimal(getattr(rec, 'profit_stop_price', None)),
+                "profit_stop_trailing_value": self._to_decimal(getattr(rec, 'profit_stop_trailing_value', None)),
+                "profit_stop_active": getattr(rec, 'profit_stop_active', False),
+                "original_published_at": None,
+            }
+        except Exception as e:
+            logger.error(f"Trigger data error Rec {rec.id}: {e}")
+            return None
+
+    def _trade_trigger_dict(self, trade: Any, telegram_user_id: Any, event_types: set) -> Optional[Dict[str, Any]]:
+        try:
+            entry_dec = self._to_decimal(trade.entry)
+            sl_dec = self._to_decimal(trade.stop_loss)
+            targets_list = [{"price": self._to_decimal(t.get("price")), "close_percent": t.get("close_percent", 0.0)} for t in (trade.targets or []) if t.get("price") is not None]
+            if not targets_list: return None
+            user_id_str = str(telegram_user_id) if telegram_user_id is not None else None
+            if not user_id_str: return None
+
+            return {
+                "id": trade.id, "item_type": "user_trade", "user_id": user_id_str, "user_db_id": trade.user_id,
+                "asset": trade.asset, "side": trade.side, "entry": entry_dec, "stop_loss": sl_dec, "targets": targets_list,
+                "status": trade.status, "order_type": OrderTypeEnum.LIMIT, "market": "Futures",
+                "processed_events": event_types,
+                "profit_stop_mode": "NONE", "profit_stop_price": None, "profit_stop_trailing_value": None, "profit_stop_active": False,
+                "original_published_at": trade.original_published_at,
+            }
+        except Exception as e:
+            logger.error(f"Trigger data error Trade {trade.id}: {e}")
+            return None
+
     def list_all_active_triggers_data(self, session: Session) -> List[Dict[str, Any]]:
         # This method returns raw dicts for the engine.
         # It queries based on Enum values. Since we sanitized DB, this is safe.
         trigger_data = []
-        
+
         # 1. Recommendations
-        active_recs = session.query(Recommendation).options(selectinload(Recommendation.events), joinedload(Recommendation.analyst)).filter(
-            Recommendation.status.in_([RecommendationStatusEnum.PENDING, RecommendationStatusEnum.ACTIVE]),
-            Recommendation.is_shadow.is_(False)
-        ).all()
-        
-        for rec in active_recs:
-            try:
-                entry_dec = self._to_decimal(rec.entry)
-                sl_dec = self._to_decimal(rec.stop_loss)
-                targets_list = [{"price": self._to_decimal(t.get("price")), "close_percent": t.get("close_percent", 0.0)} for t in (rec.targets or []) if t.get("price") is not None]
-                if not targets_list: continue
-                user_id_str = str(rec.analyst.telegram_user_id) if rec.analyst else None
-                if not user_id_str: continue
-
-                data = {
-                    "id": rec.id, "item_type": "recommendation", "user_id": user_id_str, "user_db_id": rec.analyst_id,
-                    "asset": rec.asset, "side": rec.side, "entry": entry_dec, "stop_loss": sl_dec, "targets": targets_list,
-                    "status": rec.status, "order_type": rec.order_type, "market": rec.market,
-                    "processed_events": {e.event_type for e in rec.events},
-                    "profit_stop_mode": getattr(rec, 'profit_stop_mode', 'NONE'),
-                    "profit_stop_price": self._to_decimal(getattr(rec, 'profit_stop_price', None)),
-                    "profit_stop_trailing_value": self._to_decimal(getattr(rec, 'profit_stop_trailing_value', None)),
-                    "profit_stop_active": getattr(rec, 'profit_stop_active', False),
-                    "original_published_at": None,
-                }
-                trigger_data.append(data)
-            except Exception as e: logger.error(f"Trigger data error Rec {rec.id}: {e}")
+        for rec in session.execute(self._active_recs_stmt()).unique().scalars().all():
+            data = self._rec_trigger_data(rec)
+            if data: trigger_data.append(data)
 
         # 2. UserTrades
-        active_trades = session.query(UserTrade).options(joinedload(UserTrade.user), selectinload(UserTrade.events)).filter(
-            UserTrade.status.in_([UserTradeStatusEnum.WATCHLIST, UserTradeStatusEnum.PENDING_ACTIVATION, UserTradeStatusEnum.ACTIVATED])
-        ).all()
-
-        for trade in active_trades:
-            try:
-                entry_dec = self._to_decimal(trade.entry)
-                sl_dec = self._to_decimal(trade.stop_loss)
-                targets_list = [{"price": self._to_decimal(t.get("price")), "close_percent": t.get("close_percent", 0.0)} for t in (trade.targets or []) if t.get("price") is not None]
-                if not targets_list: continue
-                user_id_str = str(trade.user.telegram_user_id) if trade.user else None
-                if not user_id_str: continue
-
-                data = {
-                    "id": trade.id, "item_type": "user_trade", "user_id": user_id_str, "user_db_id": trade.user_id,
-                    "asset": trade.asset, "side": trade.side, "entry": entry_dec, "stop_loss": sl_dec, "targets": targets_list,
-                    "status": trade.status, "order_type": OrderTypeEnum.LIMIT, "market": "Futures",
-                    "processed_events": {e.event_type for e in trade.events},
-                    "profit_stop_mode": "NONE", "profit_stop_price": None, "profit_stop_trailing_value": None, "profit_stop_active": False,
-                    "original_published_at": trade.original_published_at,
-                }
-                trigger_data.append(data)
-            except Exception as e: logger.error(f"Trigger data error Trade {trade.id}: {e}")
+        for trade in session.execute(self._active_trades_stmt()).unique().scalars().all():
+            data = self._trade_trigger_data(trade)
+            if data: trigger_data.append(data)
+
+        return trigger_data
+
+    # --- Lean projection (index builder) ---
+    @staticmethod
+    def _active_recs_projection():
+        events = (
+            select(event_types_agg(RecommendationEvent.event_type))
+            .where(
+                RecommendationEvent.recommendation_id == Recommendation.id,
+                _trigger_events_filter(RecommendationEvent.event_type),
+            )
+            .scalar_subquery()
+        )
+        return (
+            select(
+                Recommendation.id, Recommendation.analyst_id, Recommendation.asset, Recommendation.side,
+                Recommendation.entry, Recommendation.stop_loss, Recommendation.targets,
+                Recommendation.status, Recommendation.order_type, Recommendation.market,
+                Recommendation.profit_stop_mode, Recommendation.profit_stop_price,
+                Recommendation.profit_stop_trailing_value, Recommendation.profit_stop_active,
+                User.telegram_user_id, events.label("event_types"),
+            )
+            .join(User, User.id == Recommendation.analyst_id)
+            .where(
+                Recommendation.status.in_([RecommendationStatusEnum.PENDING, RecommendationStatusEnum.ACTIVE]),
+                Recommendation.is_shadow.is_(False),
+            )
+            .order_by(Recommendation.id)
+        )
+
+    @staticmethod
+    def _active_trades_projection():
+        events = (
+            select(event_types_agg(UserTradeEvent.event_type))
+            .where(
+                UserTradeEvent.user_trade_id == UserTrade.id,
+                _trigger_events_filter(UserTradeEvent.event_type),
+            )
+            .scalar_subquery()
+        )
+        return (
+            select(
+                UserTrade.id, UserTrade.user_id, UserTrade.asset, UserTrade.side,
+                UserTrade.entry, UserTrade.stop_loss, UserTrade.targets, UserTrade.status,
+                UserTrade.original_published_at, User.telegram_user_id, events.label("event_types"),
+            )
+            .join(User, User.id == UserTrade.user_id)
+            .where(UserTrade.status.in_([UserTradeStatusEnum.WATCHLIST, UserTradeStatusEnum.PENDING_ACTIVATION, UserTradeStatusEnum.ACTIVATED]))
+            .order_by(UserTrade.id)
+        )
+
+    def iter_active_triggers_data(self, session: Session, batch_size: int = 1000):
+        """
+        نفس نتيجة list_all_active_triggers_data لكن عبر projection + تجميع الأحداث في SQL،
+        وتُبَث صفاً صفاً (yield_per) بدل تحميل القائمة كاملة في الذاكرة.
+        """
+        rec_rows = session.execute(self._active_recs_projection().execution_options(yield_per=batch_size))
+        for row in rec_rows:
+            data = self._rec_trigger_dict(row, row.telegram_user_id, _event_type_set(row.event_types))
+            if data: yield data
+
+        trade_rows = session.execute(self._active_trades_projection().execution_options(yield_per=batch_size))
+        for row in trade_rows:
+            data = self._trade_trigger_dict(row, row.telegram_user_id, _event_type_set(row.event_types))
+            if data: yield data
+
+    async def list_all_active_triggers_data_async(self, session: AsyncSession) -> List[Dict[str, Any]]:
+        trigger_data = []
+
+        for rec in (await session.execute(self._active_recs_stmt())).unique().scalars().all():
+            data = self._rec_trigger_data(rec)
+            if data: trigger_data.append(data)
+
+        for trade in (await session.execute(self._active_trades_stmt())).unique().scalars().all():
+            data = self._trade_trigger_data(trade)
+            if data: trigger_data.append(data)
 
         return trigger_data
 
     def get_published_messages(self, session: Session, rec_id: int) -> List[PublishedMessage]:
         return session.query(PublishedMessage).filter(PublishedMessage.recommendation_id == rec_id).all()
 
+    async def get_published_messages_async(self, session: AsyncSession, rec_id: int) -> List[PublishedMessage]:
+        stmt = select(PublishedMessage).where(PublishedMessage.recommendation_id == rec_id)
+        return list((await session.execute(stmt)).scalars().all())
+
     def get_open_recs_for_analyst(self, session: Session, analyst_user_id: int) -> List[Recommendation]:
         return session.query(Recommendation).filter(
             Recommendation.analyst_id == analyst_user_id,
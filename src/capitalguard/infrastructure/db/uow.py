@@ -1,40 +1,69 @@
 # File: src/capitalguard/infrastructure/db/uow.py
-# Version: v2.x (Original File)
+# Version: v2.2.0-POOL-CONFIG
 # ✅ THE FIX: (Original File)
 #    - 1. هذا الملف هو "وحدة العمل" (Unit of Work) الأساسية.
+# ✅ THE UPGRADE (v2.1): AsyncEngine (asyncpg) بجانب الـ engine المتزامن:
+#    - get_async_engine() / async_session_scope() / async_uow_transaction
+#    - المعالجات async (webapp، PTB) لم تعد مضطرة لحجب الـ loop في I/O الـ DB
+#    - الـ engine يُنشأ عند أول استخدام (lazy) — الـ driver غير مطلوب لمن لا يستخدمه
+# ✅ THE UPGRADE (v2.2): إعدادات الـ pool من settings (DB_POOL_SIZE، DB_MAX_OVERFLOW،
+#    DB_POOL_TIMEOUT، DB_STATEMENT_TIMEOUT_MS) + pools مُراقَبة (infrastructure/db/pool.py)
+#    → cg_db_pool_* على /metrics.
 # 🎯 IMPACT: مطلوب بواسطة جميع المعالجات (Handlers) التي تبدأ بـ `@uow_transaction`.
 
 import logging
-from contextlib import contextmanager
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from functools import wraps
-from typing import Optional, Generator, Any, Callable
+from typing import Optional, Generator, AsyncGenerator, Any, Callable
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session, scoped_session
 from telegram import Update
 from telegram.ext import ContextTypes
 
 from capitalguard.config import settings
 from .models import Base
+from .pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool, register_pool_gauges
 from .repository import UserRepository
 
 log = logging.getLogger(__name__)
 
 # --- Database Engine & Session Setup ---
 
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _sync_engine_kwargs(url: str) -> dict:
+    """Pool صريح من settings (SQLite يبقى على الـ pool الافتراضي)."""
+    kwargs: dict = {"pool_pre_ping": True, "pool_recycle": settings.DB_POOL_RECYCLE}
+    if _is_sqlite(url):
+        return kwargs
+    connect_args = {
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={int(settings.DB_STATEMENT_TIMEOUT_MS)}"
+    kwargs.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        connect_args=connect_args,
+    )
+    return kwargs
+
+
 try:
     log.info(f"Initializing database engine for URL: ...{settings.DATABASE_URL[-20:]}")
-    engine = create_engine(
-        settings.DATABASE_URL,
-        pool_pre_ping=True,
-        pool_recycle=3600,
-        connect_args={
-            "keepalives": 1,
-            "keepalives_idle": 30,
-            "keepalives_interval": 10,
-            "keepalives_count": 5,
-        },
-    )
+    engine = create_engine(settings.DATABASE_URL, **_sync_engine_kwargs(settings.DATABASE_URL))
+    register_pool_gauges(engine.pool, "sync")
     
     # Create a thread-safe, scoped session factory
     _session_factory = sessionmaker(bind=engine, expire_on_commit=False)
@@ -46,6 +75,66 @@ except Exception as e:
     # This is a fatal error, the application cannot run.
     raise
 
+# --- Async Engine & Session Setup ---
+
+# driver المتزامن → نظيره async
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+_async_engine_lock = threading.Lock()
+
+
+def to_async_url(url: str) -> str:
+    """postgresql+psycopg://... → postgresql+asyncpg://... (بقية الـ URL كما هي)."""
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def get_async_engine() -> AsyncEngine:
+    """AsyncEngine مشترك للعملية، يُنشأ عند أول استدعاء."""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        return _async_engine
+    with _async_engine_lock:
+        if _async_engine is None:
+            url = to_async_url(settings.DATABASE_URL)
+            kwargs: dict = {"pool_pre_ping": True, "pool_recycle": settings.DB_POOL_RECYCLE}
+            if not _is_sqlite(url):
+                kwargs.update(
+                    poolclass=InstrumentedAsyncQueuePool,
+                    pool_size=settings.DB_ASYNC_POOL_SIZE,
+                    max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+                    pool_timeout=settings.DB_POOL_TIMEOUT,
+                )
+                if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+                    kwargs["connect_args"] = {
+                        "server_settings": {"statement_timeout": str(int(settings.DB_STATEMENT_TIMEOUT_MS))}
+                    }
+            _async_engine = create_async_engine(url, **kwargs)
+            register_pool_gauges(_async_engine.sync_engine.pool, "async")
+            _async_session_factory = async_sessionmaker(bind=_async_engine, expire_on_commit=False)
+            log.info("Async database engine initialized (pool_size=%s).", kwargs.get("pool_size", "default"))
+    return _async_engine
+
+
+async def dispose_async_engine() -> None:
+    """يُغلق اتصالات الـ AsyncEngine (عند إيقاف التطبيق)."""
+    global _async_engine, _async_session_factory
+    with _async_engine_lock:
+        engine, _async_engine, _async_session_factory = _async_engine, None, None
+    if engine is not None:
+        await engine.dispose()
+
+
 def create_tables():
     """Creates all tables defined in models.py."""
     log.info("Creating database tables if they do not exist...")
@@ -78,6 +167,27 @@ def session_scope() -> Generator[Session, None, None]:
         SessionScoped.remove()
         log.debug(f"Session {id(session)} closed and removed.")
 
+@asynccontextmanager
+async def async_session_scope() -> AsyncGenerator[AsyncSession, None]:
+    """
+    نظير session_scope لـ AsyncSession: commit عند النجاح، rollback عند الخطأ.
+    كل استدعاء = session مستقلة (لا scoped_session — آمن لعدة coroutines متزامنة).
+    """
+    get_async_engine()
+    session: AsyncSession = _async_session_factory()
+    log.debug(f"Async session {id(session)} opened.")
+    try:
+        yield session
+        await session.commit()
+        log.debug(f"Async session {id(session)} committed.")
+    except Exception as e:
+        log.error(f"Async session {id(session)} rollback due to exception: {e}", exc_info=True)
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+        log.debug(f"Async session {id(session)} closed.")
+
 # --- PTB Handler Decorator ---
 
 def uow_transaction(func: Callable[..., Any]) -> Callable[..., Any]:
@@ -136,4 +246,55 @@ def uow_transaction(func: Callable[..., Any]) -> Callable[..., Any]:
             SessionScoped.remove()
             log.debug(f"UoW Decorator: Session {id(session)} closed and removed for handler {func.__name__}.")
 
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+def async_uow_transaction(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    نظير uow_transaction يحقن AsyncSession في db_session.
+    المعالج يستخدم await session.execute(...) ودوال *_async في المستودعات.
+    """
+    @wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args: Any, **kwargs: Any) -> Any:
+        get_async_engine()
+        session: AsyncSession = _async_session_factory()
+        log.debug(f"Async UoW Decorator: Session {id(session)} opened for handler {func.__name__}")
+
+        db_user = None
+        if update and update.effective_user:
+            try:
+                db_user = await UserRepository(session).find_by_telegram_id_async(update.effective_user.id)
+            except Exception as e:
+                log.error(f"Async UoW: Failed to fetch db_user {update.effective_user.id}: {e}", exc_info=True)
+
+        try:
+            if 'db_session' not in kwargs:
+                kwargs['db_session'] = session
+            if 'db_user' not in kwargs:
+                kwargs['db_user'] = db_user
+
+            result = await func(update, context, *args, **kwargs)
+
+            await session.commit()
+            log.debug(f"Async UoW Decorator: Session {id(session)} committed for handler {func.__name__}.")
+            return result
+
+        except Exception as e:
+            log.error(f"Async UoW Decorator: Session {id(session)} rollback for handler {func.__name__} due to: {e}", exc_info=True)
+            await session.rollback()
+
+            try:
+                await update.effective_message.reply_text(
+                    "An unexpected error occurred. The operation was cancelled. "
+                    "The admin has been notified."
+                )
+            except Exception as notify_e:
+                log.error(f"Failed to notify user of handler error: {notify_e}")
+
+            raise
+
+        finally:
+            await session.close()
+            log.debug(f"Async UoW Decorator: Session {id(session)} closed for handler {func.__name__}.")
+
+    return wrapper
@@ -1,6 +1,33 @@
 #--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/market/ws_client.py ---
 # File: src/capitalguard/infrastructure/market/ws_client.py
-# Version: v3.1.0-STABLE (Live Dynamic Subscriptions + websockets v12 fix)
+# Version: v4.2.0-GAP-BACKFILL
+#
+# ✅ THE FIX (v4.2) — فجوات الانقطاع:
+#   أثناء إعادة الاتصال (ثوانٍ إلى دقائق) لم تُرَ قمم/قيعان السعر → SL/TP
+#   لُمس خلالها يضيع بصمت في AlertService.
+#   الآن: last_seen[symbol] = وقت آخر شمعة مُستلمة. عند إعادة اتصال shard
+#   تُجلب شموع الفجوة عبر REST (1s حتى 1000 ثانية، وإلا 1m) بالتوازي
+#   (backfill_concurrency)، ويُمرَّر high/low المدمج للـ handler (→ price_queue)
+#   قبل استئناف قراءة التيكات الحية. cg_ws_gap_seconds / cg_ws_backfilled_candles_total.
+#
+# ✅ THE UPGRADE (v4.1): فك الرسائل عبر kline_decoder.decode_kline
+#   (orjson إن توفر، رفض رسائل التأكيد قبل الـ parse، فهرسة مباشرة).
+#
+# ✅ THE UPGRADE (v4.0) — Pool اتصالات مُجزَّأ (shards):
+#   المشكلة: اتصال /stream واحد لكل الرموز → حد Binance للـ streams لكل اتصال
+#   (1024) ولرسائل التحكم (5/ث)، وcoroutine قراءة واحدة تفك كل الـ JSON.
+#   الحل:
+#     - BinanceWSClient أصبح pool من _WSShard، كل shard ≤ max_streams_per_conn
+#     - SUBSCRIBE/UNSUBSCRIBE مُقسَّمة (subscribe_batch_size) ومُباعَدة
+#       (subscribe_rate رسالة/ث) لكل اتصال على حدة
+#     - إعادة التوزيع عند الإضافة/الحذف: الجديد → أقل shard حملاً، shard ممتلئ
+#       → shard جديد، shard فارغ → يُغلق. لا نقل لـ streams حية (لا فجوات).
+#     - كل shard يُعيد الاتصال بـ backoff أسي مستقل ويُعيد الاشتراك برموزه فقط
+#   الواجهة العامة بدون تغيير: start(handler) / stop() / update_subscriptions().
+#
+# ✅ THE UPGRADE (v3.2): كل تيك kline يُكتب مباشرة في price_table.latest_prices
+#   قبل استدعاء الـ handler → قراءة sync لآخر سعر من أي thread/loop.
+#   الرموز المُلغى اشتراكها تُحذف من الجدول.
 #
 # ✅ THE FIX (BUG-W1):
 #   ws.open لا يوجد في websockets v12+ → AttributeError في runtime
@@ -16,41 +43,62 @@
 # Reviewed-by: Guardian Protocol v1 — 2026-03-15
 
 import asyncio
+import itertools
 import json
 import logging
-from typing import List, Callable, Any, Set
+import random
+import time
+from typing import List, Callable, Any, Dict, Iterable, Optional, Set
 import websockets
 
+from capitalguard.infrastructure.market.kline_decoder import Kline, decode_kline
+from capitalguard.infrastructure.market.price_table import LatestPriceTable, latest_prices
+from capitalguard.infrastructure.monitoring.metrics import (
+    WS_RECONNECTS,
+    WS_SHARD_STREAMS,
+    WS_GAP_SECONDS,
+    WS_BACKFILLED_CANDLES,
+    WS_BACKFILL_FAILURES,
+)
+from capitalguard.infrastructure.pricing.binance import BinancePricing
+
 log = logging.getLogger(__name__)
 
 
-class BinanceWSClient:
+class _WSShard:
     """
-    عميل WebSocket ثابت لـ Binance Futures.
-    يستخدم اشتراكات حية (SUBSCRIBE/UNSUBSCRIBE) بدون قطع الاتصال.
+    اتصال /stream واحد ومجموعة رموزه.
+    يملك حلقة الاستماع، إعادة الاتصال بـ backoff، ومعدل رسائل التحكم الخاص به.
     """
 
-    # المسار الأساسي بدون عملات — نضيفها عبر SUBSCRIBE
-    BASE = "wss://stream.binance.com:9443/stream"
-
-    def __init__(self):
+    def __init__(self, shard_id: int, pool: "BinanceWSClient"):
+        self.shard_id = shard_id
+        self.pool = pool
         self.ws = None
-        self.current_symbols: Set[str] = set()
-        self.handler: Callable = None
-        self._listen_task = None
+        self.symbols: Set[str] = set()
+        # ما تم إرساله فعلاً على الاتصال الحالي
+        self._subscribed: Set[str] = set()
+        self._listen_task: Optional[asyncio.Task] = None
         self._running = False
         # ✅ BUG-W1 FIX: flag بديل عن ws.open المحذوف في websockets v12
         self._connected: bool = False
+        self._send_lock = asyncio.Lock()
+        self._last_send = 0.0
+        self._msg_ids = itertools.count(1)
+        # وقت آخر انقطاع بعد اتصال ناجح (None = لم ينقطع بعد)
+        self._disconnected_at: Optional[float] = None
 
-    async def start(self, handler: Callable[[str, float, float, float], Any]) -> None:
-        """يبدأ شريان الاتصال الدائم في الخلفية."""
-        self.handler = handler
+    @property
+    def label(self) -> str:
+        return str(self.shard_id)
+
+    def start(self) -> None:
+        if self._running:
+            return
         self._running = True
         self._listen_task = asyncio.create_task(self._listen_loop())
-        log.info("BinanceWSClient: background listener started.")
 
     async def stop(self) -> None:
-        """إيقاف الاتصال بأمان."""
         self._running = False
         self._connected = False
         if self._listen_task:
@@ -59,131 +107,275 @@ class BinanceWSClient:
                 await self._listen_task
             except asyncio.CancelledError:
                 pass
+            self._listen_task = None
         if self.ws:
             try:
                 await self.ws.close()
             except Exception:
                 pass
             self.ws = None
-        log.info("BinanceWSClient: stopped.")
-
-    async def update_subscriptions(self, new_symbols_list: List[str]) -> None:
-        """
-        يُقارن العملات الجديدة بالحالية ويرسل SUBSCRIBE/UNSUBSCRIBE حياً
-        دون إغلاق الاتصال المفتوح.
-        """
-        # ✅ BUG-W1 FIX: نستخدم self._connected بدلاً من self.ws.open
-        if not self.ws or not self._connected:
-            # الاتصال لم يبدأ بعد — نحفظ العملات لتُطبَّق عند الاتصال
-            self.current_symbols = {s.lower() for s in new_symbols_list}
-            log.debug(
-                f"BinanceWSClient: not connected yet — "
-                f"queued {len(self.current_symbols)} symbols."
-            )
-            return
-
-        new_symbols = {s.lower() for s in new_symbols_list}
+        WS_SHARD_STREAMS.labels(self.label).set(0)
 
-        to_add = new_symbols - self.current_symbols
-        to_remove = self.current_symbols - new_symbols
+    async def set_symbols(self, symbols: Set[str]) -> None:
+        """يُحدِّث رموز الـ shard ويرسل الفرق فقط إن كان متصلاً."""
+        self.symbols = set(symbols)
+        WS_SHARD_STREAMS.labels(self.label).set(len(self.symbols))
+        if self.ws and self._connected:
+            await self._sync_subscriptions()
 
-        # إرسال SUBSCRIBE للعملات الجديدة
+    async def _sync_subscriptions(self) -> None:
+        to_add = self.symbols - self._subscribed
+        to_remove = self._subscribed - self.symbols
         if to_add:
-            params = [f"{s}@kline_1s" for s in to_add]
-            log.info(f"📡 SUBSCRIBE: {to_add}")
-            try:
-                await self.ws.send(json.dumps({
-                    "method": "SUBSCRIBE",
-                    "params": params,
-                    "id": 1,
-                }))
-            except Exception as e:
-                log.warning(f"SUBSCRIBE send failed: {e}")
-
-        # إرسال UNSUBSCRIBE للعملات المنتهية
+            log.info(f"📡 [shard {self.shard_id}] SUBSCRIBE: {sorted(to_add)}")
+            await self._send_control("SUBSCRIBE", to_add)
         if to_remove:
-            params = [f"{s}@kline_1s" for s in to_remove]
-            log.info(f"📡 UNSUBSCRIBE: {to_remove}")
-            try:
-                await self.ws.send(json.dumps({
-                    "method": "UNSUBSCRIBE",
-                    "params": params,
-                    "id": 2,
-                }))
-            except Exception as e:
-                log.warning(f"UNSUBSCRIBE send failed: {e}")
+            log.info(f"📡 [shard {self.shard_id}] UNSUBSCRIBE: {sorted(to_remove)}")
+            await self._send_control("UNSUBSCRIBE", to_remove)
 
-        self.current_symbols = new_symbols
+    async def _send_control(self, method: str, symbols: Iterable[str]) -> None:
+        """
+        يرسل SUBSCRIBE/UNSUBSCRIBE على دفعات ≤ subscribe_batch_size،
+        مع مسافة ≥ 1/subscribe_rate ثانية بين الرسائل على هذا الاتصال.
+        """
+        ordered = sorted(symbols)
+        batch_size = self.pool.subscribe_batch_size
+        min_gap = 1.0 / self.pool.subscribe_rate
+        for i in range(0, len(ordered), batch_size):
+            chunk = ordered[i:i + batch_size]
+            async with self._send_lock:
+                wait = self._last_send + min_gap - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                ws = self.ws
+                if ws is None or not self._connected:
+                    return
+                try:
+                    await ws.send(json.dumps({
+                        "method": method,
+                        "params": [f"{s}@kline_1s" for s in chunk],
+                        "id": next(self._msg_ids),
+                    }))
+                except Exception as e:
+                    log.warning(f"[shard {self.shard_id}] {method} send failed: {e}")
+                    return
+                finally:
+                    self._last_send = time.monotonic()
+            if method == "SUBSCRIBE":
+                self._subscribed.update(chunk)
+            else:
+                self._subscribed.difference_update(chunk)
+
+    def _next_backoff(self, attempt: int) -> float:
+        base = min(self.pool.reconnect_max_delay, self.pool.reconnect_base_delay * (2 ** attempt))
+        return base * random.uniform(0.8, 1.2)
 
     async def _listen_loop(self) -> None:
         """
-        حلقة الاستماع الدائمة مع إعادة الاتصال التلقائي.
-        تُعيد الاشتراك بالعملات المعروفة بعد كل انقطاع.
+        حلقة الاستماع الدائمة مع إعادة الاتصال التلقائي (backoff أسي).
+        تُعيد الاشتراك برموز هذا الـ shard فقط بعد كل انقطاع.
         """
+        attempt = 0
         while self._running:
             try:
-                log.info("BinanceWSClient: connecting to Binance persistent WS...")
+                log.info(f"BinanceWSClient[shard {self.shard_id}]: connecting...")
 
                 async with websockets.connect(
-                    self.BASE,
+                    self.pool.BASE,
                     ping_interval=20,
                     ping_timeout=20,
                 ) as ws:
                     self.ws = ws
                     # ✅ BUG-W1 FIX: نضبط _connected عند نجاح الاتصال
                     self._connected = True
-                    log.info("✅ BinanceWSClient: connected successfully.")
+                    self._subscribed = set()
+                    attempt = 0
+                    log.info(f"✅ BinanceWSClient[shard {self.shard_id}]: connected.")
+
+                    if self.symbols:
+                        await self._sync_subscriptions()
 
-                    # إعادة الاشتراك بالعملات المعروفة بعد إعادة الاتصال
-                    if self.current_symbols:
-                        log.info(
-                            f"BinanceWSClient: re-subscribing to "
-                            f"{len(self.current_symbols)} known symbols after reconnect."
-                        )
-                        await self.update_subscriptions(list(self.current_symbols))
+                    # ملء فجوة الانقطاع قبل أي تيك حي (الرسائل تنتظر في buffer الـ socket)
+                    if self._disconnected_at is not None:
+                        WS_GAP_SECONDS.observe(time.time() - self._disconnected_at)
+                        self._disconnected_at = None
+                        await self.pool._backfill(self.symbols)
 
                     # حلقة استقبال الرسائل
+                    # (تأكيدات SUBSCRIBE/UNSUBSCRIBE والرسائل التالفة → None)
+                    on_kline = self.pool._on_kline
                     while self._running:
-                        try:
-                            message = await ws.recv()
-                        except websockets.exceptions.ConnectionClosed:
-                            raise  # يُعالج في الـ outer except
-
-                        data = json.loads(message)
-
-                        # تجاهل رسائل تأكيد SUBSCRIBE/UNSUBSCRIBE
-                        if "result" in data and "id" in data:
-                            continue
-
-                        payload = data.get("data", {})
-                        k = payload.get("k", {})
-
-                        symbol = k.get("s")
-                        if not symbol:
-                            continue
-
-                        try:
-                            low   = float(k.get("l", 0))
-                            high  = float(k.get("h", 0))
-                            close = float(k.get("c", 0))
-                        except (TypeError, ValueError):
-                            continue
-
-                        if self.handler and low and high and close:
-                            await self.handler(symbol, low, high, close)
+                        kline = decode_kline(await ws.recv())
+                        if kline is not None:
+                            await on_kline(kline)
 
             except websockets.exceptions.ConnectionClosed as e:
-                log.warning(f"BinanceWSClient: connection dropped ({e}). Reconnecting in 5s...")
+                log.warning(f"BinanceWSClient[shard {self.shard_id}]: connection dropped ({e}).")
             except asyncio.CancelledError:
-                log.info("BinanceWSClient: listen loop cancelled.")
+                log.info(f"BinanceWSClient[shard {self.shard_id}]: listen loop cancelled.")
                 break
             except Exception as e:
-                log.error(f"BinanceWSClient: unexpected error ({e}). Restarting in 5s...")
+                log.error(f"BinanceWSClient[shard {self.shard_id}]: unexpected error ({e}).")
             finally:
                 # ✅ BUG-W1 FIX: نمسح _connected عند أي انقطاع
+                if self._connected and self._disconnected_at is None:
+                    self._disconnected_at = time.time()
                 self._connected = False
                 self.ws = None
 
             if self._running:
-                await asyncio.sleep(5)
+                delay = self._next_backoff(attempt)
+                attempt += 1
+                WS_RECONNECTS.labels(self.label).inc()
+                log.info(f"BinanceWSClient[shard {self.shard_id}]: reconnecting in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+
+class BinanceWSClient:
+    """
+    Pool اتصالات WebSocket لـ Binance بنفس واجهة العميل الأحادي السابق.
+    يوزِّع الرموز على shards (≤ max_streams_per_conn لكل اتصال)
+    ويستخدم اشتراكات حية (SUBSCRIBE/UNSUBSCRIBE) بدون قطع الاتصال.
+    """
+
+    # المسار الأساسي بدون عملات — نضيفها عبر SUBSCRIBE
+    BASE = "wss://stream.binance.com:9443/stream"
+
+    def __init__(
+        self,
+        price_table: Optional[LatestPriceTable] = None,
+        max_streams_per_conn: int = 200,
+        subscribe_rate: float = 4.0,
+        subscribe_batch_size: int = 100,
+        reconnect_base_delay: float = 1.0,
+        reconnect_max_delay: float = 60.0,
+        backfill_concurrency: int = 8,
+        backfill_spot: bool = True,
+    ):
+        self.price_table = price_table if price_table is not None else latest_prices
+        self.max_streams_per_conn = max(1, int(max_streams_per_conn))
+        self.subscribe_rate = max(0.1, float(subscribe_rate))
+        self.subscribe_batch_size = max(1, int(subscribe_batch_size))
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.backfill_concurrency = max(1, int(backfill_concurrency))
+        # BASE هو stream الـ spot → شموع الفجوة من REST الـ spot
+        self.backfill_spot = backfill_spot
+        # SYMBOL → وقت فتح آخر شمعة مُستلمة (ms)
+        self.last_seen: Dict[str, int] = {}
+
+        self.handler: Callable = None
+        self.shards: Dict[int, _WSShard] = {}
+        self._shard_ids = itertools.count()
+        self._assign_lock = asyncio.Lock()
+        self._running = False
+
+    @property
+    def current_symbols(self) -> Set[str]:
+        return set().union(*(s.symbols for s in self.shards.values()))
+
+    async def start(self, handler: Callable[[str, float, float, float], Any]) -> None:
+        """يبدأ كل الـ shards المعروفة (والجديدة تبدأ فور إنشائها)."""
+        self.handler = handler
+        self._running = True
+        for shard in self.shards.values():
+            shard.start()
+        log.info(f"BinanceWSClient: pool started ({len(self.shards)} shards).")
+
+    async def stop(self) -> None:
+        """إيقاف كل الاتصالات بأمان."""
+        self._running = False
+        await asyncio.gather(*(s.stop() for s in self.shards.values()), return_exceptions=True)
+        log.info("BinanceWSClient: stopped.")
+
+    async def update_subscriptions(self, new_symbols_list: List[str]) -> None:
+        """
+        يُقارن العملات الجديدة بالحالية ويوزِّع الفرق على الـ shards:
+        الحذف من shard الرمز، الإضافة لأقل shard حملاً (أو shard جديد)،
+        والـ shards الفارغة تُغلق. الرموز الحية لا تُنقل بين الاتصالات.
+        """
+        new_symbols = {s.lower() for s in new_symbols_list}
+
+        async with self._assign_lock:
+            plan = {sid: shard.symbols & new_symbols for sid, shard in self.shards.items()}
+            assigned = set().union(*plan.values()) if plan else set()
+            to_remove = self.current_symbols - new_symbols
+
+            for symbol in sorted(new_symbols - assigned):
+                # الـ shards التي فرغت تُغلق بدل أن تُملأ من جديد
+                open_ids = [
+                    sid for sid, syms in plan.items() if 0 < len(syms) < self.max_streams_per_conn
+                ] or [sid for sid, syms in plan.items() if not syms]
+                if open_ids:
+                    sid = min(open_ids, key=lambda i: len(plan[i]))
+                else:
+                    sid = next(self._shard_ids)
+                    self.shards[sid] = _WSShard(sid, self)
+                    plan[sid] = set()
+                plan[sid].add(symbol)
+
+            for sid, syms in plan.items():
+                shard = self.shards[sid]
+                if not syms:
+                    await shard.stop()
+                    del self.shards[sid]
+                    continue
+                if syms != shard.symbols:
+                    await shard.set_symbols(syms)
+                if self._running:
+                    shard.start()
+
+        for s in to_remove:
+            self.price_table.discard(s)
+            self.last_seen.pop(s.upper(), None)
+
+        log.debug(
+            f"BinanceWSClient: {len(new_symbols)} symbols on {len(self.shards)} shards "
+            f"({[len(s.symbols) for s in self.shards.values()]})."
+        )
+
+    async def _on_kline(self, kline: Kline) -> None:
+        symbol, low, high, close, ts = kline
+        if ts:
+            self.last_seen[symbol] = ts
+        self.price_table.update(symbol, low, high, close)
+        if self.handler:
+            await self.handler(symbol, low, high, close)
+
+    async def _backfill(self, symbols: Set[str]) -> None:
+        """
+        يجلب شموع الفجوة لكل رمز له last_seen ويُمرِّر (low, high, close) المدمجة
+        للـ handler — AlertService يرى القمة/القاع الفائتين كتيك واحد.
+        """
+        now_ms = int(time.time() * 1000)
+        jobs = [(s.upper(), self.last_seen[s.upper()]) for s in symbols if s.upper() in self.last_seen]
+        if not jobs:
+            return
+        sem = asyncio.Semaphore(self.backfill_concurrency)
+
+        async def fill(symbol: str, since_ms: int) -> int:
+            interval = "1s" if now_ms - since_ms <= 1_000_000 else "1m"
+            async with sem:
+                candles = await BinancePricing.get_klines(
+                    symbol, interval, since_ms, now_ms, spot=self.backfill_spot,
+                )
+            if not candles:
+                WS_BACKFILL_FAILURES.inc()
+                return 0
+            low = min(c[2] for c in candles)
+            high = max(c[1] for c in candles)
+            close = candles[-1][3]
+            self.last_seen[symbol] = max(self.last_seen.get(symbol, 0), candles[-1][0])
+            WS_BACKFILLED_CANDLES.labels(interval).inc(len(candles))
+            if self.handler:
+                await self.handler(symbol, low, high, close)
+            return len(candles)
+
+        results = await asyncio.gather(*(fill(s, since) for s, since in jobs), return_exceptions=True)
+        filled = sum(r for r in results if isinstance(r, int))
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            WS_BACKFILL_FAILURES.inc(len(errors))
+            log.warning(f"BinanceWSClient: backfill failed for {len(errors)} symbols ({errors[0]}).")
+        log.info(f"BinanceWSClient: backfilled {filled} candles for {len(jobs)} symbols after reconnect.")
 #--- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/market/ws_client.py ---
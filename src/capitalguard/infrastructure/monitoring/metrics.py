@@ -0,0 +1,198 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/monitoring/metrics.py
+# Version: v1.10.0
+#
+# مقاييس Prometheus الداخلية لخط معالجة الأسعار والتنبيهات.
+# تُسجَّل في الـ registry الافتراضي → تظهر تلقائياً على /metrics
+# (interfaces/api/metrics.py يستدعي generate_latest()).
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# ── AlertService — Tick Router ───────────────────────────────────────────────
+ALERT_TICKS_ROUTED = Counter(
+    "cg_alert_ticks_routed_total",
+    "Ticks delivered to a symbol mailbox",
+    ["symbol"],
+)
+ALERT_TICKS_MERGED = Counter(
+    "cg_alert_ticks_merged_total",
+    "Ticks merged into a pending OHLC window while the symbol worker was busy",
+    ["symbol"],
+)
+
+ALERT_INDEX_BUILD_SECONDS = Gauge(
+    "cg_alert_index_build_seconds",
+    "Duration of the last full trigger-index build from the database",
+)
+
+# ── AlertService — Per-stage latency ─────────────────────────────────────────
+#   decision : استلام التيك في الـ Router → انتهاء التقييم (أقدم تيك في النافذة)
+#   db_queue : إرسال job للـ DbExecutor → بدء تنفيذها
+#   db_job   : مدة job الـ lifecycle كاملة على الـ DbExecutor
+#   commit   : session.commit() + refresh في _commit_and_dispatch
+#   notify   : إرسال إشعار/تعديل بطاقة Telegram
+ALERT_STAGE_LATENCY = Histogram(
+    "cg_alert_stage_latency_seconds",
+    "Latency of each alert pipeline stage",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+# ── Leader election (leader_election.py) ─────────────────────────────────────
+LEADER_STATUS = Gauge(
+    "cg_leader",
+    "1 while this process holds the named leader lease, else 0",
+    ["name"],
+)
+LEADER_TRANSITIONS = Counter(
+    "cg_leader_transitions_total",
+    "Leader lease acquisitions and losses in this process",
+    ["name", "event"],
+)
+
+# ── Telegram outbound dispatcher (notify/dispatcher.py) ─────────────────────
+TG_QUEUE_DEPTH = Gauge(
+    "cg_tg_queue_depth",
+    "Telegram jobs waiting per priority lane",
+    ["lane"],
+)
+TG_QUEUE_WAIT = Histogram(
+    "cg_tg_queue_wait_seconds",
+    "Time from enqueue to the start of a Telegram API call",
+    ["lane"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+TG_SENT = Counter(
+    "cg_tg_sent_total",
+    "Telegram API calls completed per priority lane",
+    ["lane"],
+)
+TG_DROPPED = Counter(
+    "cg_tg_dropped_total",
+    "Telegram jobs dropped because their lane queue was full",
+    ["lane"],
+)
+TG_RETRY_AFTER = Counter(
+    "cg_tg_retry_after_total",
+    "RetryAfter (flood-wait) responses from Telegram",
+)
+TG_CARD_EDITS_COALESCED = Counter(
+    "cg_tg_card_edits_coalesced_total",
+    "Pending card renders replaced by a newer one inside the debounce window",
+)
+TG_CARD_EDITS_SKIPPED = Counter(
+    "cg_tg_card_edits_skipped_total",
+    "Card edits skipped because the rendered card equals the last one sent",
+)
+
+# ── Notification outbox relay (notify/outbox.py) ────────────────────────────
+OUTBOX_DELIVERIES = Counter(
+    "cg_outbox_deliveries_total",
+    "Outbox delivery attempts by kind and outcome (sent / retry / failed)",
+    ["kind", "outcome"],
+)
+OUTBOX_DELIVERY_LAG = Histogram(
+    "cg_outbox_delivery_lag_seconds",
+    "Time from the outbox row being committed to its successful delivery",
+    ["kind"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+# ── core_cache (AdvancedCacheSystem) ────────────────────────────────────────
+CACHE_HITS = Counter(
+    "cg_cache_hits_total",
+    "core_cache hits by tier",
+    ["tier"],
+)
+CACHE_MISSES = Counter(
+    "cg_cache_misses_total",
+    "core_cache misses (neither L1 nor Redis)",
+)
+CACHE_EVICTIONS = Counter(
+    "cg_cache_evictions_total",
+    "L1 entries evicted",
+    ["reason"],
+)
+CACHE_L1_ENTRIES = Gauge(
+    "cg_cache_l1_entries",
+    "Entries currently held in the L1 memory cache",
+)
+CACHE_L2_FLUSHES = Counter(
+    "cg_cache_l2_flushes_total",
+    "Write-behind pipeline flushes to Redis",
+)
+CACHE_L2_FLUSHED_KEYS = Counter(
+    "cg_cache_l2_flushed_keys_total",
+    "Keys written to Redis by write-behind flushes (after coalescing)",
+)
+
+# ── Binance WS pool ─────────────────────────────────────────────────────────
+WS_SHARD_STREAMS = Gauge(
+    "cg_ws_shard_streams",
+    "kline streams assigned to each Binance WS shard",
+    ["shard"],
+)
+WS_RECONNECTS = Counter(
+    "cg_ws_reconnects_total",
+    "Binance WS shard reconnect attempts",
+    ["shard"],
+)
+
+WS_GAP_SECONDS = Histogram(
+    "cg_ws_gap_seconds",
+    "Time a Binance WS shard was disconnected before reconnecting",
+    buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+WS_BACKFILLED_CANDLES = Counter(
+    "cg_ws_backfilled_candles_total",
+    "Klines fetched over REST to cover WS reconnect gaps",
+    ["interval"],
+)
+WS_BACKFILL_FAILURES = Counter(
+    "cg_ws_backfill_failures_total",
+    "Symbols whose reconnect gap could not be backfilled",
+)
+
+# ── PriceService ────────────────────────────────────────────────────────────
+PRICE_FETCH_COALESCED = Counter(
+    "cg_price_fetch_coalesced_total",
+    "Price lookups that awaited an in-flight upstream fetch instead of issuing their own",
+    ["market"],
+)
+
+# ── DB connection pools (label pool = sync | async) ─────────────────────────
+DB_POOL_SIZE = Gauge(
+    "cg_db_pool_size",
+    "Configured pool size",
+    ["pool"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "cg_db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["pool"],
+)
+DB_POOL_OVERFLOW = Gauge(
+    "cg_db_pool_overflow",
+    "Overflow connections currently open beyond pool_size",
+    ["pool"],
+)
+DB_POOL_LAST_WAIT = Gauge(
+    "cg_db_pool_last_checkout_wait_seconds",
+    "Time the most recent checkout spent waiting for a connection",
+    ["pool"],
+)
+DB_POOL_CHECKOUT_LATENCY = Histogram(
+    "cg_db_pool_checkout_seconds",
+    "Latency of acquiring a connection from the pool",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "cg_db_pool_checkout_timeouts_total",
+    "Checkouts that failed with pool exhaustion (pool_timeout exceeded)",
+    ["pool"],
+)
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
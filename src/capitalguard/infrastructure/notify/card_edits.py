@@ -0,0 +1,144 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/notify/card_edits.py
+# Version: v1.0.1-EDIT-COALESCER
+#
+# ✅ THE FIX (v1.0.1): flush_all كان يُلغي كل timer حتى أثناء _flush — الـ render
+#   سُحب من _pending فيضيع آخر تعديل للبطاقة عند الإغلاق. التعديل الجاري الآن
+#   مهمة مستقلة تحت shield: إلغاء الـ timer لا يقطعها، وflush_all ينتظرها قبل
+#   إرسال الأحدث لنفس الرسالة.
+#
+# ✅ THE UPGRADE — دمج تعديلات بطاقات التوصيات:
+#
+# المشكلة:
+#   notify_card_update يُعيد بناء البطاقة ويُعدِّل كل نسخة منشورة بعد كل حدث.
+#   TP + إغلاق جزئي + تحريك SL في نفس الثانية = 3 build_trade_card_text
+#   و 3 edit_message_text لكل قناة → flood-wait أثناء الحركات الحادة.
+#
+# الحل — لكل (channel, message):
+#   - آخر render معلَّق فقط (الأقدم يُستبدل: cg_tg_card_edits_coalesced_total)
+#   - التنفيذ بعد نافذة debounce قصيرة — render واحد وتعديل واحد للنافذة كلها
+#   - hash النص + لوحة الأزرار يُقارن بآخر نسخة أُرسلت → تطابق = لا استدعاء
+#     (cg_tg_card_edits_skipped_total)
+#   - الحالة تُعدَّل على loop الموزِّع فقط (مهما كان loop المُستدعي)
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple, Union
+
+from capitalguard.infrastructure.monitoring.metrics import (
+    TG_CARD_EDITS_COALESCED,
+    TG_CARD_EDITS_SKIPPED,
+)
+from .dispatcher import PRIORITY_BULK, TelegramDispatcher
+
+log = logging.getLogger(__name__)
+
+ChatId = Union[int, str]
+EditKey = Tuple[ChatId, int]
+# render() → (text, keyboard) — يُستدعى مرة واحدة لكل نافذة
+Render = Callable[[], Awaitable[Tuple[str, Any]]]
+# edit(chat_id, message_id, text, keyboard) — استدعاء Bot الخام
+Edit = Callable[[ChatId, int, str, Any], Awaitable[Any]]
+
+
+def _payload_hash(text: str, keyboard: Any) -> int:
+    markup = keyboard.to_json() if hasattr(keyboard, "to_json") else repr(keyboard)
+    return hash((text, markup))
+
+
+class CardEditCoalescer:
+    def __init__(
+        self,
+        dispatcher: TelegramDispatcher,
+        edit: Edit,
+        debounce_seconds: float = 1.0,
+        max_tracked: int = 10_000,
+    ):
+        self.dispatcher = dispatcher
+        self.edit = edit
+        self.debounce_seconds = debounce_seconds
+        self.max_tracked = max_tracked
+        self._pending: Dict[EditKey, Render] = {}
+        self._timers: Dict[EditKey, asyncio.Task] = {}
+        # تعديلات سُحبت من _pending ولم تكتمل بعد — لا تُلغى مع الـ timer
+        self._in_flight: Dict[EditKey, asyncio.Future] = {}
+        # آخر hash أُرسل بنجاح لكل رسالة (LRU محدود)
+        self._last_sent: "OrderedDict[EditKey, int]" = OrderedDict()
+
+    def schedule(self, chat_id: ChatId, message_id: int, render: Render) -> None:
+        """يُسجِّل أحدث render للرسالة ويعود فوراً — آمن من أي loop/thread."""
+        key = (chat_id, message_id)
+        loop = self.dispatcher.loop
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if loop is None or current is loop:
+            self._schedule(key, render)
+        else:
+            loop.call_soon_threadsafe(self._schedule, key, render)
+
+    def _schedule(self, key: EditKey, render: Render) -> None:
+        if key in self._pending:
+            TG_CARD_EDITS_COALESCED.inc()
+        self._pending[key] = render
+        timer = self._timers.get(key)
+        if timer is None or timer.done():
+            self._timers[key] = asyncio.ensure_future(self._flush_after_debounce(key))
+
+    async def _flush_after_debounce(self, key: EditKey) -> None:
+        try:
+            while key in self._pending:
+                await asyncio.sleep(self.debounce_seconds)
+                render = self._pending.pop(key, None)
+                if render is not None:
+                    flush = asyncio.ensure_future(self._flush(key, render))
+                    self._in_flight[key] = flush
+                    flush.add_done_callback(lambda f, k=key: self._forget_flush(k, f))
+                    await asyncio.shield(flush)
+        finally:
+            if self._timers.get(key) is asyncio.current_task():
+                del self._timers[key]
+
+    def _forget_flush(self, key: EditKey, flush: asyncio.Future) -> None:
+        if self._in_flight.get(key) is flush:
+            del self._in_flight[key]
+
+    async def _flush(self, key: EditKey, render: Render) -> None:
+        chat_id, message_id = key
+        try:
+            text, keyboard = await render()
+        except Exception:
+            log.exception("Card render failed for %s/%s", chat_id, message_id)
+            return
+        digest = _payload_hash(text, keyboard)
+        if self._last_sent.get(key) == digest:
+            TG_CARD_EDITS_SKIPPED.inc()
+            return
+        future = self.dispatcher.submit(
+            chat_id, lambda: self.edit(chat_id, message_id, text, keyboard), PRIORITY_BULK
+        )
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            # الفشل سُجِّل في الموزِّع — لا hash → التعديل التالي يُرسَل
+            return
+        self._last_sent[key] = digest
+        self._last_sent.move_to_end(key)
+        while len(self._last_sent) > self.max_tracked:
+            self._last_sent.popitem(last=False)
+
+    async def flush_all(self) -> None:
+        """يُنفِّذ كل المعلَّق فوراً (الإغلاق) بدل انتظار نوافذ الـ debounce."""
+        for task in list(self._timers.values()):
+            task.cancel()
+        self._timers.clear()
+        pending, self._pending = self._pending, {}
+        # الجارية أولاً — ثم الأحدث، فلا يسبق تعديلٌ قديم تعديلاً أحدث لنفس الرسالة
+        await asyncio.gather(*list(self._in_flight.values()), return_exceptions=True)
+        await asyncio.gather(*(self._flush(k, r) for k, r in pending.items()), return_exceptions=True)
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
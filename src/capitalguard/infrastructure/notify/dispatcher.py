@@ -0,0 +1,362 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/notify/dispatcher.py
+# Version: v1.0.1-TG-DISPATCH
+#
+# ✅ THE UPGRADE — موزِّع إرسال Telegram بحدود معدل وأولويات:
+#
+# المشكلة:
+#   TelegramNotifier._send_text يُرسل مباشرة، وعند RetryAfter ينام داخل
+#   الـ coroutine المُستدعي ثم يُعيد المحاولة (recursion) → worker رمز في
+#   AlertService ينتظر Telegram. 50 هدفاً في لحظة واحدة = تقييم متوقف.
+#
+# الحل:
+#   - submit() يضع job في طابور ويعود فوراً (concurrent Future لمن يحتاج النتيجة)
+#   - token bucket عام (~30/ث) + bucket لكل محادثة (مجموعة/قناة 20/دقيقة، خاص 1/ث)
+#   - 3 ممرات: critical (ردود SL/إغلاق، رسائل خاصة) → normal (نشر) → bulk (تعديل بطاقات)
+#   - محادثة مشغولة أو bucket فارغ لا يحجب بقية المحادثات
+#   - RetryAfter يُوقف bucket تلك المحادثة فقط ويُعيد الـ job لرأس طابورها
+#   - طوابير محدودة: الامتلاء يُسقط أقدم job في نفس الممر (cg_tg_dropped_total)
+#   - الإرسال الفعلي على loop واحد (loop الموزِّع) مهما كان loop المُرسِل
+#
+# ✅ THE FIX (v1.0.1): BadRequest يرث NetworkError في PTB 21 → "chat not found" /
+#   "can't parse entities" كانت تُعاد max_attempts مرة وتحجب طابور المحادثة.
+#   BadRequest و Forbidden الآن فشل نهائي فوري.
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import asyncio
+import concurrent.futures
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Union
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from capitalguard.infrastructure.monitoring.metrics import (
+    TG_DROPPED,
+    TG_QUEUE_DEPTH,
+    TG_QUEUE_WAIT,
+    TG_RETRY_AFTER,
+    TG_SENT,
+)
+
+log = logging.getLogger(__name__)
+
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+LANE_NAMES = ("critical", "normal", "bulk")
+
+ChatId = Union[int, str]
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """الثواني حتى يتوفر token (0 = متاح الآن)."""
+        self._refill(now)
+        wait = self.paused_until - now
+        if self.tokens < 1.0:
+            wait = max(wait, (1.0 - self.tokens) / self.rate)
+        return max(wait, 0.0)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1.0
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class _Job:
+    __slots__ = ("chat_id", "send", "priority", "future", "attempts", "enqueued_at")
+
+    def __init__(self, chat_id, send, priority, future, enqueued_at):
+        self.chat_id = chat_id
+        self.send = send
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+        self.enqueued_at = enqueued_at
+
+
+class TelegramDispatcher:
+    """
+    طابور إرسال مشترك لكل استدعاءات Bot.
+    send: دالة بلا معاملات تُعيد awaitable (send_message / edit_message_text ...)
+    تُنفَّذ على loop الموزِّع؛ RetryAfter / NetworkError تُعالَج هنا.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 25.0,
+        group_rate_per_minute: float = 20.0,
+        private_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_queue: int = 1000,
+        concurrency: int = 8,
+        max_attempts: int = 3,
+        network_retry_delay: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.global_rate = global_rate
+        self.group_rate = group_rate_per_minute / 60.0
+        self.private_rate = private_rate
+        self.chat_burst = chat_burst
+        self.max_queue = max(1, int(max_queue))
+        self.concurrency = max(1, int(concurrency))
+        self.max_attempts = max(1, int(max_attempts))
+        self.network_retry_delay = network_retry_delay
+        self._clock = clock
+
+        now = clock()
+        self._global = TokenBucket(global_rate, max(1.0, global_rate), now)
+        self._buckets: Dict[ChatId, TokenBucket] = {}
+        # ممر لكل أولوية: chat_id → طابور FIFO (OrderedDict = دوران بين المحادثات)
+        self._lanes = tuple(OrderedDict() for _ in LANE_NAMES)
+        self._sizes = [0] * len(LANE_NAMES)
+        self._busy: Set[ChatId] = set()
+        self._inflight: Set[asyncio.Task] = set()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+
+    # ─────────────────────────────────────────────────────────────
+    # Lifecycle
+    # ─────────────────────────────────────────────────────────────
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop if self.running else None
+
+    @property
+    def running(self) -> bool:
+        return self._started and not self._loop.is_closed()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """يربط الموزِّع بـ loop (الحالي افتراضياً). كل الإرسال يتم عليه."""
+        if self.running:
+            return
+        loop = loop or asyncio.get_running_loop()
+        self._loop = loop
+        self._started = True
+
+        def _boot():
+            self._wake = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = loop.create_task(self._run())
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            _boot()
+        else:
+            loop.call_soon_threadsafe(_boot)
+        log.info("TelegramDispatcher started (global %.0f/s, concurrency %d).", self.global_rate, self.concurrency)
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """ينتظر تفريغ الطوابير حتى timeout ثم يُلغي ما تبقى."""
+        if not self.running:
+            return
+        deadline = self._clock() + timeout
+        while (self.pending or self._inflight) and self._clock() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        for task in list(self._inflight):
+            task.cancel()
+        for lane in self._lanes:
+            for queue in lane.values():
+                for job in queue:
+                    job.future.cancel()
+            lane.clear()
+        self._sizes = [0] * len(LANE_NAMES)
+        self._task = None
+        self._started = False
+
+    @property
+    def pending(self) -> int:
+        return sum(self._sizes)
+
+    # ─────────────────────────────────────────────────────────────
+    # Producers — أي thread / loop
+    # ─────────────────────────────────────────────────────────────
+
+    def submit(
+        self,
+        chat_id: ChatId,
+        send: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_NORMAL,
+    ) -> concurrent.futures.Future:
+        """يضع الإرسال في الطابور ويعود فوراً؛ await asyncio.wrap_future(...) لمن يحتاج النتيجة."""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        if not self.running:
+            try:
+                self.start()
+            except RuntimeError:
+                future.set_exception(RuntimeError("TelegramDispatcher has no running loop"))
+                return future
+        job = _Job(chat_id, send, min(max(priority, 0), len(LANE_NAMES) - 1), future, self._clock())
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is self._loop:
+            self._enqueue(job)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, job)
+        return future
+
+    # ─────────────────────────────────────────────────────────────
+    # Scheduler — loop الموزِّع فقط
+    # ─────────────────────────────────────────────────────────────
+
+    def _enqueue(self, job: _Job, front: bool = False) -> None:
+        lane = self._lanes[job.priority]
+        if not front and self._sizes[job.priority] >= self.max_queue:
+            # أقدم job في الممر يُسقَط (تعديلات البطاقات القديمة تُستبدل بالأحدث عادةً)
+            oldest_chat = next(iter(lane))
+            dropped = lane[oldest_chat].popleft()
+            if not lane[oldest_chat]:
+                del lane[oldest_chat]
+            self._sizes[job.priority] -= 1
+            dropped.future.cancel()
+            TG_DROPPED.labels(LANE_NAMES[job.priority]).inc()
+        queue = lane.get(job.chat_id)
+        if queue is None:
+            queue = lane[job.chat_id] = deque()
+        if front:
+            queue.appendleft(job)
+            lane.move_to_end(job.chat_id, last=False)
+        else:
+            queue.append(job)
+        self._sizes[job.priority] += 1
+        TG_QUEUE_DEPTH.labels(LANE_NAMES[job.priority]).set(self._sizes[job.priority])
+        if self._wake is not None:
+            self._wake.set()
+
+    def _bucket(self, chat_id: ChatId, now: float) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 4096:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.idle(now)}
+            is_group = str(chat_id).startswith(("-", "@"))
+            rate = self.group_rate if is_group else self.private_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.chat_burst if is_group else 1.0, now)
+        return bucket
+
+    def _next_job(self, now: float):
+        """(job, None) للإرسال الآن، أو (None, ثوانٍ حتى أقرب job جاهز / None = انتظر حدثاً)."""
+        if not self.pending:
+            return None, None
+        global_wait = self._global.delay(now)
+        soonest = math.inf
+        for priority, lane in enumerate(self._lanes):
+            for chat_id, queue in lane.items():
+                if chat_id in self._busy:
+                    continue
+                wait = self._bucket(chat_id, now).delay(now)
+                if wait > 0:
+                    soonest = min(soonest, wait)
+                    continue
+                if global_wait > 0:
+                    return None, global_wait
+                job = queue.popleft()
+                if queue:
+                    lane.move_to_end(chat_id)
+                else:
+                    del lane[chat_id]
+                self._sizes[priority] -= 1
+                TG_QUEUE_DEPTH.labels(LANE_NAMES[priority]).set(self._sizes[priority])
+                return job, None
+        return None, (soonest if soonest < math.inf else None)
+
+    async def _run(self) -> None:
+        while True:
+            now = self._clock()
+            job, wait = self._next_job(now)
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._slots.acquire()
+            now = self._clock()
+            self._global.take(now)
+            self._bucket(job.chat_id, now).take(now)
+            self._busy.add(job.chat_id)
+            task = asyncio.ensure_future(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job: _Job) -> None:
+        lane = LANE_NAMES[job.priority]
+        TG_QUEUE_WAIT.labels(lane).observe(self._clock() - job.enqueued_at)
+        try:
+            result = await job.send()
+        except RetryAfter as e:
+            retry = e.retry_after
+            seconds = retry.total_seconds() if hasattr(retry, "total_seconds") else float(retry)
+            TG_RETRY_AFTER.inc()
+            log.warning("Telegram flood limit for %s — pausing chat %.1fs.", job.chat_id, seconds)
+            self._bucket(job.chat_id, self._clock()).pause(self._clock() + seconds)
+            self._enqueue(job, front=True)
+        except (BadRequest, Forbidden) as e:
+            # دائم (قبل NetworkError — BadRequest يرثه): لا إعادة ولا إيقاف للمحادثة
+            log.warning("Telegram rejected send to %s: %s", job.chat_id, e)
+            self._set_exception(job, e)
+        except NetworkError as e:
+            # TimedOut وأخطاء الشبكة — إعادة محدودة دون حجب بقية المحادثات
+            job.attempts += 1
+            if job.attempts < self.max_attempts:
+                self._bucket(job.chat_id, self._clock()).pause(self._clock() + self.network_retry_delay)
+                self._enqueue(job, front=True)
+            else:
+                log.error("Telegram send to %s failed after %d attempts: %s", job.chat_id, job.attempts, e)
+                self._set_exception(job, e)
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            log.warning("Telegram send to %s failed: %s", job.chat_id, e)
+            self._set_exception(job, e)
+        else:
+            TG_SENT.labels(lane).inc()
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            self._slots.release()
+            self._wake.set()
+
+    @staticmethod
+    def _set_exception(job: _Job, exc: BaseException) -> None:
+        if not job.future.done():
+            job.future.set_exception(exc)
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
@@ -0,0 +1,395 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/notify/outbox.py
+# Version: v1.0.2-TX-OUTBOX
+#
+# ✅ THE UPGRADE — Outbox معاملاتي لإشعارات Telegram:
+#
+# المشكلة:
+#   LifecycleService كان يُطلق create_task لكل رد (بلا حد) قبل commit:
+#   - الرد قد يُرسَل لحالة لم تُحفظ (rollback بعده)
+#   - موت العملية قبل الإرسال = إشعار ضائع بلا أثر
+#   - بطء Telegram يتراكم كمهام معلَّقة داخل عملية تقييم التيكات
+#
+# الحل:
+#   enqueue_notifications() يكتب صفوف notification_outbox في نفس session
+#   تغيير الحالة → commit واحد للحالة وإشعاراتها (أو لا شيء).
+#   OutboxRelay يُفرِّغ الجدول على دفعات بعيداً عن المسار الحرج:
+#   - claim: SELECT ... FOR UPDATE SKIP LOCKED + available_at = now + lease، ثم commit
+#     (لا transaction مفتوحة أثناء الشبكة؛ عدة relays/نسخ لا تأخذ نفس الصف)
+#   - الإرسال عبر TelegramDispatcher (حدود المعدل والأولوية كما هي)
+#   - نجاح → SENT؛ فشل مؤقت → backoff أُسّي؛ فشل دائم/استنفاد المحاولات → FAILED
+#   - موت الـ relay بعد الـ claim → ينتهي الـ lease ويُعاد الصف (at-least-once)
+#   - idempotency_key فريد: إعادة تنفيذ نفس تغيير الحالة لا تُضيف إشعاراً ثانياً
+#
+# ✅ THE FIX (v1.0.1): الموزِّع يُلغي future المهمة عند امتلاء الممر أو stop() —
+#   كان CancelledError يخرج من _deliver ويُنهي مهمة الـ relay بصمت. الآن إلغاء
+#   الإرسال = فشل مؤقت (يُعاد جدولته)؛ الإلغاء يُمرَّر فقط إن أُلغيت مهمة الـ relay نفسها.
+# ✅ THE FIX (v1.0.2): lease ثابت 60 ث أقصر من دفعة فيها > 20 رداً لنفس القناة
+#   (20 رسالة/دقيقة لكل مجموعة) → relay آخر يُطالب بنفس الصفوف ويُكرِّرها.
+#   الـ lease يُحسب من أكبر عدد صفوف لمحادثة واحدة ÷ معدل المحادثة، ويُجدَّد كل
+#   ثلث lease حتى تُسجَّل النتائج. التجديد مشروط بأن available_at ما زال lease هذا
+#   الـ relay (token تفاؤلي بلا عمود إضافي).
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import asyncio
+import hashlib
+import inspect
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from telegram.error import BadRequest, Forbidden
+
+from capitalguard.infrastructure.db.models import NotificationOutbox
+from capitalguard.infrastructure.db.uow import session_scope
+from capitalguard.infrastructure.monitoring.metrics import (
+    OUTBOX_DELIVERIES,
+    OUTBOX_DELIVERY_LAG,
+)
+
+log = logging.getLogger(__name__)
+
+KIND_REPLY = "REPLY"
+KIND_PRIVATE = "PRIVATE"
+
+STATUS_PENDING = "PENDING"
+STATUS_SENT = "SENT"
+STATUS_FAILED = "FAILED"
+
+
+class UnsupportedOutboxKind(Exception):
+    pass
+
+
+class DeliveryCancelled(Exception):
+    """الموزِّع أسقط الإرسال (ممر ممتلئ أو إيقاف) — يُعاد لاحقاً."""
+
+
+# أخطاء لن تنجح بالإعادة (البوت مطرود، المحادثة غير موجودة...)
+_PERMANENT_ERRORS = (BadRequest, Forbidden, UnsupportedOutboxKind)
+
+
+def outbox_key(*parts: Any) -> str:
+    """مفتاح idempotency ثابت من مكوِّنات الحدث (≤ 128 حرفاً)."""
+    raw = "|".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def enqueue_notifications(session: Session, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    يُضيف صفوف الإشعارات لنفس transaction المُستدعي (لا commit هنا).
+    المفاتيح المكررة تُتجاهل بصمت (ON CONFLICT DO NOTHING).
+    كل صف: idempotency_key, kind, chat_id, payload, و reply_to_message_id / recommendation_id اختيارياً.
+    """
+    now = datetime.now(timezone.utc)
+    values = [
+        {
+            "recommendation_id": None,
+            "reply_to_message_id": None,
+            **row,
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now,
+        }
+        for row in rows
+    ]
+    if not values:
+        return 0
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+    if dialect_insert is not None:
+        stmt = dialect_insert(NotificationOutbox).on_conflict_do_nothing(index_elements=["idempotency_key"])
+    else:
+        keys = [v["idempotency_key"] for v in values]
+        existing = set(session.execute(
+            select(NotificationOutbox.idempotency_key).where(NotificationOutbox.idempotency_key.in_(keys))
+        ).scalars())
+        values = [v for v in values if v["idempotency_key"] not in existing]
+        if not values:
+            return 0
+        stmt = insert(NotificationOutbox)
+    session.execute(stmt, values)
+    return len(values)
+
+
+@dataclass(frozen=True)
+class _Claimed:
+    id: int
+    kind: str
+    chat_id: int
+    reply_to_message_id: Optional[int]
+    payload: Dict[str, Any]
+    attempts: int
+    created_at: Optional[datetime]
+    lease_until: datetime
+
+
+def _relay_cancelled() -> bool:
+    """هل طُلب إلغاء المهمة الحالية نفسها (وليس future داخلي أُلغي)؟"""
+    task = asyncio.current_task()
+    return task is not None and task.cancelling() > 0
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite يُعيد datetime بلا tz
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class OutboxRelay:
+    """يُسلِّم صفوف notification_outbox عبر الـ notifier على دفعات مع إعادة المحاولة."""
+
+    def __init__(
+        self,
+        notifier: Any,
+        batch_size: int = 100,
+        poll_interval: float = 2.0,
+        max_attempts: int = 8,
+        claim_seconds: float = 60.0,
+        chat_rate_per_minute: float = 20.0,
+        retry_base_delay: float = 2.0,
+        retry_max_delay: float = 300.0,
+        retention_hours: float = 24.0,
+        session_factory=session_scope,
+    ):
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.claim_seconds = claim_seconds
+        self.chat_rate_per_minute = chat_rate_per_minute
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retention_hours = retention_hours
+        self.session_factory = session_factory
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+    # ─────────────────────────────────────────────────────────────
+    # Lifecycle
+    # ─────────────────────────────────────────────────────────────
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        loop = loop or asyncio.get_running_loop()
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self.run())
+        log.info("OutboxRelay started (batch=%d).", self.batch_size)
+
+    async def stop(self) -> None:
+        """يُوقف الحلقة؛ الصفوف غير المُسلَّمة تبقى PENDING للتشغيل التالي."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self) -> None:
+        """يُوقظ الـ relay فور commit — آمن من أي thread/loop."""
+        loop, event = self._loop, self._wakeup
+        if loop is None or event is None or loop.is_closed():
+            return
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is loop:
+            event.set()
+        else:
+            loop.call_soon_threadsafe(event.set)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                # دفعة ممتلئة → غالباً يوجد المزيد، لا انتظار
+                while await self.drain_once() >= self.batch_size:
+                    pass
+                await self._maybe_purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("OutboxRelay: drain failed.")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    # ─────────────────────────────────────────────────────────────
+    # Drain
+    # ─────────────────────────────────────────────────────────────
+
+    async def drain_once(self) -> int:
+        """دفعة واحدة: claim → إرسال متوازٍ → تسجيل النتائج. يُعيد عدد الصفوف المُطالَب بها."""
+        loop = asyncio.get_running_loop()
+        claimed = await loop.run_in_executor(None, self._claim_batch)
+        if not claimed:
+            return 0
+        renewer = asyncio.ensure_future(self._keep_claimed(claimed))
+        try:
+            outcomes = await asyncio.gather(*(self._deliver(job) for job in claimed))
+        finally:
+            renewer.cancel()
+            try:
+                await renewer
+            except asyncio.CancelledError:
+                pass
+        await loop.run_in_executor(None, self._record, list(zip(claimed, outcomes)))
+        return len(claimed)
+
+    def _lease_seconds(self, per_chat: Dict[int, int]) -> float:
+        # أبطأ محادثة في الدفعة تحدد زمن التسليم (حد المعدل لكل محادثة في الموزِّع)
+        busiest = max(per_chat.values(), default=0)
+        return self.claim_seconds + max(busiest - 1, 0) * 60.0 / max(self.chat_rate_per_minute, 1e-6)
+
+    async def _keep_claimed(self, claimed: List[_Claimed]) -> None:
+        """يُجدِّد lease الدفعة دورياً حتى تُسجَّل النتائج (التسليم قد يتجاوز الـ lease)."""
+        loop = asyncio.get_running_loop()
+        ids = [job.id for job in claimed]
+        lease_until = claimed[0].lease_until
+        while True:
+            await asyncio.sleep(self.claim_seconds / 3.0)
+            renewed_until = datetime.now(timezone.utc) + timedelta(seconds=self.claim_seconds)
+            if renewed_until <= lease_until:
+                continue
+            renewed = await loop.run_in_executor(None, self._renew, ids, lease_until, renewed_until)
+            if renewed < len(ids):
+                log.warning("OutboxRelay: lost the lease on %d of %d rows.", len(ids) - renewed, len(ids))
+            lease_until = renewed_until
+
+    def _renew(self, ids: List[int], lease_until: datetime, renewed_until: datetime) -> int:
+        with self.session_factory() as session:
+            result = session.execute(
+                update(NotificationOutbox)
+                .where(
+                    NotificationOutbox.id.in_(ids),
+                    NotificationOutbox.status == STATUS_PENDING,
+                    NotificationOutbox.available_at == lease_until,
+                )
+                .values(available_at=renewed_until)
+            )
+            return result.rowcount or 0
+
+    def _claim_batch(self) -> List[_Claimed]:
+        now = datetime.now(timezone.utc)
+        with self.session_factory() as session:
+            rows = session.execute(
+                select(NotificationOutbox)
+                .where(
+                    NotificationOutbox.status == STATUS_PENDING,
+                    NotificationOutbox.available_at <= now,
+                )
+                .order_by(NotificationOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            per_chat: Dict[int, int] = {}
+            for row in rows:
+                per_chat[row.chat_id] = per_chat.get(row.chat_id, 0) + 1
+            lease_until = now + timedelta(seconds=self._lease_seconds(per_chat))
+            claimed = []
+            for row in rows:
+                row.attempts = (row.attempts or 0) + 1
+                row.available_at = lease_until
+                claimed.append(_Claimed(
+                    row.id, row.kind, row.chat_id, row.reply_to_message_id,
+                    dict(row.payload or {}), row.attempts, _aware(row.created_at), lease_until,
+                ))
+            return claimed
+
+    async def _deliver(self, job: _Claimed) -> Optional[BaseException]:
+        text = job.payload.get("text", "")
+        try:
+            if job.kind == KIND_REPLY:
+                await self._call(self.notifier.post_notification_reply, job.chat_id, job.reply_to_message_id, text)
+            elif job.kind == KIND_PRIVATE:
+                await self._call(self.notifier.send_private_text, job.chat_id, text)
+            else:
+                return UnsupportedOutboxKind(job.kind)
+        except asyncio.CancelledError:
+            if _relay_cancelled():
+                raise
+            return DeliveryCancelled("dispatcher dropped the send")
+        except Exception as e:
+            return e
+        return None
+
+    @staticmethod
+    async def _call(fn, *args):
+        if inspect.iscoroutinefunction(fn):
+            # wait=True → فشل الإرسال يُرفع هنا بدل أن يُسجَّل فقط في الموزِّع
+            if "wait" in inspect.signature(fn).parameters:
+                return await fn(*args, wait=True)
+            return await fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.retry_base_delay * (2 ** max(attempts - 1, 0)), self.retry_max_delay)
+
+    def _record(self, results: List[Tuple[_Claimed, Optional[BaseException]]]) -> None:
+        now = datetime.now(timezone.utc)
+        sent_ids = []
+        with self.session_factory() as session:
+            for job, error in results:
+                if error is None:
+                    sent_ids.append(job.id)
+                    OUTBOX_DELIVERIES.labels(job.kind, "sent").inc()
+                    if job.created_at is not None:
+                        OUTBOX_DELIVERY_LAG.labels(job.kind).observe(max((now - job.created_at).total_seconds(), 0.0))
+                    continue
+                permanent = isinstance(error, _PERMANENT_ERRORS)
+                values: Dict[str, Any] = {"last_error": f"{type(error).__name__}: {error}"[:1000]}
+                if permanent or job.attempts >= self.max_attempts:
+                    values["status"] = STATUS_FAILED
+                    OUTBOX_DELIVERIES.labels(job.kind, "failed").inc()
+                    log.error("OutboxRelay: giving up on #%s after %d attempt(s): %s", job.id, job.attempts, error)
+                else:
+                    values["available_at"] = now + timedelta(seconds=self._retry_delay(job.attempts))
+                    OUTBOX_DELIVERIES.labels(job.kind, "retry").inc()
+                    log.warning("OutboxRelay: #%s attempt %d failed: %s", job.id, job.attempts, error)
+                session.execute(
+                    update(NotificationOutbox).where(NotificationOutbox.id == job.id).values(**values)
+                )
+            if sent_ids:
+                session.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id.in_(sent_ids))
+                    .values(status=STATUS_SENT, sent_at=now, last_error=None)
+                )
+
+    async def _maybe_purge(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop.time() - self._last_purge < 3600:
+            return
+        self._last_purge = loop.time()
+        await loop.run_in_executor(None, self._purge_sent)
+
+    def _purge_sent(self) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.retention_hours)
+        with self.session_factory() as session:
+            session.execute(
+                delete(NotificationOutbox).where(
+                    NotificationOutbox.status == STATUS_SENT,
+                    NotificationOutbox.sent_at < cutoff,
+                )
+            )
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
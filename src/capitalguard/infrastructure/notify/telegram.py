@@ -1,20 +1,37 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/notify/telegram.py ---
 # File: src/capitalguard/infrastructure/notify/telegram.py
-# Version: v11.1.0-HOTFIX (Async Text Build)
+# Version: v12.3.0-OUTBOX
 # ✅ THE FIX: Added 'await' before build_trade_card_text calls to support Live Price fetching.
+# ✅ THE UPGRADE (v12.0): كل استدعاءات Bot تمر عبر TelegramDispatcher (dispatcher.py):
+#    حدود معدل عامة ولكل محادثة + ممرات أولوية. ردود التوصيات والرسائل الخاصة
+#    والتعديلات تُوضع في الطابور ويعود المُستدعي فوراً (لا نوم RetryAfter داخل
+#    worker التنبيهات)؛ النشر ينتظر نتيجته فقط لأنه يحتاج message_id.
+# ✅ THE UPGRADE (v12.1): تعديلات البطاقات عبر CardEditCoalescer (card_edits.py):
+#    آخر render لكل (قناة، رسالة) بعد نافذة debounce، ولا تعديل إن لم يتغير النص.
+# ✅ THE UPGRADE (v12.2): post_to_channels — البطاقة تُبنى مرة واحدة (سعر حي واحد)
+#    وتُرسَل لكل القنوات عبر الموزِّع دفعة واحدة، بدل render لكل قناة.
+# ✅ THE UPGRADE (v12.3): wait=True في post_notification_reply / send_private_text
+#    → ينتظر نتيجة الموزِّع ويرفع الفشل (OutboxRelay يُعيد المحاولة لاحقاً).
 
 import logging
 import asyncio
-from typing import Optional, Union, Tuple, Dict, Any
+from typing import Optional, Union, Tuple, Dict, Any, Iterable
 from telegram import Bot, InlineKeyboardMarkup
 from telegram.constants import ParseMode
-from telegram.error import RetryAfter, TimedOut, NetworkError
+from telegram.error import TelegramError
 from telegram.request import HTTPXRequest
 
 from capitalguard.config import settings
 from capitalguard.domain.entities import Recommendation, RecommendationStatus
 from capitalguard.interfaces.telegram.ui_texts import build_trade_card_text
 from capitalguard.interfaces.telegram.keyboards import public_channel_keyboard
+from capitalguard.infrastructure.notify.card_edits import CardEditCoalescer
+from capitalguard.infrastructure.notify.dispatcher import (
+    PRIORITY_BULK,
+    PRIORITY_CRITICAL,
+    PRIORITY_NORMAL,
+    TelegramDispatcher,
+)
 
 log = logging.getLogger(__name__)
 
@@ -34,10 +51,23 @@ class TelegramNotifier:
         self.bot = Bot(token=self.bot_token, request=request)
         self._bot_username: Optional[str] = None
         self.ptb_app = None
+        self.dispatcher = TelegramDispatcher(
+            global_rate=settings.TELEGRAM_GLOBAL_RATE,
+            group_rate_per_minute=settings.TELEGRAM_GROUP_RATE_PER_MIN,
+            private_rate=settings.TELEGRAM_PRIVATE_RATE,
+            max_queue=settings.TELEGRAM_DISPATCH_MAX_QUEUE,
+            concurrency=settings.TELEGRAM_DISPATCH_CONCURRENCY,
+        )
+        self.card_edits = CardEditCoalescer(
+            self.dispatcher, self._edit_message,
+            debounce_seconds=settings.TELEGRAM_CARD_EDIT_DEBOUNCE_SECONDS,
+        )
 
         try:
             loop = asyncio.get_event_loop()
             if loop.is_running():
+                # الموزِّع على loop التطبيق الرئيسي — يبقى حياً بعد توقف loops أخرى
+                self.dispatcher.start(loop)
                 loop.create_task(self._init_bot_info())
             else:
                 loop.run_until_complete(self._init_bot_info())
@@ -63,46 +93,64 @@ class TelegramNotifier:
         if self.ptb_app and hasattr(self.ptb_app, 'bot'): return self.ptb_app.bot.username
         return "CapitalGuardBot"
 
-    async def _send_text(self, chat_id: Union[int, str], text: str, 
-                        keyboard: Optional[InlineKeyboardMarkup] = None,
-                        retries: int = 3) -> Optional[Tuple[int, int]]:
+    async def _send_message(self, chat_id: Union[int, str], text: str,
+                            keyboard: Optional[InlineKeyboardMarkup] = None,
+                            reply_to: Optional[int] = None) -> Tuple[int, int]:
+        """استدعاء Bot الخام — يُنفَّذ داخل الموزِّع (RetryAfter/الشبكة تُعالَج هناك)."""
+        msg = await self.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=keyboard,
+            reply_to_message_id=reply_to,
+            allow_sending_without_reply=True if reply_to else None,
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True
+        )
+        return (msg.chat.id, msg.message_id)
+
+    async def _edit_message(self, chat_id: Union[int, str], message_id: int,
+                            text: str, keyboard: Optional[InlineKeyboardMarkup] = None) -> bool:
         try:
-            msg = await self.bot.send_message(
+            await self.bot.edit_message_text(
                 chat_id=chat_id,
+                message_id=message_id,
                 text=text,
                 reply_markup=keyboard,
                 parse_mode=ParseMode.HTML,
                 disable_web_page_preview=True
             )
-            return (msg.chat.id, msg.message_id)
-        except RetryAfter as e:
-            log.warning(f"Flood limit. Sleeping {e.retry_after}s")
-            await asyncio.sleep(e.retry_after)
-            return await self._send_text(chat_id, text, keyboard, retries)
-        except (TimedOut, NetworkError) as e:
-            if retries > 0:
-                await asyncio.sleep(1)
-                return await self._send_text(chat_id, text, keyboard, retries - 1)
-            log.error(f"Network failed for {chat_id}: {e}")
+        except TelegramError as e:
+            if "message is not modified" in str(e).lower(): return True
+            raise
+        return True
+
+    async def _send_text(self, chat_id: Union[int, str], text: str,
+                        keyboard: Optional[InlineKeyboardMarkup] = None,
+                        priority: int = PRIORITY_NORMAL,
+                        wait: bool = True) -> Optional[Tuple[int, int]]:
+        future = self.dispatcher.submit(
+            chat_id, lambda: self._send_message(chat_id, text, keyboard), priority
+        )
+        if not wait:
             return None
+        try:
+            return await asyncio.wrap_future(future)
         except Exception as e:
             log.error(f"Send failed for {chat_id}: {e}")
             return None
 
-    async def _edit_text(self, chat_id: Union[int, str], message_id: int, 
-                        text: str, keyboard: Optional[InlineKeyboardMarkup] = None) -> bool:
-        try:
-            await self.bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=text,
-                reply_markup=keyboard,
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=True
-            )
+    async def _edit_text(self, chat_id: Union[int, str], message_id: int,
+                        text: str, keyboard: Optional[InlineKeyboardMarkup] = None,
+                        wait: bool = False) -> bool:
+        """wait=False: True تعني "في الطابور" — الفشل يُسجَّل في الموزِّع."""
+        future = self.dispatcher.submit(
+            chat_id, lambda: self._edit_message(chat_id, message_id, text, keyboard), PRIORITY_BULK
+        )
+        if not wait:
             return True
+        try:
+            return await asyncio.wrap_future(future)
         except Exception as e:
-            if "message is not modified" in str(e).lower(): return True
             log.warning(f"Edit failed {chat_id}/{message_id}: {e}")
             return False
 
@@ -110,10 +158,14 @@ class TelegramNotifier:
 
     async def send_admin_alert(self, text: str):
         if settings.TELEGRAM_ADMIN_CHAT_ID:
-            asyncio.create_task(self._send_text(settings.TELEGRAM_ADMIN_CHAT_ID, f"🚨 <b>SYSTEM ALERT</b>\n{text}"))
+            await self._send_text(settings.TELEGRAM_ADMIN_CHAT_ID, f"🚨 <b>SYSTEM ALERT</b>\n{text}", wait=False)
 
-    async def send_private_text(self, chat_id: int, text: str):
-        await self._send_text(chat_id, text)
+    async def send_private_text(self, chat_id: int, text: str, wait: bool = False):
+        future = self.dispatcher.submit(
+            chat_id, lambda: self._send_message(chat_id, text), PRIORITY_CRITICAL
+        )
+        if wait:
+            return await asyncio.wrap_future(future)
 
     async def post_to_channel(self, channel_id: Union[int, str], rec: Recommendation, 
                             keyboard: Optional[InlineKeyboardMarkup] = None) -> Optional[Tuple[int, int]]:
@@ -124,30 +176,42 @@ class TelegramNotifier:
             keyboard = public_channel_keyboard(rec.id, self.bot_username)
         return await self._send_text(channel_id, text, keyboard)
 
+    async def post_to_channels(self, channel_ids: Iterable[Union[int, str]], rec: Recommendation,
+                               keyboard: Optional[InlineKeyboardMarkup] = None
+                               ) -> Dict[Union[int, str], Optional[Tuple[int, int]]]:
+        """نشر نفس البطاقة لعدة قنوات: render واحد، وكل الإرسالات في طابور الموزِّع معاً."""
+        channel_ids = list(dict.fromkeys(channel_ids))
+        if not channel_ids:
+            return {}
+        text = await build_trade_card_text(rec, self.bot_username, is_initial_publish=True)
+        if keyboard is None:
+            keyboard = public_channel_keyboard(rec.id, self.bot_username)
+        results = await asyncio.gather(*(self._send_text(ch, text, keyboard) for ch in channel_ids))
+        return dict(zip(channel_ids, results))
+
     async def edit_recommendation_card_by_ids(self, channel_id: Union[int, str], 
                                             message_id: int, 
                                             rec: Recommendation, 
                                             bot_username: str = None) -> bool:
         uname = bot_username or self.bot_username
-        
-        # ✅ CRITICAL FIX: Added 'await' here
-        text = await build_trade_card_text(rec, uname, is_initial_publish=False)
-        
-        keyboard = None
-        if rec.status != RecommendationStatus.CLOSED:
-            keyboard = public_channel_keyboard(rec.id, uname)
-            
-        return await self._edit_text(channel_id, message_id, text, keyboard)
 
-    async def post_notification_reply(self, chat_id: int, message_id: int, text: str):
-        try:
-            await self.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                reply_to_message_id=message_id,
-                parse_mode=ParseMode.HTML,
-                allow_sending_without_reply=True
-            )
-        except Exception as e:
-            log.error(f"Reply failed {chat_id}/{message_id}: {e}")
+        async def render():
+            # ✅ CRITICAL FIX: Added 'await' here
+            text = await build_trade_card_text(rec, uname, is_initial_publish=False)
+            keyboard = None
+            if rec.status != RecommendationStatus.CLOSED:
+                keyboard = public_channel_keyboard(rec.id, uname)
+            return text, keyboard
+
+        # render واحد لآخر حالة بعد نافذة الـ debounce — True = مُجدوَل
+        self.card_edits.schedule(channel_id, message_id, render)
+        return True
+
+    async def post_notification_reply(self, chat_id: int, message_id: int, text: str, wait: bool = False):
+        # ردود الأحداث (SL/TP/إغلاق) قبل تعديلات البطاقات
+        future = self.dispatcher.submit(
+            chat_id, lambda: self._send_message(chat_id, text, reply_to=message_id), PRIORITY_CRITICAL
+        )
+        if wait:
+            return await asyncio.wrap_future(future)
 # --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
\ No newline at end of file
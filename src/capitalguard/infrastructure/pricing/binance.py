@@ -1,6 +1,8 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/pricing/binance.py ---
 # File: src/capitalguard/infrastructure/pricing/binance.py
-# Version: v2.1.0-GLOBAL-CLIENT
+# Version: v2.2.0-KLINES
+#
+# ✅ THE UPGRADE (v2.2): get_klines — شموع تاريخية لملء فجوات انقطاع WS.
 #
 # ✅ THE FIX (P2 — Global HTTP Client):
 #   كان httpx.AsyncClient() يُنشأ ويُغلق في كل طلب:
@@ -18,7 +20,7 @@
 from __future__ import annotations
 
 import logging
-from typing import Optional, Dict, ClassVar
+from typing import Optional, Dict, ClassVar, List, Tuple
 
 import httpx
 
@@ -26,6 +28,8 @@ log = logging.getLogger(__name__)
 
 BINANCE_SPOT_TICKER = "https://api.binance.com/api/v3/ticker/price"
 BINANCE_FUT_TICKER  = "https://fapi.binance.com/fapi/v1/ticker/price"
+BINANCE_SPOT_KLINES = "https://api.binance.com/api/v3/klines"
+BINANCE_FUT_KLINES  = "https://fapi.binance.com/fapi/v1/klines"
 
 BINANCE_BLOCKED_CODES = {418, 429, 451, 403}  # 418=IP Ban, 429=Rate Limit, 451=Geo-Block, 403=Forbidden
 
@@ -125,4 +129,44 @@ class BinancePricing:
         except Exception as e:
             log.error("Binance REST bulk unexpected error: %s", e, exc_info=True)
             return price_map
+    @classmethod
+    async def get_klines(
+        cls,
+        symbol: str,
+        interval: str,
+        start_ms: int,
+        end_ms: int,
+        spot: bool = True,
+        limit: int = 1000,
+        timeout: float = 6.0,
+    ) -> List[Tuple[int, float, float, float]]:
+        """✅ ASYNC: شموع [start_ms, end_ms] → [(open_time_ms, high, low, close)]."""
+        url = BINANCE_SPOT_KLINES if spot else BINANCE_FUT_KLINES
+        params = {
+            "symbol": symbol.upper(), "interval": interval,
+            "startTime": int(start_ms), "endTime": int(end_ms), "limit": limit,
+        }
+        try:
+            client = cls._get_client()
+            r = await client.get(url, params=params, timeout=timeout)
+            if r.status_code in BINANCE_BLOCKED_CODES:
+                log.warning("Binance klines blocked for %s (HTTP %s).", symbol, r.status_code)
+                return []
+            if not r.is_success:
+                log.warning("Binance klines fetch failed for %s: %s", symbol, r.text[:200])
+                return []
+            return [
+                (int(row[0]), float(row[2]), float(row[3]), float(row[4]))
+                for row in r.json()
+            ]
+        except httpx.TimeoutException:
+            log.warning("Binance klines timeout for %s", symbol)
+            return []
+        except httpx.RequestError as e:
+            log.error("Binance klines request error for %s: %s", symbol, e)
+            cls._client = None  # أعد الإنشاء في الطلب التالي
+            return []
+        except Exception as e:
+            log.warning("Binance klines unexpected error for %s: %s", symbol, e)
+            return []
 # --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/pricing/binance.py ---
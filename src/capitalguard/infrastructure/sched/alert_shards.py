@@ -0,0 +1,155 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/sched/alert_shards.py
+# Version: v1.0.2-SYMBOL-SHARDS
+#
+# ✅ THE UPGRADE — تقسيم تقييم التنبيهات على عمليات مستقلة:
+#
+# المشكلة:
+#   AlertService + PriceStreamer يعملان داخل عملية uvicorn واحدة
+#   → GIL واحد لكل الرموز، والـ API والبوت يتنافسان معهما على نفس الـ CPU.
+#
+# الحل:
+#   ALERT_SHARD_COUNT عامل alert_worker (برنامج supervisord مستقل)، كل عامل
+#   يملك shard_of(symbol) == ALERT_SHARD_INDEX فقط: فهرس triggers خاص،
+#   BinanceWSClient خاص بهذه الرموز، و StrategyEngine لتوصياتها.
+#   العملية الرئيسية (API/البوت) لا تُقيِّم — تنشر تغييرات الفهرس على
+#   "cg:trigger_update"، وكل عامل يطبِّق ما يملكه بعد إعادة القراءة من DB.
+#
+# أمان إعادة التوزيع:
+#   - crc32 ثابت بين العمليات والإصدارات (لا hash() العشوائي لكل عملية)
+#   - آثار lifecycle تبقى على DB: get_for_update + فحص الحالة/الأحداث
+#     → عاملان يملكان نفس الرمز لحظياً (restart متدرج) لا يُكرِّران إغلاقاً أو TP
+#   - حالة StrategyEngine في hash مشترك: العامل يُفلت حالات غيره دون حذفها
+#
+# ✅ THE FIX (v1.0.1): publish_trigger_event كان يبني client (و pool + اتصال TCP)
+#   لكل تغيير ثم يُغلقه. الآن client واحد لكل event loop يُعاد استخدامه
+#   (اتصالات redis.asyncio مرتبطة بالـ loop الذي أنشأها).
+#
+# ✅ THE FIX (v1.0.2): pub/sub بلا إعادة إرسال — ما نُشر بين خطأ المستمع وإعادة
+#   الاشتراك (أو قبل أول اشتراك) كان يضيع حتى _run_index_sync (10 دقائق).
+#   listen_trigger_events(on_subscribed=...) يُستدعى بعد كل اشتراك ناجح:
+#   إعادة بناء الفهرس من DB تلتقط كل ما فات، والأحداث اللاحقة مُخزَّنة في الاشتراك.
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import asyncio
+import json
+import logging
+import os
+import weakref
+import zlib
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+# قناة Redis لتغييرات الفهرس (العملية الرئيسية → العمال)
+TRIGGER_UPDATE_CHANNEL = "cg:trigger_update"
+
+ACTION_UPSERT = "UPSERT"
+ACTION_REMOVE = "REMOVE"
+
+
+def shard_of(symbol: str, count: int) -> int:
+    """رقم الـ shard المالك للرمز — ثابت لنفس (symbol, count) في كل العمليات."""
+    if count <= 1:
+        return 0
+    return zlib.crc32((symbol or "").upper().encode("utf-8")) % count
+
+
+@dataclass(frozen=True)
+class SymbolShard:
+    index: int
+    count: int
+
+    def __post_init__(self) -> None:
+        if self.count < 1 or not 0 <= self.index < self.count:
+            raise ValueError(f"invalid alert shard {self.index}/{self.count}")
+
+    def owns(self, symbol: str) -> bool:
+        return shard_of(symbol, self.count) == self.index
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+# client نشر مشترك لكل loop — لا اتصال جديد لكل تغيير trigger
+_publish_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+
+def _publish_client(url: str):
+    loop = asyncio.get_running_loop()
+    client = _publish_clients.get(loop)
+    if client is None:
+        import redis.asyncio as aioredis
+        client = aioredis.from_url(url, decode_responses=True)
+        _publish_clients[loop] = client
+    return client
+
+
+async def publish_trigger_event(
+    action: str, item_type: str, item_id: int, asset: Optional[str] = None
+) -> None:
+    """
+    يُبلغ العمال بتغيّر trigger عنصر واحد — fire-and-forget.
+    العامل يُعيد قراءة العنصر من DB؛ ما يضيع أثناء انقطاع المستمع تُعوِّضه
+    إعادة المزامنة بعد إعادة الاشتراك (on_subscribed)، والباقي _run_index_sync.
+    """
+    try:
+        url = os.getenv("REDIS_URL")
+        if not url:
+            return
+        client = _publish_client(url)
+        message = json.dumps({
+            "action": action,
+            "item_type": item_type,
+            "item_id": item_id,
+            "asset": (asset or "").upper(),
+        })
+        await client.publish(TRIGGER_UPDATE_CHANNEL, message)
+    except Exception:
+        log.debug("publish_trigger_event failed for %s:%s", item_type, item_id, exc_info=True)
+
+
+async def listen_trigger_events(
+    handler: Callable[[Dict[str, Any]], Awaitable[None]],
+    retry_seconds: float = 30.0,
+    on_subscribed: Optional[Callable[[], Awaitable[None]]] = None,
+) -> None:
+    """
+    يستهلك "cg:trigger_update" حتى الإلغاء ويُمرِّر كل حدث صالح لـ handler.
+    on_subscribed: يُستدعى بعد كل (إعادة) اشتراك وقبل أول رسالة — لإعادة المزامنة
+    من DB، فما نُشر قبل الاشتراك لا يضيع.
+    """
+    while True:
+        try:
+            url = os.getenv("REDIS_URL")
+            if not url:
+                log.info("alert shards: no REDIS_URL — relying on periodic index sync.")
+                return
+            import redis.asyncio as aioredis
+            client = aioredis.from_url(url, decode_responses=True)
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(TRIGGER_UPDATE_CHANNEL)
+                log.info("alert shards: subscribed to '%s'.", TRIGGER_UPDATE_CHANNEL)
+                if on_subscribed is not None:
+                    try:
+                        await on_subscribed()
+                    except Exception:
+                        log.exception("alert shards: resync after subscribe failed.")
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        event = json.loads(message.get("data") or "{}")
+                    except (json.JSONDecodeError, TypeError):
+                        continue
+                    if event.get("item_type") and event.get("item_id") is not None:
+                        await handler(event)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            log.error("alert shards: listener error: %s — retrying in %.0fs.", e, retry_seconds)
+            await asyncio.sleep(retry_seconds)
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
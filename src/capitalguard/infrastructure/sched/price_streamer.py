@@ -1,6 +1,11 @@
 #--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/sched/price_streamer.py ---
 # File: src/capitalguard/infrastructure/sched/price_streamer.py
-# Version: v8.0.0-PUBSUB
+# Version: v8.1.0-SHARDED
+#
+# ✅ THE UPGRADE (v8.1) — symbol_filter لعمال alert المُقسَّمين:
+#   عامل alert_worker يمرِّر SymbolShard.owns → Initial Load و ADD عبر Pub/Sub
+#   يشتركان فقط بالرموز التي يملكها العامل (الـ Sweep يقرأ فهرساً مُرشَّحاً أصلاً).
+#   بدون filter → نفس السلوك السابق (كل الرموز في عملية واحدة).
 #
 # ✅ THE UPGRADE (P1 — Redis Pub/Sub بدل Polling):
 #
@@ -41,8 +46,9 @@ import asyncio
 import json
 import logging
 import os
-from typing import Set, Dict, Optional
+from typing import Callable, Set, Dict, Optional
 
+from capitalguard.config import settings
 from capitalguard.infrastructure.market.ws_client import BinanceWSClient
 from capitalguard.infrastructure.db.uow import session_scope
 from capitalguard.infrastructure.db.repository import RecommendationRepository
@@ -73,10 +79,21 @@ class PriceStreamer:
       3. Safety Sweep: كل 5 دقائق من الذاكرة (بدون DB)
     """
 
-    def __init__(self, price_queue: asyncio.Queue, repo: RecommendationRepository):
+    def __init__(
+        self,
+        price_queue: asyncio.Queue,
+        repo: RecommendationRepository,
+        symbol_filter: Optional[Callable[[str], bool]] = None,
+    ):
         self.price_queue = price_queue
         self.repo = repo
-        self.client = BinanceWSClient()
+        # None → كل الرموز؛ وإلا الرموز التي يملكها هذا العامل فقط
+        self.symbol_filter = symbol_filter
+        self.client = BinanceWSClient(
+            max_streams_per_conn=settings.BINANCE_WS_MAX_STREAMS_PER_CONN,
+            subscribe_rate=settings.BINANCE_WS_SUBSCRIBE_RATE,
+            subscribe_batch_size=settings.BINANCE_WS_SUBSCRIBE_BATCH,
+        )
 
         # مجموعة الرموز المُشترَك بها حالياً
         self._subscribed_symbols: Set[str] = set()
@@ -207,6 +224,9 @@ class PriceStreamer:
                     if t.asset:
                         symbols.add(t.asset.upper())
 
+            if self.symbol_filter is not None:
+                symbols = {s for s in symbols if self.symbol_filter(s)}
+
             if symbols:
                 await self.client.update_subscriptions(list(symbols))
                 self._subscribed_symbols = symbols
@@ -275,6 +295,8 @@ class PriceStreamer:
 
                         if not symbol:
                             continue
+                        if self.symbol_filter is not None and not self.symbol_filter(symbol):
+                            continue
 
                         if action == "ADD" and symbol not in self._subscribed_symbols:
                             await self.client.update_subscriptions(
@@ -372,7 +394,9 @@ class PriceStreamer:
             "close":  close,
             "ts":     int(asyncio.get_event_loop().time()),
         })
-        await core_cache.set(f"price:FUTURES:{symbol}", close, ttl=60)
-        await core_cache.set(f"price:SPOT:{symbol}",    close, ttl=60)
+        # مفتاحان في buffer واحد للـ write-behind (لا await على Redis)
+        await core_cache.set_many(
+            {f"price:FUTURES:{symbol}": close, f"price:SPOT:{symbol}": close}, ttl=60
+        )
 
 #--- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/infrastructure/sched/price_streamer.py ---
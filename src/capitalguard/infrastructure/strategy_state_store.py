@@ -0,0 +1,76 @@
+# --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
+# File: src/capitalguard/infrastructure/strategy_state_store.py
+# Version: v1.0.0-STRATEGY-CHECKPOINT
+#
+# ✅ THE UPGRADE — تخزين حالة StrategyEngine في Redis hash:
+#
+# المشكلة:
+#   boot كان يمرِّر storage=None → highest/lowest للـ trailing stops
+#   تعود لسعر الدخول مع كل deploy.
+#
+# الحل:
+#   hash واحد "<persistence_key>:items" — field لكل توصية (rec_id → JSON).
+#   save_items يكتب الـ dirty فقط + HDEL للمغلقة في pipeline واحد.
+#   client متزامن (redis-py) — المحرك يستدعيه عبر asyncio.to_thread،
+#   فلا ارتباط بأي event loop (نفس مشكلة core_engine مع redis.asyncio).
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import logging
+import os
+from typing import Dict, Iterable, Optional
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+log = logging.getLogger(__name__)
+
+
+class RedisStrategyStateStore:
+    """Storage لـ StrategyEngine: get/set/delete (blob قديم) + load_items/save_items (hash)."""
+
+    def __init__(self, redis_url: str):
+        self._client = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    # ── Legacy blob API (persist_state / load_persisted_state) ────────────
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        self._client.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    # ── Batched hash API ──────────────────────────────────────────────────
+    def load_items(self, key: str) -> Dict[str, str]:
+        return self._client.hgetall(key) or {}
+
+    def save_items(self, key: str, items: Dict[str, str], removed: Iterable[str]) -> None:
+        removed = list(removed)
+        if not items and not removed:
+            return
+        pipe = self._client.pipeline(transaction=False)
+        if items:
+            pipe.hset(key, mapping=items)
+        if removed:
+            pipe.hdel(key, *removed)
+        pipe.execute()
+
+
+def build_strategy_state_store(redis_url: Optional[str] = None) -> Optional[RedisStrategyStateStore]:
+    """Redis store إن توفر REDIS_URL، وإلا None (المحرك يعمل بدون persistence)."""
+    url = redis_url or os.getenv("REDIS_URL")
+    if not url or not REDIS_AVAILABLE:
+        log.info("StrategyEngine: no REDIS_URL — state checkpointing disabled.")
+        return None
+    try:
+        return RedisStrategyStateStore(url)
+    except Exception as e:
+        log.warning("StrategyEngine: state store init failed: %s", e)
+        return None
+
+# --- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE ---
@@ -1,7 +1,13 @@
 #--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/interfaces/api/main.py ---
 # File: src/capitalguard/interfaces/api/main.py
-# Version: v27.2 - Webapp Portfolio Shortcut & Auto-Backup
+# Version: v27.5 - Notification Outbox Relay
 # ✅ THE FIX: Added Auto-Backup loop to FastAPI startup event for production.
+# ✅ THE UPGRADE (v27.3): ALERT_SHARD_COUNT > 0 → التقييم في عمليات alert_worker؛
+#    الـ API لا يبني فهرساً ولا يفتح WS — AlertService هنا يُمرِّر التغييرات فقط.
+# ✅ THE UPGRADE (v27.4): ALERT_LEADER_ELECTION → نسخة واحدة فقط (حاملة lease Redis)
+#    تُشغِّل AlertService/PriceStreamer؛ البقية تخدم HTTP وتستلم عند سقوط القائد.
+# ✅ THE UPGRADE (v27.5): OutboxRelay يعمل في كل نسخة (SKIP LOCKED يمنع التكرار)
+#    ويُسلِّم إشعارات notification_outbox بعد commit.
 
 import logging
 import asyncio
@@ -30,6 +36,7 @@ from capitalguard.application.services.market_data_service import MarketDataServ
 
 # ✅ NEW: Import auto_backup_loop for background execution in production
 from capitalguard.infrastructure.db.backup_service import auto_backup_loop
+from capitalguard.infrastructure.sched.leader_election import LeaderElector
 
 log = logging.getLogger(__name__)
 
@@ -118,6 +125,7 @@ class RedisPersistence(BasePersistence):
 app = FastAPI(title="CapitalGuard Pro API", version="27.2-webapp") # ✅ Version Bump
 app.state.ptb_app = None
 app.state.services = None
+app.state.alert_elector = None
 
 # ✅ WEBAPP SUPPORT: Mount static files for WebApp
 app.mount("/static", StaticFiles(directory="src/capitalguard/interfaces/api/static"), name="static")
@@ -166,6 +174,10 @@ async def on_startup():
     register_all_handlers(ptb_app)
     ptb_app.add_error_handler(error_handler)
 
+    outbox_relay = app.state.services.get("outbox_relay")
+    if outbox_relay:
+        outbox_relay.start()
+
     # --- ✅ GEO-BLOCK FIX: Populate symbol cache *before* starting alert service ---
     market_data_service: MarketDataService = app.state.services.get("market_data_service")
     if market_data_service:
@@ -182,7 +194,22 @@ async def on_startup():
     # --- End of Fix ---
 
     alert_service: AlertService = app.state.services.get("alert_service")
-    if alert_service:
+    if alert_service and settings.ALERT_SHARD_COUNT > 0:
+        log.info("AlertService: evaluation delegated to %d alert_worker shards.", settings.ALERT_SHARD_COUNT)
+    elif alert_service and settings.ALERT_LEADER_ELECTION:
+        # التقييم يبدأ فقط عند الفوز بالـ lease — التابع يخدم HTTP والبوت
+        app.state.alert_elector = LeaderElector(
+            "alert-service",
+            on_elected=alert_service.start_evaluating,
+            on_revoked=alert_service.stop_evaluating,
+            redis_url=redis_url,
+            lease_seconds=settings.ALERT_LEADER_LEASE_SECONDS,
+        )
+        app.state.alert_elector.start()
+        log.info("AlertService: competing for alert leadership.")
+    elif alert_service:
+        # حالة StrategyEngine المحفوظة أولاً → build يحتفظ بها للتوصيات الموجودة
+        await alert_service.restore_strategy_state()
         await alert_service.build_triggers_index()
         alert_service.start()
         log.info("AlertService background tasks started.")
@@ -210,9 +237,22 @@ async def on_startup():
 async def on_shutdown():
     log.info("🔌 Application shutdown sequence initiated...")
     alert_service: AlertService = app.state.services.get("alert_service")
-    if alert_service:
+    if app.state.alert_elector:
+        # يتنحى ويحذف الـ lease → نسخة أخرى تستلم خلال ثوانٍ
+        await app.state.alert_elector.stop()
+        log.info("Alert leadership released.")
+    elif alert_service:
         alert_service.stop()
         log.info("AlertService stopped.")
+    outbox_relay = (app.state.services or {}).get("outbox_relay")
+    if outbox_relay:
+        # ما لم يُسلَّم يبقى PENDING في الجدول — تسلِّمه النسخة التالية
+        await outbox_relay.stop()
+    notifier = (app.state.services or {}).get("notifier")
+    if getattr(notifier, "dispatcher", None) is not None:
+        # تعديلات البطاقات المعلَّقة ثم ما تبقى في طابور Telegram (حتى 5 ث)
+        await notifier.card_edits.flush_all()
+        await notifier.dispatcher.stop()
     if app.state.ptb_app:
         await app.state.ptb_app.stop()
         await app.state.ptb_app.shutdown()
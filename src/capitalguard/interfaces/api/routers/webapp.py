@@ -1,7 +1,9 @@
 #--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/interfaces/api/routers/webapp.py ---
 # File: src/capitalguard/interfaces/api/routers/webapp.py
-# Version: v2.4.0-ANALYTICS-FIX
+# Version: v2.6.0-BATCH-PRICES
 # ✅ THE FIX: Restored and implemented 'get_signal_details' endpoint.
+# ✅ THE UPGRADE (v2.5): get_signal_details يقرأ عبر async_session_scope — لا حجب للـ loop.
+# ✅ THE UPGRADE (v2.6): /portfolio يجلب كل الأسعار بـ get_cached_prices (MGET واحد).
 # 🎯 IMPACT: Fixes the "Open Analytics" button error in Telegram.
 
 import logging
@@ -18,7 +20,7 @@ from fastapi import APIRouter, Request, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 
 from capitalguard.config import settings
-from capitalguard.infrastructure.db.uow import session_scope
+from capitalguard.infrastructure.db.uow import session_scope, async_session_scope
 from capitalguard.infrastructure.db.repository import UserRepository, ChannelRepository, RecommendationRepository
 from capitalguard.interfaces.telegram.parsers import parse_targets_list
 from capitalguard.application.services.price_service import PriceService
@@ -130,9 +132,8 @@ async def get_user_portfolio(initData: str, request: Request):
         with session_scope() as session:
             items = trade_service.get_open_positions_for_user(session, str(telegram_id))
             assets = set((getattr(i.asset, 'value'), getattr(i, 'market', 'Futures')) for i in items)
-            tasks = [price_service.get_cached_price(a, m) for a, m in assets]
-            prices = await asyncio.gather(*tasks, return_exceptions=True)
-            price_map = {a: p for (a, _), p in zip(assets, prices) if isinstance(p, (int, float))}
+            prices = await price_service.get_cached_prices(assets)
+            price_map = {a: p for (a, _), p in prices.items() if isinstance(p, (int, float))}
 
             out_items = []
             for i in items:
@@ -219,8 +220,8 @@ async def get_signal_details(rec_id: int, request: Request):
         lifecycle = request.app.state.services.get("lifecycle_service")
         price_svc = request.app.state.services.get("price_service")
 
-        with session_scope() as session:
-            rec_orm = lifecycle.repo.get(session, rec_id)
+        async with async_session_scope() as session:
+            rec_orm = await lifecycle.repo.get_async(session, rec_id)
             if not rec_orm:
                 return {"ok": False, "error": "Signal not found"}
 
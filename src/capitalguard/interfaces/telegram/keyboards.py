@@ -6,7 +6,6 @@
 
 import math
 import logging
-import asyncio
 from decimal import Decimal
 from typing import List, Iterable, Set, Optional, Any, Dict, Tuple, Union
 from enum import Enum
@@ -261,9 +260,8 @@ async def build_open_recs_keyboard(
             for item in paginated_items if _get_attr(item, 'asset')
         }
         
-        price_tasks = [price_service.get_cached_price(asset, market) for asset, market in assets_to_fetch]
-        price_results = await asyncio.gather(*price_tasks, return_exceptions=True)
-        prices_map = {asset_market[0]: price for asset_market, price in zip(assets_to_fetch, price_results) if not isinstance(price, Exception) and price is not None}
+        price_results = await price_service.get_cached_prices(assets_to_fetch)
+        prices_map = {asset_market[0]: price for asset_market, price in price_results.items() if price is not None}
 
         # --- 4. Build keyboard rows (Design 2 & 4) ---
         keyboard_rows = []
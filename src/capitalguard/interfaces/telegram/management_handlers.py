@@ -1,6 +1,9 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/interfaces/telegram/management_handlers.py ---
 # File: src/capitalguard/interfaces/telegram/management_handlers.py
-# Version: v106.3.1-PRODUCTION-MERGED
+# Version: v106.4.0-PRODUCTION-MERGED
+# ✅ THE UPGRADE (v106.4): زر Refresh في القنوات (أكثر callback تكراراً) يعمل على
+#    async_uow_transaction + repo.get_async — لا يحجب الـ loop في I/O الـ DB.
+#    تحديث لوحة الإدارة (private) يبقى على uow_transaction (خدمات متزامنة).
 # ✅ MERGED FIXES:
 #    1. Tuple Crash Fix: Changed 'kb_rows = ()' to 'kb_rows = []' to support append.
 #    2. Channel Silence: Restricted text input to PRIVATE chats only.
@@ -27,7 +30,7 @@ from telegram.ext import (
 )
 
 # --- INFRASTRUCTURE ---
-from capitalguard.infrastructure.db.uow import uow_transaction
+from capitalguard.infrastructure.db.uow import uow_transaction, async_uow_transaction
 from capitalguard.infrastructure.core_engine import core_cache
 from capitalguard.interfaces.telegram.schemas import TypedCallback, ManagementAction, ManagementNamespace
 from capitalguard.interfaces.telegram.session import SessionContext
@@ -41,7 +44,7 @@ from capitalguard.interfaces.telegram.keyboards import (
     public_channel_keyboard
 )
 from capitalguard.interfaces.telegram.ui_texts import build_trade_card_text, PortfolioViews
-from capitalguard.interfaces.telegram.auth import require_active_user, get_db_user
+from capitalguard.interfaces.telegram.auth import require_active_user
 from capitalguard.infrastructure.db.models import User
 from capitalguard.domain.entities import UserType as UserTypeEntity
 from capitalguard.application.services.trade_service import TradeService
@@ -331,15 +334,31 @@ class PortfolioController:
 
         # 2. Public Channel (View-Only Refresh)
         #    Does NOT check for user authentication.
+        async def load(repo):
+            return repo.get(db_session, rec_id)
+
+        await PortfolioController._refresh_public_card(update, context, load)
+
+    @staticmethod
+    async def handle_public_refresh_async(update: Update, context: ContextTypes.DEFAULT_TYPE, db_session, callback: TypedCallback):
+        """نفس تحديث البطاقة العامة لكن بقراءة AsyncSession (المسار الساخن في القنوات)."""
+        rec_id = callback.get_int(0)
+        await PortfolioController._refresh_public_card(update, context, lambda repo: repo.get_async(db_session, rec_id))
+
+    @staticmethod
+    async def _refresh_public_card(update: Update, context: ContextTypes.DEFAULT_TYPE, load_rec):
+        """load_rec(repo) → awaitable للتوصية؛ أي خطأ (قراءة أو عرض) يُجاب بـ "Update Failed" فقط."""
+        query = update.callback_query
         try:
             lifecycle = get_service(context, "lifecycle_service", LifecycleService)
             price_svc = get_service(context, "price_service", PriceService)
             
             # Get Recommendation (Read-Only)
-            rec_orm = lifecycle.repo.get(db_session, rec_id)
+            rec_orm = await load_rec(lifecycle.repo)
             if not rec_orm:
                 await query.answer("⚠️ Signal Not Found")
                 return
+            rec_id = rec_orm.id
             
             rec_entity = lifecycle.repo._to_entity(rec_orm)
             
@@ -399,24 +418,17 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, db_ses
     await ActionRouter.dispatch(update, context, db_session, db_user)
 
 # --- ✅ NEW: PUBLIC REFRESH HANDLER WITH SUBSCRIPTION GATE ---
-@uow_transaction
+@async_uow_transaction
 async def on_public_refresh_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, db_session, db_user=None, **kwargs):
     """
     Special handler for the REFRESH action.
     Logic:
     1. If user is Registered -> Refresh the price inside the channel.
     2. If user is Guest -> Redirect them to the bot to subscribe (Growth Hack).
+    db_session هنا AsyncSession؛ db_user يُقرأ بـ find_by_telegram_id_async
+    (غير المسجَّل = None → توجيه للبوت، والتسجيل يتم عند /start).
     """
     query = update.callback_query
-    
-    # محاولة جلب المستخدم للتحقق من حالته
-    if not db_user:
-        try:
-            # نستخدم دالة المساعد الموجودة لجلب المستخدم أو التحقق منه
-            # ملاحظة: في القنوات العامة update.effective_user قد يكون موجوداً للشخص الذي ضغط الزر
-            db_user = get_db_user(update, context, db_session)
-        except Exception:
-            db_user = None
 
     # التحقق: هل هو مستخدم مسجل ونشط؟
     if not db_user or not db_user.is_active:
@@ -438,7 +450,15 @@ async def on_public_refresh_callback(update: Update, context: ContextTypes.DEFAU
 
     # إذا كان مسجلاً، نتابع عملية التحديث الطبيعية
     data = TypedCallback.parse(query.data)
-    await PortfolioController.handle_refresh(update, context, db_session, db_user, data)
+    if update.effective_chat.type == "private":
+        # لوحة الإدارة تعتمد على خدمات متزامنة → UoW متزامن مستقل
+        await _on_private_refresh(update, context, callback=data)
+        return
+    await PortfolioController.handle_public_refresh_async(update, context, db_session, data)
+
+@uow_transaction
+async def _on_private_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE, db_session, db_user, callback: TypedCallback, **kwargs):
+    await PortfolioController.handle_refresh(update, context, db_session, db_user, callback)
 
 @uow_transaction
 @require_active_user
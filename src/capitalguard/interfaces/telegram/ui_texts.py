@@ -1,6 +1,9 @@
 # --- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/interfaces/telegram/ui_texts.py ---
 # File: src/capitalguard/interfaces/telegram/ui_texts.py
-# Version: v17.1.0-CLEAN-CARD (Leverage & Redundancy Fix)
+# Version: v17.2.0-BLOCK-CACHE
+# ✅ v17.2.0: build_trade_card_text يحتفظ بالكتل الثابتة (header / strategy / targets /
+#    notes / timeline / footer) في LRU مفتاحه نسخة التوصية (id, updated_at, عدد الأحداث، ...).
+#    لكل render تُحسب لوحة السعر الحي/PnL فقط، ولا lookup للسعر لبطاقة مغلقة.
 # ✅ CRITICAL FIXES:
 #    1. LEVERAGE FIX: Removed default '20x'. Only shows if explicitly set in notes (e.g., "Lev: 50x").
 #    2. CLEAN LAYOUT: Removed redundant price/symbol info to save space.
@@ -9,7 +12,9 @@
 from __future__ import annotations
 import logging
 import re
-from typing import List, Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple
 from decimal import Decimal
 from datetime import datetime
 
@@ -79,14 +84,18 @@ def _calculate_duration(rec: Recommendation) -> str:
 # --- CORE: Live Price Integration ---
 async def get_live_price(symbol: str, market: str = "Futures") -> Optional[float]:
     try:
+        # ✅ آخر تيك WS في نفس العملية أولاً — بلا Redis
+        from capitalguard.infrastructure.market.price_table import latest_prices
+        live = latest_prices.get_close(symbol)
+        if live: return live
+
         from capitalguard.infrastructure.core_engine import core_cache
         cache_key = f"price:{market.upper()}:{symbol}"
-        price = await core_cache.get(cache_key)
-        if price: return float(price)
-        
         alt_market = "SPOT" if market == "Futures" else "Futures"
         alt_key = f"price:{alt_market}:{symbol}"
-        price = await core_cache.get(alt_key)
+        # ✅ get_many: المفتاحان في round-trip واحد (L1 أولاً ثم MGET)
+        found = await core_cache.get_many([cache_key, alt_key])
+        price = found.get(cache_key) or found.get(alt_key)
         return float(price) if price else None
     except Exception: return None
 
@@ -281,59 +290,119 @@ def _build_clean_timeline(rec: Recommendation) -> str:
         return "\n".join(lines)
     except Exception: return ""
 
+# --- Block Render Cache ---
+DIVIDER = "────────────────"
+
+
+class _CardBlockCache:
+    """LRU للكتل الثابتة لكل نسخة توصية — آمن بين threads (PTB / alert loop / DbExecutor)."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            blocks = self._entries.get(key)
+            if blocks is not None:
+                self._entries.move_to_end(key)
+            return blocks
+
+    def put(self, key: tuple, blocks: Tuple[str, str]) -> None:
+        with self._lock:
+            self._entries[key] = blocks
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_card_blocks = _CardBlockCache()
+
+
+def _card_version_key(rec: Recommendation, bot_username: str) -> Optional[tuple]:
+    """نسخة التوصية كما تراها الكتل الثابتة — None (بلا cache) لتوصية غير محفوظة."""
+    rec_id = getattr(rec, 'id', None)
+    if not rec_id:
+        return None
+    return (
+        rec_id,
+        getattr(rec, 'updated_at', None),
+        len(rec.events or []),
+        str(_get_attr(rec, 'status')),
+        str(_get_attr(rec, 'stop_loss', 0)),
+        bot_username,
+    )
+
+
+def _build_static_blocks(rec: Recommendation, bot_username: str) -> Tuple[str, str]:
+    """(header, tail): كل ما لا يتغير مع السعر — tail = كل ما بعد لوحة السعر."""
+    header = _build_header(rec, bot_username)
+    parts = []
+
+    # 3. Strategy (Entry + SL + Risk)
+    parts.append(_build_strategy_block(rec))
+    parts.append("")
+
+    # 4. Targets
+    parts.append(_build_targets_block(rec))
+
+    # 5. Notes (Cleaned)
+    notes = getattr(rec, 'notes', '')
+    if notes:
+        # Remove technical notes like "Lev: 20x" from display notes
+        clean_notes = re.sub(r'Lev:?\s*\d+x?\s*\|?', '', notes, flags=re.IGNORECASE).strip()
+        if clean_notes:
+            parts.append(DIVIDER)
+            parts.append(f"📝 {clean_notes[:100]}")
+
+    # 6. Timeline
+    timeline = _build_clean_timeline(rec)
+    if timeline:
+        parts.append(DIVIDER)
+        parts.append(timeline)
+
+    # 7. Footer Link
+    link = _get_webapp_link(getattr(rec, 'id', 0), bot_username)
+    parts.append(f"\n🔍 <a href='{link}'><b>Open Analytics</b></a>")
+
+    return header, "\n".join(parts)
+
+
 # --- MAIN BUILDER (Async) ---
 async def build_trade_card_text(rec: Recommendation, bot_username: str, is_initial_publish: bool = False) -> str:
     try:
         symbol = _get_attr(rec.asset, 'value', 'SYMBOL')
         market = getattr(rec, 'market', 'Futures') or 'Futures'
-        
-        # Fetch Live Price
-        cached_price = getattr(rec, 'live_price', None)
-        if not cached_price:
-            cached_price = await get_live_price(symbol, market)
-        if not cached_price:
-            cached_price = float(_to_decimal(_get_attr(rec, 'entry', 0)))
-            
-        setattr(rec, 'live_price', cached_price)
-        
-        DIVIDER = "────────────────"
-        parts = []
-        
-        # 1. Header (Symbol + Side + Leverage)
-        parts.append(_build_header(rec, bot_username))
-        parts.append("")
-        
-        # 2. Dashboard (Live Price + PnL)
-        parts.append(_build_status_dashboard(rec, is_initial_publish))
-        parts.append(DIVIDER)
-        
-        # 3. Strategy (Entry + SL + Risk)
-        parts.append(_build_strategy_block(rec))
-        parts.append("")
-        
-        # 4. Targets
-        parts.append(_build_targets_block(rec))
-        
-        # 5. Notes (Cleaned)
-        notes = getattr(rec, 'notes', '')
-        if notes:
-            # Remove technical notes like "Lev: 20x" from display notes
-            clean_notes = re.sub(r'Lev:?\s*\d+x?\s*\|?', '', notes, flags=re.IGNORECASE).strip()
-            if clean_notes:
-                parts.append(DIVIDER)
-                parts.append(f"📝 {clean_notes[:100]}")
-        
-        # 6. Timeline
-        timeline = _build_clean_timeline(rec)
-        if timeline:
-            parts.append(DIVIDER)
-            parts.append(timeline)
-            
-        # 7. Footer Link
-        link = _get_webapp_link(getattr(rec, 'id', 0), bot_username)
-        parts.append(f"\n🔍 <a href='{link}'><b>Open Analytics</b></a>")
-        
-        return "\n".join(parts)
+        status_str = str(_get_attr(rec, 'status'))
+
+        # Fetch Live Price — البطاقة المغلقة وإشعار التفعيل الأول لا يعرضانه
+        needs_price = status_str != "CLOSED" and not (is_initial_publish and status_str == "ACTIVE")
+        if needs_price:
+            cached_price = getattr(rec, 'live_price', None)
+            if not cached_price:
+                cached_price = await get_live_price(symbol, market)
+            if not cached_price:
+                cached_price = float(_to_decimal(_get_attr(rec, 'entry', 0)))
+            setattr(rec, 'live_price', cached_price)
+
+        # 1 + 3..7: كتل ثابتة لنسخة التوصية (cache)
+        key = _card_version_key(rec, bot_username)
+        blocks = _card_blocks.get(key) if key else None
+        if blocks is None:
+            blocks = _build_static_blocks(rec, bot_username)
+            if key:
+                _card_blocks.put(key, blocks)
+        header, tail = blocks
+
+        # 2. Dashboard (Live Price + PnL) — يُحسب في كل render
+        dashboard = _build_status_dashboard(rec, is_initial_publish)
+
+        return "\n".join((header, "", dashboard, DIVIDER, tail))
     except Exception as e:
         log.error(f"Card Error: {e}", exc_info=True)
         return "📊 <b>SIGNAL ERROR</b>"
@@ -0,0 +1,109 @@
+#--- START OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/interfaces/worker/alert_worker.py ---
+# File: src/capitalguard/interfaces/worker/alert_worker.py
+# Version: v1.2.0-SHARD-LEADER-OUTBOX
+#
+# ✅ THE UPGRADE — عامل تقييم التنبيهات لـ shard واحد من الرموز:
+#   python -m capitalguard.interfaces.worker.alert_worker
+#   supervisord يُشغِّل ALERT_SHARD_COUNT نسخة، كلٌ بـ ALERT_SHARD_INDEX=%(process_num)d.
+#   العامل يبني نفس خدمات الـ API (build_services) لكن AlertService يملك
+#   SymbolShard(index, count): فهرس + BinanceWSClient + حالة المحرك لرموزه فقط.
+#   Telegram للإرسال فقط (initialize بدون polling/webhook — الـ API يستقبل التحديثات).
+#   v1.1: ALERT_LEADER_ELECTION → lease لكل shard؛ نسخ العامل في حاويات متعددة
+#   لا تُقيِّم نفس الـ shard مرتين — الاحتياطي يستلم عند سقوط القائد.
+#   v1.2: OutboxRelay محلي — إشعارات التيكات تُسلَّم من نفس العامل فور commit.
+#
+# Reviewed-by: Guardian Protocol v1 — 2026-10-16
+
+import asyncio
+import logging
+import signal
+
+from dotenv import load_dotenv
+
+# تحميل المتغيرات البيئية أولاً قبل أي استيراد
+load_dotenv()
+
+from telegram.ext import Application
+
+from capitalguard.config import settings
+from capitalguard.boot import build_services
+from capitalguard.logging_conf import setup_logging
+from capitalguard.infrastructure.sched.alert_shards import SymbolShard
+from capitalguard.infrastructure.sched.leader_election import LeaderElector
+
+log = logging.getLogger("capitalguard.alert_worker")
+
+
+async def main() -> None:
+    shard = SymbolShard(settings.ALERT_SHARD_INDEX, max(settings.ALERT_SHARD_COUNT, 1))
+    log.info("Alert worker %s starting...", shard)
+
+    # إرسال فقط — بدون persistence (حالة المحادثات ملك عملية الـ API)
+    ptb_app = None
+    if settings.TELEGRAM_BOT_TOKEN:
+        ptb_app = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+        await ptb_app.initialize()
+    else:
+        log.error("TELEGRAM_BOT_TOKEN not set — notifications disabled in this worker.")
+
+    services = build_services(ptb_app=ptb_app, alert_shard=shard)
+
+    # tick sizes لمسار fixed-point في StrategyEngine (نفس ترتيب الـ API)
+    market_data_service = services.get("market_data_service")
+    if market_data_service:
+        await market_data_service.refresh_symbols_cache()
+
+    outbox_relay = services.get("outbox_relay")
+    if outbox_relay:
+        outbox_relay.start()
+
+    alert_service = services["alert_service"]
+    elector = None
+    if settings.ALERT_LEADER_ELECTION:
+        elector = LeaderElector(
+            f"alert-shard-{shard.index}-of-{shard.count}",
+            on_elected=alert_service.start_evaluating,
+            on_revoked=alert_service.stop_evaluating,
+            lease_seconds=settings.ALERT_LEADER_LEASE_SECONDS,
+        )
+        elector.start()
+        log.info("Alert worker %s competing for its shard lease.", shard)
+    else:
+        await alert_service.start_evaluating()
+        log.info("Alert worker %s running.", shard)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        await stop_event.wait()
+    finally:
+        log.info("Alert worker %s stopping...", shard)
+        # stop() يُفرِّغ آخر checkpoint لحالات هذا الـ shard
+        if elector:
+            await elector.stop()
+        else:
+            alert_service.stop()
+        if outbox_relay:
+            await outbox_relay.stop()
+        notifier = services.get("notifier")
+        if getattr(notifier, "dispatcher", None) is not None:
+            await notifier.card_edits.flush_all()
+            await notifier.dispatcher.stop()
+        if ptb_app:
+            await ptb_app.shutdown()
+        log.info("Alert worker %s stopped.", shard)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logging.info("Alert worker stopped manually.")
+#--- END OF FULL, FINAL, AND CONFIRMED READY-TO-USE FILE: src/capitalguard/interfaces/worker/alert_worker.py ---
@@ -13,10 +13,18 @@ os.environ["TELEGRAM_BOT_TOKEN"] = "123:fake_token"
 os.environ["ENV"] = "test"
 
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker
 from capitalguard.infrastructure.db.models.base import Base
 from capitalguard.boot import build_services
 
+
+# Test DB is SQLite — render Postgres JSONB columns as JSON so create_all works.
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
 @pytest.fixture(scope="session")
 def db_engine():
     """Creates a test database engine and handles schema creation/teardown."""
@@ -0,0 +1,107 @@
+# --- START OF FILE: tests/test_alert_service.py ---
+import asyncio
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+
+from capitalguard.application.services.alert_service import AlertService, _parse_tick
+from capitalguard.application.strategy.engine import StrategyEngine
+from capitalguard.infrastructure.db.models import (
+    Recommendation, User, RecommendationStatusEnum, OrderTypeEnum,
+)
+
+
+@pytest.fixture
+def alert_service() -> AlertService:
+    """AlertService with a real StrategyEngine and mocked lifecycle/price/repo."""
+    engine = StrategyEngine(lifecycle_service=MagicMock())
+    return AlertService(
+        lifecycle_service=MagicMock(),
+        price_service=MagicMock(),
+        repo=MagicMock(),
+        strategy_engine=engine,
+    )
+
+
+def _make_rec(rec_id: int = 1, status=RecommendationStatusEnum.ACTIVE, stop_loss: str = "59000") -> Recommendation:
+    rec = Recommendation(
+        id=rec_id, analyst_id=7, asset="BTCUSDT", side="LONG",
+        entry=Decimal("60000"), stop_loss=Decimal(stop_loss),
+        targets=[{"price": "61000", "close_percent": 50}, {"price": "62000", "close_percent": 50}],
+        status=status, order_type=OrderTypeEnum.LIMIT, market="Futures",
+        is_shadow=False, profit_stop_mode="TRAILING", profit_stop_active=True,
+        profit_stop_trailing_value=Decimal("1"),
+    )
+    rec.analyst = User(id=7, telegram_user_id=1001)
+    rec.events = []
+    return rec
+
+
+def test_sync_trigger_inserts_then_replaces_in_place(alert_service: AlertService):
+    rec = _make_rec()
+    asyncio.run(alert_service.sync_trigger_from_orm(rec))
+    assert len(alert_service.active_triggers["BTCUSDT:Futures"]) == 1
+
+    rec.stop_loss = Decimal("59500")
+    asyncio.run(alert_service.sync_trigger_from_orm(rec))
+    triggers = alert_service.active_triggers["BTCUSDT:Futures"]
+    assert len(triggers) == 1
+    assert triggers[0]["stop_loss"] == Decimal("59500")
+
+
+def test_sync_trigger_preserves_strategy_watermarks(alert_service: AlertService):
+    rec = _make_rec()
+    asyncio.run(alert_service.sync_trigger_from_orm(rec))
+    alert_service.strategy_engine._state[rec.id].highest = Decimal("65000")
+
+    rec.stop_loss = Decimal("59900")
+    asyncio.run(alert_service.sync_trigger_from_orm(rec))
+    assert alert_service.strategy_engine._state[rec.id].highest == Decimal("65000")
+
+
+def test_sync_trigger_removes_closed_item(alert_service: AlertService):
+    rec = _make_rec()
+    asyncio.run(alert_service.sync_trigger_from_orm(rec))
+    rec.status = RecommendationStatusEnum.CLOSED
+    asyncio.run(alert_service.sync_trigger_from_orm(rec))
+    assert "BTCUSDT:Futures" not in alert_service.active_triggers
+    assert not alert_service.strategy_engine.has_state(rec.id)
+
+def test_busy_worker_ticks_merge_into_one_window(alert_service: AlertService):
+    key = "BTCUSDT:Futures"
+    windows = []
+
+    async def fake_worker(k, mailbox):
+        windows.append(await mailbox.get())
+
+    alert_service._symbol_worker = fake_worker
+
+    async def run():
+        alert_service._workers_lock = asyncio.Lock()
+        for low, high, close in (("100", "101", "100.5"), ("95", "99", "96"), ("97", "104", "98")):
+            await alert_service._dispatch_to_symbol(key, _parse_tick(
+                {"symbol": "BTCUSDT", "market": "Futures", "low": low, "high": high, "close": close}))
+        await alert_service._symbol_workers[key]
+
+    asyncio.run(run())
+    assert windows[0].pop("received_at") > 0
+    assert windows == [{
+        "symbol": "BTCUSDT", "market": "Futures",
+        "low": Decimal("95"), "high": Decimal("104"), "close": Decimal("98"),
+    }]
+    assert alert_service.merged_ticks[key] == 2
+
+
+def test_index_rebuild_keeps_watermarks_of_surviving_recs(alert_service: AlertService):
+    keep, gone = _make_rec(1), _make_rec(2)
+    for rec in (keep, gone):
+        asyncio.run(alert_service.sync_trigger_from_orm(rec))
+    alert_service.strategy_engine._state[keep.id].highest = Decimal("65000")
+
+    survivors = [t for t in alert_service.active_triggers["BTCUSDT:Futures"] if t.id == keep.id]
+    alert_service._apply_new_index({"BTCUSDT:Futures": survivors})
+    assert alert_service.strategy_engine._state[keep.id].highest == Decimal("65000")
+    assert not alert_service.strategy_engine.has_state(gone.id)
+
+# --- END OF FILE ---
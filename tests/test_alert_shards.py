@@ -0,0 +1,281 @@
+# --- START OF FILE: tests/test_alert_shards.py ---
+import asyncio
+import contextlib
+import json
+import time
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from capitalguard.application.services import alert_service as alert_module
+from capitalguard.application.services.alert_service import AlertService
+from capitalguard.application.strategy.engine import StrategyEngine
+from capitalguard.infrastructure.db.models import (
+    Recommendation, User, RecommendationStatusEnum, OrderTypeEnum,
+)
+from capitalguard.infrastructure.sched import alert_shards
+from capitalguard.infrastructure.sched.alert_shards import SymbolShard, shard_of
+
+SYMBOLS = [f"COIN{i}USDT" for i in range(200)]
+
+
+def _make_rec(rec_id: int, asset: str) -> Recommendation:
+    rec = Recommendation(
+        id=rec_id, analyst_id=7, asset=asset, side="LONG",
+        entry=Decimal("100"), stop_loss=Decimal("90"),
+        targets=[{"price": "110", "close_percent": 100}],
+        status=RecommendationStatusEnum.ACTIVE, order_type=OrderTypeEnum.LIMIT, market="Futures",
+        is_shadow=False, profit_stop_mode="NONE", profit_stop_active=False,
+    )
+    rec.analyst = User(id=7, telegram_user_id=1001)
+    rec.events = []
+    return rec
+
+
+def _service(**kwargs) -> AlertService:
+    return AlertService(
+        lifecycle_service=MagicMock(), price_service=MagicMock(), repo=MagicMock(),
+        strategy_engine=StrategyEngine(lifecycle_service=MagicMock()), **kwargs,
+    )
+
+
+def _owned_and_foreign(shard):
+    owned = next(s for s in SYMBOLS if shard.owns(s))
+    foreign = next(s for s in SYMBOLS if not shard.owns(s))
+    return owned, foreign
+
+
+def test_shard_of_is_stable_and_partitions_every_symbol():
+    shards = [SymbolShard(i, 4) for i in range(4)]
+    for symbol in SYMBOLS:
+        assert sum(s.owns(symbol) for s in shards) == 1
+        assert shard_of(symbol, 4) == shard_of(symbol.lower(), 4)
+    assert shard_of("BTCUSDT", 4) == 3            # crc32 — same in every process and release
+    assert all(shard_of(s, 1) == 0 for s in SYMBOLS)
+    assert min(sum(s.owns(x) for x in SYMBOLS) for s in shards) > 30
+
+
+def test_invalid_shard_is_rejected():
+    with pytest.raises(ValueError):
+        SymbolShard(3, 3)
+
+
+def test_sharded_service_indexes_only_owned_symbols(monkeypatch):
+    shard = SymbolShard(0, 2)
+    owned, foreign = _owned_and_foreign(shard)
+    svc = _service(shard=shard)
+    svc.repo.iter_active_triggers_data.return_value = [
+        svc.build_trigger_data_from_orm(_make_rec(1, owned)),
+        svc.build_trigger_data_from_orm(_make_rec(2, foreign)),
+    ]
+    monkeypatch.setattr(alert_module, "session_scope", lambda: contextlib.nullcontext(None))
+
+    asyncio.run(svc.build_triggers_index())
+    assert list(svc.active_triggers) == [f"{owned}:Futures"]
+
+    asyncio.run(svc.sync_trigger_from_orm(_make_rec(3, foreign)))
+    assert list(svc.active_triggers) == [f"{owned}:Futures"]
+
+
+def test_rebuild_releases_foreign_states_without_deleting_checkpoint():
+    shard = SymbolShard(0, 2)
+    owned, _ = _owned_and_foreign(shard)
+    svc = _service(shard=shard)
+    engine = svc.strategy_engine
+    asyncio.run(svc.sync_trigger_from_orm(_make_rec(1, owned)))
+    asyncio.run(svc.sync_trigger_from_orm(_make_rec(2, owned)))
+    engine.initialize_state_for_recommendation({"id": 99, "entry": "1"})   # restored, another shard's
+    engine._removed.clear()
+
+    survivors = [t for t in svc.active_triggers[f"{owned}:Futures"] if t.id == 1]
+    svc._apply_new_index({f"{owned}:Futures": survivors})
+    assert engine.has_state(1) and not engine.has_state(2) and not engine.has_state(99)
+    assert engine._removed == {2}                  # only our closed rec is deleted from the hash
+
+
+def test_first_rebuild_after_restart_deletes_owned_closed_checkpoints():
+    shard = SymbolShard(0, 2)
+    owned, foreign = _owned_and_foreign(shard)
+    svc = _service(shard=shard)                    # fresh process: empty index
+    engine = svc.strategy_engine
+    engine.initialize_state_for_recommendation({"id": 1, "entry": "1", "asset": owned})
+    engine.initialize_state_for_recommendation({"id": 5, "entry": "1", "asset": owned})    # closed while down
+    engine.initialize_state_for_recommendation({"id": 99, "entry": "1", "asset": foreign})
+    engine._removed.clear()
+
+    svc._apply_new_index({f"{owned}:Futures": [svc.build_trigger_data_from_orm(_make_rec(1, owned))]})
+    assert engine.has_state(1) and not engine.has_state(5) and not engine.has_state(99)
+    assert engine._removed == {5}
+
+
+def test_moving_asset_to_another_shard_releases_the_trigger():
+    shard = SymbolShard(0, 2)
+    owned, foreign = _owned_and_foreign(shard)
+    svc = _service(shard=shard)
+    rec = _make_rec(1, owned)
+    asyncio.run(svc.sync_trigger_from_orm(rec))
+    svc.strategy_engine._removed.clear()
+
+    rec.asset = foreign
+    asyncio.run(svc.sync_trigger_from_orm(rec))
+    assert svc.active_triggers == {}
+    assert not svc.strategy_engine.has_state(1) and not svc.strategy_engine._removed
+
+
+def test_forwarding_service_publishes_instead_of_indexing(monkeypatch):
+    events = []
+
+    async def publish(action, item_type, item_id, asset=None):
+        events.append((action, item_type, item_id, asset))
+
+    monkeypatch.setattr(alert_module, "publish_trigger_event", publish)
+    svc = _service(forward_updates=True)
+    rec = _make_rec(5, "SOLUSDT")
+    asyncio.run(svc.sync_trigger_from_orm(rec))
+    rec.status = RecommendationStatusEnum.CLOSED
+    asyncio.run(svc.sync_trigger_from_orm(rec))
+
+    assert svc.active_triggers == {}
+    assert events == [("UPSERT", "recommendation", 5, "SOLUSDT"), ("REMOVE", "recommendation", 5, None)]
+
+
+def test_worker_applies_trigger_events_from_db():
+    shard = SymbolShard(1, 2)
+    owned, foreign = _owned_and_foreign(shard)
+    svc = _service(shard=shard)
+    rows = {1: svc.build_trigger_data_from_orm(_make_rec(1, owned))}
+    svc._load_trigger_from_db = lambda item_type, item_id: rows.get(item_id)
+
+    async def run():
+        await svc._on_trigger_event({"action": "UPSERT", "item_type": "recommendation", "item_id": 1, "asset": owned})
+        await svc._on_trigger_event({"action": "UPSERT", "item_type": "recommendation", "item_id": 2, "asset": foreign})
+        indexed = [t.id for t in svc.active_triggers[f"{owned}:Futures"]]
+        await svc._on_trigger_event({"action": "REMOVE", "item_type": "recommendation", "item_id": 1})
+        return indexed
+
+    assert asyncio.run(run()) == [1]
+    assert svc.active_triggers == {}
+    assert not svc.strategy_engine.has_state(1)
+
+
+def test_trigger_events_reuse_one_redis_client_per_loop(monkeypatch):
+    import redis.asyncio as aioredis
+    created, published = [], []
+
+    class _FakeRedis:
+        async def publish(self, channel, message):
+            published.append(channel)
+
+    def from_url(url, **kwargs):
+        created.append(url)
+        return _FakeRedis()
+
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(aioredis, "from_url", from_url)
+
+    async def run():
+        for i in range(3):
+            await alert_shards.publish_trigger_event("UPSERT", "recommendation", i, "BTCUSDT")
+
+    asyncio.run(run())
+    asyncio.run(run())                                  # a new loop gets its own client
+    assert len(created) == 2
+    assert published == [alert_shards.TRIGGER_UPDATE_CHANNEL] * 6
+
+
+def test_listener_resyncs_after_every_subscribe(monkeypatch):
+    import redis.asyncio as aioredis
+    calls = []
+
+    class _PubSub:
+        def __init__(self, attempt):
+            self.attempt = attempt
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def subscribe(self, channel):
+            calls.append(("subscribe", self.attempt))
+
+        async def listen(self):
+            yield {"type": "message", "data": json.dumps({"item_type": "recommendation", "item_id": self.attempt})}
+            if self.attempt == 1:
+                raise ConnectionError("redis went away")   # updates published now are never delivered
+            await asyncio.Event().wait()
+
+    attempts = []
+
+    class _FakeRedis:
+        def pubsub(self):
+            attempts.append(1)
+            return _PubSub(len(attempts))
+
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(aioredis, "from_url", lambda url, **kwargs: _FakeRedis())
+
+    async def handler(event):
+        calls.append(("event", event["item_id"]))
+
+    async def resync():
+        calls.append(("resync", len(attempts)))
+
+    async def run():
+        task = asyncio.ensure_future(alert_shards.listen_trigger_events(handler, retry_seconds=0, on_subscribed=resync))
+        while ("event", 2) not in calls:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+
+    asyncio.run(run())
+    assert calls == [
+        ("subscribe", 1), ("resync", 1), ("event", 1),
+        ("subscribe", 2), ("resync", 2), ("event", 2),
+    ]
+
+
+def test_new_leader_rebuilds_index_after_subscribing(monkeypatch):
+    import redis.asyncio as aioredis
+    calls = []
+
+    class _PubSub:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def subscribe(self, channel):
+            calls.append("subscribe")
+
+        async def listen(self):
+            await asyncio.Event().wait()
+            yield {}
+
+    class _FakeRedis:
+        def pubsub(self):
+            return _PubSub()
+
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(aioredis, "from_url", lambda url, **kwargs: _FakeRedis())
+    svc = _service(streamer=MagicMock())
+
+    async def build():
+        calls.append("build")
+
+    svc.build_triggers_index = build
+    svc.strategy_engine.restore_checkpoint = AsyncMock(return_value=0)
+    asyncio.run(svc.start_evaluating())
+    try:
+        deadline = time.monotonic() + 2
+        while calls != ["build", "subscribe", "build"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        svc.stop()
+    # changes published before the subscription (election gap, failover) are picked up by the resync
+    assert calls == ["build", "subscribe", "build"]
+
+# --- END OF FILE ---
@@ -0,0 +1,155 @@
+# --- START OF FILE: tests/test_async_uow.py ---
+import asyncio
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from capitalguard.infrastructure.db import uow
+from capitalguard.infrastructure.db.models import (
+    Base, User, UserType, Recommendation, RecommendationEvent, PublishedMessage, UserTrade, UserTradeEvent,
+    RecommendationStatusEnum,
+)
+from capitalguard.infrastructure.db.repository import RecommendationRepository, UserRepository
+from capitalguard.application.services.lifecycle_service import LifecycleService
+from capitalguard.application.services.price_service import PriceService
+from capitalguard.interfaces.telegram import management_handlers
+
+pytest.importorskip("aiosqlite")
+
+
+_TABLES = [t.__table__ for t in (User, Recommendation, RecommendationEvent, PublishedMessage, UserTrade, UserTradeEvent)]
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("postgresql://u:p@h:5432/db", "postgresql+asyncpg://u:p@h:5432/db"),
+    ("postgresql+psycopg://u:p@h/db", "postgresql+asyncpg://u:p@h/db"),
+    ("postgresql+asyncpg://u:p@h/db", "postgresql+asyncpg://u:p@h/db"),
+    ("sqlite:///./dev.db", "sqlite+aiosqlite:///./dev.db"),
+])
+def test_to_async_url(url, expected):
+    assert uow.to_async_url(url) == expected
+
+
+@pytest.fixture
+def seeded_db(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine, tables=_TABLES)
+    with sessionmaker(bind=engine)() as s:
+        user = User(telegram_user_id=777, user_type=UserType.ANALYST, is_active=True)
+        s.add(user)
+        s.flush()
+        rec = Recommendation(
+            analyst_id=user.id, asset="BTCUSDT", side="LONG", entry=Decimal("100"),
+            stop_loss=Decimal("90"), targets=[{"price": 110, "close_percent": 100}],
+            status=RecommendationStatusEnum.ACTIVE, market="Futures",
+        )
+        s.add(rec)
+        s.flush()
+        s.add(RecommendationEvent(recommendation_id=rec.id, event_type="ACTIVATED"))
+        s.add(PublishedMessage(recommendation_id=rec.id, telegram_channel_id=-100, telegram_message_id=5))
+        s.commit()
+        rec_id = rec.id
+
+    monkeypatch.setattr(uow.settings, "DATABASE_URL", url)
+    yield engine, rec_id
+    asyncio.run(uow.dispose_async_engine())
+    engine.dispose()
+
+
+def test_async_twins_match_sync_reads(seeded_db):
+    engine, rec_id = seeded_db
+    repo = RecommendationRepository()
+    with sessionmaker(bind=engine)() as s:
+        sync_triggers = repo.list_all_active_triggers_data(s)
+        sync_rec = repo.get(s, rec_id)
+        sync_msgs = [(m.telegram_channel_id, m.telegram_message_id) for m in repo.get_published_messages(s, rec_id)]
+        sync_events = {e.event_type for e in sync_rec.events}
+
+    async def read():
+        async with uow.async_session_scope() as session:
+            rec = await repo.get_async(session, rec_id)
+            locked = await repo.get_for_update_async(session, rec_id)
+            msgs = await repo.get_published_messages_async(session, rec_id)
+            triggers = await repo.list_all_active_triggers_data_async(session)
+            user = await UserRepository(session).find_by_telegram_id_async(777)
+            return (
+                rec.analyst.telegram_user_id, {e.event_type for e in rec.events}, locked.id,
+                [(m.telegram_channel_id, m.telegram_message_id) for m in msgs], triggers, user.id,
+            )
+
+    analyst_tg, events, locked_id, msgs, triggers, user_id = asyncio.run(read())
+    assert analyst_tg == 777
+    assert events == sync_events == {"ACTIVATED"}
+    assert locked_id == rec_id
+    assert msgs == sync_msgs == [(-100, 5)]
+    assert triggers == sync_triggers and len(triggers) == 1
+    assert user_id == triggers[0]["user_db_id"]
+
+
+def test_async_session_scope_rolls_back_on_error(seeded_db):
+    _, rec_id = seeded_db
+    repo = RecommendationRepository()
+
+    async def failing_update():
+        async with uow.async_session_scope() as session:
+            rec = await repo.get_for_update_async(session, rec_id)
+            rec.notes = "should not persist"
+            raise RuntimeError("boom")
+
+    async def read_notes():
+        async with uow.async_session_scope() as session:
+            return (await repo.get_async(session, rec_id)).notes
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(failing_update())
+    assert asyncio.run(read_notes()) is None
+
+
+def _refresh_update(telegram_user_id, rec_id):
+    query = MagicMock()
+    query.data = f"rec:refresh:{rec_id}"
+    query.answer = AsyncMock()
+    query.message = SimpleNamespace(chat_id=-100, message_id=5)
+    update = SimpleNamespace(
+        callback_query=query, effective_user=SimpleNamespace(id=telegram_user_id),
+        effective_chat=SimpleNamespace(type="channel"), effective_message=MagicMock(),
+    )
+    lifecycle = MagicMock(spec=LifecycleService)
+    lifecycle.repo = RecommendationRepository()
+    price = MagicMock(spec=PriceService)
+    price.get_cached_price = AsyncMock(return_value=105.0)
+    context = SimpleNamespace(
+        bot=SimpleNamespace(username="cgbot"),
+        bot_data={"services": {"lifecycle_service": lifecycle, "price_service": price}},
+    )
+    return update, context
+
+
+def test_public_refresh_reads_through_async_session(seeded_db, monkeypatch):
+    _, rec_id = seeded_db
+    edits = []
+
+    async def edit(bot, chat_id, message_id, text=None, reply_markup=None, **kwargs):
+        edits.append((chat_id, message_id, text))
+        return True
+
+    monkeypatch.setattr(management_handlers, "safe_edit_message", edit)
+    sync_scope = MagicMock(side_effect=AssertionError("sync session used"))
+    monkeypatch.setattr(uow, "SessionScoped", sync_scope)
+
+    update, context = _refresh_update(777, rec_id)
+    asyncio.run(management_handlers.on_public_refresh_callback(update, context))
+    assert len(edits) == 1 and "BTCUSDT" in edits[0][2]
+    update.callback_query.answer.assert_awaited_once_with("✅ Prices Updated")
+
+    guest, context = _refresh_update(999, rec_id)              # not registered → redirected to the bot
+    asyncio.run(management_handlers.on_public_refresh_callback(guest, context))
+    assert len(edits) == 1
+    assert guest.callback_query.answer.await_args.kwargs["url"].endswith("?start=subscribe_from_channel")
+
+# --- END OF FILE ---
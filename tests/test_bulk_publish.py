@@ -0,0 +1,89 @@
+# --- START OF FILE: tests/test_bulk_publish.py ---
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from capitalguard.application.services.channel_publishing import post_card_to_channels, save_published_messages
+from capitalguard.infrastructure.db.models import (
+    Base, User, UserType, Recommendation, RecommendationEvent, PublishedMessage, UserTrade, UserTradeEvent,
+    RecommendationStatusEnum,
+)
+from capitalguard.infrastructure.notify import telegram as tg
+from capitalguard.infrastructure.notify.dispatcher import TelegramDispatcher
+
+
+def _notifier(monkeypatch, renders, sends):
+    async def build(rec, bot_username, is_initial_publish=False):
+        renders.append(rec)
+        return "card"
+
+    async def send_message(chat_id, text, keyboard=None, reply_to=None):
+        if chat_id == -3:
+            raise RuntimeError("bot was kicked")
+        sends.append((chat_id, text, keyboard))
+        return chat_id, 100 + len(sends)
+
+    monkeypatch.setattr(tg, "build_trade_card_text", build)
+    notifier = object.__new__(tg.TelegramNotifier)
+    notifier._bot_username, notifier.ptb_app = "CapitalGuardBot", None
+    notifier.dispatcher = TelegramDispatcher(max_attempts=1)
+    notifier._send_message = send_message
+    return notifier
+
+
+def test_card_is_rendered_once_for_all_channels(monkeypatch):
+    renders, sends = [], []
+    notifier = _notifier(monkeypatch, renders, sends)
+
+    async def run():
+        notifier.dispatcher.start()
+        results = await post_card_to_channels(notifier, [-1, -2, -3, -1], MagicMock(id=7), "kb")
+        await notifier.dispatcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert len(renders) == 1
+    assert sorted(s[0] for s in sends) == [-2, -1] and {s[1:] for s in sends} == {("card", "kb")}
+    assert results[0] == results[3] and results[0][0] == -1 and results[2] is None
+
+
+def test_notifier_without_bulk_path_falls_back_to_per_channel():
+    notifier = MagicMock()
+    notifier.post_to_channel = AsyncMock(side_effect=[(-1, 5), RuntimeError("boom")])
+    results = asyncio.run(post_card_to_channels(notifier, [-1, -2], MagicMock(id=7), None))
+    assert results[0] == (-1, 5) and isinstance(results[1], RuntimeError)
+    assert notifier.post_to_channel.await_count == 2
+
+
+def test_published_messages_are_saved_in_one_insert(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'publish.db'}")
+    tables = (User, Recommendation, RecommendationEvent, PublishedMessage, UserTrade, UserTradeEvent)
+    Base.metadata.create_all(engine, tables=[t.__table__ for t in tables])
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, params, context, many: statements.append(sql))
+
+    with sessionmaker(bind=engine)() as s:
+        user = User(telegram_user_id=777, user_type=UserType.ANALYST, is_active=True)
+        s.add(user)
+        s.flush()
+        rec = Recommendation(
+            analyst_id=user.id, asset="BTCUSDT", side="LONG", entry=Decimal("100"),
+            stop_loss=Decimal("90"), targets=[{"price": 110, "close_percent": 100}],
+            status=RecommendationStatusEnum.ACTIVE, market="Futures",
+        )
+        s.add(rec)
+        s.flush()
+        statements.clear()
+        save_published_messages(s, rec.id, [(-100 - i, i) for i in range(25)])
+        s.commit()
+        rows = s.query(PublishedMessage).filter_by(recommendation_id=rec.id).count()
+
+    assert rows == 25
+    assert sum("INSERT INTO published_messages" in sql for sql in statements) == 1
+    engine.dispose()
+
+# --- END OF FILE ---
@@ -0,0 +1,120 @@
+# --- START OF FILE: tests/test_card_edits.py ---
+import asyncio
+
+from telegram.error import BadRequest
+
+from capitalguard.infrastructure.notify.card_edits import CardEditCoalescer
+from capitalguard.infrastructure.notify.dispatcher import TelegramDispatcher
+
+
+def _harness(fail_first=False):
+    edits, renders = [], []
+
+    async def edit(chat_id, message_id, text, keyboard):
+        if fail_first and not edits:
+            edits.append(None)
+            raise BadRequest("chat not found")
+        edits.append((chat_id, message_id, text))
+        return True
+
+    def render_of(text):
+        async def render():
+            renders.append(text)
+            return text, None
+        return render
+
+    return edits, renders, edit, render_of
+
+
+def test_burst_of_updates_becomes_one_render_and_one_edit():
+    edits, renders, edit, render_of = _harness()
+
+    async def run():
+        dispatcher = TelegramDispatcher()
+        dispatcher.start()
+        coalescer = CardEditCoalescer(dispatcher, edit, debounce_seconds=0.05)
+        for text in ("tp1", "partial", "sl-moved"):          # same second, same card
+            coalescer.schedule(-100, 7, render_of(text))
+        coalescer.schedule(-200, 9, render_of("other-channel"))
+        await asyncio.sleep(0.15)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert renders == ["sl-moved", "other-channel"]
+    assert sorted(edits) == [(-200, 9, "other-channel"), (-100, 7, "sl-moved")]
+
+
+def test_unchanged_card_is_not_edited_again():
+    edits, renders, edit, render_of = _harness()
+
+    async def run():
+        dispatcher = TelegramDispatcher()
+        dispatcher.start()
+        coalescer = CardEditCoalescer(dispatcher, edit, debounce_seconds=0.02)
+        for text in ("v1", "v1", "v2"):
+            coalescer.schedule(-100, 7, render_of(text))
+            await asyncio.sleep(0.08)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert renders == ["v1", "v1", "v2"]
+    assert [e[2] for e in edits] == ["v1", "v2"]
+
+
+def test_failed_edit_is_retried_by_the_next_update():
+    edits, _, edit, render_of = _harness(fail_first=True)
+
+    async def run():
+        dispatcher = TelegramDispatcher()
+        dispatcher.start()
+        coalescer = CardEditCoalescer(dispatcher, edit, debounce_seconds=0.02)
+        for _ in range(2):
+            coalescer.schedule(-100, 7, render_of("v1"))
+            await asyncio.sleep(0.08)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert edits == [None, (-100, 7, "v1")]
+
+
+def test_flush_all_sends_pending_edits_immediately():
+    edits, _, edit, render_of = _harness()
+
+    async def run():
+        dispatcher = TelegramDispatcher()
+        dispatcher.start()
+        coalescer = CardEditCoalescer(dispatcher, edit, debounce_seconds=60)
+        coalescer.schedule(-100, 7, render_of("closed"))
+        await asyncio.sleep(0)
+        await coalescer.flush_all()
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert edits == [(-100, 7, "closed")]
+
+
+def test_flush_all_completes_an_edit_whose_render_is_in_flight():
+    edits, _, edit, render_of = _harness()
+
+    async def run():
+        dispatcher = TelegramDispatcher()
+        dispatcher.start()
+        coalescer = CardEditCoalescer(dispatcher, edit, debounce_seconds=0.01)
+        rendering, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_render():
+            rendering.set()
+            await release.wait()
+            return "closed", None
+
+        coalescer.schedule(-100, 7, slow_render)
+        await rendering.wait()                    # the render was already popped from _pending
+        coalescer.schedule(-100, 7, render_of("closed+pnl"))
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        await coalescer.flush_all()
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert edits == [(-100, 7, "closed"), (-100, 7, "closed+pnl")]
+
+# --- END OF FILE ---
@@ -0,0 +1,89 @@
+# --- START OF FILE: tests/test_card_render.py ---
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from capitalguard.domain.entities import OrderType, Recommendation, RecommendationStatus
+from capitalguard.domain.value_objects import Price, Side, Symbol, Targets
+from capitalguard.interfaces.telegram import ui_texts
+from capitalguard.interfaces.telegram.ui_texts import build_trade_card_text
+
+
+def _make_rec(n_targets=10, n_events=20) -> Recommendation:
+    base = datetime(2026, 10, 16, 12, 0)
+    types = ["TP1_HIT", "TP2_HIT", "PARTIAL", "SL_UPDATED", "TP3_HIT"]
+    events = [
+        SimpleNamespace(event_type=types[i % len(types)], event_timestamp=base + timedelta(minutes=i),
+                        event_data={"price": 101 + i, "amount": 5})
+        for i in range(n_events)
+    ]
+    return Recommendation(
+        asset=Symbol("BTCUSDT"), side=Side("LONG"),
+        entry=Price(Decimal("100")), stop_loss=Price(Decimal("95")),
+        targets=Targets([{"price": Decimal(101 + i), "close_percent": 10} for i in range(n_targets)]),
+        order_type=OrderType.LIMIT, id=42, status=RecommendationStatus.ACTIVE,
+        notes="Lev: 20x | breakout retest", updated_at=base, events=events,
+    )
+
+
+def _render(rec, price):
+    rec.live_price = price
+    return asyncio.run(build_trade_card_text(rec, "CapitalGuardBot"))
+
+
+def test_cached_blocks_render_the_same_card():
+    ui_texts._card_blocks.clear()
+    rec = _make_rec()
+    cold = _render(rec, 103.0)
+    warm = _render(rec, 103.0)
+    ui_texts._card_blocks.clear()
+    assert cold == warm == _render(rec, 103.0)
+    assert "TP10" in cold and "Latest Updates" in cold and "breakout retest" in cold
+
+
+def test_price_moves_only_change_the_dashboard():
+    ui_texts._card_blocks.clear()
+    rec = _make_rec()
+    first, second = _render(rec, 103.0), _render(rec, 110.0)
+    assert first != second
+    changed = [(a, b) for a, b in zip(first.splitlines(), second.splitlines()) if a != b]
+    assert len(changed) == 1 and "Price:" in changed[0][1]
+
+
+def test_new_event_or_update_invalidates_cached_blocks():
+    ui_texts._card_blocks.clear()
+    rec = _make_rec(n_events=0)
+    before = _render(rec, 103.0)
+    rec.events.append(SimpleNamespace(event_type="SL_HIT", event_timestamp=datetime(2026, 10, 16, 13, 0), event_data={}))
+    after_event = _render(rec, 103.0)
+    assert "Stop Loss" not in before and "Stop Loss" in after_event
+
+    rec.notes = "scalp"
+    rec.updated_at = rec.updated_at + timedelta(seconds=1)
+    assert "scalp" in _render(rec, 103.0)
+
+
+@pytest.mark.skipif(not os.getenv("CG_RUN_BENCHMARKS"), reason="set CG_RUN_BENCHMARKS=1 for the card render benchmark")
+def test_card_render_benchmark():
+    rec = _make_rec(n_targets=10, n_events=20)
+
+    async def rate(clear_cache, rounds=2000):
+        started = time.perf_counter()
+        for i in range(rounds):
+            if clear_cache:
+                ui_texts._card_blocks.clear()
+            rec.live_price = 100.0 + (i % 50) / 10
+            await build_trade_card_text(rec, "CapitalGuardBot")
+        return rounds / (time.perf_counter() - started)
+
+    cold = asyncio.run(rate(True))
+    warm = asyncio.run(rate(False))
+    print(f"\ncard render (10 targets, 20 events): full {cold:,.0f} cards/s, block cache {warm:,.0f} cards/s")
+    assert warm > cold
+
+# --- END OF FILE ---
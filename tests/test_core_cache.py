@@ -0,0 +1,163 @@
+# --- START OF FILE: tests/test_core_cache.py ---
+import asyncio
+import json
+import threading
+import time
+
+from prometheus_client import REGISTRY
+
+from capitalguard.infrastructure import core_engine
+from capitalguard.infrastructure.core_engine import AdvancedCacheSystem
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._ops = []
+
+    def setex(self, key, ttl, data):
+        self._ops.append((key, ttl, data))
+
+    async def execute(self):
+        self._redis.pipelines.append(self._ops)
+        for key, _, data in self._ops:
+            self._redis.store[key] = data
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.pipelines = []
+        self.mget_calls = []
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def mget(self, keys):
+        self.mget_calls.append(list(keys))
+        return [self.store.get(k) for k in keys]
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+
+def _cache(monkeypatch, **kwargs):
+    redis = _FakeRedis()
+    cache = AdvancedCacheSystem(redis_url="redis://fake", **kwargs)
+    monkeypatch.setattr(core_engine, "REDIS_AVAILABLE", True)
+    monkeypatch.setattr(cache, "_get_redis", lambda: redis)
+    return cache, redis
+
+
+def test_l1_is_bounded_lru(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entries=2)
+    lru_before = REGISTRY.get_sample_value("cg_cache_evictions_total", {"reason": "lru"}) or 0.0
+
+    async def run():
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        assert await cache.get("a") == 1      # "a" becomes most recently used
+        await cache.set("c", 3)               # evicts "b"
+        return list(cache._l1)
+
+    assert asyncio.run(run()) == ["a", "c"]
+    assert cache.stats.evictions == 1
+    assert REGISTRY.get_sample_value("cg_cache_evictions_total", {"reason": "lru"}) == lru_before + 1
+
+
+def test_expired_entries_are_swept(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    now = [1000.0]
+    monkeypatch.setattr(core_engine.time, "time", lambda: now[0])
+
+    async def run():
+        await cache.set("short", 1, ttl=1)
+        await cache.set("long", 2, ttl=60)
+        now[0] += 5
+        return cache.sweep_expired()
+
+    assert asyncio.run(run()) == 1
+    assert list(cache._l1) == ["long"]
+
+
+def test_writes_are_coalesced_into_one_pipeline(monkeypatch):
+    cache, redis = _cache(monkeypatch, flush_interval=0.05)
+
+    async def run():
+        for price in (1, 2, 3):
+            await cache.set("price:FUTURES:BTCUSDT", price)
+            await cache.set("price:SPOT:BTCUSDT", price)
+        assert redis.pipelines == []          # set() never waits on Redis
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert len(redis.pipelines) == 1 and len(redis.pipelines[0]) == 2
+    assert json.loads(redis.store["price:FUTURES:BTCUSDT"]) == 3
+
+
+def test_l2_hit_populates_l1_and_miss_is_counted(monkeypatch):
+    cache, redis = _cache(monkeypatch)
+    redis.store["k"] = json.dumps({"v": 1}).encode()
+    misses_before = REGISTRY.get_sample_value("cg_cache_misses_total") or 0.0
+
+    async def run():
+        return await cache.get("k"), await cache.get("k"), await cache.get("missing")
+
+    assert asyncio.run(run()) == ({"v": 1}, {"v": 1}, None)
+    assert (cache.stats.l2_hits, cache.stats.l1_hits, cache.stats.misses) == (1, 1, 1)
+    assert REGISTRY.get_sample_value("cg_cache_misses_total") == misses_before + 1
+
+
+def test_get_many_resolves_l1_locally_and_rest_in_one_mget(monkeypatch):
+    cache, redis = _cache(monkeypatch)
+    redis.store["b"] = json.dumps(2).encode()
+
+    async def run():
+        await cache.set_many({"a": 1})
+        return await cache.get_many(["a", "b", "c", "b"])
+
+    assert asyncio.run(run()) == {"a": 1, "b": 2}
+    assert redis.mget_calls == [["b", "c"]]
+    assert "b" in cache._l1
+
+
+class _SlowPending(dict):
+    """_pending whose iteration pauses after the first buffer — widens the race window."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.iterating = threading.Event()
+
+    def values(self):
+        for pending in super().values():
+            yield pending
+            self.iterating.set()
+            time.sleep(0.1)
+
+
+def test_delete_is_safe_while_another_loop_starts_buffering(monkeypatch):
+    cache, redis = _cache(monkeypatch)
+    cache._pending = _SlowPending({1: {"k": (1, 60)}, 2: {"k": (2, 60)}})
+
+    def other_thread():
+        cache._pending.iterating.wait(1)
+
+        async def run():
+            await cache.set("other", 3)       # new loop → new buffer in _pending
+            time.sleep(0.15)                  # keep it buffered while delete() iterates
+            await cache.flush()
+        asyncio.run(run())
+
+    t = threading.Thread(target=other_thread)
+    t.start()
+    try:
+        asyncio.run(cache.delete("k"))
+    finally:
+        t.join()
+    assert {1: {}, 2: {}}.items() <= dict(cache._pending).items()
+    assert json.loads(redis.store["other"]) == 3
+
+# --- END OF FILE ---
@@ -0,0 +1,106 @@
+# --- START OF FILE: tests/test_db_executor.py ---
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from capitalguard.application.services.alert_service import AlertService
+from capitalguard.infrastructure.db.executor import DbExecutor, origin_loop, run_on_origin_loop
+
+
+@pytest.fixture
+def executor():
+    ex = DbExecutor(workers=2, max_pending=8)
+    ex.start()
+    yield ex
+    ex.stop()
+
+
+def test_submit_runs_job_on_worker_thread(executor: DbExecutor):
+    caller = threading.get_ident()
+
+    async def job(x):
+        return threading.get_ident(), x * 2
+
+    thread_id, value = asyncio.run(executor.submit(job, 21))
+    assert value == 42
+    assert thread_id != caller
+
+
+def test_run_on_origin_loop_returns_to_submitter(executor: DbExecutor):
+    async def on_origin():
+        return asyncio.get_running_loop()
+
+    async def job():
+        assert origin_loop() is not None
+        return asyncio.get_running_loop(), await run_on_origin_loop(on_origin())
+
+    async def main():
+        job_loop, notify_loop = await executor.submit(job)
+        return asyncio.get_running_loop(), job_loop, notify_loop
+
+    caller_loop, job_loop, notify_loop = asyncio.run(main())
+    assert job_loop is not caller_loop
+    assert notify_loop is caller_loop
+
+
+def test_submit_propagates_exceptions(executor: DbExecutor):
+    async def job():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(executor.submit(job))
+
+
+def test_submit_without_start_runs_inline():
+    ex = DbExecutor(workers=1)
+
+    async def job():
+        return threading.get_ident()
+
+    assert asyncio.run(ex.submit(job)) == threading.get_ident()
+
+
+def test_alert_service_routes_lifecycle_calls_through_executor(executor: DbExecutor):
+    seen = []
+
+    async def process_activation_event(item_id):
+        seen.append((item_id, threading.get_ident()))
+
+    lifecycle = MagicMock()
+    lifecycle.process_activation_event = process_activation_event
+    svc = AlertService(
+        lifecycle_service=lifecycle, price_service=MagicMock(), repo=MagicMock(),
+        strategy_engine=MagicMock(), db_executor=executor,
+    )
+    asyncio.run(svc._submit_lifecycle(lifecycle.process_activation_event, 7))
+    assert seen and seen[0][0] == 7
+    assert seen[0][1] != threading.get_ident()
+
+
+def test_submits_pending_at_stop_fail_instead_of_hanging():
+    ex = DbExecutor(workers=1, max_pending=8)
+    ex.start()
+    started = threading.Event()
+
+    async def stuck():
+        started.set()
+        await asyncio.Event().wait()
+
+    async def queued():
+        return "never runs"
+
+    async def main():
+        submits = [asyncio.ensure_future(ex.submit(stuck))]
+        await asyncio.to_thread(started.wait, 2)
+        submits += [asyncio.ensure_future(ex.submit(queued)) for _ in range(3)]
+        await asyncio.sleep(0.05)                 # the three jobs are queued behind the stuck one
+        await asyncio.to_thread(ex.stop)
+        return await asyncio.wait_for(asyncio.gather(*submits, return_exceptions=True), 2)
+
+    results = asyncio.run(main())
+    assert len(results) == 4
+    assert all(isinstance(r, RuntimeError) and "DbExecutor stopped" in str(r) for r in results)
+
+# --- END OF FILE ---
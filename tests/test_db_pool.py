@@ -0,0 +1,52 @@
+# --- START OF FILE: tests/test_db_pool.py ---
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, exc, text
+
+from capitalguard.infrastructure.db import uow
+from capitalguard.infrastructure.db.pool import InstrumentedQueuePool, register_pool_gauges
+
+
+def _sample(name, pool="sync"):
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0.0
+
+
+def test_pool_gauges_and_checkout_timeout(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.05,
+    )
+    register_pool_gauges(engine.pool, "sync")
+    checkouts_before = _sample("cg_db_pool_checkout_seconds_count")
+    timeouts_before = _sample("cg_db_pool_checkout_timeouts_total")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert _sample("cg_db_pool_size") == 1
+        assert _sample("cg_db_pool_checked_out") == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    assert _sample("cg_db_pool_checked_out") == 0
+    assert _sample("cg_db_pool_overflow") == 0
+    assert _sample("cg_db_pool_checkout_seconds_count") == checkouts_before + 2
+    assert _sample("cg_db_pool_checkout_timeouts_total") == timeouts_before + 1
+    assert _sample("cg_db_pool_last_checkout_wait_seconds") >= 0.05
+    engine.dispose()
+
+
+def test_postgres_engine_kwargs_come_from_settings(monkeypatch):
+    monkeypatch.setattr(uow.settings, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(uow.settings, "DB_MAX_OVERFLOW", 3)
+    monkeypatch.setattr(uow.settings, "DB_POOL_TIMEOUT", 4.0)
+    monkeypatch.setattr(uow.settings, "DB_STATEMENT_TIMEOUT_MS", 15000)
+    kwargs = uow._sync_engine_kwargs("postgresql+psycopg://u:p@h/db")
+    assert kwargs["poolclass"] is InstrumentedQueuePool
+    assert (kwargs["pool_size"], kwargs["max_overflow"], kwargs["pool_timeout"]) == (7, 3, 4.0)
+    assert kwargs["connect_args"]["options"] == "-c statement_timeout=15000"
+
+    monkeypatch.setattr(uow.settings, "DB_STATEMENT_TIMEOUT_MS", 0)
+    assert "options" not in uow._sync_engine_kwargs("postgresql://u:p@h/db")["connect_args"]
+    assert "pool_size" not in uow._sync_engine_kwargs("sqlite:///./x.db")
+
+# --- END OF FILE ---
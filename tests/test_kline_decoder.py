@@ -0,0 +1,85 @@
+# --- START OF FILE: tests/test_kline_decoder.py ---
+import json
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from capitalguard.infrastructure.market import kline_decoder
+from capitalguard.infrastructure.market.kline_decoder import Kline, decode_kline
+
+# إطارات kline_1s بصيغة combined stream كما تصل من Binance
+_FRAMES = [
+    '{"stream":"btcusdt@kline_1s","data":{"e":"kline","E":1760601601002,"s":"BTCUSDT","k":{"t":1760601600000,'
+    '"T":1760601600999,"s":"BTCUSDT","i":"1s","f":5299061837,"L":5299061851,"o":"111204.01000000",'
+    '"c":"111204.00000000","h":"111204.01000000","l":"111203.99000000","v":"0.09134000","n":15,"x":true,'
+    '"q":"10157.38024790","V":"0.00312000","Q":"346.95651120","B":"0"}}}',
+    '{"stream":"ethusdt@kline_1s","data":{"e":"kline","E":1760601601004,"s":"ETHUSDT","k":{"t":1760601600000,'
+    '"T":1760601600999,"s":"ETHUSDT","i":"1s","f":2958834410,"L":2958834422,"o":"4012.36000000",'
+    '"c":"4012.40000000","h":"4012.41000000","l":"4012.35000000","v":"3.18920000","n":13,"x":true,'
+    '"q":"12796.16290500","V":"2.01130000","Q":"8070.11735110","B":"0"}}}',
+    '{"result":null,"id":3}',
+]
+
+
+def test_decode_kline_matches_stdlib_path():
+    assert decode_kline(_FRAMES[0]) == Kline("BTCUSDT", 111203.99, 111204.01, 111204.0, 1760601600000)
+    assert decode_kline(_FRAMES[1].encode()) == Kline("ETHUSDT", 4012.35, 4012.41, 4012.4, 1760601600000)
+    assert decode_kline(_FRAMES[0], loads=json.loads) == decode_kline(_FRAMES[0])
+    assert decode_kline(_FRAMES[2]) is None
+    assert decode_kline('{"data":{"k":{"s":"X","l":"0","h":"1","c":"1"}}}') is None
+    assert decode_kline('{"data": broken') is None
+
+
+def _legacy_extract(message):
+    """مسار حلقة الاستماع قبل kline_decoder — خط الأساس للمقارنة."""
+    data = json.loads(message)
+    if "result" in data and "id" in data:
+        return None
+    k = data.get("data", {}).get("k", {})
+    symbol = k.get("s")
+    if not symbol:
+        return None
+    return symbol, float(k.get("l", 0)), float(k.get("h", 0)), float(k.get("c", 0))
+
+
+def _replay(decode, frames, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for frame in frames:
+            decode(frame)
+    return len(frames) * rounds / (time.perf_counter() - started)
+
+
+def _peak_bytes_per_message(decode, frames):
+    tracemalloc.start()
+    try:
+        peaks = []
+        for frame in frames:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            decode(frame)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        return sum(peaks) / len(peaks)
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.skipif(not os.getenv("CG_RUN_BENCHMARKS"), reason="set CG_RUN_BENCHMARKS=1 for the kline replay benchmark")
+def test_kline_replay_benchmark():
+    frames = _FRAMES * 100
+    rows = [
+        ("legacy loop", _legacy_extract),
+        ("stdlib json", lambda m: decode_kline(m, json.loads)),
+    ]
+    if kline_decoder.FAST_JSON_AVAILABLE:
+        rows.append(("orjson", decode_kline))
+    print()
+    for name, decode in rows:
+        rate = _replay(decode, frames, rounds=50)
+        peak = _peak_bytes_per_message(decode, _FRAMES[:2])
+        print(f"{name:12s}: {rate:,.0f} msg/s, peak {peak:,.0f} B allocated per kline message")
+        assert rate > 0
+
+# --- END OF FILE ---
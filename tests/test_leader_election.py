@@ -0,0 +1,114 @@
+# --- START OF FILE: tests/test_leader_election.py ---
+import asyncio
+import time
+
+from capitalguard.infrastructure.sched import leader_election
+from capitalguard.infrastructure.sched.leader_election import LeaderElector
+
+
+class _FakeRedis:
+    """SET NX PX + the two lease scripts, with wall-clock expiry."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _get(self, key):
+        value, expires_at = self.data.get(key, (None, 0.0))
+        return value if time.monotonic() < expires_at else None
+
+    async def set(self, key, value, nx=False, px=None):
+        if self.down:
+            raise ConnectionError("redis down")
+        if nx and self._get(key) is not None:
+            return None
+        self.data[key] = (value, time.monotonic() + px / 1000)
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.down:
+            raise ConnectionError("redis down")
+        if self._get(key) != token:
+            return 0
+        if script == leader_election._RENEW_SCRIPT:
+            self.data[key] = (token, time.monotonic() + int(args[0]) / 1000)
+        else:
+            del self.data[key]
+        return 1
+
+
+def _elector(redis, log, name):
+    async def elected():
+        log.append((name, "elected"))
+
+    async def revoked():
+        log.append((name, "revoked"))
+
+    return LeaderElector("alerts", elected, revoked, client=redis, lease_seconds=0.3)
+
+
+async def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_single_leader_and_fast_handover_on_shutdown():
+    redis, log = _FakeRedis(), []
+
+    async def run():
+        a, b = _elector(redis, log, "a"), _elector(redis, log, "b")
+        a.start()
+        await _wait_for(lambda: a.is_leader)
+        b.start()
+        await asyncio.sleep(0.5)                       # b keeps trying while a renews
+        assert not b.is_leader
+        handover = time.monotonic()
+        await a.stop()                                 # releases the lease
+        await _wait_for(lambda: b.is_leader)
+        elapsed = time.monotonic() - handover
+        await b.stop()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    assert log == [("a", "elected"), ("a", "revoked"), ("b", "elected"), ("b", "revoked")]
+    assert elapsed < 0.3                               # within one retry interval (lease/3)
+
+
+def test_follower_takes_over_when_leader_dies_without_release():
+    redis, log = _FakeRedis(), []
+
+    async def run():
+        a, b = _elector(redis, log, "a"), _elector(redis, log, "b")
+        a.start()
+        await _wait_for(lambda: a.is_leader)
+        b.start()
+        a._task.cancel()                               # crash: no renew, no release
+        await _wait_for(lambda: b.is_leader)
+        await b.stop()
+
+    asyncio.run(run())
+    assert log[:2] == [("a", "elected"), ("b", "elected")]
+
+
+def test_leader_steps_down_when_redis_is_unreachable_past_lease():
+    redis, log = _FakeRedis(), []
+
+    async def run():
+        a = _elector(redis, log, "a")
+        a.start()
+        await _wait_for(lambda: a.is_leader)
+        redis.down = True
+        await asyncio.sleep(0.15)
+        still_leader = a.is_leader                     # transient errors within the lease are tolerated
+        await _wait_for(lambda: not a.is_leader)
+        redis.down = False
+        await _wait_for(lambda: a.is_leader)           # re-elected once Redis is back
+        await a.stop()
+        return still_leader
+
+    assert asyncio.run(run()) is True
+    assert log == [("a", "elected"), ("a", "revoked"), ("a", "elected"), ("a", "revoked")]
+
+# --- END OF FILE ---
@@ -0,0 +1,212 @@
+# --- START OF FILE: tests/test_notification_outbox.py ---
+import asyncio
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from telegram.error import Forbidden, NetworkError
+
+from capitalguard.application.services.lifecycle_service import LifecycleService
+from capitalguard.infrastructure.db.models import (
+    Base, User, UserType, Recommendation, RecommendationEvent, PublishedMessage, UserTrade, UserTradeEvent,
+    NotificationOutbox, RecommendationStatusEnum,
+)
+from capitalguard.infrastructure.db.repository import RecommendationRepository
+from capitalguard.infrastructure.notify.outbox import (
+    KIND_REPLY, OutboxRelay, enqueue_notifications, outbox_key,
+)
+
+_TABLES = [t.__table__ for t in (User, Recommendation, RecommendationEvent, PublishedMessage,
+                                 UserTrade, UserTradeEvent, NotificationOutbox)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    Base.metadata.create_all(engine, tables=_TABLES)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+
+    @contextmanager
+    def scope():
+        session = factory()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    with scope() as s:
+        user = User(telegram_user_id=777, user_type=UserType.ANALYST, is_active=True)
+        s.add(user)
+        s.flush()
+        rec = Recommendation(
+            analyst_id=user.id, asset="BTCUSDT", side="LONG", entry=Decimal("100"),
+            stop_loss=Decimal("90"), targets=[{"price": 110, "close_percent": 100}],
+            status=RecommendationStatusEnum.ACTIVE, market="Futures",
+        )
+        s.add(rec)
+        s.flush()
+        for ch, msg in ((-100, 5), (-200, 6), (-300, 7)):
+            s.add(PublishedMessage(recommendation_id=rec.id, telegram_channel_id=ch, telegram_message_id=msg))
+        rec_id = rec.id
+    yield scope, rec_id
+    engine.dispose()
+
+
+def _reply(key, chat_id, text="🎯 Hit TP1"):
+    return {"idempotency_key": outbox_key(key), "kind": KIND_REPLY, "chat_id": chat_id,
+            "reply_to_message_id": 5, "payload": {"text": text}}
+
+
+def _rows(scope):
+    with scope() as s:
+        return {r.chat_id: r for r in s.query(NotificationOutbox).all()}
+
+
+def test_rows_commit_with_the_state_change_and_keys_are_idempotent(db):
+    scope, _ = db
+    with pytest.raises(RuntimeError):
+        with scope() as s:
+            enqueue_notifications(s, [_reply("a", -100)])
+            raise RuntimeError("state change failed")
+    assert _rows(scope) == {}
+
+    with scope() as s:
+        enqueue_notifications(s, [_reply("a", -100), _reply("b", -200)])
+    with scope() as s:
+        enqueue_notifications(s, [_reply("a", -100)])         # same event replayed
+    assert sorted(_rows(scope)) == [-200, -100]
+
+
+def test_relay_delivers_retries_and_gives_up(db):
+    scope, _ = db
+    with scope() as s:
+        enqueue_notifications(s, [_reply("ok", -100), _reply("flaky", -200), _reply("kicked", -300)])
+    sent = []
+
+    async def post_notification_reply(chat_id, message_id, text, wait=False):
+        if chat_id == -200:
+            raise NetworkError("timeout")
+        if chat_id == -300:
+            raise Forbidden("bot was kicked")
+        sent.append((chat_id, message_id, text, wait))
+
+    notifier = MagicMock()
+    notifier.post_notification_reply = post_notification_reply
+    relay = OutboxRelay(notifier, session_factory=scope, retry_base_delay=60.0)
+
+    async def run():
+        first = await relay.drain_once()
+        second = await relay.drain_once()     # flaky row is backing off, others are done
+        return first, second
+
+    assert asyncio.run(run()) == (3, 0)
+    assert sent == [(-100, 5, "🎯 Hit TP1", True)]
+    rows = _rows(scope)
+    assert rows[-100].status == "SENT" and rows[-100].sent_at is not None
+    assert rows[-200].status == "PENDING" and rows[-200].attempts == 1 and "timeout" in rows[-200].last_error
+    assert rows[-300].status == "FAILED"
+
+
+def test_send_dropped_by_the_dispatcher_is_retried_and_relay_keeps_running(db):
+    scope, _ = db
+    with scope() as s:
+        enqueue_notifications(s, [_reply("dropped", -100)])
+
+    async def post_notification_reply(chat_id, message_id, text, wait=False):
+        dropped = asyncio.get_running_loop().create_future()
+        dropped.cancel()                        # lane full / dispatcher stopping
+        await dropped
+
+    notifier = MagicMock()
+    notifier.post_notification_reply = post_notification_reply
+    relay = OutboxRelay(notifier, session_factory=scope, poll_interval=0.01, retry_base_delay=60.0)
+
+    async def run():
+        relay.start()
+        await asyncio.sleep(0.2)
+        alive = not relay._task.done()
+        await relay.stop()
+        return alive
+
+    assert asyncio.run(run())
+    row = _rows(scope)[-100]
+    assert row.status == "PENDING" and row.attempts == 1 and "DeliveryCancelled" in row.last_error
+
+
+def test_claimed_rows_are_redelivered_after_the_lease_expires(db):
+    scope, _ = db
+    with scope() as s:
+        enqueue_notifications(s, [_reply("crash", -100)])
+    relay = OutboxRelay(MagicMock(), session_factory=scope, claim_seconds=0.0)
+
+    claimed = relay._claim_batch()             # relay dies before recording the outcome
+    again = relay._claim_batch()
+    assert [c.id for c in claimed] == [c.id for c in again]
+    assert again[0].attempts == 2
+
+
+def test_lease_is_renewed_while_a_slow_delivery_is_in_flight(db):
+    scope, _ = db
+    with scope() as s:
+        enqueue_notifications(s, [_reply("slow", -100)])
+    sends = []
+
+    async def post_notification_reply(chat_id, message_id, text, wait=False):
+        sends.append(chat_id)
+        await asyncio.sleep(1.0)                # flood-limited channel
+
+    notifier = MagicMock()
+    notifier.post_notification_reply = post_notification_reply
+    first = OutboxRelay(notifier, session_factory=scope, claim_seconds=0.3)
+    second = OutboxRelay(notifier, session_factory=scope, claim_seconds=0.3)
+
+    async def poll_second():
+        claimed = 0
+        for _ in range(12):
+            await asyncio.sleep(0.1)
+            claimed += await second.drain_once()
+        return claimed
+
+    async def run():
+        return await asyncio.gather(first.drain_once(), poll_second())
+
+    assert asyncio.run(run()) == [1, 0]
+    assert sends == [-100]
+    assert _rows(scope)[-100].status == "SENT"
+
+
+def test_lease_covers_the_per_chat_rate_limit_of_the_batch():
+    relay = OutboxRelay(MagicMock(), claim_seconds=60.0, chat_rate_per_minute=20.0)
+    assert relay._lease_seconds({-100: 1, -200: 1}) == 60.0
+    assert relay._lease_seconds({-100: 41, -200: 3}) == 60.0 + 120.0
+
+
+def test_lifecycle_replies_go_to_the_outbox_once_per_state_change(db):
+    scope, rec_id = db
+    notifier = MagicMock()
+    lifecycle = LifecycleService(RecommendationRepository(), notifier)
+    lifecycle.outbox_relay = MagicMock()
+
+    async def run():
+        for _ in range(2):                     # the same TP processed twice
+            with scope() as s:
+                await lifecycle.notify_reply(rec_id, "🎯 Hit TP1 at 110!", s)
+        with scope() as s:
+            s.add(RecommendationEvent(recommendation_id=rec_id, event_type="SL_UPDATED"))
+            await lifecycle.notify_reply(rec_id, "🎯 Hit TP1 at 110!", s)
+
+    asyncio.run(run())
+    with scope() as s:
+        rows = s.query(NotificationOutbox).order_by(NotificationOutbox.id).all()
+        assert [(r.chat_id, r.reply_to_message_id) for r in rows] == [(-100, 5), (-200, 6), (-300, 7)] * 2
+        assert all(r.recommendation_id == rec_id and r.status == "PENDING" for r in rows)
+    notifier.post_notification_reply.assert_not_called()
+
+# --- END OF FILE ---
@@ -0,0 +1,156 @@
+# --- START OF FILE: tests/test_price_service.py ---
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from capitalguard.application.services import price_service as price_module
+from capitalguard.application.services.price_service import PriceService
+from capitalguard.infrastructure import core_engine
+from capitalguard.infrastructure.market import price_table
+from capitalguard.infrastructure.market.price_table import LatestPriceTable
+from capitalguard.infrastructure.pricing.binance import BinancePricing
+
+
+def test_get_cached_prices_batches_ws_lookups(monkeypatch):
+    calls = []
+
+    async def get_many(keys):
+        calls.append(list(keys))
+        return {"price:FUTURES:BTCUSDT": 100.0, "price:FUTURES:ADAUSDT": 5.0}
+
+    fetched = []
+
+    async def fetch_live(self, normalized, market):
+        fetched.append((normalized, market))
+        return 1.5
+
+    monkeypatch.setattr(core_engine.core_cache, "get_many", get_many)
+    monkeypatch.setattr(PriceService, "_fetch_live", fetch_live)
+    monkeypatch.setattr(price_module, "price_cache", price_module.InMemoryCache(ttl_seconds=60))
+
+    svc = PriceService()
+    pairs = [("BTCUSDT", "Futures"), ("ADA", "Spot"), ("SOLUSDT", "Futures")]
+    prices = asyncio.run(svc.get_cached_prices(pairs))
+
+    assert prices == {("BTCUSDT", "Futures"): 100.0, ("ADA", "Spot"): 5.0, ("SOLUSDT", "Futures"): 1.5}
+    assert len(calls) == 1 and len(calls[0]) == 6
+    assert fetched == [("SOLUSDT", "Futures")]
+
+    # الاستدعاء الثاني يُخدَم من L0 بالكامل
+    assert asyncio.run(svc.get_cached_prices(pairs[:2])) == {("BTCUSDT", "Futures"): 100.0, ("ADA", "Spot"): 5.0}
+    assert len(calls) == 1
+
+
+def _cold_cache(monkeypatch):
+    async def get_many(keys):
+        return {}
+
+    async def set_many(mapping, ttl=60):
+        pass
+
+    monkeypatch.setattr(core_engine.core_cache, "get_many", get_many)
+    monkeypatch.setattr(core_engine.core_cache, "set_many", set_many)
+    monkeypatch.setattr(price_module, "price_cache", price_module.InMemoryCache(ttl_seconds=60))
+
+
+def test_many_misses_use_one_bulk_ticker_call(monkeypatch):
+    _cold_cache(monkeypatch)
+    bulk_calls = []
+
+    async def get_all_prices(spot=True, timeout=8.0):
+        bulk_calls.append(spot)
+        return {"BTCUSDT": 100.0, "ETHUSDT": 5.0, "XRPUSDT": 0.5}
+
+    async def get_price(*args, **kwargs):
+        raise AssertionError("per-symbol REST must not be used above the threshold")
+
+    async def coingecko(self, normalized):
+        return 42.0 if normalized == "NEWUSDT" else None
+
+    monkeypatch.setattr(BinancePricing, "get_all_prices", get_all_prices)
+    monkeypatch.setattr(BinancePricing, "get_price", get_price)
+    monkeypatch.setattr(PriceService, "_fetch_coingecko", coingecko)
+
+    svc = PriceService(bulk_fetch_threshold=2)
+    pairs = [("BTCUSDT", "Futures"), ("ETHUSDT", "Futures"), ("NEWUSDT", "Futures")]
+    prices = asyncio.run(svc.get_cached_prices(pairs))
+
+    assert prices == {("BTCUSDT", "Futures"): 100.0, ("ETHUSDT", "Futures"): 5.0, ("NEWUSDT", "Futures"): 42.0}
+    assert bulk_calls == [False]
+    # رموز لم تُطلب كُتبت في L0 أيضاً
+    assert price_module.price_cache.get(svc._l0_key("XRPUSDT", "Futures")) == 0.5
+    assert svc._inflight == {}
+
+
+def test_concurrent_batches_share_inflight_fetches(monkeypatch):
+    _cold_cache(monkeypatch)
+    fetched = []
+
+    async def fetch_live(self, normalized, market):
+        fetched.append(normalized)
+        await asyncio.sleep(0.01)
+        return 7.0
+
+    monkeypatch.setattr(PriceService, "_fetch_live", fetch_live)
+    svc = PriceService()
+
+    async def run():
+        return await asyncio.gather(
+            svc.get_cached_prices([("BTCUSDT", "Futures"), ("ETHUSDT", "Futures")]),
+            svc.get_cached_prices([("BTCUSDT", "Futures")]),
+        )
+
+    first, second = asyncio.run(run())
+    assert first[("BTCUSDT", "Futures")] == second[("BTCUSDT", "Futures")] == 7.0
+    assert sorted(fetched) == ["BTCUSDT", "ETHUSDT"]
+
+
+def test_concurrent_single_misses_issue_one_upstream_call(monkeypatch):
+    _cold_cache(monkeypatch)
+    calls = []
+
+    async def get_price(symbol, spot=True, timeout=4.0):
+        calls.append((symbol, spot))
+        await asyncio.sleep(0.01)
+        return 123.0
+
+    monkeypatch.setattr(BinancePricing, "get_price", get_price)
+    monkeypatch.setattr(price_module.PriceService, "_write_back_cache", lambda *a: asyncio.sleep(0))
+    before = REGISTRY.get_sample_value("cg_price_fetch_coalesced_total", {"market": "futures"}) or 0.0
+    svc = PriceService()
+
+    async def run():
+        plain = [asyncio.ensure_future(svc.get_cached_price("SOL", "Futures")) for _ in range(5)]
+        while not svc._inflight:
+            await asyncio.sleep(0)
+        # a forced refresh must not reuse the flight that started before it
+        forced = asyncio.ensure_future(svc.get_cached_price("SOLUSDT", "Futures", force_refresh=True))
+        await asyncio.sleep(0)
+        late = svc.get_cached_price("SOL", "Futures")          # joins the forced (newer) flight
+        return await asyncio.gather(*plain, forced, late)
+
+    assert asyncio.run(run()) == [123.0] * 7
+    assert calls == [("SOLUSDT", False)] * 2
+    assert REGISTRY.get_sample_value("cg_price_fetch_coalesced_total", {"market": "futures"}) == before + 5
+    assert svc._inflight == {}
+
+
+def test_latest_price_table_is_consulted_before_caches(monkeypatch):
+    async def no_cache(*args, **kwargs):
+        raise AssertionError("core_cache must not be touched for a live symbol")
+
+    table = LatestPriceTable(max_age_seconds=30)
+    monkeypatch.setattr(price_module, "latest_prices", table)
+    monkeypatch.setattr(core_engine.core_cache, "get", no_cache)
+    monkeypatch.setattr(core_engine.core_cache, "get_many", no_cache)
+    table.update("dogeusdt", low=0.1, high=0.3, close=0.2)
+
+    svc = PriceService()
+    assert asyncio.run(svc.get_cached_price("DOGE", "Futures")) == 0.2
+    assert asyncio.run(svc.get_cached_prices([("DOGEUSDT", "Spot")])) == {("DOGEUSDT", "Spot"): 0.2}
+
+    table.update("DOGEUSDT", low=0.1, high=0.3, close=0.25, ts=price_table.time.time() - 31)
+    assert table.get("DOGEUSDT") is None
+    assert table.get("DOGEUSDT", max_age=60).close == 0.25
+
+# --- END OF FILE ---
@@ -0,0 +1,179 @@
+# --- START OF FILE: tests/test_strategy_engine.py ---
+import asyncio
+import os
+import random
+import time
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+
+from capitalguard.application.services.market_data_service import MarketDataService
+from capitalguard.application.strategy.engine import StrategyEngine
+
+TICK_SIZE = Decimal("0.01")
+
+
+def _rec(rec_id, side="LONG", mode="TRAILING", entry="60000.00", sl="59000.00",
+         trailing="1", profit_price=None):
+    return {
+        "id": rec_id, "side": side, "status": "ACTIVE", "entry": Decimal(entry),
+        "stop_loss": Decimal(sl), "profit_stop_active": True, "profit_stop_mode": mode,
+        "profit_stop_trailing_value": Decimal(trailing),
+        "profit_stop_price": Decimal(profit_price) if profit_price else None,
+    }
+
+
+def _engine(fast: bool) -> StrategyEngine:
+    return StrategyEngine(
+        lifecycle_service=MagicMock(),
+        config={"percentage_threshold": 10, "min_sl_move": "0"},
+        tick_size_provider=(lambda symbol, market: TICK_SIZE) if fast else None,
+    )
+
+
+def _random_recs(rnd, n):
+    recs = []
+    for i in range(n):
+        side = rnd.choice(["LONG", "SHORT"])
+        mode = rnd.choice(["TRAILING", "FIXED", "BREAK_EVEN"])
+        entry = Decimal(rnd.randint(5_900_000, 6_100_000)).scaleb(-2)
+        sl = entry - 500 if side == "LONG" else entry + 500
+        pp = entry + 300 if side == "LONG" else entry - 300
+        # بعض السجلات بمنازل عشرية أكثر من tickSize → تُجبر مسار Decimal لهذا السجل
+        if i % 7 == 0:
+            pp += Decimal("0.001")
+        rec = _rec(i, side=side, mode=mode, entry=str(entry), sl=str(sl),
+                   trailing=rnd.choice(["1", "0.5", "250"]), profit_price=str(pp))
+        rec["break_even_after_profit_pct"] = "0.2"
+        recs.append(rec)
+    return recs
+
+
+def _random_ticks(rnd, n):
+    price = Decimal("60000.00")
+    ticks = []
+    for _ in range(n):
+        price += Decimal(rnd.randint(-20000, 20000)).scaleb(-2)
+        low = price - Decimal(rnd.randint(0, 5000)).scaleb(-2)
+        high = price + Decimal(rnd.randint(0, 5000)).scaleb(-2)
+        ticks.append({"high": high, "low": low, "close": price, "ts": 1,
+                      "symbol": "BTCUSDT", "market": "Futures"})
+    return ticks
+
+
+def test_fixed_point_path_matches_decimal_path():
+    rnd = random.Random(7)
+    recs = _random_recs(rnd, 300)
+    ticks = _random_ticks(rnd, 200)
+    slow, fast = _engine(False), _engine(True)
+
+    async def run():
+        for tick in ticks:
+            assert await fast.evaluate_batch(recs, tick) == await slow.evaluate_batch(recs, tick)
+        for rec_id, state in slow._state.items():
+            other = fast._state[rec_id]
+            assert (other.highest, other.lowest, other.in_profit_zone, other.last_trailing_sl) == \
+                   (state.highest, state.lowest, state.in_profit_zone, state.last_trailing_sl)
+
+    asyncio.run(run())
+
+
+def test_fast_path_not_used_when_state_hooks_registered():
+    engine = _engine(True)
+    seen = []
+    engine.register_hook("on_state_changed", lambda rec_id, data: seen.append(rec_id))
+    asyncio.run(engine.evaluate_batch([_rec(1)], _random_ticks(random.Random(1), 1)[0]))
+    assert 1 in seen
+
+
+def test_market_data_service_extracts_tick_size():
+    svc = MarketDataService()
+    svc._symbols_cache = {"BTCUSDT": {"markets": {"Futures-USD-M"}, "tick_sizes": {
+        "Futures-USD-M": MarketDataService._extract_tick_size(
+            {"filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.10000000"}]})}}}
+    assert svc.get_tick_size("btcusdt", "Futures") == Decimal("0.1")
+    assert svc.get_tick_size("BTCUSDT", "Spot") is None
+
+
+@pytest.mark.skipif(not os.getenv("CG_RUN_BENCHMARKS"), reason="set CG_RUN_BENCHMARKS=1 for the ticks/s benchmark")
+def test_microbenchmark_ticks_per_second_1k_recs():
+    rnd = random.Random(3)
+    recs = [_rec(i, entry=str(Decimal(rnd.randint(5_900_000, 6_100_000)).scaleb(-2))) for i in range(1000)]
+    ticks = _random_ticks(rnd, 200)
+
+    def bench(engine):
+        async def run():
+            start = time.perf_counter()
+            for tick in ticks:
+                await engine.evaluate_batch(recs, tick)
+            return len(ticks) / (time.perf_counter() - start)
+        return asyncio.run(run())
+
+    slow_tps, fast_tps = bench(_engine(False)), bench(_engine(True))
+    print(f"\n[evaluate_batch 1k recs/1 symbol] decimal={slow_tps:.0f} ticks/s "
+          f"fixed-point={fast_tps:.0f} ticks/s (x{fast_tps / slow_tps:.1f})")
+    assert slow_tps > 0 and fast_tps > 0
+
+
+class _DictStore:
+    """Same contract as RedisStrategyStateStore, backed by a dict of hashes."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.writes = []
+
+    def load_items(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def save_items(self, key, items, removed):
+        self.writes.append((dict(items), list(removed)))
+        h = self.hashes.setdefault(key, {})
+        h.update(items)
+        for field in removed:
+            h.pop(field, None)
+
+
+def _tick(high, low):
+    return {"high": Decimal(high), "low": Decimal(low), "close": Decimal(high), "ts": 1,
+            "symbol": "BTCUSDT", "market": "Futures"}
+
+
+def test_checkpoint_writes_only_changed_states_in_one_batch():
+    store = _DictStore()
+    engine = StrategyEngine(lifecycle_service=MagicMock(), storage=store, tick_size_provider=lambda s, m: TICK_SIZE)
+    recs = [_rec(1), _rec(2, side="SHORT", sl="61000.00")]
+
+    async def run():
+        await engine.evaluate_batch(recs, _tick("60000.00", "60000.00"))
+        assert await engine.checkpoint() == 2          # initial states
+        await engine.evaluate_batch(recs, _tick("60000.00", "60000.00"))
+        assert await engine.checkpoint() == 0          # nothing moved → no write
+        await engine.evaluate_batch(recs, _tick("60500.00", "60100.00"))
+        assert await engine.checkpoint() == 1          # only the LONG high moved
+    asyncio.run(run())
+    assert len(store.writes) == 2
+    assert list(store.writes[1][0]) == ["1"]
+
+
+def test_restored_watermarks_survive_restart_and_rebuild():
+    store = _DictStore()
+    first = StrategyEngine(lifecycle_service=MagicMock(), storage=store)
+    rec = _rec(7)
+    asyncio.run(first.evaluate_batch([rec], _tick("62000.00", "61000.00")))
+    first.shutdown()
+
+    second = StrategyEngine(lifecycle_service=MagicMock(), storage=store)
+    assert asyncio.run(second.restore_checkpoint()) == 1
+    second.retain_states([rec])                         # rebuild with the same rec
+    assert second._state[7].highest == Decimal("62000.00")
+
+    # a flat tick right after restart must still trail from the restored high
+    actions = asyncio.run(second.evaluate_batch([rec], _tick("60100.00", "60000.00")))
+    assert actions and actions[0].new_sl == Decimal("62000.00") * Decimal("0.99")
+
+    second.retain_states([])                            # rec closed while down
+    asyncio.run(second.checkpoint())
+    assert store.load_items(second._items_key) == {}
+
+# --- END OF FILE ---
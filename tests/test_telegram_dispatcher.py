@@ -0,0 +1,171 @@
+# --- START OF FILE: tests/test_telegram_dispatcher.py ---
+import asyncio
+import time
+
+from telegram.error import BadRequest, RetryAfter, TimedOut
+
+from capitalguard.infrastructure.notify.dispatcher import (
+    PRIORITY_BULK,
+    PRIORITY_CRITICAL,
+    PRIORITY_NORMAL,
+    TelegramDispatcher,
+)
+
+
+def _recorder(sent, label, delay=0.0):
+    async def send():
+        if delay:
+            await asyncio.sleep(delay)
+        sent.append((label, time.monotonic()))
+        return label
+    return send
+
+
+def test_submit_returns_immediately_and_result_is_awaitable():
+    sent = []
+
+    async def run():
+        dispatcher = TelegramDispatcher(concurrency=1)
+        dispatcher.start()
+        started = time.monotonic()
+        future = dispatcher.submit(-100, _recorder(sent, "post", delay=0.1))
+        enqueue_cost = time.monotonic() - started
+        result = await asyncio.wrap_future(future)
+        await dispatcher.stop()
+        return enqueue_cost, result
+
+    enqueue_cost, result = asyncio.run(run())
+    assert enqueue_cost < 0.01 and result == "post"
+
+
+def test_critical_lane_goes_before_card_edits_under_global_limit():
+    sent = []
+
+    async def run():
+        dispatcher = TelegramDispatcher(global_rate=20, concurrency=1)
+        dispatcher.start()
+        for i in range(5):
+            dispatcher.submit(-i, _recorder(sent, f"edit{i}"), PRIORITY_BULK)
+        dispatcher.submit(-50, _recorder(sent, "post"), PRIORITY_NORMAL)
+        last = dispatcher.submit(-60, _recorder(sent, "sl-reply"), PRIORITY_CRITICAL)
+        await asyncio.wrap_future(last)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    order = [label for label, _ in sent]
+    assert order.index("sl-reply") < order.index("post") < order.index("edit1")
+
+
+def test_per_chat_limit_does_not_block_other_chats():
+    sent = []
+
+    async def run():
+        # 60/min per group = 1 every second after a burst of 1
+        dispatcher = TelegramDispatcher(group_rate_per_minute=60, chat_burst=1)
+        dispatcher.start()
+        dispatcher.submit(-1, _recorder(sent, "a1"))
+        dispatcher.submit(-1, _recorder(sent, "a2"))
+        other = dispatcher.submit(-2, _recorder(sent, "b1"))
+        await asyncio.wrap_future(other)
+        await asyncio.sleep(0.1)
+        snapshot = [label for label, _ in sent]
+        await dispatcher.stop(timeout=2.0)
+        return snapshot
+
+    snapshot = asyncio.run(run())
+    assert snapshot == ["a1", "b1"]                 # a2 waits for chat -1's bucket
+    times = dict(sent)
+    assert times["a2"] - times["a1"] >= 0.9
+
+
+def test_retry_after_pauses_only_that_chat_and_retries():
+    sent, calls = [], {"n": 0}
+
+    async def flaky():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise RetryAfter(1)
+        sent.append(("flooded", time.monotonic()))
+        return "ok"
+
+    async def run():
+        dispatcher = TelegramDispatcher(group_rate_per_minute=600)
+        dispatcher.start()
+        started = time.monotonic()
+        flooded = dispatcher.submit(-1, flaky, PRIORITY_CRITICAL)
+        other = dispatcher.submit(-2, _recorder(sent, "other"))
+        await asyncio.wrap_future(other)
+        other_done = time.monotonic() - started
+        result = await asyncio.wrap_future(flooded)
+        flooded_done = time.monotonic() - started
+        await dispatcher.stop()
+        return other_done, result, flooded_done
+
+    other_done, result, flooded_done = asyncio.run(run())
+    assert other_done < 0.2 and result == "ok" and flooded_done >= 1.0
+
+
+def test_network_errors_are_retried_then_reported():
+    async def always_timeout():
+        raise TimedOut()
+
+    async def run():
+        dispatcher = TelegramDispatcher(max_attempts=2, network_retry_delay=0.01)
+        dispatcher.start()
+        future = dispatcher.submit(5, always_timeout)
+        try:
+            await asyncio.wrap_future(future)
+        except TimedOut:
+            return True
+        finally:
+            await dispatcher.stop()
+        return False
+
+    assert asyncio.run(run()) is True
+
+
+def test_bad_request_fails_at_once_without_blocking_the_chat():
+    sent, attempts = [], []
+
+    async def chat_not_found():
+        attempts.append(1)
+        raise BadRequest("Chat not found")
+
+    async def run():
+        dispatcher = TelegramDispatcher(max_attempts=5, network_retry_delay=1.0)
+        dispatcher.start()
+        bad = dispatcher.submit(-7, chat_not_found)
+        good = dispatcher.submit(-7, _recorder(sent, "next"))
+        started = time.monotonic()
+        try:
+            await asyncio.wrap_future(bad)
+        except BadRequest:
+            pass
+        await asyncio.wrap_future(good)
+        elapsed = time.monotonic() - started
+        await dispatcher.stop()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    assert len(attempts) == 1
+    assert [label for label, _ in sent] == ["next"] and elapsed < 0.5
+
+
+def test_full_lane_drops_oldest_job():
+    sent = []
+
+    async def run():
+        dispatcher = TelegramDispatcher(max_queue=2)
+        dispatcher.start()
+        # submit from the dispatcher loop before the scheduler gets a turn
+        futures = [dispatcher.submit(-1, _recorder(sent, f"edit{i}"), PRIORITY_BULK) for i in range(3)]
+        await asyncio.wrap_future(futures[-1])
+        await asyncio.sleep(0.01)
+        await dispatcher.stop()
+        return futures
+
+    futures = asyncio.run(run())
+    assert futures[0].cancelled()
+    assert [label for label, _ in sent] == ["edit1", "edit2"]
+
+# --- END OF FILE ---
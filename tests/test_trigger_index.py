@@ -0,0 +1,90 @@
+# --- START OF FILE: tests/test_trigger_index.py ---
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+from capitalguard.application.services.alert_service import AlertService, _parse_tick
+from capitalguard.application.services.trigger_index import SymbolLevelIndex
+from capitalguard.application.strategy.engine import StrategyEngine
+from capitalguard.infrastructure.db.models import (
+    RecommendationStatusEnum, UserTradeStatusEnum,
+)
+
+
+def _trigger(item_id, side="LONG", status=RecommendationStatusEnum.ACTIVE,
+             entry="100", sl="90", tps=("110", "120"), item_type="recommendation",
+             profit_stop_active=False):
+    return {
+        "id": item_id, "item_type": item_type, "user_id": "1", "asset": "BTCUSDT",
+        "side": side, "entry": Decimal(entry), "stop_loss": Decimal(sl),
+        "targets": [{"price": Decimal(p), "close_percent": 50} for p in tps],
+        "status": status, "market": "Futures", "processed_events": set(),
+        "profit_stop_active": profit_stop_active, "original_published_at": None,
+    }
+
+
+def _ids(triggers):
+    return [t["id"] for t in triggers]
+
+
+def test_quiet_tick_returns_no_candidates():
+    idx = SymbolLevelIndex()
+    idx.add(_trigger(1))
+    idx.add(_trigger(2, side="SHORT", sl="110", tps=("90", "80")))
+    assert idx.crossed(Decimal("95"), Decimal("105")) == []
+
+
+def test_long_and_short_levels_follow_price_condition_rules():
+    idx = SymbolLevelIndex()
+    idx.add(_trigger(1))                                              # LONG: SL 90, TP 110/120
+    idx.add(_trigger(2, side="SHORT", sl="110", tps=("90", "80")))    # SHORT: SL 110, TP 90/80
+    assert _ids(idx.crossed(Decimal("100"), Decimal("111"))) == [1, 2]
+    assert _ids(idx.crossed(Decimal("89"), Decimal("100"))) == [1, 2]
+    idx.add(_trigger(3, sl="50", tps=("130",)))
+    assert _ids(idx.crossed(Decimal("100"), Decimal("130"))) == [1, 2, 3]
+
+
+def test_pending_indexes_entry_not_targets():
+    idx = SymbolLevelIndex()
+    idx.add(_trigger(1, status=UserTradeStatusEnum.WATCHLIST, item_type="user_trade"))
+    assert idx.crossed(Decimal("105"), Decimal("200")) == []
+    assert _ids(idx.crossed(Decimal("99"), Decimal("105"))) == [1]
+
+
+def test_replace_and_remove_keep_arrays_in_sync():
+    idx = SymbolLevelIndex()
+    idx.add(_trigger(1))
+    idx.add(_trigger(1, sl="95"))
+    assert _ids(idx.crossed(Decimal("94"), Decimal("96"))) == [1]
+    assert idx._down_prices == [Decimal("95")]
+    assert idx.remove(("recommendation", 1))
+    assert len(idx) == 0
+    assert idx.crossed(Decimal("0"), Decimal("1000")) == []
+
+
+def test_worker_evaluates_only_crossed_triggers():
+    service = AlertService(
+        lifecycle_service=MagicMock(process_tp_hit_event=AsyncMock()),
+        price_service=MagicMock(),
+        repo=MagicMock(),
+        strategy_engine=StrategyEngine(lifecycle_service=MagicMock()),
+    )
+    service._apply_new_index({
+        "BTCUSDT:Futures": [_trigger(1), _trigger(2, sl="50", tps=("500",))],
+    })
+
+    async def run():
+        service._triggers_lock = asyncio.Lock()
+        service._workers_lock = asyncio.Lock()
+        service._evaluate_core_triggers = AsyncMock(wraps=service._evaluate_core_triggers)
+        await service._dispatch_to_symbol("BTCUSDT:Futures", _parse_tick(
+            {"symbol": "BTCUSDT", "market": "Futures", "low": "105", "high": "111", "close": "110"}))
+        await asyncio.sleep(0.01)
+        service._symbol_workers["BTCUSDT:Futures"].cancel()
+        return service._evaluate_core_triggers.await_args_list
+
+    calls = asyncio.run(run())
+    assert [c.args[0]["id"] for c in calls] == [1]
+    service.lifecycle_service.process_tp_hit_event.assert_awaited_once_with(1, 1, Decimal("110"))
+
+# --- END OF FILE ---
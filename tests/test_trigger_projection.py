@@ -0,0 +1,116 @@
+# --- START OF FILE: tests/test_trigger_projection.py ---
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from capitalguard.application.services import alert_service as alert_module
+from capitalguard.application.services.alert_service import AlertService
+from capitalguard.application.strategy.engine import StrategyEngine
+from capitalguard.infrastructure.db.models import (
+    Base, User, UserType, Recommendation, RecommendationEvent, UserTrade, UserTradeEvent,
+    RecommendationStatusEnum, UserTradeStatusEnum,
+)
+from capitalguard.infrastructure.db.repository import RecommendationRepository
+
+_TABLES = [t.__table__ for t in (User, Recommendation, RecommendationEvent, UserTrade, UserTradeEvent)]
+_REC_STATUSES = (RecommendationStatusEnum.ACTIVE, RecommendationStatusEnum.PENDING, RecommendationStatusEnum.CLOSED)
+
+
+def _seed(url, recs, events_per_rec):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine, tables=_TABLES)
+    Session = sessionmaker(bind=engine)
+    with Session() as s:
+        analyst = User(telegram_user_id=1001, user_type=UserType.ANALYST, is_active=True)
+        trader = User(telegram_user_id=2002, user_type=UserType.TRADER, is_active=True)
+        s.add_all([analyst, trader])
+        s.flush()
+        for i in range(recs):
+            price = Decimal(100 + i % 50)
+            rec = Recommendation(
+                analyst_id=analyst.id, asset=("BTCUSDT", "ETHUSDT")[i % 2], side=("LONG", "SHORT")[i % 2],
+                entry=price, stop_loss=price - 5 if i % 2 == 0 else price + 5,
+                targets=[{"price": float(price + (10 if i % 2 == 0 else -10)), "close_percent": 100}],
+                status=_REC_STATUSES[i % 3], market="Futures", is_shadow=(i % 17 == 0),
+                profit_stop_active=(i % 5 == 0), profit_stop_mode="TRAILING" if i % 5 == 0 else "NONE",
+            )
+            s.add(rec)
+            s.flush()
+            s.add_all([
+                RecommendationEvent(recommendation_id=rec.id, event_type=("ACTIVATED", "TP1_HIT", "SL_UPDATED")[j % 3])
+                for j in range(events_per_rec)
+            ])
+            if i % 4 == 0:
+                trade = UserTrade(
+                    user_id=trader.id, asset="BTCUSDT", side="LONG", entry=price, stop_loss=price - 5,
+                    targets=[{"price": float(price + 10), "close_percent": 100}],
+                    status=(UserTradeStatusEnum.ACTIVATED, UserTradeStatusEnum.WATCHLIST, UserTradeStatusEnum.CLOSED)[i % 3],
+                )
+                s.add(trade)
+                s.flush()
+                s.add(UserTradeEvent(user_trade_id=trade.id, event_type="ACTIVATED"))
+        s.commit()
+    return engine
+
+
+def _normalize(items):
+    return sorted(items, key=lambda d: (d["item_type"], d["id"]))
+
+
+def test_projection_matches_orm_path(tmp_path):
+    engine = _seed(f"sqlite:///{tmp_path / 'proj.db'}", recs=60, events_per_rec=4)
+    repo = RecommendationRepository()
+    with sessionmaker(bind=engine)() as s:
+        orm_items = repo.list_all_active_triggers_data(s)
+        lean_items = list(repo.iter_active_triggers_data(s, batch_size=7))
+    assert lean_items and _normalize(lean_items) == _normalize(orm_items)
+    assert lean_items[0]["processed_events"] == {"ACTIVATED", "TP1_HIT"}    # SL_UPDATED is not aggregated
+    engine.dispose()
+
+
+def _startup_to_first_evaluation(engine, use_projection):
+    repo = RecommendationRepository()
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def scope():
+        with Session() as s:
+            yield s
+
+    if not use_projection:
+        repo.iter_active_triggers_data = lambda s: iter(repo.list_all_active_triggers_data(s))
+    svc = AlertService(
+        lifecycle_service=MagicMock(), price_service=MagicMock(), repo=repo,
+        strategy_engine=StrategyEngine(lifecycle_service=MagicMock()),
+    )
+    original = alert_module.session_scope
+    alert_module.session_scope = scope
+    try:
+        started = time.perf_counter()
+        asyncio.run(svc.build_triggers_index())
+        crossed = svc._level_index["BTCUSDT:Futures"].crossed(Decimal("90"), Decimal("160"))
+        elapsed = time.perf_counter() - started
+    finally:
+        alert_module.session_scope = original
+    assert crossed
+    return elapsed, sum(len(v) for v in svc.active_triggers.values())
+
+
+@pytest.mark.skipif(not os.getenv("CG_RUN_BENCHMARKS"), reason="set CG_RUN_BENCHMARKS=1 for the 100k-event run")
+def test_startup_to_first_evaluation_benchmark(tmp_path):
+    engine = _seed(f"sqlite:///{tmp_path / 'bench.db'}", recs=5000, events_per_rec=20)
+    orm_s, orm_n = _startup_to_first_evaluation(engine, use_projection=False)
+    lean_s, lean_n = _startup_to_first_evaluation(engine, use_projection=True)
+    print(f"\nstartup→first evaluation (100k events): ORM {orm_s * 1000:.0f} ms, "
+          f"projection {lean_s * 1000:.0f} ms ({orm_s / lean_s:.1f}x), {lean_n} triggers")
+    assert orm_n == lean_n
+    engine.dispose()
+
+# --- END OF FILE ---
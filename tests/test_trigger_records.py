@@ -0,0 +1,123 @@
+# --- START OF FILE: tests/test_trigger_records.py ---
+import asyncio
+import os
+import random
+import tracemalloc
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from capitalguard.application.services.alert_service import AlertService
+from capitalguard.application.services.trigger_records import (
+    TriggerRecord, events_to_mask, mask_to_events, scaled_bounds,
+)
+from capitalguard.application.strategy.engine import CloseAction, StrategyEngine
+from capitalguard.infrastructure.db.models import RecommendationStatusEnum
+
+
+def _trigger_dict(item_id, side="LONG", entry="100", sl="90.5", tps=("110", "120.25"),
+                  status=RecommendationStatusEnum.ACTIVE, events=()):
+    return {
+        "id": item_id, "item_type": "recommendation", "user_id": "1", "user_db_id": 7,
+        "asset": "BTCUSDT", "side": side, "entry": Decimal(entry), "stop_loss": Decimal(sl),
+        "targets": [{"price": Decimal(p), "close_percent": 50} for p in tps],
+        "status": status, "order_type": None, "market": "Futures",
+        "processed_events": set(events), "profit_stop_mode": "NONE",
+        "profit_stop_price": None, "profit_stop_trailing_value": None,
+        "profit_stop_active": False, "original_published_at": None,
+    }
+
+
+def test_record_round_trips_dict_view():
+    d = _trigger_dict(1, events=("ACTIVATED", "TP2_HIT", "SL_UPDATED"))
+    rec = TriggerRecord.from_dict(d)
+    assert rec["entry"] == Decimal("100")
+    assert rec["stop_loss"] == Decimal("90.5")
+    assert [t["price"] for t in rec["targets"]] == [Decimal("110"), Decimal("120.25")]
+    # الأحداث التي لا يقرأها التقييم لا تُخزَّن
+    assert rec["processed_events"] == {"ACTIVATED", "TP2_HIT"}
+    assert rec.get("break_even_buffer", "0") == "0"
+    assert TriggerRecord.from_dict(rec) is rec
+
+
+def test_event_mask_round_trip():
+    events = {"ACTIVATED", "INVALIDATED", "SL_HIT", "FINAL_CLOSE", "TP1_HIT", "TP12_HIT"}
+    assert mask_to_events(events_to_mask(events)) == events
+
+
+def test_scaled_bounds_are_exact():
+    # high=100.0049 لا يصل إلى 100.005، low=100.0051 لا ينزل إليه
+    lo_i, hi_i = scaled_bounds(Decimal("100.0051"), Decimal("100.0049"), 3)
+    assert hi_i < 100005 < lo_i
+
+
+def _reference_calls(trigger, low, high):
+    """المنطق الأصلي على Decimal — مرجع للمقارنة."""
+    side, ev = trigger["side"], trigger["processed_events"]
+    up = lambda p: high >= p
+    down = lambda p: low <= p
+    sl_hit = down if side == "LONG" else up
+    tp_hit = up if side == "LONG" else down
+    if "SL_HIT" not in ev and "FINAL_CLOSE" not in ev and sl_hit(trigger["stop_loss"]):
+        return [("close", trigger["stop_loss"])]
+    return [
+        ("tp", i, t["price"])
+        for i, t in enumerate(trigger["targets"], 1)
+        if f"TP{i}_HIT" not in ev and tp_hit(t["price"])
+    ]
+
+
+def test_scaled_evaluation_matches_decimal_path():
+    rnd = random.Random(42)
+    lifecycle = MagicMock(process_tp_hit_event=AsyncMock())
+    service = AlertService(lifecycle, MagicMock(), MagicMock(), StrategyEngine(lifecycle_service=MagicMock()))
+
+    async def run():
+        for n in range(500):
+            side = rnd.choice(["LONG", "SHORT"])
+            base = Decimal(rnd.randint(1000, 100000)).scaleb(-rnd.randint(0, 6))
+            step = base / 50
+            sign = 1 if side == "LONG" else -1
+            tps = tuple(str(base + sign * step * k) for k in (1, 2, 3))
+            d = _trigger_dict(n, side=side, entry=str(base), sl=str(base - sign * step), tps=tps,
+                              events=rnd.sample(["TP1_HIT", "TP2_HIT", "SL_HIT"], rnd.randint(0, 2)))
+            low = base + step * Decimal(rnd.uniform(-2, 3)).quantize(Decimal("0.0001"))
+            high = low + step * Decimal(rnd.uniform(0, 3)).quantize(Decimal("0.0001"))
+
+            lifecycle.process_tp_hit_event.reset_mock()
+            actions = await service._evaluate_core_triggers(TriggerRecord.from_dict(d), high, low, {})
+            got = [("close", a.price) for a in actions if isinstance(a, CloseAction)]
+            got += [("tp", *c.args[1:]) for c in lifecycle.process_tp_hit_event.await_args_list]
+            assert got == _reference_calls(d, low, high), (d, low, high)
+
+    asyncio.run(run())
+
+
+# ── Memory benchmark ──────────────────────────────────────────────────────────
+
+def _measure(n, factory):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    items = [factory(i) for i in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del items
+    return size
+
+
+@pytest.mark.parametrize("n", [
+    10_000,
+    pytest.param(100_000, marks=pytest.mark.skipif(
+        not os.getenv("CG_RUN_BENCHMARKS"), reason="set CG_RUN_BENCHMARKS=1 for the 100k run")),
+])
+def test_memory_benchmark_records_vs_dicts(n):
+    dict_bytes = _measure(n, lambda i: _trigger_dict(i, entry=f"{60000 + i}.12345678", events=("ACTIVATED",)))
+    record_bytes = _measure(n, lambda i: TriggerRecord.from_dict(
+        _trigger_dict(i, entry=f"{60000 + i}.12345678", events=("ACTIVATED",))))
+    print(f"\n[trigger memory n={n}] dict={dict_bytes / n:.0f} B/trigger "
+          f"record={record_bytes / n:.0f} B/trigger ({record_bytes / dict_bytes:.0%})")
+    assert record_bytes < dict_bytes
+
+# --- END OF FILE ---
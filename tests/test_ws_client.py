@@ -0,0 +1,166 @@
+# --- START OF FILE: tests/test_ws_client.py ---
+import asyncio
+import json
+
+from capitalguard.infrastructure.market import ws_client
+from capitalguard.infrastructure.market.price_table import LatestPriceTable
+from capitalguard.infrastructure.market.ws_client import BinanceWSClient
+
+
+class _FakeWS:
+    def __init__(self):
+        self.sent = []
+        self.inbox = asyncio.Queue()
+        self.closed = False
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+    async def recv(self):
+        message = await self.inbox.get()
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    async def close(self):
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def subscribed(self):
+        streams = set()
+        for msg in self.sent:
+            params = {p.split("@")[0] for p in msg["params"]}
+            streams = streams | params if msg["method"] == "SUBSCRIBE" else streams - params
+        return streams
+
+
+def _patch_connect(monkeypatch):
+    sockets = []
+
+    def connect(url, **kwargs):
+        ws = _FakeWS()
+        sockets.append(ws)
+        return ws
+
+    monkeypatch.setattr(ws_client.websockets, "connect", connect)
+    return sockets
+
+
+def _kline(symbol, close, ts=0):
+    return json.dumps({"data": {"k": {"s": symbol, "t": ts, "l": close - 1, "h": close + 1, "c": close}}})
+
+
+def test_symbols_are_sharded_and_rebalanced(monkeypatch):
+    sockets = _patch_connect(monkeypatch)
+    table = LatestPriceTable()
+    ticks = []
+
+    async def handler(symbol, low, high, close):
+        ticks.append((symbol, close))
+
+    async def run():
+        client = BinanceWSClient(price_table=table, max_streams_per_conn=2, subscribe_rate=1000)
+        await client.start(handler)
+        await client.update_subscriptions(["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "ADAUSDT"])
+        await asyncio.sleep(0.05)
+        layout = sorted(sorted(s.symbols) for s in client.shards.values())
+        per_socket = [ws.subscribed() for ws in sockets]
+
+        sockets[0].inbox.put_nowait(_kline(sorted(per_socket[0])[0].upper(), 10.0))
+        await asyncio.sleep(0.02)
+        live = table.get_close(ticks[0][0])
+
+        # removing both symbols of one shard closes it; a new symbol fills the emptiest shard
+        emptied = next(s for s in client.shards.values() if len(s.symbols) == 2)
+        keep = client.current_symbols - emptied.symbols
+        await client.update_subscriptions(sorted(keep) + ["DOGEUSDT"])
+        await asyncio.sleep(0.05)
+        after = sorted(len(s.symbols) for s in client.shards.values())
+        await client.stop()
+        return layout, per_socket, live, after
+
+    layout, per_socket, live, after = asyncio.run(run())
+    assert len(layout) == 3 and all(len(s) <= 2 for s in layout)
+    assert sorted(sum(map(sorted, per_socket), [])) == ["adausdt", "btcusdt", "ethusdt", "solusdt", "xrpusdt"]
+    assert len(ticks) == 1 and live == 10.0
+    assert after == [2, 2]
+
+
+def test_subscribe_messages_are_batched_and_paced(monkeypatch):
+    sockets = _patch_connect(monkeypatch)
+
+    async def run():
+        client = BinanceWSClient(max_streams_per_conn=10, subscribe_rate=20, subscribe_batch_size=2)
+        await client.start(None)
+        await client.update_subscriptions([f"S{i}USDT" for i in range(5)])
+        started = asyncio.get_running_loop().time()
+        while not sockets or len(sockets[0].sent) < 3:
+            await asyncio.sleep(0.01)
+        elapsed = asyncio.get_running_loop().time() - started
+        await client.stop()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    assert [len(m["params"]) for m in sockets[0].sent] == [2, 2, 1]
+    assert elapsed >= 0.09          # 3 messages at 20/s → ≥ 2 gaps of 50 ms
+
+
+def test_shard_reconnects_and_resubscribes_its_own_symbols(monkeypatch):
+    sockets = _patch_connect(monkeypatch)
+
+    async def run():
+        client = BinanceWSClient(max_streams_per_conn=1, subscribe_rate=1000,
+                                 reconnect_base_delay=0.01, reconnect_max_delay=0.01)
+        await client.start(None)
+        await client.update_subscriptions(["BTCUSDT", "ETHUSDT"])
+        await asyncio.sleep(0.05)
+        victim = next(i for i, ws in enumerate(sockets) if ws.subscribed() == {"ethusdt"})
+        sockets[victim].inbox.put_nowait(OSError("reset"))   # reader fails → shard reconnects alone
+        await asyncio.sleep(0.1)
+        await client.stop()
+
+    asyncio.run(run())
+    assert len(sockets) == 3
+    assert sockets[-1].subscribed() == {"ethusdt"}
+
+
+def test_reconnect_backfills_gap_before_live_ticks(monkeypatch):
+    sockets = _patch_connect(monkeypatch)
+    ticks, requests = [], []
+
+    async def handler(symbol, low, high, close):
+        ticks.append((symbol, low, high, close))
+
+    async def get_klines(symbol, interval, start_ms, end_ms, spot=True, **kwargs):
+        requests.append((symbol, interval, start_ms))
+        # القاع 90 والقمة 130 حدثا أثناء الانقطاع
+        return [(start_ms, 105.0, 90.0, 100.0), (start_ms + 1000, 130.0, 99.0, 120.0)]
+
+    monkeypatch.setattr(ws_client.BinancePricing, "get_klines", get_klines)
+
+    async def run():
+        client = BinanceWSClient(subscribe_rate=1000, reconnect_base_delay=0.01, reconnect_max_delay=0.01)
+        await client.start(handler)
+        await client.update_subscriptions(["BTCUSDT"])
+        await asyncio.sleep(0.02)
+        now_ms = int(ws_client.time.time() * 1000)
+        sockets[0].inbox.put_nowait(_kline("BTCUSDT", 100.0, ts=now_ms - 5000))
+        sockets[0].inbox.put_nowait(OSError("reset"))
+        while len(sockets) < 2:
+            await asyncio.sleep(0.01)
+        sockets[1].inbox.put_nowait(_kline("BTCUSDT", 121.0, ts=now_ms))
+        await asyncio.sleep(0.05)
+        await client.stop()
+        return now_ms, client.last_seen["BTCUSDT"]
+
+    now_ms, last_seen = asyncio.run(run())
+    assert requests == [("BTCUSDT", "1s", now_ms - 5000)]
+    assert ticks == [("BTCUSDT", 99.0, 101.0, 100.0), ("BTCUSDT", 90.0, 130.0, 120.0), ("BTCUSDT", 120.0, 122.0, 121.0)]
+    assert last_seen == now_ms
+
+# --- END OF FILE ---